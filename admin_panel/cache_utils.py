@@ -3,10 +3,15 @@
 import logging
 from typing import Optional
 from config.database import redis_client
+from core.cache.tagged_keys import invalidate_tag
 from core.utils.log_rate_limiter import should_log_redis_warning
 
 logger = logging.getLogger(__name__)
 
+# Теги кеша админки (ключи регистрируются при записи через set_tagged)
+ADMIN_CACHE_TAG = "admin"
+DASHBOARD_CACHE_TAG = "admin:dashboard_stats"
+
 
 def invalidate_dashboard_cache(month: Optional[str] = None) -> int:
     """Инвалидирует кеш статистики дашборда.
@@ -26,9 +31,7 @@ def invalidate_dashboard_cache(month: Optional[str] = None) -> int:
             deleted = redis_client.delete(cache_key)
         else:
             # Инвалидируем все кеши дашборда
-            pattern = "admin:dashboard_stats:*"
-            keys = redis_client.keys(pattern)
-            deleted = redis_client.delete(*keys) if keys else 0
+            deleted = invalidate_tag(redis_client, DASHBOARD_CACHE_TAG, legacy_match="admin:dashboard_stats:*")
         
         logger.info(f"Invalidated dashboard cache: {deleted} keys (month={month or 'all'})")
         return deleted
@@ -48,9 +51,7 @@ def invalidate_admin_cache() -> int:
         return 0
     
     try:
-        pattern = "admin:*"
-        keys = redis_client.keys(pattern)
-        deleted = redis_client.delete(*keys) if keys else 0
+        deleted = invalidate_tag(redis_client, ADMIN_CACHE_TAG, legacy_match="admin:*")
         logger.info(f"Invalidated all admin caches: {deleted} keys")
         return deleted
     except Exception as e:
@@ -130,6 +130,36 @@ app.include_router(webhook_router, prefix="", tags=["webhooks"])
 app.include_router(placeholders.router, prefix="", tags=["placeholders"])
 
 
+@app.on_event("startup")
+async def load_tariff_limits():
+    """Load tariff limits table and subscribe to change notifications."""
+    from core.tariffs.tariff_cache import get_tariff_cache
+    tariff_cache = get_tariff_cache()
+    await tariff_cache.load()
+    tariff_cache.start_listener()
+
+
+@app.on_event("startup")
+async def start_webhook_inbox_consumer():
+    """Start background processing of the payment webhook inbox."""
+    from core.payments.webhook_inbox import get_webhook_inbox_consumer
+    get_webhook_inbox_consumer().start()
+
+
+@app.on_event("shutdown")
+async def stop_webhook_inbox_consumer():
+    """Stop webhook inbox consumer; unprocessed events stay in the inbox."""
+    from core.payments.webhook_inbox import get_webhook_inbox_consumer
+    await get_webhook_inbox_consumer().stop()
+
+
+@app.on_event("shutdown")
+async def stop_tariff_limits_listener():
+    """Stop tariff limits change listener."""
+    from core.tariffs.tariff_cache import get_tariff_cache
+    get_tariff_cache().stop_listener()
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint for Railway."""
@@ -3,9 +3,12 @@
 from fastapi import APIRouter, Request, Form, HTTPException, Query
 from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.templating import Jinja2Templates
-from typing import Dict, Any
+from html import escape, unescape
+from html.parser import HTMLParser
+from typing import Dict, Any, List, Optional, Tuple
 import json
 import logging
+import re
 
 try:
     from core.lexicon.service import LexiconService
@@ -25,92 +28,267 @@ templates = Jinja2Templates(directory="admin_panel/templates")
 logger = logging.getLogger(__name__)
 
 
+# Теги, которые Telegram принимает в parse_mode=HTML (атрибуты - только href у <a>)
+TELEGRAM_TAGS = frozenset({'b', 'i', 'u', 's', 'a', 'code', 'pre', 'tg-spoiler'})
+# Синонимы Quill/HTML -> тег Telegram
+TAG_ALIASES = {'strong': 'b', 'em': 'i', 'ins': 'u', 'strike': 's', 'del': 's'}
+HEADER_TAGS = frozenset({'h1', 'h2', 'h3', 'h4', 'h5', 'h6'})
+LIST_TAGS = frozenset({'ul', 'ol'})
+# Пустые пары этих тегов не делают абзац содержательным (<p><b></b></p> удаляется)
+EMPTY_FORMATTING_TAGS = frozenset({'b', 'i', 'u', 's', 'a'})
+NBSP_ENTITIES = frozenset({'nbsp', '#160', '#xa0'})
+EXTRA_NEWLINES = re.compile(r'\n{3,}')
+# Один проход по разметке: комментарий, открывающий/закрывающий тег или ссылка на символ;
+# все, что между совпадениями, - текст
+HTML_TOKEN = re.compile(
+    r'<!--.*?-->'
+    r'|<(?P<end>/)?(?P<tag>[a-zA-Z][^\s/>]*)(?P<attrs>(?:[^>"\']|"[^"]*"|\'[^\']*\')*)>'
+    r'|&(?P<ref>#[0-9]+|#[xX][0-9a-fA-F]+|[a-zA-Z][a-zA-Z0-9]*);',
+    re.DOTALL,
+)
+HREF_ATTR = re.compile(r'\bhref\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s"\'>]+))', re.IGNORECASE)
+
+
+class _QuillToTelegramParser:
+    """Streaming Quill HTML -> Telegram HTML converter (one pass over the input).
+
+    Токены режет один скомпилированный HTML_TOKEN: html.parser.HTMLParser на
+    коротких записях лексикона медленнее, чем прежняя цепочка re.sub.
+
+    Абзацы Quill буферизуются до </p>, чтобы решить, что с ними делать:
+    <p><br></p> - пустая строка, <p></p> и <p><b></b></p> - удаляются,
+    остальные - текст + перевод строки. Пробелы между </p> и следующим <p>
+    отбрасываются. Неподдерживаемые теги снимаются, содержимое остается.
+    Подряд больше двух переводов строки схлопываются один раз в result().
+    """
+
+    def __init__(self):
+        self._out: List[str] = []
+        # Токены текущего абзаца: (kind, markup, tag); kind - data/br/start/end/raw
+        self._paragraph: Optional[List[Tuple[str, str, str]]] = None
+        # Пробелы сразу после </p>: отбрасываются, если дальше идет непустой абзац
+        self._after_paragraph: Optional[List[str]] = None
+
+    # --- вывод -------------------------------------------------------------
+
+    def _emit(self, chunk: str) -> None:
+        if chunk:
+            self._out.append(chunk)
+
+    def _flush_after_paragraph(self) -> None:
+        if self._after_paragraph:
+            for chunk in self._after_paragraph:
+                self._emit(chunk)
+        self._after_paragraph = None
+
+    def _write(self, kind: str, value: str, tag: str = '') -> None:
+        if self._paragraph is not None:
+            self._paragraph.append((kind, value, tag))
+            return
+        if self._after_paragraph is not None:
+            if kind == 'data' and value.isspace():
+                self._after_paragraph.append(value)
+                return
+            self._flush_after_paragraph()
+        self._emit(value)
+
+    # --- абзацы ------------------------------------------------------------
+
+    def _open_paragraph(self) -> None:
+        if self._paragraph is not None:
+            # Вложенный <p> (Quill так не делает) - закрываем предыдущий как есть
+            self._emit_paragraph_content(self._paragraph)
+        self._paragraph = []
+
+    def _close_paragraph(self) -> None:
+        tokens, self._paragraph = self._paragraph, None
+        if tokens is None:
+            # </p> без открывающего тега
+            self._write('raw', '\n')
+            return
+
+        has_text = any(kind == 'data' and not value.isspace() for kind, value, _ in tokens)
+        if not has_text:
+            kinds = [kind for kind, _, _ in tokens if kind != 'data']
+            if not kinds:
+                return  # <p></p>
+            if kinds == ['br']:
+                # <p><br></p> - намеренная пустая строка
+                self._flush_after_paragraph()
+                self._emit('\n')
+                return
+            if self._only_empty_formatting(tokens):
+                return
+
+        # </p> ... <p> склеиваются в один перевод строки
+        self._after_paragraph = None
+        for _, value, _ in tokens:
+            self._emit(value)
+        self._emit('\n')
+        self._after_paragraph = []
+
+    def _emit_paragraph_content(self, tokens: List[Tuple[str, str, str]]) -> None:
+        self._flush_after_paragraph()
+        for _, value, _ in tokens:
+            self._emit(value)
+
+    @staticmethod
+    def _only_empty_formatting(tokens: List[Tuple[str, str, str]]) -> bool:
+        """<p> + пробелы + одна или больше пар <b>пробелы</b> вплотную друг к другу."""
+        index = 0
+        while index < len(tokens) and tokens[index][0] == 'data' and tokens[index][1].isspace():
+            index += 1
+        pairs = 0
+        while index < len(tokens):
+            kind, _, tag = tokens[index]
+            if kind != 'start' or tag not in EMPTY_FORMATTING_TAGS:
+                return False
+            index += 1
+            while index < len(tokens) and tokens[index][0] == 'data' and tokens[index][1].isspace():
+                index += 1
+            if index >= len(tokens) or tokens[index][0] != 'end' or tokens[index][2] != tag:
+                return False
+            index += 1
+            pairs += 1
+        return pairs > 0
+
+    # --- токены -------------------------------------------------------------
+
+    def feed(self, html: str) -> None:
+        position = 0
+        for match in HTML_TOKEN.finditer(html):
+            if match.start() > position:
+                self.handle_data(html[position:match.start()])
+            position = match.end()
+            tag, ref = match.group('tag', 'ref')
+            if tag is not None:
+                if match.group('end'):
+                    self.handle_endtag(tag.lower())
+                else:
+                    self.handle_starttag(tag.lower(), match.group('attrs'))
+            elif ref is not None:
+                if ref[0] == '#':
+                    self.handle_charref(ref[1:])
+                else:
+                    self.handle_entityref(ref)
+        if position < len(html):
+            self.handle_data(html[position:])
+
+    def handle_starttag(self, tag: str, attrs: str) -> None:
+        if tag == 'p':
+            self._open_paragraph()
+            return
+        if tag == 'br':
+            self._write('br', '\n')
+            return
+
+        tag = TAG_ALIASES.get(tag, tag)
+        if tag in HEADER_TAGS:
+            self._write('start', '<b>', 'b')
+        elif tag in LIST_TAGS:
+            self._write('raw', '\n')
+        elif tag == 'li':
+            self._write('raw', '• ')
+        elif tag in TELEGRAM_TAGS:
+            if tag == 'a':
+                href_match = HREF_ATTR.search(attrs)
+                href = unescape(next(filter(None, href_match.groups()), '')) if href_match else None
+                markup = f'<a href="{escape(href)}">' if href else '<a>'
+            else:
+                markup = f'<{tag}>'
+            self._write('start', markup, tag)
+
+    def handle_endtag(self, tag):
+        if tag == 'p':
+            self._close_paragraph()
+            return
+        if tag == 'br':
+            return
+
+        tag = TAG_ALIASES.get(tag, tag)
+        if tag in HEADER_TAGS:
+            self._write('end', '</b>', 'b')
+            self._write('raw', '\n')
+        elif tag in LIST_TAGS or tag == 'li':
+            self._write('raw', '\n')
+        elif tag in TELEGRAM_TAGS:
+            self._write('end', f'</{tag}>', tag)
+
+    def handle_data(self, data):
+        self._write('data', escape(data, quote=False))
+
+    def handle_entityref(self, name):
+        self._write('data', ' ' if name.lower() in NBSP_ENTITIES else f'&{name};')
+
+    def handle_charref(self, name):
+        self._write('data', ' ' if f'#{name.lower()}' in NBSP_ENTITIES else f'&#{name};')
+
+    def result(self) -> str:
+        if self._paragraph is not None:
+            # Незакрытый последний абзац
+            self._emit_paragraph_content(self._paragraph)
+            self._paragraph = None
+        self._flush_after_paragraph()
+        # Ведущие переводы строки и третий подряд не выводим
+        return EXTRA_NEWLINES.sub('\n\n', ''.join(self._out).strip('\n'))
+
+
 def convert_quill_html_to_telegram(html: str) -> str:
     """
-    Convert Quill HTML to Telegram-compatible HTML.
+    Convert Quill HTML to Telegram-compatible HTML in a single pass.
     Telegram supports: <b>, <i>, <u>, <s>, <a>, <code>, <pre>
     Preserves all spaces and line breaks exactly as set by admin.
     Only removes truly empty paragraphs (without any content).
-    
-    CRITICAL: Preserves formatting 1:1 - no extra newlines or spaces.
     """
-    import re
-    
     if not html:
         return html
-    
-    # Remove Quill-specific attributes and classes (but preserve content)
-    html = re.sub(r' class="[^"]*"', '', html)
-    html = re.sub(r' style="[^"]*"', '', html)
-    
-    # Convert non-breaking spaces to regular spaces (preserve spacing intent)
-    html = re.sub(r'&nbsp;', ' ', html, flags=re.IGNORECASE)
-    html = re.sub(r'&#160;', ' ', html)
-    
-    # Convert <strong> to <b>
-    html = re.sub(r'<strong>', '<b>', html, flags=re.IGNORECASE)
-    html = re.sub(r'</strong>', '</b>', html, flags=re.IGNORECASE)
-    
-    # Convert <em> to <i>
-    html = re.sub(r'<em>', '<i>', html, flags=re.IGNORECASE)
-    html = re.sub(r'</em>', '</i>', html, flags=re.IGNORECASE)
-    
-    # Convert headers to bold (Telegram doesn't support headers)
-    html = re.sub(r'<h[1-6][^>]*>', '<b>', html, flags=re.IGNORECASE)
-    html = re.sub(r'</h[1-6]>', '</b>\n', html, flags=re.IGNORECASE)
-    
-    # Remove unsupported tags but keep their content
-    # Keep only Telegram-compatible tags: b, i, u, s, a, code, pre
-    unsupported_tags = ['div', 'span', 'blockquote']
-    for tag in unsupported_tags:
-        html = re.sub(rf'<{tag}[^>]*>', '', html, flags=re.IGNORECASE)
-        html = re.sub(rf'</{tag}>', '', html, flags=re.IGNORECASE)
-    
-    # Handle lists - convert to simple text with bullets
-    html = re.sub(r'<ul[^>]*>|</ul>', '\n', html, flags=re.IGNORECASE)
-    html = re.sub(r'<ol[^>]*>|</ol>', '\n', html, flags=re.IGNORECASE)
-    html = re.sub(r'<li[^>]*>', '• ', html, flags=re.IGNORECASE)
-    html = re.sub(r'</li>', '\n', html, flags=re.IGNORECASE)
-    
-    # CRITICAL: Handle paragraph breaks and line breaks in correct order
-    # Strategy: Convert <p> tags to mark paragraph boundaries, then <br> for line breaks
-    # 
-    # Step 1: Convert paragraph boundaries - each </p><p> pair is a paragraph break (single \n)
-    # But if there's a <p><br></p> or <p></p> between paragraphs, that's an extra break
-    # First, mark empty paragraphs with <br> as line breaks: <p><br></p> -> <LINEBREAK>
-    html = re.sub(r'<p[^>]*>\s*<br\s*/?>\s*</p>', '<LINEBREAK>', html, flags=re.IGNORECASE)
-    html = re.sub(r'<p[^>]*>\s*</p>', '', html, flags=re.IGNORECASE)  # Remove truly empty paragraphs
-    
-    # Remove paragraphs that contain ONLY empty formatting tags (like <p><b></b></p>)
-    html = re.sub(r'<p[^>]*>\s*(?:<(?:b|i|u|s|a)[^>]*>\s*</(?:b|i|u|s|a)>)+</p>', '', html, flags=re.IGNORECASE)
-    
-    # Step 2: Convert <br> tags within paragraphs to newlines
-    html = re.sub(r'<br\s*/?>', '\n', html, flags=re.IGNORECASE)
-    
-    # Step 3: Convert paragraph boundaries to newlines
-    # Replace adjacent paragraphs: </p>...<p> becomes single \n
-    html = re.sub(r'</p>\s*<p[^>]*>', '\n', html, flags=re.IGNORECASE)
-    
-    # Remove remaining opening <p> tags
-    html = re.sub(r'<p[^>]*>', '', html, flags=re.IGNORECASE)
-    
-    # Replace closing </p> tags with newline
-    html = re.sub(r'</p>', '\n', html, flags=re.IGNORECASE)
-    
-    # Step 4: Restore <LINEBREAK> markers as newlines (these represent intentional empty lines)
-    html = html.replace('<LINEBREAK>', '\n')
-    
-    # Step 5: Clean up excessive newlines (3+ become 2 max)
-    # This preserves intentional double breaks but removes accidental triples
-    html = re.sub(r'\n{3,}', '\n\n', html)
-    
-    # DO NOT strip whitespace from individual lines - preserve all spaces as set by admin
-    # DO NOT remove single empty lines - they are intentional breaks
-    
-    # Only remove leading/trailing newlines from the entire text (but preserve internal ones)
-    html = html.strip('\n')
-    
-    return html
+
+    parser = _QuillToTelegramParser()
+    parser.feed(html)
+    return parser.result()
+
+
+class _TagBalanceParser(HTMLParser):
+    """Collects tag balance errors of Telegram HTML."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack: List[str] = []
+        self.errors: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag not in TELEGRAM_TAGS:
+            self.errors.append(f"неподдерживаемый тег <{tag}>")
+            return
+        self.stack.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.errors.append(f"неподдерживаемый тег <{tag}/>")
+
+    def handle_endtag(self, tag):
+        if tag not in TELEGRAM_TAGS:
+            self.errors.append(f"неподдерживаемый тег </{tag}>")
+        elif not self.stack:
+            self.errors.append(f"лишний закрывающий тег </{tag}>")
+        elif self.stack[-1] != tag:
+            self.errors.append(f"</{tag}> закрывает незакрытый <{self.stack[-1]}>")
+            if tag in self.stack:
+                del self.stack[len(self.stack) - 1 - self.stack[::-1].index(tag):]
+        else:
+            self.stack.pop()
+
+
+def validate_telegram_html(html: str) -> None:
+    """Raise ValueError if Telegram would reject the markup (unbalanced or unsupported tags)."""
+    if not html:
+        return
+
+    parser = _TagBalanceParser()
+    parser.feed(html)
+    parser.close()
+    errors = parser.errors + [f"не закрыт тег <{tag}>" for tag in reversed(parser.stack)]
+    if errors:
+        raise ValueError("Некорректная HTML-разметка: " + "; ".join(errors))
 
 
 def get_lexicon_categories() -> Dict[str, Dict[str, Any]]:
@@ -440,6 +618,8 @@ async def update_lexicon_entry(
         # Convert Quill HTML to Telegram-compatible HTML
         value_str = str(value) if not isinstance(value, str) else value
         value_str = convert_quill_html_to_telegram(value_str)
+        # Telegram отклонит сообщение с несбалансированными тегами - не сохраняем такое
+        validate_telegram_html(value_str)
         
         # Save to database
         success = lexicon_service.save_value(key, value_str, category)
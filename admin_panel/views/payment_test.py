@@ -51,6 +51,7 @@ async def simulate_payment(
 ):
     """Simulate payment webhook."""
     from api.webhooks.tribute import tribute_handler
+    from core.payments.webhook_inbox import get_webhook_inbox
     import uuid
     
     # Если payment_id не указан или пустой, генерируем новый
@@ -74,8 +75,9 @@ async def simulate_payment(
     }
     
     try:
-        # Обрабатываем событие напрямую (без проверки подписи для теста)
-        await tribute_handler._process_event(test_payload)
+        # Проводим событие через inbox (без проверки подписи для теста) и сразу обрабатываем очередь
+        await tribute_handler.accept_event(test_payload)
+        await get_webhook_inbox().drain()
         
         # Проверяем результат в БД
         async with AsyncSessionLocal() as session:
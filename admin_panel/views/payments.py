@@ -11,6 +11,7 @@ from typing import Optional
 from decimal import Decimal
 
 from config.database import AsyncSessionLocal
+from core.cache.system_settings_snapshot import get_system_settings_snapshot
 from database.models import Subscription, User, SubscriptionType, SystemSettings
 
 router = APIRouter()
@@ -188,6 +189,9 @@ async def update_payment_links(
             
             await session.commit()
             
+            # Бот и воркеры перечитают снимок настроек по новой версии
+            get_system_settings_snapshot().bump_version()
+            
             return RedirectResponse(url="/payments?links_updated=1", status_code=303)
             
         except Exception as e:
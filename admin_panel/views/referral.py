@@ -4,7 +4,8 @@ from fastapi import APIRouter, Request, Form, HTTPException, Query
 from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, desc
+from sqlalchemy import select, func, desc, case, tuple_
+from typing import Optional
 import logging
 
 from config.database import AsyncSessionLocal
@@ -15,108 +16,134 @@ templates = Jinja2Templates(directory="admin_panel/templates")
 logger = logging.getLogger(__name__)
 
 
+REFERRAL_PAGE_SIZE = 50
+TOP_REFERRERS_LIMIT = 10
+
+
+def _referral_counts():
+    """Subquery: referrer_id -> number of referred users (один GROUP BY на всю таблицу)."""
+    return (
+        select(User.referrer_id, func.count(User.id).label('referrals_count'))
+        .where(User.referrer_id.isnot(None))
+        .group_by(User.referrer_id)
+        .subquery('referral_counts')
+    )
+
+
+async def get_referral_stats(session: AsyncSession) -> dict:
+    """Summary cards in a single aggregate query."""
+    row = (await session.execute(
+        select(
+            func.count(User.id).label('total_users'),
+            func.count(User.referrer_id).label('total_referrers'),
+            func.count(case((User.referral_balance > 0, 1))).label('users_with_balance'),
+            func.coalesce(func.sum(User.referral_balance), 0).label('total_balance'),
+        )
+    )).one()
+    return {
+        "total_users": row.total_users or 0,
+        "total_referrers": row.total_referrers or 0,
+        "users_with_balance": row.users_with_balance or 0,
+        "total_balance": row.total_balance or 0,
+    }
+
+
+async def get_users_with_referrals(
+    session: AsyncSession,
+    after_balance: Optional[int] = None,
+    after_id: Optional[int] = None,
+    per_page: int = REFERRAL_PAGE_SIZE,
+) -> tuple[list[dict], Optional[dict]]:
+    """Page of users with balance and referral count, keyset-paginated on (referral_balance, id) DESC.
+
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    counts = _referral_counts()
+    query = (
+        select(
+            User.id,
+            User.telegram_id,
+            User.username,
+            User.first_name,
+            User.last_name,
+            User.referral_balance,
+            func.coalesce(counts.c.referrals_count, 0).label('referrals_count'),
+        )
+        .outerjoin(counts, counts.c.referrer_id == User.id)
+        .order_by(desc(User.referral_balance), desc(User.id))
+        .limit(per_page + 1)
+    )
+    if after_balance is not None and after_id is not None:
+        query = query.where(tuple_(User.referral_balance, User.id) < tuple_(after_balance, after_id))
+
+    rows = (await session.execute(query)).all()
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+
+    users = [
+        {
+            'id': row.id,
+            'telegram_id': row.telegram_id,
+            'username': row.username or '—',
+            'first_name': row.first_name or '—',
+            'last_name': row.last_name or '—',
+            'referral_balance': row.referral_balance or 0,
+            'referrals_count': row.referrals_count,
+        }
+        for row in rows
+    ]
+    next_cursor = None
+    if has_next:
+        next_cursor = {'after_balance': rows[-1].referral_balance, 'after_id': rows[-1].id}
+    return users, next_cursor
+
+
+async def get_top_referrers(session: AsyncSession, limit: int = TOP_REFERRERS_LIMIT) -> list[dict]:
+    """Top referrers by referral count from the same aggregate."""
+    counts = _referral_counts()
+    result = await session.execute(
+        select(User.id, User.telegram_id, User.referral_balance, counts.c.referrals_count)
+        .join(counts, counts.c.referrer_id == User.id)
+        .order_by(desc(counts.c.referrals_count), User.id)
+        .limit(limit)
+    )
+    return [
+        {
+            'id': row.id,
+            'telegram_id': row.telegram_id,
+            'referral_balance': row.referral_balance or 0,
+            'referrals_count': row.referrals_count,
+        }
+        for row in result
+    ]
+
+
 @router.get("/referral", response_class=HTMLResponse)
-async def referral_page(request: Request):
+async def referral_page(
+    request: Request,
+    after_balance: Optional[int] = Query(None),
+    after_id: Optional[int] = Query(None),
+    per_page: int = Query(REFERRAL_PAGE_SIZE, ge=1, le=200),
+):
     """Referral program management page."""
     try:
         async with AsyncSessionLocal() as session:
-            # Get statistics
-            # Total users with referrers
-            referrers_query = select(func.count(User.id)).where(User.referrer_id.isnot(None))
-            referrers_result = await session.execute(referrers_query)
-            total_referrers = referrers_result.scalar() or 0
-            
-            # Total users with referral balance > 0
-            balance_query = select(func.count(User.id)).where(User.referral_balance > 0)
-            balance_result = await session.execute(balance_query)
-            users_with_balance = balance_result.scalar() or 0
-            
-            # Total referral balance across all users
-            total_balance_query = select(func.sum(User.referral_balance))
-            total_balance_result = await session.execute(total_balance_query)
-            total_balance = total_balance_result.scalar() or 0
-            
-            # Users with referrals (users who have referred others)
-            referrals_query = select(
-                User.id,
-                User.telegram_id,
-                User.referral_balance,
-                func.count(User.id).label('referrals_count')
-            ).join(
-                User, User.referrer_id == User.id
-            ).group_by(User.id).limit(10)
-            
-            # Get top referrers
-            top_referrers_query = select(
-                User.id,
-                User.telegram_id,
-                User.referral_balance,
-                func.count(User.id).label('referrals_count')
-            ).where(
-                User.referrer_id.isnot(None)
-            ).group_by(User.referrer_id).order_by(desc('referrals_count')).limit(10)
-            
-            # This is complex, let's simplify
-            # Get users who referred others
-            referrer_ids_query = select(User.referrer_id).where(User.referrer_id.isnot(None)).distinct()
-            referrer_ids_result = await session.execute(referrer_ids_query)
-            referrer_ids = [row[0] for row in referrer_ids_result.fetchall()]
-            
-            top_referrers = []
-            if referrer_ids:
-                for referrer_id in referrer_ids[:10]:
-                    referrer_query = select(User).where(User.id == referrer_id)
-                    referrer_result = await session.execute(referrer_query)
-                    referrer = referrer_result.scalar_one_or_none()
-                    if referrer:
-                        # Count referrals
-                        referrals_count_query = select(func.count(User.id)).where(User.referrer_id == referrer_id)
-                        referrals_count_result = await session.execute(referrals_count_query)
-                        referrals_count = referrals_count_result.scalar() or 0
-                        top_referrers.append({
-                            'id': referrer.id,
-                            'telegram_id': referrer.telegram_id,
-                            'referral_balance': referrer.referral_balance or 0,
-                            'referrals_count': referrals_count
-                        })
-            
-            # Sort by referrals count
-            top_referrers.sort(key=lambda x: x['referrals_count'], reverse=True)
-            
-            # Get all users with their referral data (for the "Рефералы и баллы" table)
-            all_users_query = select(User).order_by(desc(User.referral_balance), desc(User.id))
-            all_users_result = await session.execute(all_users_query)
-            all_users = all_users_result.scalars().all()
-            
-            # Prepare users data with referral counts
-            users_with_referrals = []
-            for user in all_users:
-                # Count how many users this user referred
-                referrals_count_query = select(func.count(User.id)).where(User.referrer_id == user.id)
-                referrals_count_result = await session.execute(referrals_count_query)
-                referrals_count = referrals_count_result.scalar() or 0
-                
-                users_with_referrals.append({
-                    'id': user.id,
-                    'telegram_id': user.telegram_id,
-                    'username': user.username or '—',
-                    'first_name': user.first_name or '—',
-                    'last_name': user.last_name or '—',
-                    'referral_balance': user.referral_balance or 0,
-                    'referrals_count': referrals_count
-                })
-            
+            stats = await get_referral_stats(session)
+            users_with_referrals, next_cursor = await get_users_with_referrals(
+                session, after_balance=after_balance, after_id=after_id, per_page=per_page
+            )
+            top_referrers = await get_top_referrers(session)
+
             return templates.TemplateResponse(
                 "referral.html",
                 {
                     "request": request,
-                    "stats": {
-                        "total_referrers": total_referrers,
-                        "users_with_balance": users_with_balance,
-                        "total_balance": total_balance or 0,
-                    },
-                    "top_referrers": top_referrers[:10],
-                    "users_with_referrals": users_with_referrals
+                    "stats": stats,
+                    "top_referrers": top_referrers,
+                    "users_with_referrals": users_with_referrals,
+                    "next_cursor": next_cursor,
+                    "is_first_page": after_id is None,
+                    "per_page": per_page,
                 }
             )
     except Exception as e:
@@ -20,30 +20,27 @@ logger = logging.getLogger(__name__)
 async def tariff_limits_page(request: Request):
     """Display tariff limits management page."""
     try:
-        db = SessionLocal()
-        try:
-            tariff_service = TariffService(db)
-            all_limits = tariff_service.get_all_tariff_limits()
-            
-            # Convert to dict for template
-            tariff_data = {}
-            for sub_type, limits in all_limits.items():
-                tariff_data[sub_type.value] = {
-                    'analytics_limit': limits['analytics_limit'],
-                    'themes_limit': limits['themes_limit'],
-                    'theme_cooldown_days': limits['theme_cooldown_days'],
-                    'test_pro_duration_days': limits.get('test_pro_duration_days')
-                }
-            
-            return templates.TemplateResponse(
-                "tariff_limits.html",
-                {
-                    "request": request,
-                    "tariff_data": tariff_data
-                }
-            )
-        finally:
-            db.close()
+        # Лимиты берутся из таблицы тарифов в памяти, без обращения к БД
+        tariff_service = TariffService()
+        all_limits = tariff_service.get_all_tariff_limits()
+        
+        # Convert to dict for template
+        tariff_data = {}
+        for sub_type, limits in all_limits.items():
+            tariff_data[sub_type.value] = {
+                'analytics_limit': limits['analytics_limit'],
+                'themes_limit': limits['themes_limit'],
+                'theme_cooldown_days': limits['theme_cooldown_days'],
+                'test_pro_duration_days': limits.get('test_pro_duration_days')
+            }
+        
+        return templates.TemplateResponse(
+            "tariff_limits.html",
+            {
+                "request": request,
+                "tariff_data": tariff_data
+            }
+        )
     except Exception as e:
         logger.error(f"Error loading tariff limits page: {e}")
         raise HTTPException(status_code=500, detail=str(e))
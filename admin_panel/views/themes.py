@@ -8,7 +8,8 @@ from sqlalchemy import select, func, desc, or_
 from typing import Optional
 
 from config.database import AsyncSessionLocal
-from database.models import ThemeRequest, User, Subscription
+from database.models import ThemeRequest, User, Subscription, UserThemeStats
+from core.theme_stats import count_themes
 
 router = APIRouter()
 templates = Jinja2Templates(directory="admin_panel/templates")
@@ -18,71 +19,60 @@ templates = Jinja2Templates(directory="admin_panel/templates")
 async def themes_page(request: Request, status: Optional[str] = Query(None), page: int = 1, per_page: int = 20):
     """Themes management page."""
     async with AsyncSessionLocal() as session:
-        # Build query - показываем только выданные темы (ISSUED) по умолчанию
+        # Build filter - показываем только выданные темы (ISSUED) по умолчанию
         if not status or status == "ISSUED":
-            query = select(ThemeRequest).where(ThemeRequest.status == "ISSUED")
+            status_filter = [ThemeRequest.status == "ISSUED"]
         elif status == "ALL":
-            query = select(ThemeRequest)  # Показываем все
+            status_filter = []  # Показываем все
         else:
-            query = select(ThemeRequest).where(ThemeRequest.status == status)
+            status_filter = [ThemeRequest.status == status]
         
         # Get total count
-        if not status or status == "ISSUED":
-            total_count_query = select(func.count(ThemeRequest.id)).where(ThemeRequest.status == "ISSUED")
-        elif status == "ALL":
-            total_count_query = select(func.count(ThemeRequest.id))
-        else:
-            total_count_query = select(func.count(ThemeRequest.id)).where(ThemeRequest.status == status)
-        
+        total_count_query = select(func.count(ThemeRequest.id)).where(*status_filter)
         total_count = await session.execute(total_count_query)
         total = total_count.scalar() or 0
         
-        # Get paginated results
+        # Get paginated results with user and issued themes stats in one query
         offset = (page - 1) * per_page
-        query = query.order_by(desc(ThemeRequest.created_at)).limit(per_page).offset(offset)
-        
+        query = (
+            select(
+                ThemeRequest.id,
+                ThemeRequest.user_id,
+                ThemeRequest.theme_name,
+                ThemeRequest.status,
+                ThemeRequest.created_at,
+                User.telegram_id,
+                User.username,
+                User.first_name,
+                User.last_name,
+                UserThemeStats.issued_count,
+            )
+            .outerjoin(User, User.id == ThemeRequest.user_id)
+            .outerjoin(UserThemeStats, UserThemeStats.user_id == ThemeRequest.user_id)
+            .where(*status_filter)
+            .order_by(desc(ThemeRequest.created_at))
+            .limit(per_page)
+            .offset(offset)
+        )
         result = await session.execute(query)
-        theme_requests = result.scalars().all()
         
-        # Get user information for each request and calculate issued themes count
         requests_with_users = []
-        for tr in theme_requests:
-            user_result = await session.execute(
-                select(User).where(User.id == tr.user_id)
-            )
-            user = user_result.scalar_one_or_none()
-            
-            # Calculate total issued themes count for this user
-            issued_requests_query = select(ThemeRequest).where(
-                ThemeRequest.user_id == tr.user_id,
-                ThemeRequest.status == "ISSUED"
-            )
-            issued_requests_result = await session.execute(issued_requests_query)
-            issued_requests = issued_requests_result.scalars().all()
-            
-            # Count themes (split by \n)
-            total_issued_themes = 0
-            for issued_req in issued_requests:
-                if issued_req.theme_name:
-                    themes = [t.strip() for t in issued_req.theme_name.split('\n') if t.strip()]
-                    total_issued_themes += len(themes)
-            
-            # Count themes in current request
-            current_request_themes_count = 0
-            if tr.theme_name:
-                current_themes = [t.strip() for t in tr.theme_name.split('\n') if t.strip()]
-                current_request_themes_count = len(current_themes)
+        for row in result.all():
+            if row.first_name:
+                user_name = f"{row.first_name} {row.last_name}"
+            else:
+                user_name = row.username if row.username else f"ID: {row.user_id}"
             
             requests_with_users.append({
-                "id": tr.id,
-                "user_id": tr.user_id,
-                "user_name": f"{user.first_name} {user.last_name}" if user and user.first_name else (user.username if user and user.username else f"ID: {tr.user_id}"),
-                "user_telegram_id": user.telegram_id if user else None,
-                "username": user.username if user else None,
-                "status": tr.status,
-                "created_at": tr.created_at,
-                "current_request_themes_count": current_request_themes_count,
-                "total_issued_themes": total_issued_themes
+                "id": row.id,
+                "user_id": row.user_id,
+                "user_name": user_name,
+                "user_telegram_id": row.telegram_id,
+                "username": row.username,
+                "status": row.status,
+                "created_at": row.created_at,
+                "current_request_themes_count": count_themes(row.theme_name),
+                "total_issued_themes": row.issued_count or 0
             })
         
         # Get statistics
@@ -11,6 +11,7 @@ from typing import Optional, List
 from datetime import datetime, timedelta
 
 from config.database import AsyncSessionLocal, redis_client
+from core.cache.system_settings_snapshot import get_system_settings_snapshot
 from database.models import User, SubscriptionType, SystemSettings
 from database.models import Limits, CSVAnalysis, Subscription, AnalyticsReport, ThemeRequest
 
@@ -629,6 +630,7 @@ async def update_admin_ids(request_body: dict = Body(...)):
                 logger.info("Invalidated Redis cache for admin_ids")
             except Exception as e:
                 logger.warning(f"Failed to invalidate Redis cache: {e}")
+            get_system_settings_snapshot().bump_version()
             
             return JSONResponse(content={
                 "success": True,
@@ -11,6 +11,7 @@ from fastapi import APIRouter, Request, HTTPException, Depends, Form
 from fastapi.responses import JSONResponse
 
 from api.webhooks.tribute import tribute_webhook, tribute_handler
+from core.payments.webhook_inbox import get_webhook_inbox
 from config.settings import settings
 
 
@@ -100,8 +101,9 @@ async def test_tribute_webhook(
                     content={"error": "Invalid signature", "message": "Проверка подписи не пройдена"}
                 )
         
-        # Обрабатываем событие напрямую
-        await tribute_handler._process_event(test_payload)
+        # Проводим событие через inbox и сразу обрабатываем очередь
+        await tribute_handler.accept_event(test_payload, payload_str)
+        await get_webhook_inbox().drain()
         
         return JSONResponse(
             status_code=200,
@@ -151,6 +153,12 @@ async def test_webhook(request: Request):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@webhook_router.get("/webhook/metrics")
+async def webhook_metrics():
+    """Webhook inbox metrics: ingest latency, processing lag and backlog."""
+    return JSONResponse(status_code=200, content=await get_webhook_inbox().get_metrics())
+
+
 # Health check endpoint
 @webhook_router.get("/health")
 async def health_check():
@@ -3,11 +3,15 @@
 import hashlib
 import hmac
 import json
+import time
 from typing import Dict, Any
 from aiohttp import web
 from aiohttp.web_request import Request
 
 from config.settings import settings
+from core.payments.webhook_inbox import InboxEvent, get_webhook_inbox, get_webhook_inbox_consumer
+
+PROVIDER = "boosty"
 
 
 class BoostyWebhookHandler:
@@ -30,7 +34,12 @@ class BoostyWebhookHandler:
         return hmac.compare_digest(signature, expected_signature)
     
     async def handle_webhook(self, request: Request) -> web.Response:
-        """Handle Boosty webhook."""
+        """Handle Boosty webhook.
+        
+        Event is appended to the durable webhook inbox and processed
+        asynchronously by the inbox consumer.
+        """
+        started = time.perf_counter()
         try:
             # Get headers
             signature = request.headers.get('X-Boosty-Signature', '')
@@ -45,8 +54,11 @@ class BoostyWebhookHandler:
             # Parse JSON
             data = json.loads(payload)
             
-            # Process event
-            await self._process_event(data)
+            # Persist event before acknowledging
+            inbox = get_webhook_inbox()
+            inserted = await inbox.ingest(self._build_inbox_event(data, payload))
+            inbox.metrics.observe_ingest(time.perf_counter() - started, duplicate=not inserted)
+            get_webhook_inbox_consumer().notify()
             
             return web.Response(status=200, text="OK")
             
@@ -54,46 +66,55 @@ class BoostyWebhookHandler:
             print(f"Error processing Boosty webhook: {e}")
             return web.Response(status=500, text="Internal error")
     
-    async def _process_event(self, data: Dict[str, Any]):
-        """Process Boosty event."""
+    def _build_inbox_event(self, data: Dict[str, Any], payload: str) -> InboxEvent:
+        """Convert Boosty event to a normalized inbox event."""
         event_type = data.get('type')
+        payment_id = data.get('payment_id')
+        payment_id = str(payment_id) if payment_id is not None else None
+        event_id = str(data.get('id') or payment_id or hashlib.sha256(payload.encode()).hexdigest())
         
         if event_type == 'payment.success':
-            await self._handle_payment_success(data)
-        elif event_type == 'payment.failed':
-            await self._handle_payment_failed(data)
+            user_id = data.get('user_id')
+            if not all([payment_id, user_id, data.get('subscription_type')]):
+                return InboxEvent(
+                    provider=PROVIDER,
+                    event_id=f"{event_type}:{event_id}",
+                    event_name=event_type,
+                    payload=payload,
+                    payment_id=payment_id,
+                    ignore_reason="Incomplete payment data",
+                )
+            
+            print(f"Payment success: {payment_id}, user: {user_id}, amount: {data.get('amount')}")
+            return InboxEvent(
+                provider=PROVIDER,
+                event_id=f"{event_type}:{event_id}",
+                event_name=event_type,
+                payload=payload,
+                payment_id=payment_id,
+                telegram_user_id=int(user_id),
+                subscription_type=data.get('subscription_type'),
+                amount=data.get('amount'),
+                discount_percent=data.get('discount_percent', 0) or 0,
+            )
+        
+        if event_type == 'payment.failed':
+            self._handle_payment_failed(data)
+            reason = "Payment failed"
         else:
             print(f"Unknown event type: {event_type}")
-    
-    async def _handle_payment_success(self, data: Dict[str, Any]):
-        """Handle successful payment."""
-        # Extract payment information
-        payment_id = data.get('payment_id')
-        user_id = data.get('user_id')
-        amount = data.get('amount')
-        subscription_type = data.get('subscription_type')
-        discount_percent = data.get('discount_percent', 0)
-        
-        print(f"Payment success: {payment_id}, user: {user_id}, amount: {amount}")
+            reason = f"Unknown event type: {event_type}"
         
-        # Process payment with payment handler
-        from core.subscriptions.payment_handler import PaymentHandler
-        payment_handler = PaymentHandler()
-        
-        success = await payment_handler.process_payment_success(
+        return InboxEvent(
+            provider=PROVIDER,
+            event_id=f"{event_type}:{event_id}",
+            event_name=event_type,
+            payload=payload,
             payment_id=payment_id,
-            user_id=user_id,
-            amount=amount,
-            subscription_type=subscription_type,
-            discount_percent=discount_percent
+            ignore_reason=reason,
         )
-        
-        if success:
-            print(f"Subscription activated successfully for user {user_id}")
-        else:
-            print(f"Failed to activate subscription for user {user_id}")
     
-    async def _handle_payment_failed(self, data: Dict[str, Any]):
+    def _handle_payment_failed(self, data: Dict[str, Any]):
         """Handle failed payment."""
         payment_id = data.get('payment_id')
         user_id = data.get('user_id')
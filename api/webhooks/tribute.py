@@ -3,13 +3,15 @@
 import hashlib
 import hmac
 import json
+import time
 from typing import Dict, Any, Optional
 from fastapi import Request
 from fastapi.responses import JSONResponse
 
 from config.settings import settings
-# ВАЖНО: Это универсальный обработчик БД
-from core.subscriptions.payment_handler import PaymentHandler 
+from core.payments.webhook_inbox import InboxEvent, get_webhook_inbox, get_webhook_inbox_consumer
+
+PROVIDER = "tribute"
 
 
 class TributeWebhookHandler:
@@ -33,7 +35,12 @@ class TributeWebhookHandler:
         return hmac.compare_digest(signature, expected_signature)
     
     async def handle_webhook(self, request: Request) -> JSONResponse:
-        """Handle Tribute webhook."""
+        """Handle Tribute webhook.
+
+        Событие сохраняется в durable inbox и подтверждается провайдеру;
+        активация подписки выполняется фоновым потребителем inbox.
+        """
+        started = time.perf_counter()
         try:
             signature = request.headers.get('trbt-signature', '')
             payload = await request.body()
@@ -45,9 +52,12 @@ class TributeWebhookHandler:
             
             data = json.loads(payload_str)
             
-            # Запускаем обработку в фоне, чтобы сразу вернуть 200 OK
-            import asyncio
-            asyncio.create_task(self._process_event(data))
+            # Записываем событие в inbox до ответа 200 OK:
+            # при ошибке записи Tribute повторит доставку
+            inbox = get_webhook_inbox()
+            inserted = await self.accept_event(data, payload_str)
+            inbox.metrics.observe_ingest(time.perf_counter() - started, duplicate=not inserted)
+            get_webhook_inbox_consumer().notify()
             
             return JSONResponse(status_code=200, content={"status": "ok"})
             
@@ -57,21 +67,56 @@ class TributeWebhookHandler:
             traceback.print_exc()
             return JSONResponse(status_code=500, content={"error": "Internal error"})
     
-    async def _process_event(self, data: Dict[str, Any]):
-        """Process Tribute event."""
+    async def accept_event(self, data: Dict[str, Any], payload_str: Optional[str] = None) -> bool:
+        """Append Tribute event to the webhook inbox.
+        
+        Returns False if the event was already received (provider retry).
+        """
+        if payload_str is None:
+            payload_str = json.dumps(data, sort_keys=True, ensure_ascii=False)
+        event = self._build_inbox_event(data, payload_str)
+        return await get_webhook_inbox().ingest(event)
+    
+    def _build_inbox_event(self, data: Dict[str, Any], payload_str: str) -> InboxEvent:
+        """Convert Tribute event to a normalized inbox event."""
         event_name = data.get('name')
+        body_hash = hashlib.sha256(payload_str.encode()).hexdigest()
         
-        try:
-            if event_name == 'new_subscription':
-                await self._handle_payment_success(data, is_subscription=True)
-            elif event_name == 'new_digital_product':
-                await self._handle_payment_success(data, is_subscription=False)
-            else:
-                print(f"Получено неизвестное событие Tribute: {event_name}")
-        except Exception as e:
-            print(f"Ошибка при обработке события {event_name}: {e}")
-            import traceback
-            traceback.print_exc()
+        if event_name == 'new_subscription':
+            payment = self._extract_payment(data, is_subscription=True, body_hash=body_hash)
+        elif event_name == 'new_digital_product':
+            payment = self._extract_payment(data, is_subscription=False, body_hash=body_hash)
+        else:
+            print(f"Получено неизвестное событие Tribute: {event_name}")
+            return InboxEvent(
+                provider=PROVIDER,
+                event_id=f"{event_name}:{body_hash}",
+                event_name=event_name,
+                payload=payload_str,
+                ignore_reason=f"Unknown event: {event_name}",
+            )
+        
+        if payment.get('error'):
+            return InboxEvent(
+                provider=PROVIDER,
+                event_id=f"{event_name}:{payment.get('payment_id') or body_hash}",
+                event_name=event_name,
+                payload=payload_str,
+                payment_id=payment.get('payment_id'),
+                ignore_reason=payment['error'],
+            )
+        
+        return InboxEvent(
+            provider=PROVIDER,
+            event_id=f"{event_name}:{payment['payment_id']}",
+            event_name=event_name,
+            payload=payload_str,
+            payment_id=payment['payment_id'],
+            telegram_user_id=payment['telegram_user_id'],
+            subscription_type=payment['subscription_type'],
+            amount=payment['amount'],
+            discount_percent=0,  # Tribute не передает скидку в вебхуке
+        )
 
     def _get_subscription_type_from_payload(self, payload: Dict[str, Any]) -> Optional[str]:
         """
@@ -110,8 +155,8 @@ class TributeWebhookHandler:
         print(f"Полный payload: {payload}")
         return None
 
-    async def _handle_payment_success(self, data: Dict[str, Any], is_subscription: bool):
-        """Обработка успешной подписки или покупки товара."""
+    def _extract_payment(self, data: Dict[str, Any], is_subscription: bool, body_hash: str) -> Dict[str, Any]:
+        """Извлекает данные платежа из события подписки или покупки товара."""
         payload = data.get('payload', {})
         
         telegram_user_id = payload.get('telegram_user_id') or payload.get('user_id') or data.get('telegram_user_id') or data.get('user_id')
@@ -131,17 +176,16 @@ class TributeWebhookHandler:
         search_data = {**(payload if payload else {}), **(data if data else {})}
         subscription_type_str = self._get_subscription_type_from_payload(search_data)
         
-        # Проверяем, что все обязательные поля заполнены (не None и не пустые строки)
-        # payment_id может быть пустым в тестах, поэтому генерируем его если нужно
+        # payment_id может быть пустым в тестах: выводим его из тела запроса,
+        # чтобы повторная доставка того же события не активировала подписку дважды
         if not payment_id or payment_id == "":
-            import uuid
-            payment_id = f"test_{uuid.uuid4().hex[:16]}"
+            payment_id = f"test_{body_hash[:16]}"
             print(f"ВНИМАНИЕ: payment_id был пустым, сгенерирован новый: {payment_id}")
         
         if not all([telegram_user_id, amount_cents, payment_id, subscription_type_str]):
             print(f"Ошибка вебхука '{data.get('name')}': неполные данные. telegram_user_id={telegram_user_id}, amount_cents={amount_cents}, payment_id={payment_id}, subscription_type={subscription_type_str}")
             print(f"Полные данные: {data}")
-            return
+            return {"payment_id": payment_id, "error": "Incomplete payment data"}
 
         print(f"Tribute '{data.get('name')}': {payment_id}, user: {telegram_user_id}, amount: {amount_cents}, currency: {currency}")
         
@@ -168,21 +212,12 @@ class TributeWebhookHandler:
                 print(f"ВНИМАНИЕ: Неизвестная валюта '{currency}', предполагаем EUR")
             amount_eur = amount_in_currency
         
-        # Вызываем универсальный обработчик БД
-        db_handler = PaymentHandler()
-        
-        success = await db_handler.process_payment_success(
-            payment_id=str(payment_id),
-            user_id=int(telegram_user_id),
-            amount=amount_eur,  # Сумма в евро
-            subscription_type=subscription_type_str,
-            discount_percent=0  # Tribute не передает скидку в вебхуке
-        )
-        
-        if success:
-            print(f"Подписка Tribute ({subscription_type_str}) успешно активирована для user {telegram_user_id}")
-        else:
-            print(f"Ошибка активации подписки Tribute для user {telegram_user_id}")
+        return {
+            "payment_id": payment_id,
+            "telegram_user_id": int(telegram_user_id),
+            "amount": round(amount_eur, 2),  # Сумма в евро
+            "subscription_type": subscription_type_str,
+        }
 
 
 # Global handler instance
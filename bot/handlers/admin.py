@@ -13,7 +13,7 @@ from sqlalchemy.orm import Session
 from config.database import SessionLocal, redis_client
 from config.settings import settings
 from database.models import (
-    User, SubscriptionType, ThemeRequest, UserIssuedTheme,
+    User, SubscriptionType, ThemeRequest, UserIssuedTheme, UserThemeStats,
     AnalyticsReport, CSVAnalysis, Limits, SystemSettings
 )
 from core.admin.broadcast_manager import get_broadcast_manager
@@ -147,7 +147,7 @@ async def admin_stats_callback(callback: CallbackQuery):
         return
     
     broadcast_manager = get_broadcast_manager()
-    stats = broadcast_manager.get_user_statistics()
+    stats = await broadcast_manager.get_user_statistics()
     
     stats_text = f"""📊 <b>Статистика пользователей</b>
 
@@ -730,6 +730,7 @@ async def resetme_command(message: Message, state: FSMContext):
         
         # 2. Issued themes
         db.query(UserIssuedTheme).filter(UserIssuedTheme.user_id == user.id).delete()
+        db.query(UserThemeStats).filter(UserThemeStats.user_id == user.id).delete()
         
         # 3. CSV analyses (this will cascade to analytics reports and top themes)
         csv_analyses = db.query(CSVAnalysis).filter(CSVAnalysis.user_id == user.id).all()
@@ -782,6 +783,11 @@ async def resetme_command(message: Message, state: FSMContext):
         from core.cache.user_cache import get_user_cache_service
         cache_service = get_user_cache_service()
         await cache_service.invalidate_user_and_limits(user.telegram_id, user.id)
+        await cache_service.invalidate_theme_archive_count(user.id)
+        from core.cache.report_keyboard_cache import get_report_keyboard_cache
+        await get_report_keyboard_cache().invalidate(user.id)
+        from core.theme_stats import invalidate_themes_usage_cache
+        await asyncio.to_thread(invalidate_themes_usage_cache)
         
         # Success message
         await message.answer("✅ Профиль успешно сброшен. Перезапускаю онбординг...")
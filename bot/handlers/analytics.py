@@ -10,7 +10,7 @@ from aiogram import Router, F
 from aiogram.filters import Command
 from aiogram.types import CallbackQuery, Message, Document, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
-from sqlalchemy import desc, select
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from config.database import SessionLocal
@@ -21,7 +21,7 @@ from bot.lexicon import LEXICON_RU, LEXICON_COMMANDS_RU
 from bot.keyboards.main_menu import get_main_menu_keyboard
 from bot.keyboards.analytics import (
     get_analytics_list_keyboard,
-    get_analytics_report_view_keyboard,
+    get_analytics_report_view_keyboards,
     get_analytics_unavailable_keyboard,
     get_analytics_intro_keyboard,
     get_csv_instruction_keyboard
@@ -29,6 +29,8 @@ from bot.keyboards.analytics import (
 from bot.states.analytics import AnalyticsStates
 from config.settings import settings
 from bot.utils.safe_edit import safe_edit_message
+from core.analytics.report_index import get_report_index, get_report_html
+from core.cache.report_keyboard_cache import get_report_keyboard_cache
 
 router = Router()
 
@@ -42,25 +44,21 @@ REPORT_MESSAGE_DELAY = 3  # секунды между сообщениями о
 # ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ
 # ============================================================================
 
-async def get_completed_analyses(user_id: int, session: AsyncSession) -> List[CSVAnalysis]:
-    """Получить все завершенные анализы пользователя с предзагрузкой отчетов."""
-    from sqlalchemy import select
-    from sqlalchemy.orm import selectinload
+async def get_report_keyboard(user: User, report_id: int, session: AsyncSession) -> Optional[InlineKeyboardMarkup]:
+    """Получить клавиатуру навигации для отчета (из кеша или по индексу отчетов).
     
-    stmt = select(CSVAnalysis).options(
-        selectinload(CSVAnalysis.analytics_report)
-    ).where(
-        CSVAnalysis.user_id == user_id,
-        CSVAnalysis.status == AnalysisStatus.COMPLETED
-    ).order_by(desc(CSVAnalysis.created_at))
+    При промахе строит клавиатуры для всех отчетов пользователя за один проход
+    по легкому индексу и кладет их в кеш. Returns None если отчета нет в индексе.
+    """
+    cache = get_report_keyboard_cache()
+    keyboard = await cache.get_keyboard(user.id, report_id)
+    if keyboard is not None:
+        return keyboard
     
-    result = await session.execute(stmt)
-    return result.scalars().all()
-
-
-def get_reports_from_analyses(analyses: List[CSVAnalysis]) -> List[AnalyticsReport]:
-    """Извлечь отчеты из списка анализов."""
-    return [analysis.analytics_report for analysis in analyses if analysis.analytics_report]
+    reports = await get_report_index(session, user.id)
+    keyboards = get_analytics_report_view_keyboards(reports, user.subscription_type)
+    await cache.store_keyboards(user.id, keyboards)
+    return keyboards.get(report_id)
 
 
 async def delete_message_safe(bot, chat_id: int, message_id: int) -> None:
@@ -134,15 +132,14 @@ def validate_percentage(value: str) -> tuple[Optional[float], Optional[str]]:
 async def show_analytics_menu_after_limit_exhausted(message: Message, user: User, session: AsyncSession) -> None:
     """Показать меню аналитики после исчерпания лимитов."""
     try:
-        completed_analyses = await get_completed_analyses(user.id, session)
+        reports = await get_report_index(session, user.id)
         
-        if not completed_analyses:
+        if not reports:
             await message.answer(
                 text=LEXICON_RU['analytics_intro'],
                 reply_markup=get_analytics_intro_keyboard(has_reports=False)
             )
         else:
-            reports = get_reports_from_analyses(completed_analyses)
             await message.answer(
                 text=LEXICON_RU['analytics_list_title'],
                 reply_markup=get_analytics_list_keyboard(
@@ -344,10 +341,10 @@ async def analytics_callback(
         )
         return
     
-    # Получаем завершенные анализы
-    completed_analyses = await get_completed_analyses(user.id, session)
+    # Получаем завершенные отчеты (без HTML)
+    reports = await get_report_index(session, user.id)
     
-    if not completed_analyses:
+    if not reports:
         # Нет отчетов - показываем intro с инструкцией CSV
         await safe_edit_message(
             callback=callback,
@@ -357,7 +354,6 @@ async def analytics_callback(
         await state.update_data(analytics_intro_message_id=callback.message.message_id)
     else:
         # Есть отчеты - показываем список
-        reports = get_reports_from_analyses(completed_analyses)
         can_create_new = limits.analytics_remaining > 0
         
         await safe_edit_message(
@@ -416,16 +412,15 @@ async def show_reports_callback(callback: CallbackQuery, user: User, limits: Lim
     # ✅ Отвечаем СРАЗУ - убираем индикатор загрузки
     await callback.answer()
     
-    completed_analyses = await get_completed_analyses(user.id, session)
+    reports = await get_report_index(session, user.id)
     
-    if not completed_analyses:
+    if not reports:
         await safe_edit_message(
             callback=callback,
             text=LEXICON_RU['analytics_no_reports'],
             reply_markup=get_analytics_intro_keyboard(has_reports=False)
         )
     else:
-        reports = get_reports_from_analyses(completed_analyses)
         can_create_new = limits.analytics_remaining > 0
         
         await safe_edit_message(
@@ -936,44 +931,21 @@ async def view_report_callback(callback: CallbackQuery, user: User, session: Asy
     try:
         report_id = int(callback.data.replace("view_report_", ""))
         
-        from sqlalchemy import select
-        
-        # ✅ ОПТИМИЗАЦИЯ: Объединяем запросы - получаем отчет с проверкой владельца одним запросом
-        stmt = (
-            select(AnalyticsReport)
-            .join(CSVAnalysis, AnalyticsReport.csv_analysis_id == CSVAnalysis.id)
-            .where(
-                AnalyticsReport.id == report_id,
-                CSVAnalysis.user_id == user.id
-            )
-        )
-        result = await session.execute(stmt)
-        report = result.scalar_one_or_none()
+        # Клавиатура навигации из кеша, HTML - только для показываемого отчета
+        keyboard = await get_report_keyboard(user, report_id, session)
+        report_html = await get_report_html(session, user.id, report_id) if keyboard is not None else None
         
-        if not report:
+        if report_html is None:
             await callback.message.answer(
                 LEXICON_RU.get('report_not_found', 'Отчет не найден')
             )
             return
         
-        # Получаем все отчеты пользователя для навигации
-        stmt = (
-            select(AnalyticsReport)
-            .join(CSVAnalysis)
-            .where(
-                CSVAnalysis.user_id == user.id,
-                CSVAnalysis.status == AnalysisStatus.COMPLETED
-            )
-            .order_by(desc(AnalyticsReport.created_at))
-        )
-        result = await session.execute(stmt)
-        all_reports = result.scalars().all()
-        
         # Показываем отчет с навигацией
         await safe_edit_message(
             callback=callback,
-            text=report.report_text_html,
-            reply_markup=get_analytics_report_view_keyboard(all_reports, report.id, user.subscription_type)
+            text=report_html,
+            reply_markup=keyboard
         )
     except ValueError:
         await callback.message.answer("Ошибка: неверный ID отчета.")
@@ -14,6 +14,7 @@ from database.models import User, SubscriptionType, Limits
 from bot.lexicon import LEXICON_RU, LEXICON_COMMANDS_RU
 from bot.keyboards.main_menu import get_main_menu_keyboard
 from bot.utils.safe_edit import safe_edit_message
+from core.notifications.delayed_queue import DelayedMessage, get_delayed_message_queue
 from core.tariffs.tariff_service import TariffService
 
 router = Router()
@@ -176,20 +177,30 @@ async def handle_referrer_assignment(user: User, referrer_telegram_id: int, sess
         logger.warning(f"Referrer with telegram_id {referrer_telegram_id} not found")
 
 
+WELCOME_HOWTO_DELAY = 2  # seconds between promo and instructions
+
+
 async def send_welcome_sequence(message: Message, user: User):
     """Send welcome messages with new sequence."""
     
     # Шаг 1: Промо-сообщение
     await message.answer(LEXICON_RU['start_promo'])
     
-    # Шаг 2: Пауза 2 секунды
-    await asyncio.sleep(2)
-    
-    # Шаг 3: Инструкция + главное меню
-    await message.answer(
-        LEXICON_RU['start_howto'],
-        reply_markup=get_main_menu_keyboard(user.subscription_type)
-    )
+    # Шаг 2-3: через 2 секунды инструкция + главное меню.
+    # Отправляет диспетчер отложенных сообщений - обработчик (и сессия БД) не ждут
+    keyboard = get_main_menu_keyboard(user.subscription_type)
+    queued = await get_delayed_message_queue().aenqueue_sequence([
+        DelayedMessage(
+            chat_id=message.chat.id,
+            text=LEXICON_RU['start_howto'],
+            delay=WELCOME_HOWTO_DELAY,
+            reply_markup=DelayedMessage.markup(keyboard),
+        )
+    ])
+    if not queued:
+        # Без Redis - как раньше, пауза прямо в обработчике
+        await asyncio.sleep(WELCOME_HOWTO_DELAY)
+        await message.answer(LEXICON_RU['start_howto'], reply_markup=keyboard)
 
 
 async def handle_existing_user(message: Message, user: User, session: AsyncSession):
@@ -217,9 +228,7 @@ async def handle_existing_user(message: Message, user: User, session: AsyncSessi
             
             await session.commit()  # Сохраняем изменения
     
-    # Можно обновить last_activity_at
-    user.last_activity_at = now_utc
-    await session.commit()
+    # last_activity_at обновляет ActivityMiddleware пакетно, без коммита на каждый /start
     
     # Determine subscription status
     if user.subscription_type == SubscriptionType.TEST_PRO:
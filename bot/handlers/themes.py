@@ -1,9 +1,11 @@
 """Themes handler with horizontal navigation."""
 
+import asyncio
 from datetime import datetime, timedelta, timezone
+from typing import Optional
 from aiogram import Router, F
 from aiogram.types import CallbackQuery
-from sqlalchemy import select, func, desc
+from sqlalchemy import select, func, desc, tuple_
 import logging
 
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -14,6 +16,7 @@ from bot.keyboards.callbacks import ThemesCallback
 from bot.keyboards.themes import get_themes_menu_keyboard
 from bot.keyboards.common import create_cooldown_keyboard, create_archive_navigation_keyboard
 from bot.utils.safe_edit import safe_edit_message
+from core.theme_stats import record_theme_issue, count_themes, invalidate_themes_usage_cache
 from core.theme_settings import (
     get_theme_cooldown_days_for_session,
     check_theme_cooldown_from_tariff_start,
@@ -34,6 +37,59 @@ async def has_archive(session: AsyncSession, user_id: int) -> bool:
     return result.scalar_one_or_none() is not None
 
 
+async def get_archive_count(session: AsyncSession, user_id: int) -> int:
+    """Get number of issued theme requests (cached next to user record)."""
+    from core.cache.user_cache import get_user_cache_service
+    cache_service = get_user_cache_service()
+    
+    count = await cache_service.get_theme_archive_count(user_id)
+    if count is None:
+        query = select(func.count(ThemeRequest.id)).where(
+            ThemeRequest.user_id == user_id,
+            ThemeRequest.status == "ISSUED"
+        )
+        result = await session.execute(query)
+        count = result.scalar_one()
+        await cache_service.set_theme_archive_count(user_id, count)
+    return count
+
+
+async def get_archive_entry(
+    session: AsyncSession,
+    user_id: int,
+    cursor: Optional[int] = None,
+    direction: Optional[str] = None,
+    offset: int = 0
+):
+    """Get one archive entry (id, theme_name, created_at).
+    
+    Без курсора - самая новая подборка (или со смещением offset). С курсором -
+    ближайшая к подборке cursor в направлении direction ("older"/"newer") по
+    ключу (created_at, id), одна строка по индексу.
+    """
+    query = select(ThemeRequest.id, ThemeRequest.theme_name, ThemeRequest.created_at).where(
+        ThemeRequest.user_id == user_id,
+        ThemeRequest.status == "ISSUED"
+    )
+    
+    if cursor is None:
+        query = query.order_by(desc(ThemeRequest.created_at), desc(ThemeRequest.id)).offset(max(offset, 0))
+    else:
+        anchor_created_at = select(ThemeRequest.created_at).where(
+            ThemeRequest.id == cursor,
+            ThemeRequest.user_id == user_id
+        ).scalar_subquery()
+        key = tuple_(ThemeRequest.created_at, ThemeRequest.id)
+        anchor = tuple_(anchor_created_at, cursor)
+        if direction == "newer":
+            query = query.where(key > anchor).order_by(ThemeRequest.created_at, ThemeRequest.id)
+        else:
+            query = query.where(key < anchor).order_by(desc(ThemeRequest.created_at), desc(ThemeRequest.id))
+    
+    result = await session.execute(query.limit(1))
+    return result.first()
+
+
 @router.callback_query(F.data == "themes")
 async def themes_callback(
     callback: CallbackQuery, 
@@ -203,6 +259,9 @@ async def generate_themes_callback(
         )
         session.add(new_theme_request)
         
+        # Счетчики для админки - в той же транзакции, что и выдача
+        await record_theme_issue(session, user.id, count_themes(themes_text), new_theme_request.created_at)
+        
         # Обновляем лимиты тем (используем объект из middleware)
         limits.themes_used += 1
         limits.last_theme_request_at = datetime.utcnow()
@@ -214,6 +273,8 @@ async def generate_themes_callback(
         from core.cache.user_cache import get_user_cache_service
         cache_service = get_user_cache_service()
         await cache_service.invalidate_limits(user.id)
+        await cache_service.invalidate_theme_archive_count(user.id)
+        await asyncio.to_thread(invalidate_themes_usage_cache)
         
         logger.info(
             f"Successfully generated themes for user {user.id}, "
@@ -242,16 +303,10 @@ async def archive_themes_callback(
     
     logger.info(f"Archive themes callback triggered for user {user.id}, action: {callback_data.action}")
     
-    # Get all issued themes sorted by date (newest first)
-    query = select(ThemeRequest).where(
-        ThemeRequest.user_id == user.id,
-        ThemeRequest.status == "ISSUED"
-    ).order_by(desc(ThemeRequest.created_at))
-    
-    result = await session.execute(query)
-    all_requests = result.scalars().all()
+    # Most recent issued request
+    request = await get_archive_entry(session, user.id)
     
-    if not all_requests:
+    if request is None:
         await safe_edit_message(
             callback=callback,
             text=LEXICON_RU['themes_archive_empty'],
@@ -261,7 +316,7 @@ async def archive_themes_callback(
         return
     
     # Show first page (index 0 - most recent)
-    await show_archive_page(callback, user, all_requests, page=0)
+    await show_archive_page(callback, user, request, page=0, total_pages=await get_archive_count(session, user.id))
 
 
 @router.callback_query(ThemesCallback.filter(F.action == "archive_page"))
@@ -273,32 +328,25 @@ async def archive_navigation_callback(
 ):
     """Handle archive page navigation."""
     
-    # Get all issued themes sorted by date (newest first)
-    query = select(ThemeRequest).where(
-        ThemeRequest.user_id == user.id,
-        ThemeRequest.status == "ISSUED"
-    ).order_by(desc(ThemeRequest.created_at))
+    page = callback_data.page or 0
+    if callback_data.cursor is not None:
+        # Соседняя подборка относительно текущей (keyset)
+        request = await get_archive_entry(session, user.id, callback_data.cursor, callback_data.direction)
+    else:
+        # Кнопки, отправленные до появления курсора
+        request = await get_archive_entry(session, user.id, offset=page)
     
-    result = await session.execute(query)
-    all_requests = result.scalars().all()
+    if request is None:
+        await callback.answer()
+        return
     
-    # Show requested page
-    await show_archive_page(callback, user, all_requests, page=callback_data.page or 0)
+    total_pages = await get_archive_count(session, user.id)
+    await show_archive_page(callback, user, request, page=min(page, total_pages - 1), total_pages=total_pages)
 
 
-async def show_archive_page(callback: CallbackQuery, user: User, history: list, page: int):
+async def show_archive_page(callback: CallbackQuery, user: User, request, page: int, total_pages: int):
     """Show specific page of theme archive."""
     
-    total_pages = len(history)
-    
-    # Validate page number
-    if page < 0 or page >= total_pages:
-        await callback.answer()
-        return
-    
-    # Get the theme request for this page
-    request = history[page]
-    
     # Format date
     formatted_date = request.created_at.strftime("%d.%m.%Y")
     
@@ -312,7 +360,7 @@ async def show_archive_page(callback: CallbackQuery, user: User, history: list,
     await safe_edit_message(
         callback=callback,
         text=archive_text,
-        reply_markup=create_archive_navigation_keyboard(page, total_pages, user.subscription_type)
+        reply_markup=create_archive_navigation_keyboard(page, total_pages, user.subscription_type, cursor=request.id)
     )
     await callback.answer()
 
@@ -30,28 +30,21 @@ def get_analytics_list_keyboard(reports: list, can_create_new: bool, subscriptio
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
-def get_analytics_report_view_keyboard(reports: list, current_report_id: int, subscription_type: SubscriptionType) -> InlineKeyboardMarkup:
-    """Create report view keyboard with navigation between reports."""
+def _build_report_view_keyboard(prev_report, next_report) -> InlineKeyboardMarkup:
+    """Create report view keyboard for given neighbour reports."""
     keyboard = []
     
-    # Add navigation buttons if there are multiple reports
-    if len(reports) > 1:
-        # Find current report index
-        current_index = next((i for i, r in enumerate(reports) if r.id == current_report_id), 0)
-        
-        # Previous report button
-        if current_index > 0:
-            prev_report = reports[current_index - 1]
-            keyboard.append([
-                InlineKeyboardButton(text=f"◀️ {prev_report.period_human_ru}", callback_data=f"view_report_{prev_report.id}")
-            ])
-        
-        # Next report button
-        if current_index < len(reports) - 1:
-            next_report = reports[current_index + 1]
-            keyboard.append([
-                InlineKeyboardButton(text=f"▶️ {next_report.period_human_ru}", callback_data=f"view_report_{next_report.id}")
-            ])
+    # Previous report button
+    if prev_report is not None:
+        keyboard.append([
+            InlineKeyboardButton(text=f"◀️ {prev_report.period_human_ru}", callback_data=f"view_report_{prev_report.id}")
+        ])
+    
+    # Next report button
+    if next_report is not None:
+        keyboard.append([
+            InlineKeyboardButton(text=f"▶️ {next_report.period_human_ru}", callback_data=f"view_report_{next_report.id}")
+        ])
     
     # Add back to list button
     keyboard.append([
@@ -66,6 +59,28 @@ def get_analytics_report_view_keyboard(reports: list, current_report_id: int, su
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
+def get_analytics_report_view_keyboard(
+    reports: list, current_report_id: int, subscription_type: SubscriptionType
+) -> InlineKeyboardMarkup:
+    """Create report view keyboard with navigation between reports."""
+    # Find current report index
+    current_index = next((i for i, r in enumerate(reports) if r.id == current_report_id), 0)
+    prev_report = reports[current_index - 1] if current_index > 0 else None
+    next_report = reports[current_index + 1] if current_index < len(reports) - 1 else None
+    return _build_report_view_keyboard(prev_report, next_report)
+
+
+def get_analytics_report_view_keyboards(reports: list, subscription_type: SubscriptionType) -> dict[int, InlineKeyboardMarkup]:
+    """Create view keyboards for all reports at once (report id -> keyboard)."""
+    return {
+        report.id: _build_report_view_keyboard(
+            reports[index - 1] if index > 0 else None,
+            reports[index + 1] if index < len(reports) - 1 else None
+        )
+        for index, report in enumerate(reports)
+    }
+
+
 def get_analytics_unavailable_keyboard(subscription_type: SubscriptionType) -> InlineKeyboardMarkup:
     """Create keyboard for FREE users when analytics is unavailable."""
     from bot.keyboards.callbacks import ProfileCallbackData
@@ -8,6 +8,9 @@ class ThemesCallback(CallbackData, prefix="themes"):
     """Callback data for themes actions."""
     action: str
     page: Optional[int] = None
+    # Keyset-курсор архива: id текущей подборки и направление ("older"/"newer")
+    cursor: Optional[int] = None
+    direction: Optional[str] = None
 
 
 class NavigationCallback(CallbackData, prefix="nav"):
@@ -1,11 +1,13 @@
 """Common keyboard utilities."""
 
 import re
+from typing import Optional
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from database.models import SubscriptionType, Limits
 from bot.lexicon import LEXICON_COMMANDS_RU, LEXICON_RU
 from bot.keyboards.callbacks import ThemesCallback
+from bot.keyboards.keyboard_cache import cached_keyboard
 
 
 
@@ -102,6 +104,7 @@ def create_themes_keyboard(
 
 
 
+@cached_keyboard
 def get_calendar_keyboard(subscription_type: SubscriptionType) -> InlineKeyboardMarkup:
     """Create calendar section keyboard."""
     keyboard = []
@@ -136,16 +139,21 @@ def get_lessons_keyboard(subscription_type: SubscriptionType) -> InlineKeyboardM
 def create_archive_navigation_keyboard(
     page: int,
     total_pages: int,
-    subscription_type: SubscriptionType
+    subscription_type: SubscriptionType,
+    cursor: Optional[int] = None
 ) -> InlineKeyboardMarkup:
-    """Create archive navigation keyboard with pagination."""
+    """Create archive navigation keyboard with pagination.
+    
+    cursor - id текущей подборки; кнопки несут keyset-курсор, чтобы следующая
+    страница выбиралась одной строкой без OFFSET.
+    """
     builder = InlineKeyboardBuilder()
     
     # Back button (only if not on first page)
     if page > 0:
         builder.button(
             text=LEXICON_COMMANDS_RU['themes_back'],
-            callback_data=ThemesCallback(action="archive_page", page=page-1).pack()
+            callback_data=ThemesCallback(action="archive_page", page=page-1, cursor=cursor, direction="newer").pack()
         )
     
     # Page indicator (non-clickable)
@@ -158,7 +166,7 @@ def create_archive_navigation_keyboard(
     if page < total_pages - 1:
         builder.button(
             text=LEXICON_COMMANDS_RU['themes_forward'],
-            callback_data=ThemesCallback(action="archive_page", page=page+1).pack()
+            callback_data=ThemesCallback(action="archive_page", page=page+1, cursor=cursor, direction="older").pack()
         )
     
     builder.adjust(3)
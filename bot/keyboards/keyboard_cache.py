@@ -0,0 +1,113 @@
+"""In-process memoization of static inline keyboards."""
+
+import functools
+import logging
+import threading
+import time
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+from aiogram.types import InlineKeyboardMarkup
+
+logger = logging.getLogger(__name__)
+
+VERSION_CHECK_INTERVAL = 5.0
+
+
+class KeyboardCache:
+    """Keyboards keyed by (builder, subscription_type, lexicon_version).
+
+    Клавиатуры главного меню и календаря зависят только от тарифа и текстов
+    лексикона, поэтому строятся один раз на процесс. Версия лексикона
+    (LexiconService.bump_version при сохранении из админки) сверяется с Redis
+    не чаще раза в VERSION_CHECK_INTERVAL секунд; при смене версии кэш
+    очищается. Без Redis изменения из админки нельзя отследить, поэтому
+    клавиатуры строятся каждый раз, как раньше.
+
+    Возвращаемые клавиатуры общие - их нельзя изменять на месте.
+    """
+
+    def __init__(self, lexicon_service=None, check_interval: float = VERSION_CHECK_INTERVAL,
+                 clock: Callable[[], float] = time.monotonic):
+        self._lexicon_service = lexicon_service
+        self.check_interval = check_interval
+        self._clock = clock
+        self._keyboards: Dict[Tuple[str, Hashable, str], InlineKeyboardMarkup] = {}
+        self._version: Optional[str] = None
+        self._checked_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def lexicon_service(self):
+        if self._lexicon_service is None:
+            from bot.lexicon import service_instance
+            self._lexicon_service = service_instance
+        return self._lexicon_service
+
+    def _current_version(self) -> Optional[str]:
+        now = self._clock()
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return self._version
+
+        try:
+            version = self.lexicon_service.get_version()
+        except Exception as e:
+            logger.warning(f"Failed to read lexicon version: {e}")
+            version = None
+
+        with self._lock:
+            if version != self._version:
+                self._keyboards.clear()
+                self._version = version
+            self._checked_at = now
+        return version
+
+    def get_or_build(
+        self, builder_name: str, subscription_type, build: Callable[[], InlineKeyboardMarkup]
+    ) -> InlineKeyboardMarkup:
+        """Return cached keyboard or build and remember it."""
+        version = self._current_version()
+        if version is None:
+            return build()
+
+        key = (builder_name, getattr(subscription_type, 'value', subscription_type), version)
+        keyboard = self._keyboards.get(key)
+        if keyboard is None:
+            keyboard = build()
+            with self._lock:
+                if self._version == version:
+                    self._keyboards[key] = keyboard
+        return keyboard
+
+    def clear(self) -> None:
+        """Drop all cached keyboards in this process."""
+        with self._lock:
+            self._keyboards.clear()
+            self._checked_at = None
+
+
+# Global instance
+_keyboard_cache: Optional[KeyboardCache] = None
+
+
+def get_keyboard_cache() -> KeyboardCache:
+    """Get global KeyboardCache instance."""
+    global _keyboard_cache
+    if _keyboard_cache is None:
+        _keyboard_cache = KeyboardCache()
+    return _keyboard_cache
+
+
+def cached_keyboard(builder: Callable[..., InlineKeyboardMarkup]) -> Callable[..., InlineKeyboardMarkup]:
+    """Memoize a keyboard builder that depends only on subscription_type and lexicon.
+
+    Исходный построитель доступен как builder.__wrapped__.
+    """
+    builder_name = f"{builder.__module__}.{builder.__qualname__}"
+
+    @functools.wraps(builder)
+    def wrapper(subscription_type):
+        return get_keyboard_cache().get_or_build(
+            builder_name, subscription_type, lambda: builder(subscription_type)
+        )
+
+    return wrapper
@@ -5,8 +5,10 @@ from database.models import SubscriptionType
 from bot.lexicon import LEXICON_COMMANDS_RU
 from bot.lexicon.lexicon_ru import LEXICON_COMMANDS_RU
 from bot.lexicon import LEXICON_RU
+from bot.keyboards.keyboard_cache import cached_keyboard
 
 
+@cached_keyboard
 def get_main_menu_keyboard(subscription_type: SubscriptionType) -> InlineKeyboardMarkup:
     """Get main menu keyboard based on subscription type."""
     
@@ -11,6 +11,9 @@ from aiogram.fsm.storage.redis import RedisStorage
 from aiogram.fsm.storage.redis import DefaultKeyBuilder
 
 from core.notifications.scheduler import get_scheduler
+from core.tariffs.tariff_cache import get_tariff_cache
+from core.cache.system_settings_snapshot import get_system_settings_snapshot
+from core.notifications.delayed_queue import DelayedMessageDispatcher
 from config.settings import settings
 from bot.handlers import start, menu, profile, analytics, themes, lessons, calendar, faq, channel, payments, admin, invite, referral, vip_group
 from bot.middlewares.database import DatabaseMiddleware
@@ -18,6 +21,7 @@ from bot.middlewares.subscription import SubscriptionMiddleware
 from bot.middlewares.blocked_user import BlockedUserMiddleware
 from bot.middlewares.limits import LimitsMiddleware
 from bot.middlewares.rate_limit import UploadRateLimitMiddleware
+from bot.middlewares.activity import ActivityMiddleware, get_activity_tracker
 from core.utils.lexicon_validator import validate_or_raise
 
 # Configure async logging with QueueHandler to prevent Event Loop blocking
@@ -92,6 +96,9 @@ async def main():
     
     dp = Dispatcher(storage=redis_storage)
     
+    # Activity is recorded for every update (outer middleware), flushed in batches
+    dp.update.outer_middleware(ActivityMiddleware())
+    
     # Register middlewares (order matters: DatabaseMiddleware first to inject session)
     dp.message.middleware(DatabaseMiddleware())
     dp.callback_query.middleware(DatabaseMiddleware())
@@ -146,6 +153,24 @@ async def main():
     else:
         logger.info("🧹 VIP Group Cleanup: Disabled - System messages will not be deleted")
     
+    # Load tariff limits table once per process and subscribe to changes
+    tariff_cache = get_tariff_cache()
+    await tariff_cache.load()
+    tariff_cache.start_listener()
+    logger.info("Tariff limits table loaded")
+    
+    # Snapshot of system_settings (payment links) - refreshed by Redis version key
+    await get_system_settings_snapshot().load()
+    logger.info("System settings snapshot loaded")
+    
+    # Write-behind flush of users.last_activity_at
+    activity_tracker = get_activity_tracker()
+    activity_tracker.start()
+    
+    # Timed message sequences (welcome, analytics report parts) from Redis delay queue
+    delayed_dispatcher = DelayedMessageDispatcher(bot)
+    delayed_dispatcher.start()
+    
     # Start task scheduler
     scheduler = get_scheduler(bot)
     scheduler.start()
@@ -174,6 +199,22 @@ async def main():
         except Exception as e:
             logger.error(f"Error stopping scheduler: {e}")
         
+        # Остановить подписку на изменения тарифов
+        tariff_cache.stop_listener()
+        
+        # Остановить диспетчер отложенных сообщений (неотправленное остается в Redis)
+        try:
+            await delayed_dispatcher.stop()
+        except Exception as e:
+            logger.error(f"Error stopping delayed message dispatcher: {e}")
+        
+        # Сбросить накопленную активность до отмены задач и закрытия engine
+        logger.info("Flushing user activity...")
+        try:
+            await activity_tracker.stop()
+        except Exception as e:
+            logger.error(f"Error flushing user activity: {e}")
+        
         # 2. Закрыть все pending tasks
         pending = [task for task in asyncio.all_tasks() if not task.done()]
         logger.info(f"Cancelling {len(pending)} pending tasks...")
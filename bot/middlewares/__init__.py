@@ -3,5 +3,6 @@
 from .database import DatabaseMiddleware
 from .subscription import SubscriptionMiddleware
 from .limits import LimitsMiddleware
+from .activity import ActivityMiddleware
 
-__all__ = ['DatabaseMiddleware', 'SubscriptionMiddleware', 'LimitsMiddleware']
\ No newline at end of file
+__all__ = ['DatabaseMiddleware', 'SubscriptionMiddleware', 'LimitsMiddleware', 'ActivityMiddleware']
\ No newline at end of file
@@ -0,0 +1,184 @@
+"""Write-behind tracking of users.last_activity_at."""
+
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from sqlalchemy import BigInteger, DateTime, bindparam, text
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 5.0
+# 2 параметра на строку: укладываемся в лимиты SQLite (32766) и asyncpg (32767)
+MAX_ROWS_PER_STATEMENT = 5000
+
+
+class ActivityTracker:
+    """In-memory telegram_id -> last seen map flushed to users in one batch.
+
+    Апдейты только записывают время в словарь; фоновая задача раз в
+    flush_interval секунд сбрасывает накопленное одним
+    UPDATE users ... FROM (VALUES ...). При остановке бота оставшееся
+    сбрасывается в stop(). Время активности только растет: более старое
+    значение не перезапишет новое, записанное другим процессом.
+    """
+
+    def __init__(
+        self,
+        session_factory=None,
+        flush_interval: float = FLUSH_INTERVAL,
+        max_rows_per_statement: int = MAX_ROWS_PER_STATEMENT,
+        clock: Callable[[], datetime] = datetime.utcnow,
+    ):
+        self._session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.max_rows_per_statement = max_rows_per_statement
+        self._clock = clock
+        self._pending: Dict[int, datetime] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+
+    @property
+    def session_factory(self):
+        if self._session_factory is None:
+            from config.database import AsyncSessionLocal
+            self._session_factory = AsyncSessionLocal
+        return self._session_factory
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def record(self, telegram_id: int, ts: Optional[datetime] = None) -> None:
+        """Remember activity; no I/O on the update path."""
+        ts = ts or self._clock()
+        current = self._pending.get(telegram_id)
+        if current is None or ts > current:
+            self._pending[telegram_id] = ts
+
+    def _merge_back(self, batch: Dict[int, datetime]) -> None:
+        for telegram_id, ts in batch.items():
+            self.record(telegram_id, ts)
+
+    @staticmethod
+    def _build_update(dialect_name: str, rows: List[Tuple[int, datetime]]):
+        params = []
+        values = []
+        for i, (telegram_id, ts) in enumerate(rows):
+            params.append(bindparam(f"t{i}", telegram_id, type_=BigInteger))
+            params.append(bindparam(f"s{i}", ts, type_=DateTime))
+            if dialect_name == "postgresql":
+                values.append(f"(CAST(:t{i} AS BIGINT), CAST(:s{i} AS TIMESTAMP))")
+            else:
+                values.append(f"(:t{i}, :s{i})")
+        values_sql = ", ".join(values)
+
+        if dialect_name == "postgresql":
+            sql = (
+                "UPDATE users SET last_activity_at = v.ts "
+                f"FROM (VALUES {values_sql}) AS v(telegram_id, ts) "
+                "WHERE users.telegram_id = v.telegram_id "
+                "AND (users.last_activity_at IS NULL OR users.last_activity_at < v.ts)"
+            )
+        else:
+            # SQLite не поддерживает список колонок у подзапроса - именуем их через CTE
+            sql = (
+                f"WITH v(telegram_id, ts) AS (VALUES {values_sql}) "
+                "UPDATE users SET last_activity_at = v.ts FROM v "
+                "WHERE users.telegram_id = v.telegram_id "
+                "AND (users.last_activity_at IS NULL OR users.last_activity_at < v.ts)"
+            )
+        return text(sql).bindparams(*params)
+
+    async def flush(self) -> int:
+        """Write pending activity to the database. Returns number of flushed users."""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, {}
+            rows = list(batch.items())
+
+            try:
+                async with self.session_factory() as session:
+                    dialect_name = session.bind.dialect.name
+                    for start in range(0, len(rows), self.max_rows_per_statement):
+                        chunk = rows[start:start + self.max_rows_per_statement]
+                        await session.execute(self._build_update(dialect_name, chunk))
+                    await session.commit()
+            except Exception as e:
+                # Не теряем активность - попробуем в следующий раз
+                self._merge_back(batch)
+                logger.warning(f"Failed to flush user activity ({len(rows)} users): {e}")
+                return 0
+
+            logger.debug(f"Flushed activity for {len(rows)} users")
+            return len(rows)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                # shield: отмена в stop() не должна прервать запись уже снятой пачки
+                await asyncio.shield(self.flush())
+            except Exception as e:
+                logger.error(f"Activity flush loop error: {e}", exc_info=True)
+
+    def start(self) -> None:
+        """Start periodic flushing in the running event loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="activity-tracker-flush")
+
+    async def stop(self) -> None:
+        """Stop periodic flushing and drain what is left.
+
+        Идущий в этот момент сброс дозавершается (flush ждет его на блокировке).
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+# Global instance
+_activity_tracker: Optional[ActivityTracker] = None
+
+
+def get_activity_tracker() -> ActivityTracker:
+    """Get global ActivityTracker instance."""
+    global _activity_tracker
+    if _activity_tracker is None:
+        _activity_tracker = ActivityTracker()
+    return _activity_tracker
+
+
+class ActivityMiddleware(BaseMiddleware):
+    """Outer update middleware that records who interacted with the bot."""
+
+    def __init__(self, tracker: Optional[ActivityTracker] = None):
+        self._tracker = tracker
+
+    @property
+    def tracker(self) -> ActivityTracker:
+        if self._tracker is None:
+            self._tracker = get_activity_tracker()
+        return self._tracker
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is not None and not user.is_bot:
+            self.tracker.record(user.id)
+        return await handler(event, data)
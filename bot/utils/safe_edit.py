@@ -1,11 +1,151 @@
 """Safe message editing utilities."""
 
+import asyncio
+import hashlib
 import logging
+from collections import OrderedDict
+from typing import Optional
+
 from aiogram.exceptions import TelegramBadRequest
 from aiogram.types import CallbackQuery, Message
 
 logger = logging.getLogger(__name__)
 
+EDIT_HASH_LRU_SIZE = 10_000
+EDIT_HASH_TTL = 86400  # 24 hours
+EDIT_HASH_PREFIX = "edit_hash:"
+
+
+def _get_redis_client():
+    """Get Redis client with lazy import."""
+    from config.database import redis_client
+    return redis_client
+
+
+def edit_content_hash(text: str, reply_markup=None, parse_mode=None) -> str:
+    """Digest of what an edit would put into the message."""
+    if reply_markup is None:
+        markup = ""
+    elif hasattr(reply_markup, "model_dump_json"):
+        markup = reply_markup.model_dump_json(exclude_none=True)
+    else:
+        markup = repr(reply_markup)
+    payload = "\x00".join((text or "", str(parse_mode), markup))
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class EditHashCache:
+    """Last applied content hash per (chat_id, message_id).
+
+    Небольшой LRU в памяти процесса плюс Redis-хеш edit_hash:{chat_id}
+    (поле = message_id) с TTL, чтобы повторное нажатие той же кнопки не
+    уходило в Telegram ни в этом, ни в другом процессе бота.
+    """
+
+    def __init__(self, redis_client_instance=None, max_size: int = EDIT_HASH_LRU_SIZE, ttl: int = EDIT_HASH_TTL):
+        self._redis_client = redis_client_instance
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lru: "OrderedDict[tuple, str]" = OrderedDict()
+
+    @property
+    def redis_client(self):
+        if self._redis_client is None:
+            self._redis_client = _get_redis_client()
+        return self._redis_client
+
+    def _remember_local(self, key: tuple, digest: str) -> None:
+        self._lru[key] = digest
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_size:
+            self._lru.popitem(last=False)
+
+    async def get(self, chat_id: int, message_id: int) -> Optional[str]:
+        key = (chat_id, message_id)
+        digest = self._lru.get(key)
+        if digest is not None:
+            self._lru.move_to_end(key)
+            return digest
+
+        client = self.redis_client
+        if client is None:
+            return None
+        try:
+            digest = await asyncio.to_thread(client.hget, f"{EDIT_HASH_PREFIX}{chat_id}", str(message_id))
+        except Exception as e:
+            from core.utils.log_rate_limiter import should_log_redis_warning
+            if should_log_redis_warning("edit_hash_read"):
+                logger.warning(f"Error reading edit hash cache: {e}")
+            return None
+        if isinstance(digest, bytes):
+            digest = digest.decode("utf-8")
+        if digest:
+            self._remember_local(key, digest)
+        return digest
+
+    def _store_sync(self, chat_id: int, message_id: int, digest: str) -> None:
+        cache_key = f"{EDIT_HASH_PREFIX}{chat_id}"
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.hset(cache_key, str(message_id), digest)
+        pipe.expire(cache_key, self.ttl)
+        pipe.execute()
+
+    async def set(self, chat_id: int, message_id: int, digest: str) -> None:
+        self._remember_local((chat_id, message_id), digest)
+        if self.redis_client is None:
+            return
+        try:
+            await asyncio.to_thread(self._store_sync, chat_id, message_id, digest)
+        except Exception as e:
+            from core.utils.log_rate_limiter import should_log_redis_warning
+            if should_log_redis_warning("edit_hash_write"):
+                logger.warning(f"Failed to store edit hash: {e}")
+
+    async def forget(self, chat_id: int, message_id: int) -> None:
+        self._lru.pop((chat_id, message_id), None)
+        if self.redis_client is None:
+            return
+        try:
+            await asyncio.to_thread(self.redis_client.hdel, f"{EDIT_HASH_PREFIX}{chat_id}", str(message_id))
+        except Exception as e:
+            logger.debug(f"Failed to drop edit hash: {e}")
+
+
+# Global instance
+_edit_hash_cache: Optional[EditHashCache] = None
+
+
+def get_edit_hash_cache() -> EditHashCache:
+    """Get global EditHashCache instance."""
+    global _edit_hash_cache
+    if _edit_hash_cache is None:
+        _edit_hash_cache = EditHashCache()
+    return _edit_hash_cache
+
+
+def _message_key(message: Message) -> Optional[tuple]:
+    chat = getattr(message, "chat", None)
+    message_id = getattr(message, "message_id", None)
+    chat_id = getattr(chat, "id", None)
+    if not isinstance(chat_id, int) or not isinstance(message_id, int):
+        return None
+    return chat_id, message_id
+
+
+def _current_text(message: Message, parse_mode) -> Optional[str]:
+    """Text the message shows now, in the same markup the edit is sent in."""
+    try:
+        mode = (parse_mode or "").lower()
+        if mode == "html":
+            current = message.html_text
+        elif mode == "markdownv2":
+            current = message.md_text
+        else:
+            current = message.text
+    except Exception:
+        return None
+    return current.strip() if isinstance(current, str) else None
+
 
 async def safe_edit_message(callback: CallbackQuery = None, message: Message = None, text: str = "", reply_markup=None, parse_mode="HTML"):
     """Safely edit message with error handling."""
@@ -19,12 +159,26 @@ async def safe_edit_message(callback: CallbackQuery = None, message: Message = N
     else:
         raise ValueError("Either callback or message must be provided")
     
+    key = _message_key(target_message)
+    digest = edit_content_hash(text, reply_markup, parse_mode)
+    hash_cache = get_edit_hash_cache()
+    if key is not None and await hash_cache.get(*key) == digest:
+        # Та же кнопка нажата повторно - содержимое не изменится, в Telegram не ходим.
+        # Текст и клавиатура в апдейте отражают текущее состояние сообщения: если их
+        # поменяли в обход safe_edit_message, хеш устарел и редактируем как обычно
+        if (getattr(target_message, "reply_markup", None) == reply_markup
+                and _current_text(target_message, parse_mode) == (text or "").strip()):
+            logger.debug("Message content unchanged, edit skipped")
+            return
+    
     try:
         await target_message.edit_text(
             text=text,
             reply_markup=reply_markup,
             parse_mode=parse_mode
         )
+        if key is not None:
+            await hash_cache.set(*key, digest)
         
         # ✅ ОПТИМИЗАЦИЯ: Не вызываем callback.answer() здесь, так как он уже вызывается 
         # в начале обработчиков для быстрого ответа. Если callback.answer() еще не был вызван,
@@ -33,9 +187,13 @@ async def safe_edit_message(callback: CallbackQuery = None, message: Message = N
     except TelegramBadRequest as e:
         if "message is not modified" in str(e).lower():
             logger.debug("Message was not modified")
+            if key is not None:
+                await hash_cache.set(*key, digest)
             # Не вызываем callback.answer() - должен быть вызван в обработчике
         elif "message to edit not found" in str(e).lower():
             logger.warning("Message to edit not found, sending new message")
+            if key is not None:
+                await hash_cache.forget(*key)
             await target_message.answer(
                 text=text,
                 reply_markup=reply_markup,
@@ -1,23 +1,37 @@
 """Broadcast system for admin messages."""
 
 import asyncio
+import time
 from datetime import datetime, timezone, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy import case, desc, func, or_, select
 
 from config.database import SessionLocal
-from database.models import User, SubscriptionType, BroadcastMessage
+from database.models import User, Limits, SubscriptionType, BroadcastMessage
 from core.notifications.notification_manager import get_notification_manager
 
+USER_STATISTICS_TTL = 60  # seconds
+
 
 class BroadcastManager:
     """Manager for broadcast messages and admin functions."""
     
-    def __init__(self, bot=None):
+    def __init__(self, bot=None, async_session_factory=None, clock: Callable[[], float] = time.monotonic):
         self.bot = bot
         self.db = SessionLocal()
         self.notification_manager = get_notification_manager(bot)
+        self._async_session_factory = async_session_factory
+        self._clock = clock
+        self._stats_cache: Optional[Tuple[float, Dict[str, Any]]] = None
+        self._stats_lock: Optional[asyncio.Lock] = None
+    
+    @property
+    def async_session_factory(self):
+        if self._async_session_factory is None:
+            from config.database import AsyncSessionLocal
+            self._async_session_factory = AsyncSessionLocal
+        return self._async_session_factory
     
     def __del__(self):
         """Close database session."""
@@ -121,43 +135,62 @@ class BroadcastManager:
             print(f"Error getting broadcast history: {e}")
             return []
     
-    def get_user_statistics(self) -> Dict[str, Any]:
-        """Get user statistics for admin panel."""
+    @staticmethod
+    def _user_statistics_query(dialect_name: str):
+        """One aggregate over users LEFT JOIN limits (limits.user_id is unique)."""
+        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+        conditions = {
+            f"subscription_{subscription_type.value}": User.subscription_type == subscription_type
+            for subscription_type in SubscriptionType
+        }
+        conditions["recent_users"] = User.created_at >= thirty_days_ago
+        conditions["active_users"] = or_(Limits.analytics_used > 0, Limits.themes_used > 0)
+
+        def count_where(condition):
+            if dialect_name == "postgresql":
+                return func.count().filter(condition)
+            # count игнорирует NULL: CASE без ELSE считает только подходящие строки
+            return func.count(case((condition, 1)))
+
+        columns = [func.count().label("total_users")]
+        columns += [count_where(condition).label(name) for name, condition in conditions.items()]
+        return select(*columns).select_from(User).outerjoin(Limits, Limits.user_id == User.id)
+
+    async def get_user_statistics(self) -> Dict[str, Any]:
+        """Get user statistics for admin panel (cached for USER_STATISTICS_TTL seconds)."""
         
-        try:
-            # Total users
-            total_users = self.db.query(User).count()
-            
-            # Users by subscription type
-            subscription_stats = {}
-            for subscription_type in SubscriptionType:
-                count = self.db.query(User).filter(User.subscription_type == subscription_type).count()
-                subscription_stats[subscription_type.value] = count
-            
-            # Recent users (last 30 days)
-            thirty_days_ago = datetime.now(timezone.utc) - timedelta(days=30)
-            recent_users = self.db.query(User).filter(User.created_at >= thirty_days_ago).count()
-            
-            # Active users (with limits used)
-            active_users = self.db.query(User).join(User.limits).filter(
-                User.limits.has(
-                    (User.limits.analytics_used > 0) | 
-                    (User.limits.themes_used > 0) | 
-                    (User.limits.top_themes_used > 0)
-                )
-            ).count()
+        cached = self._stats_cache
+        if cached is not None and self._clock() - cached[0] < USER_STATISTICS_TTL:
+            return cached[1]
+        
+        if self._stats_lock is None:
+            self._stats_lock = asyncio.Lock()
+        async with self._stats_lock:
+            # Пока ждали блокировку, статистику мог посчитать другой запрос
+            cached = self._stats_cache
+            if cached is not None and self._clock() - cached[0] < USER_STATISTICS_TTL:
+                return cached[1]
             
-            return {
-                "total_users": total_users,
-                "subscription_stats": subscription_stats,
-                "recent_users": recent_users,
-                "active_users": active_users,
+            try:
+                async with self.async_session_factory() as session:
+                    query = self._user_statistics_query(session.bind.dialect.name)
+                    row = (await session.execute(query)).mappings().one()
+            except Exception as e:
+                print(f"Error getting user statistics: {e}")
+                return {}
+            
+            stats = {
+                "total_users": row["total_users"],
+                "subscription_stats": {
+                    subscription_type.value: row[f"subscription_{subscription_type.value}"]
+                    for subscription_type in SubscriptionType
+                },
+                "recent_users": row["recent_users"],
+                "active_users": row["active_users"],
                 "last_updated": datetime.now(timezone.utc).strftime("%d.%m.%Y %H:%M")
             }
-            
-        except Exception as e:
-            print(f"Error getting user statistics: {e}")
-            return {}
+            self._stats_cache = (self._clock(), stats)
+            return stats
     
     def update_new_works_parameter(self, months: int) -> bool:
         """Update the 'new works' parameter for analytics."""
@@ -6,13 +6,14 @@ from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional, Union
 import redis
 from config.database import redis_client
+from core.cache.tagged_keys import SCAN_COUNT, invalidate_tag, set_tagged
 
 
 class AICacheManager:
     """Manage caching of AI results with TTL and invalidation strategies."""
     
-    def __init__(self):
-        self.redis_client = redis_client
+    def __init__(self, redis_client_instance: Optional[redis.Redis] = None):
+        self.redis_client = redis_client_instance or redis_client
         self.default_ttl = 86400  # 24 hours
         self.cache_prefix = "ai_cache:"
     
@@ -24,6 +25,12 @@ class AICacheManager:
         
         return f"{self.cache_prefix}{cache_type}:{identifier}:{params_hash}"
     
+    def _tags(self, cache_type: str, identifier: Optional[str] = None) -> str:
+        """Tag of all entries of type or of one identifier."""
+        if identifier:
+            return f"{self.cache_prefix}{cache_type}:{identifier}"
+        return f"{self.cache_prefix}{cache_type}"
+    
     def get_cached_result(self, cache_type: str, identifier: str, **kwargs) -> Optional[Dict[str, Any]]:
         """Get cached AI result."""
         try:
@@ -31,7 +38,9 @@ class AICacheManager:
             cached_data = self.redis_client.get(cache_key)
             
             if cached_data:
-                result = json.loads(cached_data.decode('utf-8'))
+                if isinstance(cached_data, bytes):
+                    cached_data = cached_data.decode('utf-8')
+                result = json.loads(cached_data)
                 result['cached'] = True
                 result['cache_timestamp'] = result.get('cache_timestamp', 'unknown')
                 return result
@@ -57,7 +66,10 @@ class AICacheManager:
             cache_data = json.dumps(result, ensure_ascii=False)
             ttl = ttl or self.default_ttl
             
-            self.redis_client.setex(cache_key, ttl, cache_data)
+            set_tagged(self.redis_client, cache_key, cache_data, ttl, [
+                self._tags(cache_type),
+                self._tags(cache_type, identifier)
+            ])
             
             return True
             
@@ -66,7 +78,7 @@ class AICacheManager:
             return False
     
     def invalidate_cache(self, cache_type: str, identifier: str = None) -> int:
-        """Invalidate cache entries."""
+        """Invalidate cache entries (by tag, without KEYS)."""
         try:
             if identifier:
                 # Invalidate specific identifier
@@ -75,11 +87,7 @@ class AICacheManager:
                 # Invalidate all entries of this type
                 pattern = f"{self.cache_prefix}{cache_type}:*"
             
-            keys = self.redis_client.keys(pattern)
-            if keys:
-                return self.redis_client.delete(*keys)
-            
-            return 0
+            return invalidate_tag(self.redis_client, self._tags(cache_type, identifier), legacy_match=pattern)
             
         except Exception as e:
             print(f"Error invalidating cache: {e}")
@@ -88,22 +96,20 @@ class AICacheManager:
     def get_cache_statistics(self) -> Dict[str, Any]:
         """Get cache statistics."""
         try:
-            # Get all AI cache keys
-            pattern = f"{self.cache_prefix}*"
-            keys = self.redis_client.keys(pattern)
-            
             stats = {
-                "total_cached_items": len(keys),
+                "total_cached_items": 0,
                 "cache_types": {},
                 "memory_usage": 0,
                 "hit_rate": 0.0
             }
             
-            # Analyze cache types
-            for key in keys:
-                key_str = key.decode('utf-8')
+            # Analyze cache types (SCAN - не блокирует Redis как KEYS)
+            pattern = f"{self.cache_prefix}*"
+            for key in self.redis_client.scan_iter(match=pattern, count=SCAN_COUNT):
+                key_str = key.decode('utf-8') if isinstance(key, bytes) else key
                 cache_type = key_str.split(':')[1] if ':' in key_str else 'unknown'
                 
+                stats["total_cached_items"] += 1
                 if cache_type not in stats["cache_types"]:
                     stats["cache_types"][cache_type] = 0
                 stats["cache_types"][cache_type] += 1
@@ -132,10 +138,9 @@ class AICacheManager:
         try:
             # Redis automatically handles TTL, but we can check for any issues
             pattern = f"{self.cache_prefix}*"
-            keys = self.redis_client.keys(pattern)
             
             expired_count = 0
-            for key in keys:
+            for key in self.redis_client.scan_iter(match=pattern, count=SCAN_COUNT):
                 ttl = self.redis_client.ttl(key)
                 if ttl == -2:  # Key doesn't exist (expired)
                     expired_count += 1
@@ -1,68 +1,193 @@
 """AI categorizer for themes and content with caching and batch processing."""
 
+import asyncio
 import openai
+import httpx
 import redis
 import json
+import weakref
 from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
 from config.settings import settings
 from config.database import redis_client
 
 
+# Один клиент провайдера на event loop: соединения переиспользуются между батчами,
+# семафор ограничивает число одновременных запросов к API.
+# Пул соединений httpx (как и семафор) привязан к loop, в котором им впервые
+# воспользовались, а воркеры вызывают asyncio.run() на каждую задачу - поэтому
+# клиент и семафор хранятся по loop и уходят вместе с ним.
+CATEGORIZER_CONCURRENCY = 4
+CATEGORIZER_BATCH_SIZE = 50
+
+_shared_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, openai.AsyncOpenAI]" = (
+    weakref.WeakKeyDictionary()
+)
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _create_client() -> openai.AsyncOpenAI:
+    return openai.AsyncOpenAI(
+        api_key=settings.openai_api_key,
+        http_client=httpx.AsyncClient(timeout=httpx.Timeout(60.0))
+    )
+
+
+def get_shared_client() -> openai.AsyncOpenAI:
+    """Get OpenAI client shared within the running event loop."""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # Вне event loop делить нечего - пул свяжется с loop первого запроса
+        return _create_client()
+    client = _shared_clients.get(loop)
+    if client is None:
+        client = _shared_clients[loop] = _create_client()
+    return client
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    """Get provider semaphore bound to the running event loop."""
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(CATEGORIZER_CONCURRENCY)
+    return semaphore
+
+
+def _to_str(value) -> Optional[str]:
+    if value is None:
+        return None
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
 class ThemeCategorizer:
     """Enhanced AI categorizer with caching and batch processing."""
     
-    def __init__(self):
+    def __init__(self, redis_client_instance: Optional[redis.Redis] = None,
+                 client: Optional[openai.AsyncOpenAI] = None):
         if settings.openai_api_key:
             openai.api_key = settings.openai_api_key
-        self.redis_client = redis_client
+        self.redis_client = redis_client_instance or redis_client
+        self._client = client
         self.cache_ttl = 86400  # 24 hours
     
+    @property
+    def client(self) -> openai.AsyncOpenAI:
+        """Provider client (shared unless injected)."""
+        return self._client or get_shared_client()
+    
+    async def _create_completion(self, **kwargs):
+        """Call provider through the shared semaphore."""
+        async with _get_semaphore():
+            return await self.client.chat.completions.create(**kwargs)
+    
+    @staticmethod
+    def _cache_key(theme: str) -> str:
+        return f"theme_category:{theme.lower()}"
+    
+    def get_cached_categories(self, themes: List[str]) -> Dict[str, str]:
+        """Get cached categories for themes with a single MGET."""
+        if self.redis_client is None or not themes:
+            return {}
+        
+        try:
+            values = self.redis_client.mget([self._cache_key(theme) for theme in themes])
+            return {
+                theme: _to_str(value)
+                for theme, value in zip(themes, values)
+                if value
+            }
+        except Exception as e:
+            print(f"Error getting cached categories: {e}")
+            return {}
+    
+    def _cache_categories(self, categories: Dict[str, str]):
+        """Cache categories with one pipelined round-trip of SET ... EX."""
+        if self.redis_client is None or not categories:
+            return
+        
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for theme, category in categories.items():
+                pipe.set(self._cache_key(theme), category, ex=self.cache_ttl)
+            pipe.execute()
+        except Exception as e:
+            print(f"Error caching categories: {e}")
+    
     async def categorize_batch(self, themes: List[str]) -> List[Dict[str, Any]]:
-        """Categorize multiple themes in batch for efficiency."""
+        """Categorize multiple themes in batch for efficiency.
+        
+        Кеш читается одним MGET на весь вход, провайдеру уходят только
+        промахи (пачками по CATEGORIZER_BATCH_SIZE), новые категории
+        записываются одним pipeline. Результат - в порядке входа.
+        """
         
         if not themes:
             return []
         
         try:
-            # Check cache first
-            cached_results = []
-            uncached_themes = []
+            cached = await asyncio.to_thread(self.get_cached_categories, themes)
             
-            for theme in themes:
-                cached = self.get_cached_category(theme)
-                if cached:
-                    cached_results.append({
-                        "theme": theme,
-                        "category": cached,
-                        "cached": True
-                    })
-                else:
-                    uncached_themes.append(theme)
+            uncached_themes = list(dict.fromkeys(
+                theme for theme in themes if theme not in cached
+            ))
             
-            # Process uncached themes in batch
+            fresh: Dict[str, Dict[str, Any]] = {}
             if uncached_themes:
-                batch_results = await self._process_batch_categorization(uncached_themes)
+                chunks = [
+                    uncached_themes[i:i + CATEGORIZER_BATCH_SIZE]
+                    for i in range(0, len(uncached_themes), CATEGORIZER_BATCH_SIZE)
+                ]
+                batches = await asyncio.gather(*(
+                    self._process_batch_categorization(chunk) for chunk in chunks
+                ))
+                for chunk, batch_results in zip(chunks, batches):
+                    fresh.update(self._match_results(chunk, batch_results))
                 
-                # Cache the results
-                for result in batch_results:
-                    if not result.get("cached"):
-                        self._cache_category(result["theme"], result["category"])
-                
-                cached_results.extend(batch_results)
+                await asyncio.to_thread(self._cache_categories, {
+                    theme: result["category"] for theme, result in fresh.items()
+                })
             
-            return cached_results
+            results = []
+            for theme in themes:
+                if theme in cached:
+                    results.append({"theme": theme, "category": cached[theme], "cached": True})
+                else:
+                    results.append(fresh[theme])
+            return results
             
         except Exception as e:
             print(f"Error in batch categorization: {e}")
             return [{"theme": theme, "category": "General", "cached": False} for theme in themes]
     
+    @staticmethod
+    def _match_results(themes: List[str], batch_results: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Map provider results back to requested themes (missing ones get General)."""
+        by_name = {result["theme"].strip().lower(): result for result in batch_results}
+        matched = {}
+        for position, theme in enumerate(themes):
+            result = by_name.get(theme.lower())
+            if result is None and len(batch_results) == len(themes):
+                # Провайдер мог вернуть строки с номерами - тогда сопоставляем по порядку
+                result = batch_results[position]
+            if result is None:
+                result = {"category": "General", "confidence": 0.5}
+            matched[theme] = {
+                "theme": theme,
+                "category": result["category"],
+                "confidence": result.get("confidence", 0.8),
+                "cached": False
+            }
+        return matched
+    
     def get_cached_category(self, theme: str) -> Optional[str]:
         """Get cached category for a theme."""
         try:
-            cache_key = f"theme_category:{theme.lower()}"
-            cached = self.redis_client.get(cache_key)
-            return cached.decode('utf-8') if cached else None
+            cached = self.redis_client.get(self._cache_key(theme))
+            return _to_str(cached) if cached else None
         except Exception as e:
             print(f"Error getting cached category: {e}")
             return None
@@ -70,8 +195,7 @@ class ThemeCategorizer:
     def _cache_category(self, theme: str, category: str):
         """Cache category for a theme."""
         try:
-            cache_key = f"theme_category:{theme.lower()}"
-            self.redis_client.setex(cache_key, self.cache_ttl, category)
+            self.redis_client.setex(self._cache_key(theme), self.cache_ttl, category)
         except Exception as e:
             print(f"Error caching category: {e}")
     
@@ -93,8 +217,7 @@ class ThemeCategorizer:
             Format: Theme Name | Category | Confidence
             """
             
-            client = openai.AsyncOpenAI(api_key=settings.openai_api_key)
-            response = await client.chat.completions.create(
+            response = await self._create_completion(
                 model="gpt-3.5-turbo",
                 messages=[
                     {"role": "system", "content": "You are a stock photography expert who categorizes themes into marketable categories."},
@@ -156,8 +279,7 @@ class ThemeCategorizer:
             Focus on broad, marketable themes that would be useful for stock photography.
             """
             
-            client = openai.AsyncOpenAI(api_key=settings.openai_api_key)
-            response = await client.chat.completions.create(
+            response = await self._create_completion(
                 model="gpt-3.5-turbo",
                 messages=[
                     {"role": "system", "content": "You are a stock photography expert who categorizes content into marketable themes."},
@@ -197,8 +319,7 @@ class ThemeCategorizer:
             Return only the theme names, one per line, without numbers or bullets.
             """
             
-            client = openai.AsyncOpenAI(api_key=settings.openai_api_key)
-            response = await client.chat.completions.create(
+            response = await self._create_completion(
                 model="gpt-3.5-turbo",
                 messages=[
                     {"role": "system", "content": "You are a stock photography market analyst who suggests profitable themes."},
@@ -263,8 +384,7 @@ class ThemeCategorizer:
             Format: Category | Confidence | Explanation
             """
             
-            client = openai.AsyncOpenAI(api_key=settings.openai_api_key)
-            response = await client.chat.completions.create(
+            response = await self._create_completion(
                 model="gpt-3.5-turbo",
                 messages=[
                     {"role": "system", "content": "You are a stock photography expert who categorizes themes with high accuracy."},
@@ -4,61 +4,134 @@ import numpy as np
 from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, and_, or_
+from sqlalchemy import func, desc, and_, or_, case, delete, insert, literal, select, DateTime
+from sqlalchemy.sql import Select
 from sklearn.preprocessing import StandardScaler
 from sklearn.cluster import KMeans
 import pandas as pd
 
 from config.database import SessionLocal
-from database.models import GlobalTheme, CSVAnalysis, AnalyticsReport
+from database.models import GlobalTheme, CSVAnalysis, AnalyticsReport, ThemeTrendSnapshot
+
+
+# period -> (дней в окне, потолок роста, рост на одну продажу)
+TREND_PERIODS = {
+    'week': (7, 50.0, 0.1),
+    'month': (30, 100.0, 0.2),
+    'quarter': (90, 200.0, 0.3),
+}
+# Сколько тем (по total_sales) хранится в снимке на каждый период
+TREND_SNAPSHOT_SIZE = 200
+
+
+def _capped(expr, cap: float):
+    """SQL min(expr, cap) that works on PostgreSQL and SQLite."""
+    return case((expr > cap, cap), else_=expr)
+
+
+def trending_themes_select(period: str, now: datetime, limit: Optional[int] = None) -> Select:
+    """Growth and trend score for all themes of the window in one query.
+    
+    Повторяет _calculate_theme_growth_rate/_calculate_trend_score на стороне БД,
+    поэтому весь список считается одним запросом вместо 2 запросов на тему.
+    Строки отсортированы по total_sales (sales_rank), как и раньше до сортировки по trend_score.
+    """
+    days, growth_cap, growth_per_sale = TREND_PERIODS.get(period, (7, 0.0, 0.0))
+    sales = func.coalesce(GlobalTheme.total_sales, 0)
+    growth = _capped(sales * growth_per_sale, growth_cap)
+    usage_score = _capped(sales / 1000.0, 1.0)
+    recency_score = case((GlobalTheme.last_updated > now - timedelta(days=7), 1.0), else_=0.5)
+    trend_score = usage_score * 0.4 + growth / 100.0 * 0.4 + recency_score * 0.2
+    
+    stmt = select(
+        GlobalTheme.id.label('theme_id'),
+        GlobalTheme.theme_name,
+        sales.label('usage_count'),
+        growth.label('growth_rate'),
+        trend_score.label('trend_score'),
+        func.row_number().over(order_by=(desc(sales), GlobalTheme.id)).label('sales_rank'),
+        GlobalTheme.last_updated
+    ).where(
+        GlobalTheme.last_updated >= now - timedelta(days=days)
+    ).order_by(desc(sales), GlobalTheme.id)
+    
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+def refresh_theme_trend_snapshot(db: Session, periods: Optional[List[str]] = None,
+                                 now: Optional[datetime] = None) -> int:
+    """Recompute theme_trend_snapshot (DELETE + INSERT ... SELECT per period).
+    
+    Коммит выполняет вызывающий код. Returns number of stored rows.
+    """
+    now = now or datetime.utcnow()
+    stored = 0
+    for period in periods or list(TREND_PERIODS):
+        source = trending_themes_select(period, now, TREND_SNAPSHOT_SIZE).add_columns(
+            literal(now, DateTime).label('computed_at'),
+            literal(period).label('period')
+        )
+        db.execute(delete(ThemeTrendSnapshot).where(ThemeTrendSnapshot.period == period))
+        result = db.execute(insert(ThemeTrendSnapshot).from_select(
+            ['theme_id', 'theme_name', 'usage_count', 'growth_rate', 'trend_score',
+             'sales_rank', 'last_updated', 'computed_at', 'period'],
+            source
+        ))
+        stored += max(result.rowcount or 0, 0)
+    return stored
 
 
 class MarketAnalyzer:
     """Analyze market trends and patterns in stock photography."""
     
-    def __init__(self):
-        self.db = SessionLocal()
+    def __init__(self, db: Optional[Session] = None):
+        self._owns_db = db is None
+        self.db = db or SessionLocal()
     
     def __del__(self):
-        """Close database session."""
-        if hasattr(self, 'db'):
+        """Close database session (only if created here)."""
+        if hasattr(self, 'db') and getattr(self, '_owns_db', True):
             self.db.close()
     
     def get_trending_themes(self, period: str = 'week', limit: int = 20) -> List[Dict[str, Any]]:
-        """Get trending themes based on usage frequency."""
+        """Get trending themes based on usage frequency.
+        
+        Читает готовый снимок theme_trend_snapshot (один запрос); если снимка
+        для периода еще нет - считает то же самое одним запросом по global_themes.
+        """
         try:
-            # Calculate time threshold based on period
-            if period == 'week':
-                time_threshold = datetime.utcnow() - timedelta(days=7)
-            elif period == 'month':
-                time_threshold = datetime.utcnow() - timedelta(days=30)
-            elif period == 'quarter':
-                time_threshold = datetime.utcnow() - timedelta(days=90)
-            else:
-                time_threshold = datetime.utcnow() - timedelta(days=7)
-            
-            # Get themes with recent usage
-            trending_themes = self.db.query(GlobalTheme).filter(
-                GlobalTheme.last_updated >= time_threshold
-            ).order_by(desc(GlobalTheme.total_sales)).limit(limit).all()
-            
-            # Calculate trend scores
-            trending_data = []
-            for theme in trending_themes:
-                # Calculate growth rate
-                growth_rate = self._calculate_theme_growth_rate(theme.theme_name, period)
-                
-                # Calculate trend score
-                trend_score = self._calculate_trend_score(theme, period)
-                
-                trending_data.append({
-                    "theme_name": theme.theme_name,
-                    "usage_count": theme.total_sales,
-                    "growth_rate": growth_rate,
-                    "trend_score": trend_score,
-                    "last_used": theme.last_used,
+            rows = []
+            if period in TREND_PERIODS and limit <= TREND_SNAPSHOT_SIZE:
+                rows = self.db.execute(
+                    select(
+                        ThemeTrendSnapshot.theme_name,
+                        ThemeTrendSnapshot.usage_count,
+                        ThemeTrendSnapshot.growth_rate,
+                        ThemeTrendSnapshot.trend_score,
+                        ThemeTrendSnapshot.last_updated
+                    ).where(
+                        ThemeTrendSnapshot.period == period
+                    ).order_by(ThemeTrendSnapshot.sales_rank).limit(limit)
+                ).all()
+            
+            if not rows:
+                rows = self.db.execute(
+                    trending_themes_select(period, datetime.utcnow(), limit)
+                ).all()
+            
+            trending_data = [
+                {
+                    "theme_name": row.theme_name,
+                    "usage_count": row.usage_count,
+                    "growth_rate": float(row.growth_rate),
+                    "trend_score": round(float(row.trend_score), 3),
+                    "last_used": row.last_updated,
                     "category": "General"
-                })
+                }
+                for row in rows
+            ]
             
             # Sort by trend score
             trending_data.sort(key=lambda x: x["trend_score"], reverse=True)
@@ -0,0 +1,145 @@
+"""Fixed-length user profile vectors for similar-user search."""
+
+import math
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import desc, func, select
+from sqlalchemy.orm import Session
+
+from database.models import AnalyticsReport, CSVAnalysis, ThemeRequest, UserProfileVector
+
+
+# Меняется при любом изменении раскладки вектора - старые строки пересчитываются
+PROFILE_VECTOR_VERSION = 1
+
+PROFILE_CATEGORIES = ('business', 'lifestyle', 'technology', 'nature', 'food', 'other')
+CATEGORY_KEYWORDS = {
+    'business': ('business', 'office', 'meeting', 'corporate', 'professional', 'бизнес', 'офис', 'финанс', 'работ'),
+    'lifestyle': ('lifestyle', 'home', 'family', 'people', 'daily', 'семь', 'дом', 'люди', 'отдых'),
+    'technology': ('technology', 'digital', 'computer', 'mobile', 'internet', 'технолог', 'компьютер', 'цифров', ' ai'),
+    'nature': ('nature', 'outdoor', 'landscape', 'green', 'environment', 'природ', 'пейзаж', 'лес', 'море'),
+    'food': ('food', 'cooking', 'kitchen', 'restaurant', 'meal', 'еда', 'кухн', 'ресторан', 'блюд'),
+}
+PROFILE_STATS = ('activity', 'sales', 'revenue', 'portfolio_sold', 'new_works_sales')
+PROFILE_VECTOR_SIZE = len(PROFILE_CATEGORIES) + len(PROFILE_STATS)
+
+# Вклад блоков в косинус: предпочтения тем важнее объемов продаж
+CATEGORY_WEIGHT = 0.7
+STATS_WEIGHT = 0.3
+
+SUCCESS_STATUSES = ("APPROVED", "COMPLETED", "FULFILLED", "SUCCESS")
+
+
+def theme_category(theme: str) -> int:
+    """Index of theme category in PROFILE_CATEGORIES."""
+    text = f" {theme.lower()}"
+    for index, category in enumerate(PROFILE_CATEGORIES[:-1]):
+        if any(keyword in text for keyword in CATEGORY_KEYWORDS[category]):
+            return index
+    return len(PROFILE_CATEGORIES) - 1
+
+
+def _log_scale(value: float, full_scale: float) -> float:
+    return min(1.0, math.log1p(max(value, 0.0)) / math.log1p(full_scale))
+
+
+def build_profile_vector(theme_names: Iterable[str], total_analyses: int,
+                         total_sales: float = 0.0, total_revenue: float = 0.0,
+                         portfolio_sold_percent: float = 0.0,
+                         new_works_sales_percent: float = 0.0) -> np.ndarray:
+    """Build L2-normalized profile vector (category shares + sales stats)."""
+    shares = np.zeros(len(PROFILE_CATEGORIES), dtype=np.float64)
+    for theme_name in theme_names:
+        for line in (theme_name or "").splitlines():
+            if line.strip():
+                shares[theme_category(line)] += 1
+
+    stats = np.array([
+        _log_scale(total_analyses, 50),
+        _log_scale(total_sales, 10_000),
+        _log_scale(total_revenue, 10_000),
+        min(1.0, portfolio_sold_percent / 100),
+        min(1.0, new_works_sales_percent / 100),
+    ], dtype=np.float64)
+
+    shares_norm = np.linalg.norm(shares)
+    if shares_norm:
+        shares = shares / shares_norm
+    vector = np.concatenate([shares * CATEGORY_WEIGHT, stats * STATS_WEIGHT])
+
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector = vector / norm
+    return vector.astype(np.float32)
+
+
+def encode_vector(vector: np.ndarray) -> bytes:
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+
+def decode_vectors(blobs: Iterable[bytes]) -> np.ndarray:
+    """Stack stored vectors into (n, PROFILE_VECTOR_SIZE) float32 matrix."""
+    buffer = b"".join(blobs)
+    return np.frombuffer(buffer, dtype=np.float32).reshape(-1, PROFILE_VECTOR_SIZE)
+
+
+def top_k_similar(matrix: np.ndarray, vector: np.ndarray, k: int,
+                  threshold: float = 0.0) -> Tuple[np.ndarray, np.ndarray]:
+    """Cosine top-k over normalized rows: one mat-vec product + argpartition.
+
+    Returns (row indices, scores) sorted by score desc, only scores > threshold.
+    """
+    if matrix.shape[0] == 0 or k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+    scores = matrix @ vector
+    k = min(k, scores.shape[0])
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+    candidates = candidates[scores[candidates] > threshold]
+    return candidates, scores[candidates]
+
+
+def refresh_user_profile_vector(db: Session, user_id: int) -> UserProfileVector:
+    """Recompute and store profile vector of user (caller commits)."""
+    total_analyses = db.execute(
+        select(func.count(CSVAnalysis.id)).where(CSVAnalysis.user_id == user_id)
+    ).scalar_one()
+
+    latest_report = db.execute(
+        select(
+            AnalyticsReport.total_sales,
+            AnalyticsReport.total_revenue,
+            AnalyticsReport.portfolio_sold_percent,
+            AnalyticsReport.new_works_sales_percent
+        )
+        .join(CSVAnalysis, AnalyticsReport.csv_analysis_id == CSVAnalysis.id)
+        .where(CSVAnalysis.user_id == user_id)
+        .order_by(desc(AnalyticsReport.created_at), desc(AnalyticsReport.id))
+        .limit(1)
+    ).first()
+
+    theme_rows = db.execute(
+        select(ThemeRequest.theme_name, ThemeRequest.status).where(ThemeRequest.user_id == user_id)
+    ).all()
+    successful_themes = sum(
+        1 for row in theme_rows if row.status and row.status.upper() in SUCCESS_STATUSES
+    )
+
+    vector = build_profile_vector(
+        (row.theme_name for row in theme_rows),
+        total_analyses,
+        *(float(value or 0) for value in (latest_report or ()))
+    )
+
+    profile: Optional[UserProfileVector] = db.get(UserProfileVector, user_id)
+    if profile is None:
+        profile = UserProfileVector(user_id=user_id)
+        db.add(profile)
+    profile.vector = encode_vector(vector)
+    profile.version = PROFILE_VECTOR_VERSION
+    profile.total_analyses = total_analyses
+    profile.successful_themes = successful_themes
+    db.flush()
+    return profile
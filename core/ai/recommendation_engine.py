@@ -4,25 +4,35 @@ import numpy as np
 from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, and_, or_
+from sqlalchemy import func, desc, or_, select
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.cluster import KMeans
 import pandas as pd
 
 from config.database import SessionLocal
-from database.models import User, CSVAnalysis, AnalyticsReport, GlobalTheme, ThemeRequest
+from database.models import User, CSVAnalysis, AnalyticsReport, GlobalTheme, ThemeRequest, UserProfileVector
+from core.ai.profile_vectors import (
+    PROFILE_VECTOR_VERSION,
+    decode_vectors,
+    refresh_user_profile_vector,
+    top_k_similar,
+)
+
+# Порог сходства для похожих пользователей
+SIMILARITY_THRESHOLD = 0.3
 
 
 class RecommendationEngine:
     """Generate personalized recommendations based on user behavior."""
     
-    def __init__(self):
-        self.db = SessionLocal()
+    def __init__(self, db: Optional[Session] = None):
+        self._owns_db = db is None
+        self.db = db or SessionLocal()
     
     def __del__(self):
-        """Close database session."""
-        if hasattr(self, 'db'):
+        """Close database session (only if created here)."""
+        if hasattr(self, 'db') and getattr(self, '_owns_db', True):
             self.db.close()
     
     def get_user_behavior_profile(self, user_id: int) -> Dict[str, Any]:
@@ -159,46 +169,60 @@ class RecommendationEngine:
             }
     
     def find_similar_users(self, user_id: int, limit: int = 5) -> List[Dict[str, Any]]:
-        """Find users with similar behavior patterns."""
+        """Find users with similar behavior patterns.
+        
+        Сравнивает сохраненные векторы профилей (user_profile_vectors) всех
+        пользователей с тем же тарифом: одно матрично-векторное произведение
+        (косинус по нормированным векторам) и argpartition для top-k.
+        """
         try:
-            # Get current user's profile
-            current_profile = self.get_user_behavior_profile(user_id)
+            current = self.db.execute(
+                select(User.subscription_type, UserProfileVector)
+                .outerjoin(UserProfileVector, UserProfileVector.user_id == User.id)
+                .where(User.id == user_id)
+            ).first()
             
-            if current_profile.get("error"):
+            if current is None:
                 return []
             
-            # Get all other users with similar subscription type
-            subscription_type = current_profile["subscription_type"]
-            other_users = self.db.query(User).filter(
-                and_(
-                    User.id != user_id,
+            subscription_type, profile = current
+            if profile is None or profile.version != PROFILE_VECTOR_VERSION:
+                profile = refresh_user_profile_vector(self.db, user_id)
+                self.db.commit()
+            
+            rows = self.db.execute(
+                select(
+                    UserProfileVector.user_id,
+                    User.telegram_id,
+                    UserProfileVector.vector,
+                    UserProfileVector.successful_themes,
+                    UserProfileVector.total_analyses
+                )
+                .join(User, User.id == UserProfileVector.user_id)
+                .where(
+                    UserProfileVector.user_id != user_id,
+                    UserProfileVector.version == PROFILE_VECTOR_VERSION,
                     User.subscription_type == subscription_type
                 )
-            ).limit(100).all()
+            ).all()
             
-            similar_users = []
+            if not rows:
+                return []
             
-            for user in other_users:
-                user_profile = self.get_user_behavior_profile(user.id)
-                
-                if user_profile.get("error"):
-                    continue
-                
-                # Calculate similarity score
-                similarity_score = self._calculate_user_similarity(current_profile, user_profile)
-                
-                if similarity_score > 0.3:  # Threshold for similarity
-                    similar_users.append({
-                        "user_id": user.id,
-                        "telegram_id": user.telegram_id,
-                        "similarity_score": round(similarity_score, 3),
-                        "successful_themes": user_profile["successful_themes"],
-                        "total_analyses": user_profile["total_analyses"]
-                    })
+            matrix = decode_vectors(row.vector for row in rows)
+            vector = decode_vectors([profile.vector])[0]
+            indices, scores = top_k_similar(matrix, vector, limit, SIMILARITY_THRESHOLD)
             
-            # Sort by similarity and return top results
-            similar_users.sort(key=lambda x: x["similarity_score"], reverse=True)
-            return similar_users[:limit]
+            return [
+                {
+                    "user_id": rows[index].user_id,
+                    "telegram_id": rows[index].telegram_id,
+                    "similarity_score": round(float(score), 3),
+                    "successful_themes": rows[index].successful_themes,
+                    "total_analyses": rows[index].total_analyses
+                }
+                for index, score in zip(indices, scores)
+            ]
             
         except Exception as e:
             print(f"Error finding similar users: {e}")
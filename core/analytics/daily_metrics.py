@@ -0,0 +1,365 @@
+"""Daily metrics rollup (daily_metrics) for admin dashboard.
+
+Метрики раскладываются по UTC-дням: регистрации, переходы между тарифами,
+истечения и отток платных подписок. Фоновая задача досчитывает дни после
+водяного знака (последнего сохраненного дня), читатели суммируют строки
+rollup и досчитывают вживую только хвост после водяного знака (обычно -
+сегодняшний день).
+
+Функции синхронные (sync Session), из async кода вызываются через
+AsyncSession.run_sync.
+"""
+
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import Date, and_, cast, func, or_, select
+from sqlalchemy.orm import Session, aliased
+
+from core.utils.db import dialect_insert
+from database.models import DailyMetrics, Subscription, SubscriptionType, User
+from database.models.user import utc_now
+
+
+DAILY_METRIC_FIELDS = (
+    'new_users',
+    'paid_converted',
+    'test_pro_to_pro',
+    'test_pro_to_ultra',
+    'test_pro_to_free',
+    'free_to_paid',
+    'pro_expired',
+    'pro_churned',
+    'ultra_expired',
+    'ultra_churned',
+)
+
+TEST_PRO_DAYS = 14
+# Отток и истечение TEST_PRO зависят от последующих продлений, поэтому
+# последние дни пересчитываются, пока не "устоятся"
+DAILY_METRICS_SETTLE_DAYS = 7
+
+PAID_TYPES = (SubscriptionType.PRO, SubscriptionType.ULTRA)
+
+
+def empty_metrics() -> Dict[str, int]:
+    return dict.fromkeys(DAILY_METRIC_FIELDS, 0)
+
+
+def day_start(day: date) -> datetime:
+    return datetime(day.year, day.month, day.day)
+
+
+def month_start(day: date) -> datetime:
+    return datetime(day.year, day.month, 1)
+
+
+def next_month_start(day: date) -> datetime:
+    if day.month == 12:
+        return datetime(day.year + 1, 1, 1)
+    return datetime(day.year, day.month + 1, 1)
+
+
+def _as_date(value) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    return value
+
+
+def _as_type(value) -> Optional[SubscriptionType]:
+    if value is None or isinstance(value, SubscriptionType):
+        return value
+    return SubscriptionType(getattr(value, 'value', value))
+
+
+def _day_expr(db: Session, column):
+    # CAST(... AS DATE) в SQLite дает число, там нужен date()
+    if db.get_bind().dialect.name == "sqlite":
+        return func.date(column)
+    return cast(column, Date)
+
+
+def previous_subscription_type(previous_type, started_at: datetime,
+                               created_at: Optional[datetime],
+                               test_pro_started_at: Optional[datetime]) -> Optional[SubscriptionType]:
+    """Tariff user was on before subscription started.
+
+    Если предыдущей записи в subscriptions нет, это первая оплата: пользователь
+    был на TEST_PRO, если она еще не истекла и с регистрации прошло не больше
+    30 дней, иначе - на FREE.
+    """
+    if previous_type is not None:
+        return _as_type(previous_type)
+
+    test_pro_start = test_pro_started_at or created_at
+    if test_pro_start is None or started_at is None:
+        return None
+
+    days_since_creation = (started_at - created_at).days if created_at else 999
+    if started_at <= test_pro_start + timedelta(days=TEST_PRO_DAYS) and days_since_creation <= 30:
+        return SubscriptionType.TEST_PRO
+    return SubscriptionType.FREE
+
+
+def compute_daily_metrics(db: Session, start_day: date, end: datetime) -> Dict[date, Dict[str, int]]:
+    """Compute metrics from raw tables for days start_day..end (end exclusive).
+
+    Каждый блок - один запрос, ограниченный диапазоном дат; результат
+    содержит все дни диапазона, включая нулевые.
+    """
+    start = day_start(start_day)
+    metrics: Dict[date, Dict[str, int]] = {}
+    day = start_day
+    while day_start(day) < end:
+        metrics[day] = empty_metrics()
+        day += timedelta(days=1)
+    if not metrics:
+        return metrics
+
+    def bump(moment: datetime, field: str):
+        bucket = metrics.get(moment.date())
+        if bucket is not None:
+            bucket[field] += 1
+
+    # Регистрации
+    created_day = _day_expr(db, User.created_at)
+    for row in db.execute(
+        select(created_day.label('day'), func.count(User.id).label('count'))
+        .where(User.created_at >= start, User.created_at < end)
+        .group_by(created_day)
+    ):
+        metrics[_as_date(row.day)]['new_users'] += row.count
+
+    # Конверсия в платящих: день = max(регистрация, первая оплата)
+    first_paid = (
+        select(Subscription.user_id, func.min(Subscription.started_at).label('first_paid_at'))
+        .where(Subscription.subscription_type.in_(PAID_TYPES), Subscription.payment_id.isnot(None))
+        .group_by(Subscription.user_id)
+        .subquery()
+    )
+    for row in db.execute(
+        select(User.created_at, first_paid.c.first_paid_at)
+        .join(first_paid, first_paid.c.user_id == User.id)
+        .where(
+            User.created_at.isnot(None),
+            User.created_at < end,
+            first_paid.c.first_paid_at < end,
+            or_(User.created_at >= start, first_paid.c.first_paid_at >= start)
+        )
+    ):
+        metrics_day = max(row.created_at.date(), row.first_paid_at.date())
+        if metrics_day in metrics:
+            metrics[metrics_day]['paid_converted'] += 1
+
+    # Переходы TEST_PRO/FREE -> платный тариф: предыдущая подписка через LAG
+    active_users = select(Subscription.user_id).where(
+        Subscription.started_at >= start, Subscription.started_at < end
+    )
+    history = (
+        select(
+            Subscription.user_id,
+            Subscription.subscription_type,
+            Subscription.started_at,
+            Subscription.payment_id,
+            func.lag(Subscription.subscription_type).over(
+                partition_by=Subscription.user_id,
+                order_by=(Subscription.started_at, Subscription.id)
+            ).label('previous_type')
+        )
+        .where(Subscription.user_id.in_(active_users))
+        .subquery()
+    )
+    for row in db.execute(
+        select(history, User.created_at, User.test_pro_started_at)
+        .outerjoin(User, User.id == history.c.user_id)
+        .where(history.c.started_at >= start, history.c.started_at < end)
+    ):
+        if row.payment_id is None:
+            continue
+        sub_type = _as_type(row.subscription_type)
+        previous_type = previous_subscription_type(
+            row.previous_type, row.started_at, row.created_at, row.test_pro_started_at
+        )
+        if previous_type == SubscriptionType.TEST_PRO and sub_type == SubscriptionType.PRO:
+            bump(row.started_at, 'test_pro_to_pro')
+        elif previous_type == SubscriptionType.TEST_PRO and sub_type == SubscriptionType.ULTRA:
+            bump(row.started_at, 'test_pro_to_ultra')
+        elif previous_type == SubscriptionType.FREE and sub_type in PAID_TYPES:
+            bump(row.started_at, 'free_to_paid')
+
+    # TEST_PRO -> FREE: TEST_PRO истек в этот день, пользователь сейчас на FREE
+    # и не оплатил PRO/ULTRA в том же календарном месяце
+    trial_from = start - timedelta(days=TEST_PRO_DAYS)
+    trial_to = end - timedelta(days=TEST_PRO_DAYS)
+    candidates_query = select(User.id, User.test_pro_started_at, User.created_at).where(
+        User.subscription_type == SubscriptionType.FREE,
+        or_(
+            and_(
+                User.test_pro_started_at.isnot(None),
+                User.test_pro_started_at >= trial_from,
+                User.test_pro_started_at < trial_to
+            ),
+            and_(
+                User.test_pro_started_at.is_(None),
+                User.created_at.isnot(None),
+                User.created_at >= trial_from,
+                User.created_at < trial_to
+            )
+        )
+    )
+    expirations = {}
+    for row in db.execute(candidates_query):
+        expires_at = (row.test_pro_started_at or row.created_at) + timedelta(days=TEST_PRO_DAYS)
+        if start <= expires_at < end:
+            expirations[row.id] = expires_at
+
+    if expirations:
+        candidate_ids = candidates_query.with_only_columns(User.id)
+        upgraded = set()
+        for row in db.execute(
+            select(Subscription.user_id, Subscription.started_at)
+            .where(
+                Subscription.user_id.in_(candidate_ids),
+                Subscription.subscription_type.in_(PAID_TYPES),
+                Subscription.payment_id.isnot(None),
+                Subscription.started_at >= month_start(start_day),
+                Subscription.started_at < next_month_start(end.date())
+            )
+        ):
+            upgraded.add((row.user_id, row.started_at.year, row.started_at.month))
+
+        for user_id, expires_at in expirations.items():
+            if (user_id, expires_at.year, expires_at.month) not in upgraded:
+                bump(expires_at, 'test_pro_to_free')
+
+    # Отток: платная подписка истекла, не продлена (PRO - ни PRO, ни ULTRA
+    # после истечения) и пользователь сейчас на FREE
+    later = aliased(Subscription)
+
+    def renewed(sub_type: SubscriptionType):
+        return select(later.id).where(
+            later.user_id == Subscription.user_id,
+            later.subscription_type == sub_type,
+            later.started_at > Subscription.expires_at,
+            later.payment_id.isnot(None)
+        ).exists()
+
+    for row in db.execute(
+        select(
+            Subscription.subscription_type,
+            Subscription.expires_at,
+            User.subscription_type.label('current_type'),
+            renewed(SubscriptionType.PRO).label('renewed_pro'),
+            renewed(SubscriptionType.ULTRA).label('renewed_ultra')
+        )
+        .outerjoin(User, User.id == Subscription.user_id)
+        .where(
+            Subscription.subscription_type.in_(PAID_TYPES),
+            Subscription.payment_id.isnot(None),
+            Subscription.expires_at >= start,
+            Subscription.expires_at < end
+        )
+    ):
+        is_free = _as_type(row.current_type) == SubscriptionType.FREE
+        if _as_type(row.subscription_type) == SubscriptionType.PRO:
+            bump(row.expires_at, 'pro_expired')
+            if is_free and not row.renewed_pro and not row.renewed_ultra:
+                bump(row.expires_at, 'pro_churned')
+        else:
+            bump(row.expires_at, 'ultra_expired')
+            if is_free and not row.renewed_ultra:
+                bump(row.expires_at, 'ultra_churned')
+
+    return metrics
+
+
+def refresh_daily_metrics(db: Session, now: Optional[datetime] = None,
+                          settle_days: int = DAILY_METRICS_SETTLE_DAYS) -> int:
+    """Roll up closed days since watermark into daily_metrics (caller commits).
+
+    Первый запуск заполняет историю с даты первой регистрации. Дальше
+    обрабатываются дни после водяного знака плюс последние settle_days дней.
+    Сегодняшний день не сохраняется - читатели считают его вживую.
+
+    Returns:
+        Number of upserted days.
+    """
+    now = now or utc_now()
+    today = now.date()
+
+    watermark = db.execute(select(func.max(DailyMetrics.day))).scalar()
+    if watermark is None:
+        first_created = db.execute(select(func.min(User.created_at))).scalar()
+        start_day = first_created.date() if first_created else today
+    else:
+        start_day = min(_as_date(watermark) + timedelta(days=1), today - timedelta(days=settle_days))
+
+    if start_day >= today:
+        return 0
+
+    metrics = compute_daily_metrics(db, start_day, day_start(today))
+
+    insert = dialect_insert(db)
+    stmt = insert(DailyMetrics).values([
+        {'day': day, **values, 'computed_at': now}
+        for day, values in metrics.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DailyMetrics.day],
+        set_={field: stmt.excluded[field] for field in (*DAILY_METRIC_FIELDS, 'computed_at')}
+    )
+    db.execute(stmt)
+    return len(metrics)
+
+
+def _stored_metrics(row) -> Dict[str, int]:
+    return {field: getattr(row, field) or 0 for field in DAILY_METRIC_FIELDS}
+
+
+def daily_metrics_range(db: Session, start_day: date, end: datetime) -> Dict[date, Dict[str, int]]:
+    """Per-day metrics for start_day..end: rollup rows plus live tail after watermark."""
+    last_day = (end - timedelta(microseconds=1)).date()
+    stored = {
+        _as_date(row.day): _stored_metrics(row)
+        for row in db.execute(
+            select(DailyMetrics).where(DailyMetrics.day >= start_day, DailyMetrics.day <= last_day)
+        ).scalars()
+    }
+
+    tail_start = max(stored) + timedelta(days=1) if stored else start_day
+    result = {}
+    day = start_day
+    while day < tail_start:
+        # Дни до первой регистрации в rollup не пишутся - там нули
+        result[day] = stored.get(day) or empty_metrics()
+        day += timedelta(days=1)
+    if day_start(tail_start) < end:
+        result.update(compute_daily_metrics(db, tail_start, end))
+    return result
+
+
+def daily_metrics_totals(db: Session, before_day: date) -> Dict[str, int]:
+    """Sum of metrics over all days before before_day.
+
+    Сумма строк rollup одним запросом; дни между водяным знаком и
+    before_day (если задача отстала) досчитываются вживую.
+    """
+    row = db.execute(
+        select(func.max(DailyMetrics.day), *(func.sum(getattr(DailyMetrics, field)) for field in DAILY_METRIC_FIELDS))
+        .where(DailyMetrics.day < before_day)
+    ).one()
+    totals = {field: int(value or 0) for field, value in zip(DAILY_METRIC_FIELDS, row[1:])}
+
+    if row[0] is not None:
+        gap_start = _as_date(row[0]) + timedelta(days=1)
+    else:
+        first_created = db.execute(select(func.min(User.created_at))).scalar()
+        gap_start = first_created.date() if first_created else before_day
+
+    if gap_start < before_day:
+        for values in compute_daily_metrics(db, gap_start, day_start(before_day)).values():
+            for field in DAILY_METRIC_FIELDS:
+                totals[field] += values[field]
+    return totals
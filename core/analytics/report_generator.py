@@ -115,13 +115,17 @@ class ReportGenerator:
             work_sales[work_id]["sales"] += item["sales"]
             work_sales[work_id]["revenue"] += item["revenue"]
         
-        # Get tags for each work and categorize themes
+        # Get tags for all works at once (cache + capped concurrent fetch)
+        try:
+            tags_by_work = await self.adobe_parser.get_works_tags(work_sales)
+        finally:
+            # HTTP-сессия парсера нужна только на время загрузки тегов этого отчета
+            await self.adobe_parser.close()
         theme_sales = {}
         
         for work_id, work_data in work_sales.items():
             try:
-                # Get tags from Adobe Stock
-                tags = await self.adobe_parser.get_work_tags(work_id, work_data["title"])
+                tags = tags_by_work.get(str(work_id))
                 
                 if tags:
                     # Categorize themes
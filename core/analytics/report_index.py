@@ -0,0 +1,54 @@
+"""Lightweight index of user's analytics reports."""
+
+from datetime import datetime
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy import desc, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import AnalysisStatus
+from database.models.analytics_report import AnalyticsReport
+from database.models.csv_analysis import CSVAnalysis
+
+
+class ReportIndexEntry(NamedTuple):
+    """Report fields needed for lists and navigation (without report HTML)."""
+    id: int
+    period_human_ru: Optional[str]
+    created_at: Optional[datetime]
+
+
+async def get_report_index(session: AsyncSession, user_id: int) -> List[ReportIndexEntry]:
+    """Get completed reports of user, newest first.
+
+    Читает только (id, period_human_ru, created_at) - запрос обслуживается
+    покрывающими индексами, report_text_html не загружается.
+    """
+    stmt = (
+        select(AnalyticsReport.id, AnalyticsReport.period_human_ru, AnalyticsReport.created_at)
+        .join(CSVAnalysis, AnalyticsReport.csv_analysis_id == CSVAnalysis.id)
+        .where(
+            CSVAnalysis.user_id == user_id,
+            CSVAnalysis.status == AnalysisStatus.COMPLETED
+        )
+        .order_by(desc(AnalyticsReport.created_at), desc(AnalyticsReport.id))
+    )
+    result = await session.execute(stmt)
+    return [ReportIndexEntry(*row) for row in result.all()]
+
+
+async def get_report_html(session: AsyncSession, user_id: int, report_id: int) -> Optional[str]:
+    """Get HTML of a single report, checking that it belongs to user.
+
+    Returns None if report not found or belongs to another user.
+    """
+    stmt = (
+        select(AnalyticsReport.report_text_html)
+        .join(CSVAnalysis, AnalyticsReport.csv_analysis_id == CSVAnalysis.id)
+        .where(
+            AnalyticsReport.id == report_id,
+            CSVAnalysis.user_id == user_id
+        )
+    )
+    result = await session.execute(stmt)
+    return result.scalar_one_or_none()
@@ -0,0 +1,100 @@
+"""Per-user cache of rendered analytics report navigation keyboards."""
+
+import asyncio
+import logging
+from typing import Dict, Optional
+
+import redis
+from aiogram.types import InlineKeyboardMarkup
+
+logger = logging.getLogger(__name__)
+
+
+def _get_redis_client():
+    """Get Redis client with lazy import."""
+    from config.database import redis_client
+    return redis_client
+
+
+class ReportKeyboardCache:
+    """Rendered report view keyboards stored in a Redis hash per user.
+
+    Хеш report_keyboards:{user_id} хранит готовую клавиатуру навигации для
+    каждого отчета пользователя (поле = id отчета). Весь хеш строится за один
+    проход по индексу отчетов и сбрасывается, когда завершается новый анализ.
+    """
+
+    def __init__(self, redis_client_instance: Optional[redis.Redis] = None):
+        self.redis_client = redis_client_instance or _get_redis_client()
+        self.cache_prefix = "report_keyboards:"
+        self.cache_ttl = 86400  # 24 hours
+
+    def _get_cache_key(self, user_id: int) -> str:
+        """Generate cache key for user's keyboards."""
+        return f"{self.cache_prefix}{user_id}"
+
+    async def get_keyboard(self, user_id: int, report_id: int) -> Optional[InlineKeyboardMarkup]:
+        """Get cached keyboard for report or None on miss."""
+        if self.redis_client is None:
+            return None
+
+        try:
+            data = await asyncio.to_thread(self.redis_client.hget, self._get_cache_key(user_id), str(report_id))
+            if data:
+                return InlineKeyboardMarkup.model_validate_json(data)
+        except Exception as e:
+            from core.utils.log_rate_limiter import should_log_redis_warning
+            if should_log_redis_warning("report_keyboards_read"):
+                logger.warning(f"Error reading report keyboards cache: {e}")
+        return None
+
+    def _store_keyboards_sync(self, user_id: int, mapping: Dict[str, str]) -> None:
+        cache_key = self._get_cache_key(user_id)
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.delete(cache_key)
+        pipe.hset(cache_key, mapping=mapping)
+        pipe.expire(cache_key, self.cache_ttl)
+        pipe.execute()
+
+    async def store_keyboards(self, user_id: int, keyboards: Dict[int, InlineKeyboardMarkup]) -> None:
+        """Replace cached keyboards of user."""
+        if self.redis_client is None or not keyboards:
+            return
+
+        try:
+            mapping = {
+                str(report_id): keyboard.model_dump_json(exclude_none=True)
+                for report_id, keyboard in keyboards.items()
+            }
+            await asyncio.to_thread(self._store_keyboards_sync, user_id, mapping)
+        except Exception as e:
+            from core.utils.log_rate_limiter import should_log_redis_warning
+            if should_log_redis_warning("report_keyboards_write"):
+                logger.warning(f"Failed to cache report keyboards for user {user_id}: {e}")
+
+    def invalidate_sync(self, user_id: int) -> None:
+        """Invalidate user's keyboards (sync version for workers)."""
+        if self.redis_client is None:
+            return
+
+        try:
+            self.redis_client.delete(self._get_cache_key(user_id))
+            logger.debug(f"Invalidated report keyboards for user {user_id}")
+        except Exception as e:
+            logger.warning(f"Failed to invalidate report keyboards cache: {e}")
+
+    async def invalidate(self, user_id: int) -> None:
+        """Invalidate user's keyboards (async version for bot handlers)."""
+        await asyncio.to_thread(self.invalidate_sync, user_id)
+
+
+# Global instance
+_report_keyboard_cache: Optional[ReportKeyboardCache] = None
+
+
+def get_report_keyboard_cache() -> ReportKeyboardCache:
+    """Get global ReportKeyboardCache instance."""
+    global _report_keyboard_cache
+    if _report_keyboard_cache is None:
+        _report_keyboard_cache = ReportKeyboardCache()
+    return _report_keyboard_cache
@@ -0,0 +1,142 @@
+"""Process-wide in-memory snapshot of system_settings.
+
+Настройки (ссылки на оплату, admin_ids) читаются одним запросом и хранятся
+в памяти как неизменяемый словарь. Админка после сохранения увеличивает
+версию в Redis (bump_version); процессы сверяют версию не чаще раза в
+VERSION_CHECK_INTERVAL секунд и перечитывают таблицу только при ее смене.
+Поиск значения на пути запроса - обращение к словарю, без БД.
+"""
+
+import asyncio
+import logging
+import time
+from types import MappingProxyType
+from typing import Callable, Mapping, Optional
+
+from sqlalchemy import select
+
+from database.models import SystemSettings
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_SETTINGS_VERSION_KEY = "system_settings:version"
+VERSION_CHECK_INTERVAL = 5.0
+
+
+def _to_str(value) -> Optional[str]:
+    if value is None:
+        return None
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+class SystemSettingsSnapshot:
+    """Immutable key -> value snapshot of system_settings shared by the process."""
+
+    def __init__(self, async_session_factory=None, redis_client=None,
+                 check_interval: float = VERSION_CHECK_INTERVAL,
+                 clock: Callable[[], float] = time.monotonic):
+        self._async_session_factory = async_session_factory
+        self._redis_client = redis_client
+        self.check_interval = check_interval
+        self._clock = clock
+        self._values: Optional[Mapping[str, str]] = None
+        self._version: Optional[str] = None
+        self._checked_at = 0.0
+        self._load_lock: Optional[asyncio.Lock] = None
+
+    @property
+    def async_session_factory(self):
+        if self._async_session_factory is None:
+            from config.database import AsyncSessionLocal
+            self._async_session_factory = AsyncSessionLocal
+        return self._async_session_factory
+
+    @property
+    def redis_client(self):
+        if self._redis_client is None:
+            from config.database import redis_client
+            self._redis_client = redis_client
+        return self._redis_client
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._values is not None
+
+    def _read_version(self) -> Optional[str]:
+        client = self.redis_client
+        if client is None:
+            return None
+        try:
+            return _to_str(client.get(SYSTEM_SETTINGS_VERSION_KEY))
+        except Exception as e:
+            logger.warning(f"Failed to read system settings version: {e}")
+            return self._version
+
+    async def load(self) -> Mapping[str, str]:
+        """(Re)load all settings with a single query."""
+        # Версия читается до запроса: изменение во время загрузки вызовет еще одну
+        version = await asyncio.to_thread(self._read_version)
+        try:
+            async with self.async_session_factory() as session:
+                result = await session.execute(select(SystemSettings.key, SystemSettings.value))
+                self._values = MappingProxyType({row.key: row.value for row in result})
+            self._version = version
+        except Exception as e:
+            logger.warning(f"Failed to load system settings from DB: {e}")
+            if self._values is None:
+                self._values = MappingProxyType({})
+        self._checked_at = self._clock()
+        return self._values
+
+    async def avalues(self) -> Mapping[str, str]:
+        """Current snapshot; reloads when Redis version changed."""
+        values = self._values
+        if values is not None and self._clock() - self._checked_at < self.check_interval:
+            return values
+
+        if self._load_lock is None:
+            self._load_lock = asyncio.Lock()
+        async with self._load_lock:
+            if self._values is None:
+                return await self.load()
+            if self._clock() - self._checked_at < self.check_interval:
+                return self._values
+
+            version = await asyncio.to_thread(self._read_version)
+            if version != self._version:
+                logger.info(f"System settings version changed ({self._version} -> {version}), reloading")
+                return await self.load()
+            self._checked_at = self._clock()
+            return self._values
+
+    async def aget(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        """Get setting value by key."""
+        return (await self.avalues()).get(key, default)
+
+    def invalidate(self) -> None:
+        """Force reload on next access in this process."""
+        self._values = None
+
+    def bump_version(self) -> None:
+        """Notify all processes that settings changed (call after commit)."""
+        self.invalidate()
+        client = self.redis_client
+        if client is None:
+            logger.warning("Redis unavailable - system settings change not broadcast to other processes")
+            return
+        try:
+            client.incr(SYSTEM_SETTINGS_VERSION_KEY)
+        except Exception as e:
+            logger.warning(f"Failed to bump system settings version: {e}")
+
+
+# Global instance
+_system_settings_snapshot: Optional[SystemSettingsSnapshot] = None
+
+
+def get_system_settings_snapshot() -> SystemSettingsSnapshot:
+    """Get global SystemSettingsSnapshot instance."""
+    global _system_settings_snapshot
+    if _system_settings_snapshot is None:
+        _system_settings_snapshot = SystemSettingsSnapshot()
+    return _system_settings_snapshot
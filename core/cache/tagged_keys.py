@@ -0,0 +1,83 @@
+"""Tag-based cache invalidation without KEYS.
+
+Каждый кешируемый ключ при записи добавляется в Redis set тега
+(cache_tag:{tag}). Инвалидация атомарно забирает set тега (SMEMBERS + UNLINK
+в MULTI) и удаляет ключи через UNLINK пачками, не блокируя Redis проходом по всему keyspace.
+Для ключей, записанных до появления тегов, есть fallback через SCAN.
+"""
+
+import logging
+from typing import Iterable, List, Optional
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+TAG_PREFIX = "cache_tag:"
+# Тег живет дольше любого кешируемого значения и продлевается каждой записью
+TAG_TTL = 7 * 86400
+UNLINK_BATCH_SIZE = 500
+SCAN_COUNT = 1000
+
+
+def tag_key(tag: str) -> str:
+    """Redis key of tag set."""
+    return f"{TAG_PREFIX}{tag}"
+
+
+def set_tagged(client: redis.Redis, key: str, value, ttl: int, tags: Iterable[str]) -> None:
+    """SET key EX ttl and register key in tag sets (one pipeline round-trip)."""
+    pipe = client.pipeline(transaction=False)
+    pipe.set(key, value, ex=ttl)
+    for tag in tags:
+        pipe.sadd(tag_key(tag), key)
+        pipe.expire(tag_key(tag), max(TAG_TTL, ttl))
+    pipe.execute()
+
+
+def _unlink_batches(client: redis.Redis, keys: Iterable) -> int:
+    deleted = 0
+    batch: List = []
+    for key in keys:
+        batch.append(key)
+        if len(batch) >= UNLINK_BATCH_SIZE:
+            deleted += client.unlink(*batch)
+            batch = []
+    if batch:
+        deleted += client.unlink(*batch)
+    return deleted
+
+
+def invalidate_tag(client: redis.Redis, tag: str, legacy_match: Optional[str] = None) -> int:
+    """Delete all keys registered under tag.
+
+    Args:
+        client: Redis client
+        tag: Tag name
+        legacy_match: SCAN pattern for keys written before tagging; used only
+            when tag set does not exist (после деплоя ключи старого формата
+            живут не дольше своего TTL).
+
+    Returns:
+        Number of deleted cache keys.
+    """
+    # SMEMBERS и удаление set в одной MULTI: ключ, зарегистрированный set_tagged
+    # во время инвалидации, попадает в новый set, а не теряется вместе со старым
+    pipe = client.pipeline(transaction=True)
+    pipe.smembers(tag_key(tag))
+    pipe.unlink(tag_key(tag))
+    members, _ = pipe.execute()
+    if members:
+        return _unlink_batches(client, members)
+
+    if legacy_match:
+        return _unlink_batches(
+            client,
+            (key for key in client.scan_iter(match=legacy_match, count=SCAN_COUNT)
+             if not _to_str(key).startswith(TAG_PREFIX))
+        )
+    return 0
+
+
+def _to_str(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
@@ -3,7 +3,7 @@
 import asyncio
 import json
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterable, Tuple
 from datetime import datetime
 
 import redis
@@ -32,6 +32,8 @@ class UserCacheService:
         self.limits_cache_prefix = "limits:"
         self.user_cache_ttl = 300  # 5 minutes
         self.limits_cache_ttl = 300  # 5 minutes
+        self.theme_archive_count_prefix = "theme_archive_count:"
+        self.theme_archive_count_ttl = 86400  # 24 hours, сбрасывается при выдаче тем
     
     def _get_user_cache_key(self, telegram_id: int) -> str:
         """Generate cache key for user."""
@@ -41,6 +43,10 @@ class UserCacheService:
         """Generate cache key for limits."""
         return f"{self.limits_cache_prefix}{user_id}"
     
+    def _get_theme_archive_count_key(self, user_id: int) -> str:
+        """Generate cache key for user's themes archive size."""
+        return f"{self.theme_archive_count_prefix}{user_id}"
+    
     def _user_to_dict(self, user: User) -> Dict[str, Any]:
         """Convert User model to dictionary for caching."""
         return {
@@ -344,6 +350,73 @@ class UserCacheService:
                 except Exception:
                     pass
 
+    async def get_theme_archive_count(self, user_id: int) -> Optional[int]:
+        """Get cached number of issued theme requests (None on miss)."""
+        if self.redis_client is None:
+            return None
+        
+        try:
+            cached = await asyncio.to_thread(self.redis_client.get, self._get_theme_archive_count_key(user_id))
+            return int(cached) if cached is not None else None
+        except Exception as e:
+            from core.utils.log_rate_limiter import should_log_redis_warning
+            if should_log_redis_warning("read_cache"):
+                logger.warning(f"Error reading theme archive count from cache: {e}")
+            return None
+    
+    async def set_theme_archive_count(self, user_id: int, count: int) -> None:
+        """Cache number of issued theme requests."""
+        if self.redis_client is None:
+            return
+        
+        try:
+            await asyncio.to_thread(
+                self.redis_client.setex,
+                self._get_theme_archive_count_key(user_id),
+                self.theme_archive_count_ttl,
+                count
+            )
+        except Exception as e:
+            from core.utils.log_rate_limiter import should_log_redis_warning
+            if should_log_redis_warning("cache_theme_archive_count"):
+                logger.warning(f"Failed to cache theme archive count for user {user_id}: {e}")
+    
+    async def invalidate_theme_archive_count(self, user_id: int) -> None:
+        """Invalidate cached themes archive size (after issuing or deleting themes)."""
+        if self.redis_client is None:
+            return
+        
+        try:
+            await asyncio.to_thread(self.redis_client.delete, self._get_theme_archive_count_key(user_id))
+        except Exception as e:
+            logger.warning(f"Failed to invalidate theme archive count: {e}")
+    
+    def invalidate_many_sync(self, users: Iterable[Tuple[int, int]], batch_size: int = 500) -> int:
+        """Invalidate user and limits cache for many (user_id, telegram_id) pairs.
+
+        Ключи удаляются через pipeline пачками, один round-trip на пачку.
+        Returns number of invalidated users.
+        """
+        if self.redis_client is None:
+            return 0  # Skip invalidation if Redis unavailable
+
+        users = list(users)
+        try:
+            for start in range(0, len(users), batch_size):
+                pipe = self.redis_client.pipeline(transaction=False)
+                for user_id, telegram_id in users[start:start + batch_size]:
+                    pipe.delete(self._get_user_cache_key(telegram_id), self._get_limits_cache_key(user_id))
+                pipe.execute()
+            logger.debug(f"Invalidated cache for {len(users)} users")
+            return len(users)
+        except Exception as e:
+            logger.warning(f"Failed to invalidate cache for {len(users)} users: {e}")
+            return 0
+
+    async def invalidate_many(self, users: Iterable[Tuple[int, int]], batch_size: int = 500) -> int:
+        """Invalidate user and limits cache for many users (async version)."""
+        return await asyncio.to_thread(self.invalidate_many_sync, list(users), batch_size)
+
 
 # Global instance
 _user_cache_service: Optional[UserCacheService] = None
@@ -18,6 +18,8 @@ logger = logging.getLogger(__name__)
 
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
 LEXICON_CACHE_FILE = PROJECT_ROOT / "bot" / "lexicon" / "lexicon_cache.json"
+# Счетчик версии лексикона (вне префикса lexicon:*, чтобы invalidate_cache его не удалял)
+LEXICON_VERSION_KEY = "lexicon_version"
 
 
 class LexiconService:
@@ -423,6 +425,7 @@ class LexiconService:
 
         # Invalidate caches
         self.invalidate_cache()
+        self.bump_version()
         
         logger.info(f"Saved lexicon entry: {key} ({category_enum.value})")
         return True
@@ -490,6 +493,7 @@ class LexiconService:
         # Invalidate caches
         # Инвалидируем как общий кэш, так и кэш конкретного ключа
         self.invalidate_cache()
+        self.bump_version()
         # Также инвалидируем кэш конкретного ключа для этой категории (only if Redis is available)
         if self.redis_client is not None:
             cache_key_single = self._get_cache_key(category_enum.value, key)
@@ -543,6 +547,26 @@ class LexiconService:
                 logger.warning(f"Failed to invalidate cache: {e}")
             return 0
 
+    def get_version(self) -> Optional[str]:
+        """Current lexicon version from Redis (None if Redis unavailable)."""
+        if self.redis_client is None:
+            return None
+        value = self.redis_client.get(LEXICON_VERSION_KEY)
+        if isinstance(value, bytes):
+            value = value.decode('utf-8')
+        return value or "0"
+
+    def bump_version(self) -> None:
+        """Increment lexicon version so processes drop content derived from it (keyboards)."""
+        if self.redis_client is None:
+            return
+        try:
+            self.redis_client.incr(LEXICON_VERSION_KEY)
+        except Exception as e:
+            from core.utils.log_rate_limiter import should_log_redis_warning
+            if should_log_redis_warning("lexicon_version"):
+                logger.warning(f"Failed to bump lexicon version: {e}")
+
     def _merge_with_static(self, data: Dict[str, Dict[str, str]]) -> Dict[str, Dict[str, str]]:
         """Merge provided lexicon data with static fallback values.
         
@@ -1,12 +1,12 @@
 """AI performance monitoring with metrics tracking and error rate analysis."""
 
+import math
 import time
 import asyncio
 from datetime import datetime, timedelta
-from typing import Dict, Any, List, Optional, Callable
+from typing import Dict, Any, List, Optional, Callable, Iterable
 from dataclasses import dataclass, field
 from enum import Enum
-import statistics
 import redis
 from config.database import redis_client
 
@@ -33,13 +33,82 @@ class PerformanceMetric:
     metadata: Dict[str, Any] = field(default_factory=dict)
 
 
+# Лог-шкала бакетов латентности: бакет 0 - [0, 1ms], бакет i - (1ms * g^(i-1), 1ms * g^i].
+# При g = 2^(1/4) оценка перцентиля по геометрической середине бакета ошибается не более чем на ~9%.
+LATENCY_BUCKET_MIN = 0.001  # seconds
+LATENCY_BUCKET_GROWTH = 2 ** 0.25
+LATENCY_BUCKET_COUNT = 96  # верхняя граница последнего бакета ~4.6 часа
+LATENCY_PERCENTILES = (0.5, 0.9, 0.95, 0.99)
+
+
+def latency_bucket(seconds: float) -> int:
+    """Get histogram bucket index for latency in seconds."""
+    if seconds <= LATENCY_BUCKET_MIN:
+        return 0
+    index = math.ceil(math.log(seconds / LATENCY_BUCKET_MIN, LATENCY_BUCKET_GROWTH) - 1e-9)
+    return min(index, LATENCY_BUCKET_COUNT)
+
+
+def latency_bucket_bounds(index: int) -> tuple:
+    """Get (lower, upper) latency bounds of bucket in seconds."""
+    if index <= 0:
+        return 0.0, LATENCY_BUCKET_MIN
+    return (
+        LATENCY_BUCKET_MIN * LATENCY_BUCKET_GROWTH ** (index - 1),
+        LATENCY_BUCKET_MIN * LATENCY_BUCKET_GROWTH ** index
+    )
+
+
+def latency_bucket_value(index: int) -> float:
+    """Representative latency of bucket (geometric middle)."""
+    lower, upper = latency_bucket_bounds(index)
+    if index <= 0:
+        return upper / 2
+    return math.sqrt(lower * upper)
+
+
+def histogram_percentiles(buckets: Dict[int, int], percentiles: Iterable[float] = LATENCY_PERCENTILES) -> Dict[float, float]:
+    """Estimate percentiles from merged histogram buckets."""
+    total = sum(buckets.values())
+    if total == 0:
+        return {}
+
+    result = {}
+    ordered = sorted(buckets.items())
+    for percentile in sorted(percentiles):
+        rank = max(1, math.ceil(percentile * total))
+        seen = 0
+        for index, count in ordered:
+            seen += count
+            if seen >= rank:
+                result[percentile] = latency_bucket_value(index)
+                break
+    return result
+
+
+def _to_str(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
 class AIPerformanceMonitor:
-    """Monitor AI performance with comprehensive metrics tracking."""
+    """Monitor AI performance with comprehensive metrics tracking.
+
+    Каждый запрос увеличивает счетчики в поминутном хеше провайдера
+    (ai_performance:m:{provider}:{YYYYmmddHHMM}): requests/success/error,
+    суммы латентности и стоимости и бакет гистограммы латентности lat:{i}.
+    Все HINCRBY одного запроса уходят одним pipeline, сводка за период
+    читает HGETALL всех минутных хешей одним pipeline и считает перцентили
+    по объединенным бакетам - стоимость не зависит от числа запросов.
+    """
     
-    def __init__(self):
-        self.redis_client = redis_client
+    def __init__(self, redis_client_instance: Optional[redis.Redis] = None):
+        self.redis_client = redis_client_instance or redis_client
         self.metrics_prefix = "ai_performance:"
+        self.minute_prefix = f"{self.metrics_prefix}m:"
+        self.user_prefix = f"{self.metrics_prefix}u:"
         self.metrics_retention_days = 30
+        self.user_metrics_retention_days = 7
+        self.api_providers = ["openai", "anthropic"]
         
         # Performance thresholds
         self.thresholds = {
@@ -72,34 +141,12 @@ class AIPerformanceMonitor:
             # Calculate metrics
             response_time = time.time() - start_time
             
-            # Record metrics
-            await self._record_metric(
-                MetricType.RESPONSE_TIME, 
-                response_time, 
-                api_provider, 
-                user_id, 
-                request_id
-            )
-            
-            await self._record_metric(
-                MetricType.SUCCESS_RATE if success else MetricType.ERROR_RATE,
-                1.0 if success else 1.0,
-                api_provider,
-                user_id,
-                request_id,
-                {"error_message": error_message} if error_message else {}
-            )
-            
             # Estimate cost (simplified)
             estimated_cost = self._estimate_cost(api_provider, response_data)
-            if estimated_cost > 0:
-                await self._record_metric(
-                    MetricType.COST_PER_REQUEST,
-                    estimated_cost,
-                    api_provider,
-                    user_id,
-                    request_id
-                )
+            
+            await asyncio.to_thread(
+                self.record_request, api_provider, response_time, success, estimated_cost, user_id
+            )
         
         return {
             "success": success,
@@ -109,40 +156,70 @@ class AIPerformanceMonitor:
             "request_id": request_id
         }
     
-    async def _record_metric(self, metric_type: MetricType, value: float, 
-                           api_provider: str, user_id: Optional[str] = None,
-                           request_id: Optional[str] = None, metadata: Dict[str, Any] = None):
-        """Record a performance metric."""
+    def _minute_key(self, api_provider: str, moment: datetime) -> str:
+        return f"{self.minute_prefix}{api_provider}:{moment.strftime('%Y%m%d%H%M')}"
+    
+    def _user_key(self, user_id: str, api_provider: str, moment: datetime) -> str:
+        return f"{self.user_prefix}{user_id}:{api_provider}:{moment.strftime('%Y%m%d%H')}"
+    
+    def record_request(self, api_provider: str, response_time: float, success: bool,
+                       cost: float = 0.0, user_id: Optional[str] = None,
+                       timestamp: Optional[datetime] = None) -> None:
+        """Record one request into minute counters (single pipeline round-trip)."""
+        if self.redis_client is None:
+            return
+        
         try:
-            metric = PerformanceMetric(
-                metric_type=metric_type,
-                value=value,
-                timestamp=datetime.utcnow(),
-                api_provider=api_provider,
-                user_id=user_id,
-                request_id=request_id,
-                metadata=metadata or {}
-            )
-            
-            # Store in Redis with timestamp-based key
-            timestamp_key = metric.timestamp.strftime("%Y-%m-%d-%H")
-            key = f"{self.metrics_prefix}{metric_type.value}:{api_provider}:{timestamp_key}"
-            
-            # Add metric to sorted set (score = timestamp, value = JSON)
-            metric_data = {
-                "value": value,
-                "timestamp": metric.timestamp.isoformat(),
-                "user_id": user_id,
-                "request_id": request_id,
-                "metadata": metadata or {}
-            }
-            
-            self.redis_client.zadd(key, {str(metric_data): metric.timestamp.timestamp()})
-            self.redis_client.expire(key, self.metrics_retention_days * 86400)
+            moment = timestamp or datetime.utcnow()
+            latency_ms = int(round(response_time * 1000))
+            outcome = "success" if success else "error"
+            
+            pipe = self.redis_client.pipeline(transaction=False)
+            key = self._minute_key(api_provider, moment)
+            pipe.hincrby(key, "requests", 1)
+            pipe.hincrby(key, outcome, 1)
+            pipe.hincrby(key, "latency_ms_sum", latency_ms)
+            pipe.hincrby(key, f"lat:{latency_bucket(response_time)}", 1)
+            if cost > 0:
+                # Стоимость храним в микродолларах, чтобы обойтись целочисленным HINCRBY
+                pipe.hincrby(key, "cost_requests", 1)
+                pipe.hincrby(key, "cost_micro_sum", int(round(cost * 1_000_000)))
+            pipe.expire(key, self.metrics_retention_days * 86400)
+            
+            if user_id is not None:
+                user_key = self._user_key(user_id, api_provider, moment)
+                pipe.hincrby(user_key, "requests", 1)
+                pipe.hincrby(user_key, outcome, 1)
+                pipe.hincrby(user_key, "latency_ms_sum", latency_ms)
+                pipe.expire(user_key, self.user_metrics_retention_days * 86400)
+            
+            pipe.execute()
             
         except Exception as e:
             print(f"Error recording metric: {e}")
     
+    def _read_hashes(self, keys: List[str]) -> List[Dict[str, int]]:
+        """HGETALL all keys in one pipeline and parse counters."""
+        pipe = self.redis_client.pipeline(transaction=False)
+        for key in keys:
+            pipe.hgetall(key)
+        return [
+            {_to_str(name): int(value) for name, value in (raw or {}).items()}
+            for raw in pipe.execute()
+        ]
+    
+    def _merge_counters(self, hashes: List[Dict[str, int]]) -> Dict[str, Any]:
+        totals: Dict[str, int] = {}
+        buckets: Dict[int, int] = {}
+        for counters in hashes:
+            for name, value in counters.items():
+                if name.startswith("lat:"):
+                    index = int(name[4:])
+                    buckets[index] = buckets.get(index, 0) + value
+                else:
+                    totals[name] = totals.get(name, 0) + value
+        return {"totals": totals, "buckets": buckets}
+    
     def get_performance_summary(self, api_provider: str, hours: int = 24) -> Dict[str, Any]:
         """Get performance summary for a provider."""
         try:
@@ -157,19 +234,16 @@ class AIPerformanceMonitor:
                 "generated_at": end_time.isoformat()
             }
             
-            # Get metrics for each type
-            for metric_type in MetricType:
-                metrics_data = self._get_metrics_for_period(
-                    metric_type, api_provider, start_time, end_time
-                )
+            if self.redis_client is not None:
+                merged = self._get_counters_for_period(api_provider, start_time, end_time)
+                summary["metrics"] = self._calculate_metrics(merged, hours * 60)
                 
-                if metrics_data:
-                    summary["metrics"][metric_type.value] = self._calculate_metric_summary(
-                        metric_type, metrics_data
-                    )
-                    
-                    # Check for alerts
-                    alerts = self._check_metric_alerts(metric_type, summary["metrics"][metric_type.value])
+                # Check for alerts
+                for metric_name, metric_summary in summary["metrics"].items():
+                    if metric_name == MetricType.THROUGHPUT.value:
+                        # Низкий трафик в тихие часы - не деградация
+                        continue
+                    alerts = self._check_metric_alerts(MetricType(metric_name), metric_summary)
                     summary["alerts"].extend(alerts)
             
             # Calculate overall health
@@ -181,73 +255,71 @@ class AIPerformanceMonitor:
             print(f"Error getting performance summary: {e}")
             return {"error": str(e)}
     
-    def _get_metrics_for_period(self, metric_type: MetricType, api_provider: str,
-                               start_time: datetime, end_time: datetime) -> List[Dict[str, Any]]:
-        """Get metrics for a specific period."""
-        try:
-            metrics = []
-            
-            # Iterate through hours in the period
-            current_time = start_time
-            while current_time <= end_time:
-                timestamp_key = current_time.strftime("%Y-%m-%d-%H")
-                key = f"{self.metrics_prefix}{metric_type.value}:{api_provider}:{timestamp_key}"
-                
-                # Get metrics for this hour
-                hour_metrics = self.redis_client.zrangebyscore(
-                    key, 
-                    start_time.timestamp(), 
-                    end_time.timestamp()
-                )
-                
-                for metric_str in hour_metrics:
-                    try:
-                        metric_data = eval(metric_str)  # In production, use json.loads
-                        metrics.append(metric_data)
-                    except:
-                        continue
-                
-                current_time += timedelta(hours=1)
-            
-            return metrics
-            
-        except Exception as e:
-            print(f"Error getting metrics for period: {e}")
-            return []
+    def _get_counters_for_period(self, api_provider: str, start_time: datetime,
+                                 end_time: datetime) -> Dict[str, Any]:
+        """Merge minute counters of provider for a period."""
+        keys = []
+        current_time = start_time.replace(second=0, microsecond=0)
+        while current_time <= end_time:
+            keys.append(self._minute_key(api_provider, current_time))
+            current_time += timedelta(minutes=1)
+        return self._merge_counters(self._read_hashes(keys))
     
-    def _calculate_metric_summary(self, metric_type: MetricType, metrics_data: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """Calculate summary statistics for a metric type."""
-        try:
-            if not metrics_data:
-                return {"count": 0, "message": "No data available"}
-            
-            values = [m["value"] for m in metrics_data]
-            
-            summary = {
-                "count": len(values),
-                "min": min(values),
-                "max": max(values),
-                "mean": statistics.mean(values),
-                "median": statistics.median(values)
+    def _calculate_metrics(self, merged: Dict[str, Any], period_minutes: int) -> Dict[str, Any]:
+        """Calculate summary statistics from merged counters and histogram."""
+        totals = merged["totals"]
+        buckets = merged["buckets"]
+        requests = totals.get("requests", 0)
+        if requests == 0:
+            return {}
+        
+        metrics = {}
+        histogram_count = sum(buckets.values())
+        if histogram_count:
+            percentiles = histogram_percentiles(buckets)
+            nonempty = [index for index, count in buckets.items() if count]
+            metrics[MetricType.RESPONSE_TIME.value] = {
+                "count": histogram_count,
+                "mean": totals.get("latency_ms_sum", 0) / 1000 / histogram_count,
+                "min": latency_bucket_bounds(min(nonempty))[0],
+                "max": latency_bucket_bounds(max(nonempty))[1],
+                "median": percentiles[0.5],
+                "p90": percentiles[0.9],
+                "p95": percentiles[0.95],
+                "p99": percentiles[0.99],
+                "histogram": {str(index): buckets[index] for index in sorted(buckets)}
             }
-            
-            if len(values) > 1:
-                summary["stdev"] = statistics.stdev(values)
-                summary["variance"] = statistics.variance(values)
-            
-            # Special calculations for specific metric types
-            if metric_type == MetricType.SUCCESS_RATE:
-                summary["success_rate"] = sum(values) / len(values)
-            elif metric_type == MetricType.ERROR_RATE:
-                summary["error_rate"] = sum(values) / len(values)
-            elif metric_type == MetricType.THROUGHPUT:
-                summary["requests_per_minute"] = sum(values) / (len(values) / 60) if values else 0
-            
-            return summary
-            
-        except Exception as e:
-            print(f"Error calculating metric summary: {e}")
-            return {"error": str(e)}
+        
+        success_rate = totals.get("success", 0) / requests
+        error_rate = totals.get("error", 0) / requests
+        metrics[MetricType.SUCCESS_RATE.value] = {
+            "count": requests,
+            "mean": success_rate,
+            "success_rate": success_rate
+        }
+        metrics[MetricType.ERROR_RATE.value] = {
+            "count": requests,
+            "mean": error_rate,
+            "error_rate": error_rate
+        }
+        
+        cost_requests = totals.get("cost_requests", 0)
+        if cost_requests:
+            total_cost = totals.get("cost_micro_sum", 0) / 1_000_000
+            metrics[MetricType.COST_PER_REQUEST.value] = {
+                "count": cost_requests,
+                "mean": total_cost / cost_requests,
+                "total": total_cost
+            }
+        
+        requests_per_minute = requests / period_minutes if period_minutes else 0
+        metrics[MetricType.THROUGHPUT.value] = {
+            "count": requests,
+            "mean": requests_per_minute,
+            "requests_per_minute": requests_per_minute
+        }
+        
+        return metrics
     
     def _check_metric_alerts(self, metric_type: MetricType, summary: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Check for metric alerts based on thresholds."""
@@ -366,26 +438,40 @@ class AIPerformanceMonitor:
                 "avg_response_time": 0.0
             }
             
-            # Get metrics for each API provider
-            for api_provider in ["openai", "anthropic"]:
-                provider_metrics = []
-                
-                for metric_type in MetricType:
-                    metrics_data = self._get_user_metrics_for_period(
-                        metric_type, api_provider, user_id, start_time, end_time
-                    )
-                    
-                    if metrics_data:
-                        provider_metrics.extend(metrics_data)
+            if self.redis_client is None:
+                return user_metrics
+            
+            hour_keys = []
+            current_time = start_time.replace(minute=0, second=0, microsecond=0)
+            while current_time <= end_time:
+                hour_keys.append(current_time)
+                current_time += timedelta(hours=1)
+            
+            keys = [
+                self._user_key(user_id, api_provider, moment)
+                for api_provider in self.api_providers
+                for moment in hour_keys
+            ]
+            hashes = self._read_hashes(keys)
+            
+            total_latency_ms = 0
+            for position, api_provider in enumerate(self.api_providers):
+                provider_hashes = hashes[position * len(hour_keys):(position + 1) * len(hour_keys)]
+                totals = self._merge_counters(provider_hashes)["totals"]
+                requests = totals.get("requests", 0)
+                if not requests:
+                    continue
                 
-                if provider_metrics:
-                    user_metrics["api_providers"][api_provider] = {
-                        "request_count": len(provider_metrics),
-                        "avg_response_time": statistics.mean([m["value"] for m in provider_metrics if m.get("metric_type") == MetricType.RESPONSE_TIME.value]),
-                        "success_rate": len([m for m in provider_metrics if m.get("metric_type") == MetricType.SUCCESS_RATE.value]) / len(provider_metrics) if provider_metrics else 0
-                    }
-                    
-                    user_metrics["total_requests"] += len(provider_metrics)
+                user_metrics["api_providers"][api_provider] = {
+                    "request_count": requests,
+                    "avg_response_time": totals.get("latency_ms_sum", 0) / 1000 / requests,
+                    "success_rate": totals.get("success", 0) / requests
+                }
+                user_metrics["total_requests"] += requests
+                total_latency_ms += totals.get("latency_ms_sum", 0)
+            
+            if user_metrics["total_requests"]:
+                user_metrics["avg_response_time"] = total_latency_ms / 1000 / user_metrics["total_requests"]
             
             return user_metrics
             
@@ -393,59 +479,39 @@ class AIPerformanceMonitor:
             print(f"Error getting user performance: {e}")
             return {"error": str(e)}
     
-    def _get_user_metrics_for_period(self, metric_type: MetricType, api_provider: str,
-                                   user_id: str, start_time: datetime, end_time: datetime) -> List[Dict[str, Any]]:
-        """Get user-specific metrics for a period."""
-        try:
-            metrics = []
-            
-            current_time = start_time
-            while current_time <= end_time:
-                timestamp_key = current_time.strftime("%Y-%m-%d-%H")
-                key = f"{self.metrics_prefix}{metric_type.value}:{api_provider}:{timestamp_key}"
-                
-                hour_metrics = self.redis_client.zrangebyscore(
-                    key, 
-                    start_time.timestamp(), 
-                    end_time.timestamp()
-                )
-                
-                for metric_str in hour_metrics:
-                    try:
-                        metric_data = eval(metric_str)  # In production, use json.loads
-                        if metric_data.get("user_id") == user_id:
-                            metric_data["metric_type"] = metric_type.value
-                            metrics.append(metric_data)
-                    except:
-                        continue
-                
-                current_time += timedelta(hours=1)
-            
-            return metrics
-            
-        except Exception as e:
-            print(f"Error getting user metrics for period: {e}")
-            return []
-    
     def cleanup_old_metrics(self, days_to_keep: int = None) -> int:
-        """Clean up old metrics data."""
+        """Clean up old metrics data. Returns number of removed entries.
+        
+        Минутные и пользовательские хеши удаляются сами по TTL; здесь из ключей
+        старого формата (sorted sets со str(dict), score = timestamp) удаляются
+        записи старше days_to_keep. Опустевший sorted set Redis удаляет сам.
+        """
         try:
-            days_to_keep = days_to_keep or self.metrics_retention_days
-            cutoff_time = datetime.utcnow() - timedelta(days=days_to_keep)
+            if self.redis_client is None:
+                return 0
             
-            # Get all metric keys
-            pattern = f"{self.metrics_prefix}*"
-            keys = self.redis_client.keys(pattern)
+            days_to_keep = days_to_keep or self.metrics_retention_days
+            cutoff = (datetime.utcnow() - timedelta(days=days_to_keep)).timestamp()
             
             deleted_count = 0
-            for key in keys:
-                # Remove old entries from sorted sets
-                removed = self.redis_client.zremrangebyscore(key, 0, cutoff_time.timestamp())
-                deleted_count += removed
-                
-                # Delete empty keys
-                if self.redis_client.zcard(key) == 0:
-                    self.redis_client.delete(key)
+            batch = []
+            
+            def flush(keys):
+                pipe = self.redis_client.pipeline(transaction=False)
+                for legacy_key in keys:
+                    pipe.zremrangebyscore(legacy_key, "-inf", cutoff)
+                return sum(pipe.execute())
+            
+            for key in self.redis_client.scan_iter(match=f"{self.metrics_prefix}*", count=1000):
+                key = _to_str(key)
+                if key.startswith(self.minute_prefix) or key.startswith(self.user_prefix):
+                    continue
+                batch.append(key)
+                if len(batch) >= 500:
+                    deleted_count += flush(batch)
+                    batch = []
+            if batch:
+                deleted_count += flush(batch)
             
             return deleted_count
             
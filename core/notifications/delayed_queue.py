@@ -0,0 +1,347 @@
+"""Redis-backed queue of delayed bot messages.
+
+Обработчики и воркеры не спят между сообщениями последовательности
+(приветствие, части отчета аналитики): они кладут шаги в очередь и сразу
+возвращаются. Последовательность хранится в sorted set delayed_messages
+одним элементом (score = время отправки следующего шага). Диспетчер в
+процессе бота забирает наступившие элементы, отправляет шаг общим Bot и
+ставит в очередь остаток последовательности со сдвигом от фактического
+времени отправки - порядок и интервалы сохраняются.
+
+Гарантия - at-least-once: забранный элемент переносится в
+delayed_messages:processing с дедлайном visibility_timeout; если диспетчер
+упал до подтверждения, элемент возвращается в очередь после дедлайна и шаг
+может быть отправлен повторно.
+"""
+
+import asyncio
+import json
+import logging
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+from aiogram.types import InlineKeyboardMarkup
+
+logger = logging.getLogger(__name__)
+
+DELAYED_MESSAGES_KEY = "delayed_messages"
+DELAYED_PROCESSING_KEY = "delayed_messages:processing"
+
+
+@dataclass
+class DelayedMessage:
+    """One step of a message sequence."""
+
+    chat_id: int
+    text: str
+    # Пауза (секунды) после предыдущего шага последовательности
+    delay: float = 0.0
+    parse_mode: Optional[str] = None
+    reply_markup: Optional[Dict[str, Any]] = None
+
+    @staticmethod
+    def markup(keyboard: Optional[InlineKeyboardMarkup]) -> Optional[Dict[str, Any]]:
+        """Serialize an inline keyboard for storage in the queue."""
+        if keyboard is None:
+            return None
+        return keyboard.model_dump(mode="json", exclude_none=True)
+
+
+def _to_str(value) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+class DelayedMessageQueue:
+    """Sorted-set queue of message sequences (score = due time of the next step)."""
+
+    def __init__(
+        self,
+        redis_client_instance=None,
+        clock: Callable[[], float] = time.time,
+        visibility_timeout: float = 60.0,
+        key: str = DELAYED_MESSAGES_KEY,
+        processing_key: str = DELAYED_PROCESSING_KEY,
+    ):
+        self._redis_client = redis_client_instance
+        self.clock = clock
+        self.visibility_timeout = visibility_timeout
+        self.key = key
+        self.processing_key = processing_key
+
+    @property
+    def redis_client(self):
+        if self._redis_client is None:
+            from config.database import redis_client
+            self._redis_client = redis_client
+        return self._redis_client
+
+    @property
+    def available(self) -> bool:
+        return self.redis_client is not None
+
+    @staticmethod
+    def _member(steps: List[Dict[str, Any]], sequence_id: str, attempts: int,
+                on_sent: Optional[str], context: Optional[Dict[str, Any]]) -> str:
+        return json.dumps({
+            "id": sequence_id,
+            "steps": steps,
+            "attempts": attempts,
+            "on_sent": on_sent,
+            "context": context or {},
+        }, ensure_ascii=False, sort_keys=True)
+
+    def enqueue_sequence(
+        self,
+        messages: Sequence[DelayedMessage],
+        on_sent: Optional[str] = None,
+        context: Optional[Dict[str, Any]] = None,
+    ) -> bool:
+        """Schedule messages to be sent one after another. Returns False if Redis is unavailable.
+
+        on_sent - имя обработчика из SENT_HANDLERS, вызываемого после отправки
+        каждого шага (например, чтобы запомнить message_id).
+        """
+        if not messages:
+            return True
+        client = self.redis_client
+        if client is None:
+            return False
+
+        steps = [asdict(message) for message in messages]
+        member = self._member(steps, uuid.uuid4().hex, 0, on_sent, context)
+        try:
+            client.zadd(self.key, {member: self.clock() + steps[0]["delay"]})
+        except Exception as e:
+            from core.utils.log_rate_limiter import should_log_redis_warning
+            if should_log_redis_warning("delayed_queue_enqueue"):
+                logger.warning(f"Failed to enqueue delayed messages: {e}")
+            return False
+        return True
+
+    async def aenqueue_sequence(
+        self,
+        messages: Sequence[DelayedMessage],
+        on_sent: Optional[str] = None,
+        context: Optional[Dict[str, Any]] = None,
+    ) -> bool:
+        """Async wrapper of enqueue_sequence for handlers."""
+        if self.redis_client is None:
+            return False
+        return await asyncio.to_thread(self.enqueue_sequence, messages, on_sent, context)
+
+    def claim_due(self, limit: int = 50) -> List[Tuple[str, Dict[str, Any]]]:
+        """Move due sequences to the processing set and return (member, payload) pairs."""
+        now = self.clock()
+        deadline = now + self.visibility_timeout
+
+        def claim(pipe):
+            members = [_to_str(m) for m in pipe.zrangebyscore(self.key, "-inf", now, start=0, num=limit)]
+            if members:
+                pipe.multi()
+                pipe.zrem(self.key, *members)
+                pipe.zadd(self.processing_key, {member: deadline for member in members})
+            return members
+
+        # WATCH: если другой диспетчер забрал элементы между чтением и MULTI, повторяем
+        members = self.redis_client.transaction(claim, self.key, value_from_callable=True)
+        return [(member, json.loads(member)) for member in members]
+
+    def requeue_expired(self) -> int:
+        """Return sequences claimed by a dispatcher that did not finish in time."""
+        now = self.clock()
+
+        def requeue(pipe):
+            members = [_to_str(m) for m in pipe.zrangebyscore(self.processing_key, "-inf", now)]
+            if members:
+                pipe.multi()
+                pipe.zrem(self.processing_key, *members)
+                pipe.zadd(self.key, {member: now for member in members})
+            return members
+
+        members = self.redis_client.transaction(requeue, self.processing_key, value_from_callable=True)
+        if members:
+            logger.warning(f"Requeued {len(members)} delayed message sequences after visibility timeout")
+        return len(members)
+
+    def _settle(self, member: str, next_member: Optional[str] = None, score: float = 0.0) -> bool:
+        """Remove a claimed member and optionally schedule its continuation.
+
+        Если элемент уже вернули в очередь по таймауту (диспетчер не успел),
+        продолжение не ставится - его поставит повторная доставка.
+        """
+        def settle(pipe):
+            if pipe.zscore(self.processing_key, member) is None:
+                return False
+            pipe.multi()
+            pipe.zrem(self.processing_key, member)
+            if next_member is not None:
+                pipe.zadd(self.key, {next_member: score})
+            return True
+
+        return self.redis_client.transaction(settle, self.processing_key, value_from_callable=True)
+
+    def complete_step(self, member: str, payload: Dict[str, Any]) -> bool:
+        """Acknowledge the first step and schedule the rest of the sequence."""
+        rest = payload["steps"][1:]
+        if not rest:
+            return self._settle(member)
+        next_member = self._member(rest, payload["id"], 0, payload.get("on_sent"), payload.get("context"))
+        return self._settle(member, next_member, self.clock() + rest[0]["delay"])
+
+    def retry_step(self, member: str, payload: Dict[str, Any], delay: float) -> bool:
+        """Put the sequence back with the same first step after delay."""
+        next_member = self._member(
+            payload["steps"], payload["id"], payload.get("attempts", 0) + 1,
+            payload.get("on_sent"), payload.get("context"),
+        )
+        return self._settle(member, next_member, self.clock() + delay)
+
+    def drop(self, member: str) -> bool:
+        """Forget a sequence (user blocked the bot, etc.)."""
+        return self._settle(member)
+
+    def pending_count(self) -> int:
+        return self.redis_client.zcard(self.key) + self.redis_client.zcard(self.processing_key)
+
+
+async def _record_analytics_message(message, context: Dict[str, Any]) -> None:
+    """Remember report message id so that "back to menu" can delete it."""
+    from sqlalchemy import func, update
+    from config.database import AsyncSessionLocal
+    from database.models.csv_analysis import CSVAnalysis
+
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            update(CSVAnalysis)
+            .where(CSVAnalysis.id == context["csv_analysis_id"])
+            .values(analytics_message_ids=func.coalesce(
+                CSVAnalysis.analytics_message_ids + ",", ""
+            ) + str(message.message_id))
+        )
+        await session.commit()
+
+
+SENT_HANDLERS: Dict[str, Callable[[Any, Dict[str, Any]], Awaitable[None]]] = {
+    "analytics_report": _record_analytics_message,
+}
+
+
+class DelayedMessageDispatcher:
+    """Polls DelayedMessageQueue and sends due steps with a shared Bot."""
+
+    def __init__(
+        self,
+        bot,
+        queue: Optional[DelayedMessageQueue] = None,
+        poll_interval: float = 0.5,
+        batch_size: int = 50,
+        max_attempts: int = 5,
+        retry_delay_seconds: float = 5.0,
+        sent_handlers: Optional[Dict[str, Callable]] = None,
+    ):
+        self.bot = bot
+        self.queue = queue or get_delayed_message_queue()
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_delay_seconds = retry_delay_seconds
+        self.sent_handlers = sent_handlers or SENT_HANDLERS
+        self._task: Optional[asyncio.Task] = None
+        self._current: Optional[asyncio.Future] = None
+
+    async def run_once(self) -> int:
+        """Send all due steps. Returns number of processed sequences."""
+        await asyncio.to_thread(self.queue.requeue_expired)
+        claimed = await asyncio.to_thread(self.queue.claim_due, self.batch_size)
+        for member, payload in claimed:
+            await self._send_step(member, payload)
+        return len(claimed)
+
+    async def _send_step(self, member: str, payload: Dict[str, Any]) -> None:
+        step = payload["steps"][0]
+        kwargs = {"chat_id": step["chat_id"], "text": step["text"]}
+        if step.get("parse_mode"):
+            kwargs["parse_mode"] = step["parse_mode"]
+        if step.get("reply_markup"):
+            kwargs["reply_markup"] = InlineKeyboardMarkup.model_validate(step["reply_markup"])
+
+        try:
+            message = await self.bot.send_message(**kwargs)
+        except (TelegramForbiddenError, TelegramBadRequest) as e:
+            # Пользователь заблокировал бота / неверный запрос - остаток последовательности не нужен
+            logger.warning(f"Delayed message to {step['chat_id']} rejected by Telegram: {e}")
+            await asyncio.to_thread(self.queue.drop, member)
+            return
+        except TelegramRetryAfter as e:
+            await asyncio.to_thread(self.queue.retry_step, member, payload, e.retry_after)
+            return
+        except Exception as e:
+            attempts = payload.get("attempts", 0) + 1
+            if attempts >= self.max_attempts:
+                logger.error(f"Delayed message to {step['chat_id']} failed after {attempts} attempts: {e}")
+                await asyncio.to_thread(self.queue.drop, member)
+            else:
+                logger.warning(f"Delayed message to {step['chat_id']} failed, retrying: {e}")
+                delay = self.retry_delay_seconds * (2 ** (attempts - 1))
+                await asyncio.to_thread(self.queue.retry_step, member, payload, delay)
+            return
+
+        handler = self.sent_handlers.get(payload.get("on_sent")) if payload.get("on_sent") else None
+        if handler is not None:
+            try:
+                await handler(message, payload.get("context") or {})
+            except Exception as e:
+                logger.error(f"on_sent handler {payload['on_sent']} failed: {e}", exc_info=True)
+
+        await asyncio.to_thread(self.queue.complete_step, member, payload)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                # shield: отмена в stop() не прерывает отправку уже забранных шагов
+                self._current = asyncio.ensure_future(self.run_once())
+                await asyncio.shield(self._current)
+            except Exception as e:
+                from core.utils.log_rate_limiter import should_log_redis_warning
+                if should_log_redis_warning("delayed_queue_dispatch"):
+                    logger.error(f"Delayed message dispatcher error: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    def start(self) -> None:
+        """Start polling in the running event loop (no-op without Redis)."""
+        if not self.queue.available:
+            logger.warning("Redis unavailable - delayed message dispatcher not started")
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="delayed-message-dispatcher")
+
+    async def stop(self) -> None:
+        """Stop polling. Незавершенные шаги остаются в Redis до следующего запуска."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._current is not None and not self._current.done():
+            try:
+                await self._current
+            except Exception as e:
+                logger.error(f"Delayed message dispatcher error: {e}")
+        self._current = None
+
+
+# Global instance
+_delayed_message_queue: Optional[DelayedMessageQueue] = None
+
+
+def get_delayed_message_queue() -> DelayedMessageQueue:
+    """Get global DelayedMessageQueue instance."""
+    global _delayed_message_queue
+    if _delayed_message_queue is None:
+        _delayed_message_queue = DelayedMessageQueue()
+    return _delayed_message_queue
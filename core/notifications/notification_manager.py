@@ -2,16 +2,20 @@
 
 import asyncio
 from datetime import datetime, timezone, timedelta
-from typing import List, Optional, Dict, Any
+from typing import Iterable, List, Optional, Dict, Any, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, or_
+from sqlalchemy import select, or_, and_, case
 from aiogram import Bot
-from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
 
 from config.database import AsyncSessionLocal
 from database.models import User, SubscriptionType, Limits
 from config.settings import settings
 from core.notifications.notification_utils import add_main_menu_button_to_keyboard
+from core.cache.user_cache import get_user_cache_service
+
+# Максимум одновременно отправляемых сообщений (лимит Telegram ~30 msg/s)
+NOTIFICATION_SEND_CONCURRENCY = 20
 
 
 class NotificationManager:
@@ -20,7 +24,7 @@ class NotificationManager:
     def __init__(self, bot: Optional[Bot] = None):
         self.bot = bot
     
-    async def send_notification(self, telegram_id: int, message: str, keyboard=None) -> bool:
+    async def send_notification(self, telegram_id: int, message: str, keyboard=None, retry: bool = True) -> bool:
         """Send notification to specific user."""
         
         if not self.bot:
@@ -37,6 +41,14 @@ class NotificationManager:
             print(f"Notification sent to {telegram_id}")
             return True
             
+        except TelegramRetryAfter as e:
+            # Flood control: ждем сколько просит Telegram и пробуем один раз повторно
+            if not retry:
+                print(f"Flood control for user {telegram_id}, giving up")
+                return False
+            await asyncio.sleep(e.retry_after)
+            return await self.send_notification(telegram_id, message, keyboard, retry=False)
+            
         except TelegramForbiddenError:
             print(f"User {telegram_id} blocked the bot")
             return False
@@ -49,86 +61,102 @@ class NotificationManager:
             print(f"Error sending notification to {telegram_id}: {e}")
             return False
     
+    async def send_many(
+        self,
+        messages: Iterable[Tuple[int, str, Any]],
+        concurrency: Optional[int] = None
+    ) -> int:
+        """Send many notifications with bounded concurrency.
+
+        Args:
+            messages: Iterable of (telegram_id, message, keyboard)
+            concurrency: Max number of messages in flight (NOTIFICATION_SEND_CONCURRENCY by default)
+
+        Returns:
+            Number of successfully sent notifications
+        """
+        semaphore = asyncio.Semaphore(concurrency or NOTIFICATION_SEND_CONCURRENCY)
+
+        async def send_one(telegram_id: int, message: str, keyboard) -> bool:
+            async with semaphore:
+                return await self.send_notification(telegram_id, message, keyboard)
+
+        results = await asyncio.gather(
+            *(send_one(telegram_id, message, keyboard) for telegram_id, message, keyboard in messages)
+        )
+        return sum(1 for sent in results if sent)
+
+    def _test_pro_expiring_keyboard(self):
+        """Build keyboard for TEST_PRO expiration notifications."""
+        from bot.lexicon import LEXICON_COMMANDS_RU
+        from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+        try:
+            button_text = LEXICON_COMMANDS_RU['button_subscribe_pro_compare']
+        except KeyError:
+            button_text = "🔓 Перейти на PRO"
+
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text=button_text, callback_data="upgrade_pro")]
+        ])
+
+        # Добавляем кнопку "Назад в меню" в новый ряд
+        return add_main_menu_button_to_keyboard(keyboard, SubscriptionType.TEST_PRO)
+
     async def send_test_pro_expiring_notifications(self, session: AsyncSession) -> int:
         """Send notifications about expiring TEST_PRO subscriptions."""
         
-        from bot.lexicon import LEXICON_RU, LEXICON_COMMANDS_RU
+        from bot.lexicon import LEXICON_RU
         
-        sent_count = 0
         # Use naive datetime for comparison with database (TIMESTAMP WITHOUT TIME ZONE)
         now = datetime.utcnow()
         
-        # Users with TEST_PRO expiring in 4 days
+        # TEST_PRO истекает через 4 дня или через 1 день - один запрос на оба окна
         four_days_later = now + timedelta(days=4)
         five_days_later = now + timedelta(days=5)
-        stmt = select(User).filter(
-            User.subscription_type == SubscriptionType.TEST_PRO,
-            User.subscription_expires_at >= four_days_later,
-            User.subscription_expires_at < five_days_later,
-            User.subscription_expires_at > now
-        )
-        result = await session.execute(stmt)
-        users_4_days = result.scalars().all()
-        
-        for user in users_4_days:
-            try:
-                message = LEXICON_RU['notification_test_pro_4_days']
-            except KeyError:
-                # Fallback if key not found
-                message = "⏳ Осталось всего 4 дня бесплатного PRO.\nЧерез 4 дня большинство функций станет недоступно.\n\n👉 Оформи PRO сегодня, чтобы ничего не потерять."
-            
-            from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-            try:
-                button_text = LEXICON_COMMANDS_RU['button_subscribe_pro_compare']
-            except KeyError:
-                button_text = "🔓 Перейти на PRO"
-            
-            keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text=button_text, callback_data="upgrade_pro")]
-            ])
-            
-            # Добавляем кнопку "Назад в меню" в новый ряд
-            keyboard = add_main_menu_button_to_keyboard(keyboard, user.subscription_type)
-            
-            if await self.send_notification(user.telegram_id, message, keyboard):
-                sent_count += 1
-        
-        # Users with TEST_PRO expiring in 1 day
         one_day_later = now + timedelta(days=1)
         two_days_later = now + timedelta(days=2)
-        stmt = select(User).filter(
+        days_left = case(
+            (User.subscription_expires_at >= four_days_later, 4),
+            else_=1
+        ).label('days_left')
+        stmt = select(User.telegram_id, days_left).filter(
             User.subscription_type == SubscriptionType.TEST_PRO,
-            User.subscription_expires_at >= one_day_later,
-            User.subscription_expires_at < two_days_later,
-            User.subscription_expires_at > now
+            User.subscription_expires_at > now,
+            or_(
+                and_(User.subscription_expires_at >= four_days_later, User.subscription_expires_at < five_days_later),
+                and_(User.subscription_expires_at >= one_day_later, User.subscription_expires_at < two_days_later)
+            )
         )
         result = await session.execute(stmt)
-        users_1_day = result.scalars().all()
+        recipients = result.all()
+        if not recipients:
+            return 0
         
-        for user in users_1_day:
-            try:
-                message = LEXICON_RU['notification_test_pro_1_day']
-            except KeyError:
-                # Fallback if key not found
-                message = "⚠️ Осталось 24 часа до конца бесплатного PRO!\n\nПотом доступ к ключевым функциям исчезнет.\n\n👉 Оформи PRO сейчас и используй все возможности дальше."
-            
-            from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-            try:
-                button_text = LEXICON_COMMANDS_RU['button_subscribe_pro_compare']
-            except KeyError:
-                button_text = "🔓 Перейти на PRO"
-            
-            keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text=button_text, callback_data="upgrade_pro")]
-            ])
-            
-            # Добавляем кнопку "Назад в меню" в новый ряд
-            keyboard = add_main_menu_button_to_keyboard(keyboard, user.subscription_type)
-            
-            if await self.send_notification(user.telegram_id, message, keyboard):
-                sent_count += 1
+        try:
+            message_4_days = LEXICON_RU['notification_test_pro_4_days']
+        except KeyError:
+            # Fallback if key not found
+            message_4_days = (
+                "⏳ Осталось всего 4 дня бесплатного PRO.\nЧерез 4 дня большинство функций станет недоступно.\n\n"
+                "👉 Оформи PRO сегодня, чтобы ничего не потерять."
+            )
+        try:
+            message_1_day = LEXICON_RU['notification_test_pro_1_day']
+        except KeyError:
+            # Fallback if key not found
+            message_1_day = (
+                "⚠️ Осталось 24 часа до конца бесплатного PRO!\n\nПотом доступ к ключевым функциям исчезнет.\n\n"
+                "👉 Оформи PRO сейчас и используй все возможности дальше."
+            )
         
-        return sent_count
+        # Клавиатура одинакова для всех получателей - собираем один раз
+        keyboard = self._test_pro_expiring_keyboard()
+        
+        return await self.send_many(
+            (telegram_id, message_4_days if days == 4 else message_1_day, keyboard)
+            for telegram_id, days in recipients
+        )
     
     # УДАЛЕНО: Функция отправки маркетинговых уведомлений отключена
     # async def send_marketing_notifications(self, session: AsyncSession) -> int:
@@ -266,42 +294,17 @@ class NotificationManager:
     async def check_and_convert_expired_test_pro(self, session: AsyncSession) -> int:
         """Check and convert expired TEST_PRO subscriptions to FREE."""
         
-        from core.tariffs.tariff_service import TariffService
+        from core.subscriptions.expiry import downgrade_expired_subscriptions
         
-        # Use naive datetime for comparison with database (TIMESTAMP WITHOUT TIME ZONE)
-        now = datetime.utcnow()
-        stmt = select(User).filter(
-            User.subscription_type == SubscriptionType.TEST_PRO,
-            User.subscription_expires_at < now
-        )
-        result = await session.execute(stmt)
-        expired_users = result.scalars().all()
-        
-        # Get FREE limits from TariffService
-        tariff_service = TariffService()
-        free_limits = tariff_service.get_tariff_limits(SubscriptionType.FREE)
-        
-        converted_count = 0
-        for user in expired_users:
-            user.subscription_type = SubscriptionType.FREE
-            user.subscription_expires_at = None
-            
-            # Update limits to FREE level using TariffService
-            if user.limits:
-                user.limits.analytics_total = free_limits['analytics_limit']  # 0
-                user.limits.themes_total = free_limits['themes_limit']  # 4 (стандартный лимит для FREE)
-                user.limits.top_themes_total = 0
-                user.limits.theme_cooldown_days = free_limits['theme_cooldown_days']  # 7 дней
-                # Устанавливаем новую дату начала тарифа (для отсчета 7 дней)
-                user.limits.current_tariff_started_at = now
-            
-            converted_count += 1
+        converted = await downgrade_expired_subscriptions(session, [SubscriptionType.TEST_PRO])
         
-        if converted_count > 0:
+        if converted:
             await session.commit()
-            print(f"Converted {converted_count} expired TEST_PRO subscriptions to FREE")
+            # Сбрасываем кеш пользователей и лимитов пачками через pipeline
+            await get_user_cache_service().invalidate_many(converted)
+            print(f"Converted {len(converted)} expired TEST_PRO subscriptions to FREE")
         
-        return converted_count
+        return len(converted)
 
 
 # Global notification manager instance
@@ -121,6 +121,31 @@ class TaskScheduler:
             name='Check VIP group members access'
         )
         
+        # Hourly theme trend snapshot refresh (в Dramatiq воркере)
+        self.scheduler.add_job(
+            self.refresh_theme_trends,
+            IntervalTrigger(hours=1),
+            id='refresh_theme_trends',
+            name='Refresh theme trend snapshot'
+        )
+        
+        # Hourly daily_metrics rollup от водяного знака (в Dramatiq воркере)
+        self.scheduler.add_job(
+            self.refresh_daily_metrics,
+            CronTrigger(minute=10),
+            id='refresh_daily_metrics',
+            name='Roll up daily metrics'
+        )
+        
+        # Страховочный drain outbox платежных эффектов: повторы после backoff
+        # и эффекты, для которых не удалось поставить задачу сразу после оплаты
+        self.scheduler.add_job(
+            self.drain_payment_side_effects,
+            IntervalTrigger(minutes=1),
+            id='drain_payment_side_effects',
+            name='Drain payment side effects outbox'
+        )
+        
         # Start the scheduler
         self.scheduler.start()
         print("Task scheduler started successfully")
@@ -323,6 +348,30 @@ class TaskScheduler:
                 logger.error(f"Error checking VIP group access: {e}")
                 print(f"Error checking VIP group access: {e}")
     
+    async def refresh_theme_trends(self):
+        """Enqueue theme trend snapshot refresh."""
+        try:
+            from workers.actors import refresh_theme_trends
+            await asyncio.to_thread(refresh_theme_trends.send)
+        except Exception as e:
+            logger.error(f"Error enqueueing theme trends refresh: {e}")
+    
+    async def refresh_daily_metrics(self):
+        """Enqueue daily metrics rollup."""
+        try:
+            from workers.actors import refresh_daily_metrics
+            await asyncio.to_thread(refresh_daily_metrics.send)
+        except Exception as e:
+            logger.error(f"Error enqueueing daily metrics rollup: {e}")
+    
+    async def drain_payment_side_effects(self):
+        """Enqueue payment side effects outbox drain."""
+        try:
+            from workers.actors import drain_payment_side_effects
+            await asyncio.to_thread(drain_payment_side_effects.send)
+        except Exception as e:
+            logger.error(f"Error enqueueing payment side effects drain: {e}")
+    
     async def monitor_resources(self):
         """Мониторинг использования ресурсов."""
         try:
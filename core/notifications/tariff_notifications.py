@@ -10,6 +10,29 @@ from bot.lexicon import LEXICON_RU
 from bot.keyboards.main_menu import get_main_menu_keyboard
 
 
+def build_tariff_change_message(
+    subscription_type: SubscriptionType,
+    analytics_used: int,
+    analytics_total: int,
+    themes_used: int,
+    themes_total: int
+) -> str:
+    """Build tariff change notification text from limit values."""
+    # Get subscription label from lexicon
+    subscription_label = LEXICON_RU.get(
+        f'subscription_label_{subscription_type.value}',
+        subscription_type.value
+    )
+    
+    return LEXICON_RU['tariff_change_notification'].format(
+        subscription_type=subscription_label,
+        analytics_used=analytics_used,
+        analytics_total=analytics_total,
+        themes_used=themes_used,
+        themes_total=themes_total
+    )
+
+
 async def send_tariff_change_notification(
     bot: Bot,
     user: User,
@@ -33,23 +56,12 @@ async def send_tariff_change_notification(
         return False
     
     try:
-        # Get subscription label from lexicon
-        subscription_label = LEXICON_RU.get(
-            f'subscription_label_{subscription_type.value}',
-            subscription_type.value
-        )
-        
-        # Format limits info
-        analytics_info = f"{limits.analytics_used}/{limits.analytics_total}"
-        themes_info = f"{limits.themes_used}/{limits.themes_total}"
-        
-        # Build notification message
-        message = LEXICON_RU['tariff_change_notification'].format(
-            subscription_type=subscription_label,
-            analytics_used=limits.analytics_used,
-            analytics_total=limits.analytics_total,
-            themes_used=limits.themes_used,
-            themes_total=limits.themes_total
+        message = build_tariff_change_message(
+            subscription_type,
+            limits.analytics_used,
+            limits.analytics_total,
+            limits.themes_used,
+            limits.themes_total
         )
         
         # Create keyboard with main menu button
@@ -2,109 +2,240 @@
 
 import aiohttp
 import asyncio
-from typing import List, Optional, Dict
+import json
+import logging
+import re
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+import redis
+
+from config.database import redis_client
 from config.settings import settings
 
+logger = logging.getLogger(__name__)
+
+# Один pool соединений на парсер: не больше PARSER_MAX_CONNECTIONS сокетов
+PARSER_MAX_CONNECTIONS = 8
+# Сколько запросов get_works_tags держит в полете одновременно
+PARSER_CONCURRENCY = 8
+PARSER_TIMEOUT = 30
+TAGS_CACHE_TTL = 7 * 86400
+TAGS_CACHE_PREFIX = "adobe_tags:"
+MAX_TAGS = 10
+
+TAG_PATTERNS = [
+    re.compile(pattern, re.IGNORECASE)
+    for pattern in (r'data-tag="([^"]+)"', r'tag[^>]*>([^<]+)<', r'keyword[^>]*>([^<]+)<')
+]
+
+
+class TokenBucket:
+    """Token bucket rate limiter shared by all coroutines of a parser.
+
+    Пополняется со скоростью rate токенов в секунду до capacity;
+    acquire() ждет ровно столько, сколько нужно до следующего токена.
+    По умолчанию время берется из loop.time() текущего event loop.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None,
+                 clock: Optional[Callable[[], float]] = None,
+                 sleep: Callable[[float], Awaitable] = asyncio.sleep):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated_at: Optional[float] = None
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        if self.updated_at is not None:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        clock = self._clock or asyncio.get_running_loop().time
+        async with self._lock:
+            self._refill(clock())
+            if self.tokens < 1:
+                await self._sleep((1 - self.tokens) / self.rate)
+                self._refill(clock())
+            self.tokens -= 1
+
+
+def _to_str(value) -> Optional[str]:
+    if value is None:
+        return None
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
 
 class AdobeStockParser:
-    """Parser for Adobe Stock work information."""
-    
-    def __init__(self):
-        self.base_url = "https://stock.adobe.com"
-        self.rate_limit = settings.adobe_stock_rate_limit
-        self.last_request_time = 0
-    
-    async def get_work_tags(self, work_id: str, title: str) -> Optional[List[str]]:
-        """Get tags for a specific work."""
-        
+    """Parser for Adobe Stock work information.
+
+    Держит одну aiohttp.ClientSession на все время жизни (закрывается через
+    close() или async with), запросы проходят через общий TokenBucket.
+    """
+
+    def __init__(self, base_url: Optional[str] = None,
+                 redis_client_instance: Optional[redis.Redis] = None,
+                 rate_limit: Optional[float] = None,
+                 max_connections: int = PARSER_MAX_CONNECTIONS,
+                 concurrency: int = PARSER_CONCURRENCY):
+        self.base_url = base_url or "https://stock.adobe.com"
+        self.rate_limit = rate_limit or settings.adobe_stock_rate_limit
+        self.redis_client = redis_client_instance or redis_client
+        self.max_connections = max_connections
+        self.concurrency = concurrency
+        self.cache_ttl = TAGS_CACHE_TTL
+        self.limiter = TokenBucket(self.rate_limit)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Shared session; пересоздается, только если закрыта или loop сменился."""
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=self.max_connections),
+                timeout=aiohttp.ClientTimeout(total=PARSER_TIMEOUT)
+            )
+            self._session_loop = loop
+            self.limiter = TokenBucket(self.rate_limit)
+        return self._session
+
+    async def close(self):
+        """Close shared HTTP session."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._session_loop = None
+
+    async def _fetch(self, url: str) -> Optional[str]:
+        """GET url through rate limiter, returns body or None on non-200."""
+        session = await self._get_session()
+        await self.limiter.acquire()
+        async with session.get(url) as response:
+            if response.status == 200:
+                return await response.text()
+            logger.warning(f"Failed to fetch {url}: {response.status}")
+            return None
+
+    @staticmethod
+    def _cache_key(work_id) -> str:
+        return f"{TAGS_CACHE_PREFIX}{work_id}"
+
+    def get_cached_tags(self, work_ids: List[str]) -> Dict[str, List[str]]:
+        """Get cached tags for assets with a single MGET."""
+        if self.redis_client is None or not work_ids:
+            return {}
+
+        try:
+            values = self.redis_client.mget([self._cache_key(work_id) for work_id in work_ids])
+            return {
+                work_id: json.loads(_to_str(value))
+                for work_id, value in zip(work_ids, values)
+                if value
+            }
+        except Exception as e:
+            logger.warning(f"Error getting cached tags: {e}")
+            return {}
+
+    def _cache_tags(self, tags_by_work: Dict[str, List[str]]):
+        """Cache tags with one pipelined round-trip of SET ... EX."""
+        if self.redis_client is None or not tags_by_work:
+            return
+
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for work_id, tags in tags_by_work.items():
+                pipe.set(self._cache_key(work_id), json.dumps(tags, ensure_ascii=False), ex=self.cache_ttl)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Error caching tags: {e}")
+
+    async def _fetch_work_tags(self, work_id: str) -> Optional[List[str]]:
         try:
-            # Rate limiting
-            await self._rate_limit()
-            
-            # Construct URL
             url = f"{self.base_url}/search?search_type=usertyped&k={work_id}"
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        # Parse HTML to extract tags
-                        html = await response.text()
-                        tags = self._extract_tags_from_html(html)
-                        return tags
-                    else:
-                        print(f"Failed to fetch work {work_id}: {response.status}")
-                        return None
-                        
+            html = await self._fetch(url)
+            return self._extract_tags_from_html(html) if html is not None else None
         except Exception as e:
-            print(f"Error fetching tags for work {work_id}: {e}")
+            logger.error(f"Error fetching tags for work {work_id}: {e}")
             return None
-    
+
+    async def get_works_tags(self, work_ids: Iterable) -> Dict[str, Optional[List[str]]]:
+        """Get tags for many works.
+
+        Кеш читается одним MGET, промахи качаются через asyncio.gather не более
+        чем по self.concurrency одновременно, успешные результаты пишутся
+        одним pipeline. Неудачные загрузки возвращаются как None и не кешируются.
+        """
+        work_ids = list(dict.fromkeys(str(work_id) for work_id in work_ids))
+        if not work_ids:
+            return {}
+
+        result: Dict[str, Optional[List[str]]] = await asyncio.to_thread(self.get_cached_tags, work_ids)
+        missing = [work_id for work_id in work_ids if work_id not in result]
+        if not missing:
+            return result
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(work_id: str) -> Optional[List[str]]:
+            async with semaphore:
+                return await self._fetch_work_tags(work_id)
+
+        fetched = await asyncio.gather(*(fetch(work_id) for work_id in missing))
+        fresh = {work_id: tags for work_id, tags in zip(missing, fetched) if tags is not None}
+        await asyncio.to_thread(self._cache_tags, fresh)
+
+        result.update(zip(missing, fetched))
+        return result
+
+    async def get_work_tags(self, work_id: str, title: str) -> Optional[List[str]]:
+        """Get tags for a specific work."""
+        return (await self.get_works_tags([work_id])).get(str(work_id))
+
     def _extract_tags_from_html(self, html: str) -> List[str]:
         """Extract tags from HTML content."""
-        
+
         # Simple tag extraction (would need more sophisticated parsing in production)
-        import re
-        
-        # Look for common tag patterns
-        tag_patterns = [
-            r'data-tag="([^"]+)"',
-            r'tag[^>]*>([^<]+)<',
-            r'keyword[^>]*>([^<]+)<'
-        ]
-        
-        tags = []
-        for pattern in tag_patterns:
-            matches = re.findall(pattern, html, re.IGNORECASE)
-            tags.extend(matches)
-        
-        # Clean and deduplicate tags
-        cleaned_tags = []
-        for tag in tags:
-            tag = tag.strip().lower()
-            if tag and len(tag) > 2 and tag not in cleaned_tags:
-                cleaned_tags.append(tag)
-        
-        return cleaned_tags[:10]  # Limit to 10 tags
-    
-    async def _rate_limit(self):
-        """Implement rate limiting."""
-        
-        current_time = asyncio.get_event_loop().time()
-        time_since_last = current_time - self.last_request_time
-        min_interval = 1.0 / self.rate_limit
-        
-        if time_since_last < min_interval:
-            await asyncio.sleep(min_interval - time_since_last)
-        
-        self.last_request_time = asyncio.get_event_loop().time()
-    
+        cleaned_tags = {}
+        for pattern in TAG_PATTERNS:
+            for match in pattern.finditer(html):
+                tag = match.group(1).strip().lower()
+                if len(tag) > 2:
+                    cleaned_tags.setdefault(tag, None)
+                    if len(cleaned_tags) >= MAX_TAGS:
+                        return list(cleaned_tags)
+
+        return list(cleaned_tags)
+
     async def search_works_by_theme(self, theme: str, limit: int = 20) -> List[Dict]:
         """Search works by theme (for market analysis)."""
-        
+
         try:
-            await self._rate_limit()
-            
             # Construct search URL
             search_query = theme.replace(' ', '+')
             url = f"{self.base_url}/search?search_type=usertyped&k={search_query}"
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        html = await response.text()
-                        works = self._extract_works_from_search(html, limit)
-                        return works
-                    else:
-                        print(f"Failed to search for theme {theme}: {response.status}")
-                        return []
-                        
+
+            html = await self._fetch(url)
+            if html is None:
+                return []
+            return self._extract_works_from_search(html, limit)
+
         except Exception as e:
-            print(f"Error searching for theme {theme}: {e}")
+            logger.error(f"Error searching for theme {theme}: {e}")
             return []
-    
+
     def _extract_works_from_search(self, html: str, limit: int) -> List[Dict]:
         """Extract work information from search results."""
-        
+
         # This would need more sophisticated HTML parsing
         # For now, return empty list
-        return []
\ No newline at end of file
+        return []
@@ -9,6 +9,7 @@ from decimal import Decimal
 from config.settings import settings
 from config.database import SessionLocal
 from database.models import User, SubscriptionType, Subscription, Limits
+from core.subscriptions.referral_award import award_referral_point_sync
 
 
 class BoostyPaymentHandler:
@@ -226,11 +227,9 @@ class BoostyPaymentHandler:
             # Начисляем баллы рефереру, если это первая оплата PRO/ULTRA
             if subscription_type in [SubscriptionType.PRO, SubscriptionType.ULTRA]:
                 if user.referrer_id and not user.referral_bonus_paid:
-                    referrer = db.query(User).filter(User.id == user.referrer_id).first()
-                    if referrer:
-                        referrer.referral_balance = (referrer.referral_balance or 0) + 1
-                        user.referral_bonus_paid = True
-                        print(f"✅ Начислен 1 IQ Балл пользователю {referrer.id} за реферала {user.id}")
+                    award = award_referral_point_sync(db, user.id, payment_id)
+                    if award:
+                        print(f"✅ Начислен 1 IQ Балл пользователю {award.referrer_id} за реферала {user.id}")
             
             db.commit()
             
@@ -0,0 +1,266 @@
+"""Post-commit outbox for payment side effects.
+
+PaymentHandler не ходит в Telegram на пути обработки вебхука: разбан в VIP
+группе и уведомления (о смене тарифа, о начисленном реферальном балле)
+записываются строками payment_side_effects в той же транзакции, что и
+подписка. Dramatiq-актор drain_payment_side_effects забирает их пачками
+(SKIP LOCKED на PostgreSQL) и выполняет одним общим Bot; каждая строка
+отмечается сразу после выполнения, ошибки повторяются с экспоненциальной
+задержкой.
+
+Гарантия - at-least-once: закоммиченный эффект не теряется (строка
+переживает падение процесса, захваченные упавшим воркером строки
+забираются повторно по lock_timeout), а повтор возможен только если
+процесс упал между ответом Telegram и отметкой SENT.
+"""
+
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+from sqlalchemy import and_, or_, select, update
+
+from database.models import PaymentSideEffect, SideEffectStatus, SideEffectType, SubscriptionType
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_side_effect(
+    session,
+    payment_id: str,
+    effect_type: SideEffectType,
+    telegram_user_id: int,
+    payload: Optional[Dict[str, Any]] = None,
+) -> PaymentSideEffect:
+    """Add an outbox row to the caller's session (sync or async). Коммит остается за вызывающим кодом."""
+    effect = PaymentSideEffect(
+        payment_id=payment_id,
+        effect_type=effect_type.value,
+        telegram_user_id=telegram_user_id,
+        payload=json.dumps(payload or {}, ensure_ascii=False),
+        status=SideEffectStatus.PENDING.value,
+        attempts=0,
+    )
+    session.add(effect)
+    return effect
+
+
+async def _vip_unban(bot, telegram_user_id: int, payload: Dict[str, Any]) -> None:
+    from config.settings import settings
+    from core.vip_group.vip_group_service import is_not_banned_error
+
+    # Как VIPGroupService.unban_user_from_group, но сетевые ошибки пробрасываются - их повторяет outbox
+    try:
+        await bot.unban_chat_member(chat_id=settings.vip_group_id, user_id=telegram_user_id, only_if_banned=True)
+    except TelegramBadRequest as e:
+        if not is_not_banned_error(e):
+            raise
+        logger.debug(f"User {telegram_user_id} is not banned in VIP group")
+
+
+async def _tariff_notification(bot, telegram_user_id: int, payload: Dict[str, Any]) -> None:
+    from bot.keyboards.main_menu import get_main_menu_keyboard
+    from core.notifications.tariff_notifications import build_tariff_change_message
+
+    subscription_type = SubscriptionType(payload['subscription_type'])
+    await bot.send_message(
+        chat_id=telegram_user_id,
+        text=build_tariff_change_message(
+            subscription_type,
+            payload['analytics_used'],
+            payload['analytics_total'],
+            payload['themes_used'],
+            payload['themes_total'],
+        ),
+        parse_mode="HTML",
+        reply_markup=get_main_menu_keyboard(subscription_type),
+    )
+
+
+async def _referral_notification(bot, telegram_user_id: int, payload: Dict[str, Any]) -> None:
+    from bot.lexicon import LEXICON_RU
+
+    await bot.send_message(
+        chat_id=telegram_user_id,
+        text=LEXICON_RU['referral_points_awarded_notification'].format(
+            subscription_type=payload['subscription_type'],
+            balance=payload['balance'],
+        ),
+        parse_mode="HTML",
+    )
+
+
+SIDE_EFFECT_HANDLERS: Dict[str, Callable[[Any, int, Dict[str, Any]], Awaitable[None]]] = {
+    SideEffectType.VIP_UNBAN.value: _vip_unban,
+    SideEffectType.TARIFF_NOTIFICATION.value: _tariff_notification,
+    SideEffectType.REFERRAL_NOTIFICATION.value: _referral_notification,
+}
+
+
+class PaymentSideEffectOutbox:
+    """Batched consumer of payment_side_effects with per-effect retry/backoff."""
+
+    def __init__(
+        self,
+        session_factory=None,
+        batch_size: int = 50,
+        max_attempts: int = 5,
+        retry_delay_seconds: int = 30,
+        lock_timeout_seconds: int = 300,
+        clock: Callable[[], datetime] = datetime.utcnow,
+        handlers: Optional[Dict[str, Callable]] = None,
+    ):
+        self._session_factory = session_factory
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_delay_seconds = retry_delay_seconds
+        self.lock_timeout_seconds = lock_timeout_seconds
+        self._clock = clock
+        self.handlers = handlers or SIDE_EFFECT_HANDLERS
+
+    @property
+    def session_factory(self):
+        if self._session_factory is None:
+            from config.database import ManagedSessionLocal
+            self._session_factory = ManagedSessionLocal
+        return self._session_factory
+
+    def drain(self, bot) -> int:
+        """Execute due effects until none remain. Returns number of claimed effects.
+
+        Все отправки идут через один event loop и один Bot; HTTP-сессия бота
+        закрывается в конце, чтобы следующий запуск создал ее в своем loop.
+        """
+        total = 0
+        with asyncio.Runner() as runner:
+            try:
+                while True:
+                    effects = self._claim_batch()
+                    for effect in effects:
+                        self._execute(runner, bot, effect)
+                    total += len(effects)
+                    if len(effects) < self.batch_size:
+                        break
+            finally:
+                session = getattr(bot, "session", None)
+                if session is not None:
+                    runner.run(session.close())
+        return total
+
+    def _claim_batch(self) -> List[PaymentSideEffect]:
+        """Lock a batch of due effects (SKIP LOCKED on PostgreSQL) and mark them PROCESSING."""
+        now = self._clock()
+        stale_before = now - timedelta(seconds=self.lock_timeout_seconds)
+
+        with self.session_factory() as session:
+            effects = list(session.execute(
+                select(PaymentSideEffect)
+                .where(
+                    or_(
+                        and_(
+                            PaymentSideEffect.status == SideEffectStatus.PENDING.value,
+                            PaymentSideEffect.available_at <= now,
+                        ),
+                        # Эффект захвачен упавшим воркером - забираем повторно
+                        and_(
+                            PaymentSideEffect.status == SideEffectStatus.PROCESSING.value,
+                            PaymentSideEffect.locked_at < stale_before,
+                        ),
+                    )
+                )
+                .order_by(PaymentSideEffect.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            ).scalars().all())
+            if not effects:
+                return []
+
+            session.execute(
+                update(PaymentSideEffect)
+                .where(PaymentSideEffect.id.in_([effect.id for effect in effects]))
+                .values(
+                    status=SideEffectStatus.PROCESSING.value,
+                    locked_at=now,
+                    attempts=PaymentSideEffect.attempts + 1,
+                )
+                .execution_options(synchronize_session=False)
+            )
+            # Отсоединяем до коммита, чтобы загруженные атрибуты не истекли
+            session.expunge_all()
+            session.commit()
+
+        for effect in effects:
+            effect.attempts = (effect.attempts or 0) + 1
+        return effects
+
+    def _execute(self, runner: asyncio.Runner, bot, effect: PaymentSideEffect) -> None:
+        handler = self.handlers.get(effect.effect_type)
+        if handler is None:
+            self._finish(effect, SideEffectStatus.FAILED, f"Unknown effect type {effect.effect_type}")
+            return
+
+        try:
+            runner.run(handler(bot, effect.telegram_user_id, json.loads(effect.payload or "{}")))
+        except (TelegramForbiddenError, TelegramBadRequest) as e:
+            # Пользователь заблокировал бота / неверный запрос - повтор не поможет
+            logger.warning(f"Side effect {effect.id} ({effect.effect_type}) rejected by Telegram: {e}")
+            self._finish(effect, SideEffectStatus.FAILED, str(e))
+        except TelegramRetryAfter as e:
+            self._retry(effect, str(e), delay=e.retry_after)
+        except Exception as e:
+            logger.error(f"Side effect {effect.id} ({effect.effect_type}) failed: {e}", exc_info=True)
+            self._retry(effect, str(e))
+        else:
+            self._finish(effect, SideEffectStatus.SENT)
+
+    def _retry(self, effect: PaymentSideEffect, error: str, delay: Optional[int] = None) -> None:
+        if effect.attempts >= self.max_attempts:
+            logger.error(f"Side effect {effect.id} ({effect.effect_type}) failed after {effect.attempts} attempts: {error}")
+            self._finish(effect, SideEffectStatus.FAILED, error)
+            return
+
+        if delay is None:
+            delay = self.retry_delay_seconds * (2 ** (effect.attempts - 1))
+        self._finish(
+            effect, SideEffectStatus.PENDING, error,
+            available_at=self._clock() + timedelta(seconds=delay),
+        )
+
+    def _finish(
+        self,
+        effect: PaymentSideEffect,
+        status: SideEffectStatus,
+        error: Optional[str] = None,
+        available_at: Optional[datetime] = None,
+    ) -> None:
+        """Persist the outcome of one effect right after it was attempted."""
+        values = {"status": status.value, "locked_at": None, "last_error": error[:500] if error else None}
+        if status == SideEffectStatus.SENT:
+            values["sent_at"] = self._clock()
+        if available_at is not None:
+            values["available_at"] = available_at
+
+        with self.session_factory() as session:
+            session.execute(
+                update(PaymentSideEffect)
+                .where(PaymentSideEffect.id == effect.id)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            session.commit()
+        effect.status = status.value
+
+
+async def kick_side_effects_worker() -> None:
+    """Enqueue an outbox drain right after a payment commit.
+
+    Если брокер недоступен, эффекты заберет периодическая задача планировщика.
+    """
+    try:
+        from workers.actors import drain_payment_side_effects
+        await asyncio.to_thread(drain_payment_side_effects.send)
+    except Exception as e:
+        logger.warning(f"Failed to enqueue payment side effects drain: {e}")
@@ -2,12 +2,10 @@
 
 from typing import Optional, Dict, Any
 from types import TracebackType
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
 
 from config.settings import settings
-from config.database import AsyncSessionLocal
-from database.models import User, SubscriptionType, SystemSettings
+from core.cache.system_settings_snapshot import SystemSettingsSnapshot, get_system_settings_snapshot
+from database.models import User, SubscriptionType
 
 
 class TributePaymentHandler:
@@ -17,10 +15,11 @@ class TributePaymentHandler:
     и хранятся в конфиге.
     """
     
-    def __init__(self):
+    def __init__(self, settings_snapshot: Optional[SystemSettingsSnapshot] = None):
         self.pro_link = settings.payment.tribute_pro_link
         self.ultra_link = settings.payment.tribute_ultra_link
         self.api_key = settings.payment.tribute_api_key
+        self.settings_snapshot = settings_snapshot or get_system_settings_snapshot()
 
     async def __aenter__(self):
         return self
@@ -116,21 +115,16 @@ class TributePaymentHandler:
                 return f"{base_link}{separator}user_id={user_id}"
             return None
         
-        # Получаем ссылку из БД
-        async with AsyncSessionLocal() as session:
-            try:
-                link_query = await session.execute(
-                    select(SystemSettings).where(SystemSettings.key == link_key)
-                )
-                link_setting = link_query.scalar_one_or_none()
-                
-                if link_setting and link_setting.value:
-                    base_link = link_setting.value.strip()
-                    # Добавляем user_id к ссылке
-                    separator = '&' if '?' in base_link else '?'
-                    return f"{base_link}{separator}user_id={user_id}"
-            except Exception as e:
-                print(f"Error loading payment link from DB: {e}")
+        # Получаем ссылку из снимка system_settings в памяти (без обращения к БД)
+        try:
+            link_value = await self.settings_snapshot.aget(link_key)
+            if link_value and link_value.strip():
+                base_link = link_value.strip()
+                # Добавляем user_id к ссылке
+                separator = '&' if '?' in base_link else '?'
+                return f"{base_link}{separator}user_id={user_id}"
+        except Exception as e:
+            print(f"Error loading payment link from settings snapshot: {e}")
         
         # Fallback к старым ссылкам из settings
         if subscription_type == SubscriptionType.PRO:
@@ -0,0 +1,432 @@
+"""Durable inbox for payment provider webhooks.
+
+Вебхук только записывает событие в таблицу payment_webhook_events
+(append-only INSERT ... ON CONFLICT DO NOTHING по provider + event_id) и сразу
+отвечает провайдеру. Фоновый потребитель забирает события пачками,
+группирует их по пользователю и вызывает PaymentHandler.process_payment_success
+ровно один раз на платеж. Необработанные события переживают рестарт процесса.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import and_, func, or_, select, update
+
+from config.database import AsyncSessionLocal
+from core.utils.db import dialect_insert
+from database.models import PaymentWebhookEvent, WebhookEventStatus
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class InboxEvent:
+    """Normalized webhook event ready to be appended to the inbox."""
+
+    provider: str
+    event_id: str
+    event_name: Optional[str]
+    payload: str
+    payment_id: Optional[str] = None
+    telegram_user_id: Optional[int] = None
+    subscription_type: Optional[str] = None
+    amount: Optional[float] = None
+    discount_percent: int = 0
+    # Если задано, событие сохраняется со статусом IGNORED и не обрабатывается
+    ignore_reason: Optional[str] = None
+
+
+class WebhookInboxMetrics:
+    """In-process counters for webhook ingest and processing."""
+
+    def __init__(self):
+        self.ingested = 0
+        self.duplicates = 0
+        self.processed = 0
+        self.failed = 0
+        self.retried = 0
+        self._ingest_latency_total = 0.0
+        self._ingest_latency_max = 0.0
+        self._ingest_latency_last = 0.0
+        self._processing_lag_total = 0.0
+        self._processing_lag_max = 0.0
+
+    def observe_ingest(self, seconds: float, duplicate: bool = False) -> None:
+        """Record latency of a single webhook ingest (request -> ack)."""
+        if duplicate:
+            self.duplicates += 1
+        else:
+            self.ingested += 1
+        self._ingest_latency_total += seconds
+        self._ingest_latency_last = seconds
+        self._ingest_latency_max = max(self._ingest_latency_max, seconds)
+
+    def observe_processed(self, received_at: datetime, processed_at: datetime) -> None:
+        """Record time between webhook receipt and payment application."""
+        lag = max((processed_at - received_at).total_seconds(), 0.0)
+        self.processed += 1
+        self._processing_lag_total += lag
+        self._processing_lag_max = max(self._processing_lag_max, lag)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return metrics as a JSON-serializable dict."""
+        ingest_count = self.ingested + self.duplicates
+        return {
+            "ingest": {
+                "accepted": self.ingested,
+                "duplicates": self.duplicates,
+                "latency_avg_ms": round(self._ingest_latency_total / ingest_count * 1000, 2) if ingest_count else 0.0,
+                "latency_max_ms": round(self._ingest_latency_max * 1000, 2),
+                "latency_last_ms": round(self._ingest_latency_last * 1000, 2),
+            },
+            "processing": {
+                "processed": self.processed,
+                "failed": self.failed,
+                "retried": self.retried,
+                "lag_avg_seconds": round(self._processing_lag_total / self.processed, 3) if self.processed else 0.0,
+                "lag_max_seconds": round(self._processing_lag_max, 3),
+            },
+        }
+
+
+class WebhookInbox:
+    """Append-only webhook inbox with a batched, per-user coalescing consumer."""
+
+    def __init__(
+        self,
+        session_factory=None,
+        payment_handler=None,
+        batch_size: int = 100,
+        max_attempts: int = 5,
+        retry_delay_seconds: int = 30,
+        lock_timeout_seconds: int = 300,
+        max_concurrency: int = 4,
+    ):
+        self.session_factory = session_factory or AsyncSessionLocal
+        self._payment_handler = payment_handler
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_delay_seconds = retry_delay_seconds
+        self.lock_timeout_seconds = lock_timeout_seconds
+        self.max_concurrency = max_concurrency
+        self.metrics = WebhookInboxMetrics()
+
+    @property
+    def payment_handler(self):
+        """Lazily create PaymentHandler to avoid import cycles at module load."""
+        if self._payment_handler is None:
+            from core.subscriptions.payment_handler import PaymentHandler
+            self._payment_handler = PaymentHandler()
+        return self._payment_handler
+
+    async def ingest(self, event: InboxEvent) -> bool:
+        """Append event to the inbox.
+
+        Returns True if the event is new, False if it was already received
+        (provider retry).
+        """
+        now = datetime.utcnow()
+        status = WebhookEventStatus.IGNORED if event.ignore_reason else WebhookEventStatus.PENDING
+
+        async with self.session_factory() as session:
+            insert = dialect_insert(session)
+            stmt = insert(PaymentWebhookEvent).values(
+                provider=event.provider,
+                event_id=event.event_id,
+                event_name=event.event_name,
+                payment_id=event.payment_id,
+                telegram_user_id=event.telegram_user_id,
+                subscription_type=event.subscription_type,
+                amount=event.amount,
+                discount_percent=event.discount_percent or 0,
+                payload=event.payload,
+                status=status.value,
+                attempts=0,
+                last_error=event.ignore_reason[:500] if event.ignore_reason else None,
+                received_at=now,
+                available_at=now,
+            ).on_conflict_do_nothing(index_elements=["provider", "event_id"])
+            result = await session.execute(stmt)
+            await session.commit()
+
+        inserted = result.rowcount == 1
+        if not inserted:
+            logger.info(f"Duplicate webhook {event.provider}:{event.event_id} ignored")
+        return inserted
+
+    async def get_backlog(self) -> Dict[str, Any]:
+        """Return number of unprocessed events and age of the oldest one."""
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(
+                    func.count(PaymentWebhookEvent.id),
+                    func.min(PaymentWebhookEvent.received_at),
+                ).where(
+                    PaymentWebhookEvent.status.in_([
+                        WebhookEventStatus.PENDING.value,
+                        WebhookEventStatus.PROCESSING.value,
+                    ])
+                )
+            )
+            count, oldest = result.one()
+
+        oldest_age = (datetime.utcnow() - oldest).total_seconds() if oldest else 0.0
+        return {"pending": count or 0, "oldest_pending_age_seconds": round(max(oldest_age, 0.0), 3)}
+
+    async def get_metrics(self) -> Dict[str, Any]:
+        """Return in-process counters together with the current DB backlog."""
+        metrics = self.metrics.snapshot()
+        metrics["backlog"] = await self.get_backlog()
+        return metrics
+
+    async def drain(self) -> int:
+        """Process batches until no claimable events remain."""
+        total = 0
+        while True:
+            processed = await self.process_batch()
+            total += processed
+            if processed < self.batch_size:
+                return total
+
+    async def process_batch(self) -> int:
+        """Claim one batch of events and apply it. Returns number of claimed events."""
+        events = await self._claim_batch()
+        if not events:
+            return 0
+
+        # Коалесцируем события по пользователю: события одного пользователя
+        # обрабатываются последовательно, разные пользователи - параллельно
+        groups: "OrderedDict[Any, List[PaymentWebhookEvent]]" = OrderedDict()
+        for event in events:
+            key = event.telegram_user_id if event.telegram_user_id is not None else f"event:{event.id}"
+            groups.setdefault(key, []).append(event)
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run_group(group_events: List[PaymentWebhookEvent]):
+            async with semaphore:
+                return await self._process_user_events(group_events)
+
+        results = await asyncio.gather(*(run_group(group) for group in groups.values()))
+
+        processed_ids: List[int] = []
+        failures: List[tuple] = []
+        for group_processed, group_failures in results:
+            processed_ids.extend(group_processed)
+            failures.extend(group_failures)
+
+        await self._finish(events, processed_ids, failures)
+        return len(events)
+
+    async def _claim_batch(self) -> List[PaymentWebhookEvent]:
+        """Lock a batch of due events (SKIP LOCKED on PostgreSQL) and mark them PROCESSING."""
+        now = datetime.utcnow()
+        stale_before = now - timedelta(seconds=self.lock_timeout_seconds)
+
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(PaymentWebhookEvent)
+                .where(
+                    or_(
+                        and_(
+                            PaymentWebhookEvent.status == WebhookEventStatus.PENDING.value,
+                            PaymentWebhookEvent.available_at <= now,
+                        ),
+                        # Событие захвачено упавшим процессом - забираем повторно
+                        and_(
+                            PaymentWebhookEvent.status == WebhookEventStatus.PROCESSING.value,
+                            PaymentWebhookEvent.locked_at < stale_before,
+                        ),
+                    )
+                )
+                .order_by(PaymentWebhookEvent.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            events = list(result.scalars().all())
+            if not events:
+                return []
+
+            await session.execute(
+                update(PaymentWebhookEvent)
+                .where(PaymentWebhookEvent.id.in_([event.id for event in events]))
+                .values(
+                    status=WebhookEventStatus.PROCESSING.value,
+                    locked_at=now,
+                    attempts=PaymentWebhookEvent.attempts + 1,
+                )
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+
+        for event in events:
+            event.attempts = (event.attempts or 0) + 1
+        return events
+
+    async def _process_user_events(self, events: List[PaymentWebhookEvent]):
+        """Apply all events of one user in order, once per payment_id."""
+        processed_ids: List[int] = []
+        failures: List[tuple] = []
+        applied_payments = set()
+
+        for event in sorted(events, key=lambda e: e.id):
+            if event.payment_id in applied_payments:
+                # Повтор того же платежа в пачке - уже применен выше
+                processed_ids.append(event.id)
+                continue
+
+            try:
+                success = await self.payment_handler.process_payment_success(
+                    payment_id=event.payment_id,
+                    user_id=int(event.telegram_user_id),
+                    amount=float(event.amount) if event.amount is not None else 0.0,
+                    subscription_type=event.subscription_type,
+                    discount_percent=event.discount_percent or 0,
+                )
+            except Exception as e:
+                logger.error(f"Webhook event {event.id} processing error: {e}", exc_info=True)
+                failures.append((event, str(e)))
+                continue
+
+            if success:
+                applied_payments.add(event.payment_id)
+                processed_ids.append(event.id)
+            else:
+                failures.append((event, "process_payment_success returned False"))
+
+        return processed_ids, failures
+
+    async def _finish(
+        self,
+        events: List[PaymentWebhookEvent],
+        processed_ids: List[int],
+        failures: List[tuple],
+    ) -> None:
+        """Persist batch outcome: one UPDATE for processed events, one per failure."""
+        now = datetime.utcnow()
+
+        async with self.session_factory() as session:
+            if processed_ids:
+                await session.execute(
+                    update(PaymentWebhookEvent)
+                    .where(PaymentWebhookEvent.id.in_(processed_ids))
+                    .values(
+                        status=WebhookEventStatus.PROCESSED.value,
+                        processed_at=now,
+                        locked_at=None,
+                        last_error=None,
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+
+            for event, error in failures:
+                if event.attempts >= self.max_attempts:
+                    values = {"status": WebhookEventStatus.FAILED.value}
+                    self.metrics.failed += 1
+                    logger.error(
+                        f"Webhook event {event.provider}:{event.event_id} failed after {event.attempts} attempts: {error}"
+                    )
+                else:
+                    delay = self.retry_delay_seconds * (2 ** (event.attempts - 1))
+                    values = {
+                        "status": WebhookEventStatus.PENDING.value,
+                        "available_at": now + timedelta(seconds=delay),
+                    }
+                    self.metrics.retried += 1
+                values.update(locked_at=None, last_error=error[:500])
+                await session.execute(
+                    update(PaymentWebhookEvent)
+                    .where(PaymentWebhookEvent.id == event.id)
+                    .values(**values)
+                    .execution_options(synchronize_session=False)
+                )
+
+            await session.commit()
+
+        processed_set = set(processed_ids)
+        for event in events:
+            if event.id in processed_set:
+                self.metrics.observe_processed(event.received_at, now)
+
+
+class WebhookInboxConsumer:
+    """Background loop that drains the inbox on notification or on a poll interval."""
+
+    def __init__(self, inbox: WebhookInbox, poll_interval: float = 5.0):
+        self.inbox = inbox
+        self.poll_interval = poll_interval
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def notify(self) -> None:
+        """Wake the consumer after a new event was ingested."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def start(self) -> None:
+        """Start the consumer loop in the running event loop."""
+        if self._task is not None and not self._task.done():
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info("Webhook inbox consumer started")
+
+    async def stop(self) -> None:
+        """Stop the consumer loop, letting the current batch finish."""
+        self._stopping = True
+        self.notify()
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, timeout=30)
+            except asyncio.TimeoutError:
+                self._task.cancel()
+            self._task = None
+        logger.info("Webhook inbox consumer stopped")
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            self._wakeup.clear()
+            started = time.perf_counter()
+            try:
+                processed = await self.inbox.drain()
+                if processed:
+                    logger.info(
+                        f"Webhook inbox: processed {processed} events in {time.perf_counter() - started:.3f}s"
+                    )
+            except Exception as e:
+                logger.error(f"Webhook inbox consumer error: {e}", exc_info=True)
+
+            if self._stopping:
+                break
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+# Global instances
+_webhook_inbox: Optional[WebhookInbox] = None
+_webhook_inbox_consumer: Optional[WebhookInboxConsumer] = None
+
+
+def get_webhook_inbox() -> WebhookInbox:
+    """Get global WebhookInbox instance."""
+    global _webhook_inbox
+    if _webhook_inbox is None:
+        _webhook_inbox = WebhookInbox()
+    return _webhook_inbox
+
+
+def get_webhook_inbox_consumer() -> WebhookInboxConsumer:
+    """Get global WebhookInboxConsumer instance."""
+    global _webhook_inbox_consumer
+    if _webhook_inbox_consumer is None:
+        _webhook_inbox_consumer = WebhookInboxConsumer(get_webhook_inbox())
+    return _webhook_inbox_consumer
@@ -0,0 +1,87 @@
+"""Set-based downgrade of expired subscriptions to FREE."""
+
+import logging
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import User, Limits, SubscriptionType
+from core.tariffs.tariff_service import TariffService
+
+logger = logging.getLogger(__name__)
+
+
+async def downgrade_expired_subscriptions(
+    session: AsyncSession,
+    subscription_types: Iterable[SubscriptionType],
+    now: Optional[datetime] = None
+) -> List[Tuple[int, int]]:
+    """Switch every expired subscription of given types to FREE.
+
+    Пользователи и их лимиты обновляются одним набором запросов независимо
+    от количества истекших подписок (без загрузки объектов в сессию).
+    analytics_used и themes_used не трогаем - это история использования.
+    Коммит остается за вызывающим кодом.
+
+    Returns:
+        List of (user_id, telegram_id) for downgraded users.
+    """
+    # Use naive datetime for comparison with database (TIMESTAMP WITHOUT TIME ZONE)
+    now = now or datetime.utcnow()
+    free_limits = await TariffService().aget_tariff_limits(SubscriptionType.FREE)
+
+    expired_filter = (
+        User.subscription_type.in_(list(subscription_types)),
+        User.subscription_expires_at < now,
+    )
+    user_values = {
+        'subscription_type': SubscriptionType.FREE,
+        'subscription_expires_at': None,
+        'updated_at': now,
+    }
+    limits_values = {
+        'analytics_total': free_limits['analytics_limit'],
+        'themes_total': free_limits['themes_limit'],
+        'theme_cooldown_days': free_limits['theme_cooldown_days'],
+        # Новая дата начала тарифа (для отсчета периода тем)
+        'current_tariff_started_at': now,
+        'updated_at': now,
+    }
+
+    if session.get_bind().dialect.name == 'postgresql':
+        # Один запрос: UPDATE users ... RETURNING в CTE, затем UPDATE limits ... FROM expired
+        expired = (
+            update(User)
+            .where(*expired_filter)
+            .values(**user_values)
+            .returning(User.id, User.telegram_id)
+            .cte('expired')
+        )
+        limits_update = (
+            update(Limits)
+            .where(Limits.user_id == expired.c.id)
+            .values(**limits_values)
+            .cte('limits_update')
+        )
+        stmt = select(expired.c.id, expired.c.telegram_id).add_cte(limits_update)
+        rows = (await session.execute(stmt)).all()
+    else:
+        # SQLite не поддерживает DML в CTE: UPDATE limits ... FROM users, затем users ... RETURNING
+        await session.execute(
+            update(Limits)
+            .where(Limits.user_id == User.id, *expired_filter)
+            .values(**limits_values)
+            .execution_options(synchronize_session=False)
+        )
+        result = await session.execute(
+            update(User)
+            .where(*expired_filter)
+            .values(**user_values)
+            .returning(User.id, User.telegram_id)
+            .execution_options(synchronize_session=False)
+        )
+        rows = result.all()
+
+    return [(row[0], row[1]) for row in rows]
@@ -7,10 +7,12 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 from config.database import AsyncSessionLocal
-from database.models import User, Subscription, SubscriptionType, Limits
+from database.models import User, Subscription, SubscriptionType, Limits, SideEffectType
 from config.settings import settings
 from core.tariffs.tariff_service import TariffService
 from core.cache.user_cache import get_user_cache_service
+from core.subscriptions.referral_award import award_referral_point
+from core.payments.side_effects import enqueue_side_effect, kick_side_effects_worker
 
 logger = logging.getLogger(__name__)
 
@@ -30,9 +32,20 @@ class PaymentHandler:
         subscription_type: str,
         discount_percent: int = 0
     ) -> bool:
-        """Process successful payment and activate subscription."""
+        """Process successful payment and activate subscription.
+        
+        Идемпотентно по payment_id: повторный вызов для уже примененного
+        платежа ничего не меняет и возвращает True.
+        """
         async with AsyncSessionLocal() as session:
             try:
+                # Платеж уже применен (повторная доставка вебхука)
+                existing_query = select(Subscription.id).where(Subscription.payment_id == payment_id).limit(1)
+                existing_result = await session.execute(existing_query)
+                if existing_result.scalar_one_or_none() is not None:
+                    logger.info(f"Payment {payment_id} already applied, skipping")
+                    return True
+                
                 # Find user by telegram_id
                 user_query = select(User).where(User.telegram_id == user_id)
                 user_result = await session.execute(user_query)
@@ -89,48 +102,19 @@ class PaymentHandler:
                 
                 # Начисляем баллы рефереру, если это первая оплата PRO/ULTRA
                 if sub_type in [SubscriptionType.PRO, SubscriptionType.ULTRA]:
-                    await self._award_referral_points(user, session)
+                    await self._award_referral_points(user, session, payment_id)
                 
-                await session.commit()
+                # Побочные эффекты (Telegram) пишем в outbox в той же транзакции -
+                # их выполнит воркер после коммита
+                self._enqueue_side_effects(session, payment_id, user, sub_type, limits)
                 
-                # Разбанить пользователя из VIP группы, если он был удален ранее
-                # Это позволит ему снова войти по ссылке после обновления подписки
-                if sub_type in [SubscriptionType.PRO, SubscriptionType.ULTRA]:
-                    try:
-                        from aiogram import Bot
-                        from config.settings import settings
-                        from core.vip_group.vip_group_service import VIPGroupService
-                        
-                        bot = Bot(token=settings.bot_token)
-                        vip_service = VIPGroupService()
-                        await vip_service.unban_user_from_group(bot, user.telegram_id)
-                        await bot.session.close()
-                        logger.info(f"Unbanned user {user.telegram_id} from VIP group after subscription upgrade")
-                    except Exception as e:
-                        logger.warning(f"Failed to unban user {user.telegram_id} from VIP group: {e}")
-                        # Не прерываем обработку оплаты, если разбан не удался
+                await session.commit()
                 
                 # Invalidate cache after updating user and limits
                 cache_service = get_user_cache_service()
                 await cache_service.invalidate_user_and_limits(user.telegram_id, user.id)
                 
-                # Refresh user and limits to get latest data
-                await session.refresh(user)
-                await session.refresh(limits)
-                
-                # Send notification about tariff change (except for TEST_PRO and FREE)
-                if sub_type not in [SubscriptionType.TEST_PRO, SubscriptionType.FREE]:
-                    try:
-                        from aiogram import Bot
-                        from config.settings import settings
-                        from core.notifications.tariff_notifications import send_tariff_change_notification
-                        
-                        bot = Bot(token=settings.bot_token)
-                        await send_tariff_change_notification(bot, user, sub_type, limits)
-                        await bot.session.close()
-                    except Exception as e:
-                        print(f"Error sending tariff change notification: {e}")
-                        # Don't fail payment processing if notification fails
+                await kick_side_effects_worker()
                 
                 print(f"Subscription activated for user {user_id}: {sub_type}")
                 return True
@@ -142,6 +126,33 @@ class PaymentHandler:
                 await session.rollback()
                 return False
     
+    def _enqueue_side_effects(
+        self,
+        session: AsyncSession,
+        payment_id: str,
+        user: User,
+        sub_type: SubscriptionType,
+        limits: Limits
+    ):
+        """Write post-payment Telegram actions to the payment_side_effects outbox."""
+        # Разбанить пользователя из VIP группы, если он был удален ранее
+        # Это позволит ему снова войти по ссылке после обновления подписки
+        if sub_type in [SubscriptionType.PRO, SubscriptionType.ULTRA]:
+            enqueue_side_effect(session, payment_id, SideEffectType.VIP_UNBAN, user.telegram_id)
+        
+        # Notification about tariff change (except for TEST_PRO and FREE)
+        if sub_type not in [SubscriptionType.TEST_PRO, SubscriptionType.FREE]:
+            enqueue_side_effect(
+                session, payment_id, SideEffectType.TARIFF_NOTIFICATION, user.telegram_id,
+                {
+                    'subscription_type': sub_type.value,
+                    'analytics_used': limits.analytics_used or 0,
+                    'analytics_total': limits.analytics_total or 0,
+                    'themes_used': limits.themes_used or 0,
+                    'themes_total': limits.themes_total or 0,
+                }
+            )
+    
     def _string_to_subscription_type(self, subscription_str: str) -> Optional[SubscriptionType]:
         """Convert string to SubscriptionType enum."""
         mapping = {
@@ -224,54 +235,31 @@ class PaymentHandler:
         - analytics_used и themes_used остаются (история использования)
         - analytics_total и themes_total устанавливаются в FREE-значения
         """
-        expired_count = 0
+        from core.subscriptions.expiry import downgrade_expired_subscriptions
+        
+        expired_users = []
         
         async with AsyncSessionLocal() as session:
             try:
-                # Find expired TEST_PRO/PRO/ULTRA subscriptions
-                expired_users_query = select(User).where(
-                    User.subscription_type.in_([SubscriptionType.TEST_PRO, SubscriptionType.PRO, SubscriptionType.ULTRA]),
-                    User.subscription_expires_at < datetime.utcnow()
+                # Find and downgrade expired TEST_PRO/PRO/ULTRA subscriptions in one pass
+                expired_users = await downgrade_expired_subscriptions(
+                    session,
+                    [SubscriptionType.TEST_PRO, SubscriptionType.PRO, SubscriptionType.ULTRA]
                 )
-                expired_users_result = await session.execute(expired_users_query)
-                expired_users = expired_users_result.scalars().all()
-                
-                for user in expired_users:
-                    # Switch to FREE
-                    user.subscription_type = SubscriptionType.FREE
-                    user.subscription_expires_at = None
-                    
-                    # Update limits to FREE tier (не обнуляем used - это история)
-                    limits_query = select(Limits).where(Limits.user_id == user.id)
-                    limits_result = await session.execute(limits_query)
-                    limits = limits_result.scalar_one_or_none()
-                    
-                    if limits:
-                        tariff_service = TariffService()
-                        free_limits = tariff_service.get_tariff_limits(SubscriptionType.FREE)
-                        limits.analytics_total = free_limits['analytics_limit']
-                        limits.themes_total = free_limits['themes_limit']
-                        # Устанавливаем новую дату начала тарифа (для отсчета 7 дней)
-                        limits.current_tariff_started_at = datetime.utcnow()
-                        limits.theme_cooldown_days = free_limits['theme_cooldown_days']
-                        # analytics_used и themes_used НЕ трогаем - это история
-                    
-                    expired_count += 1
-                
                 await session.commit()
                 
-                # Invalidate cache for all expired users
-                cache_service = get_user_cache_service()
-                for user in expired_users:
-                    await cache_service.invalidate_user_and_limits(user.telegram_id, user.id)
+                # Invalidate cache for all expired users (batched pipeline)
+                if expired_users:
+                    await get_user_cache_service().invalidate_many(expired_users)
                 
-                print(f"Updated {expired_count} expired subscriptions")
+                print(f"Updated {len(expired_users)} expired subscriptions")
                 
             except Exception as e:
                 print(f"Error checking subscription expiry: {e}")
                 await session.rollback()
+                expired_users = []
         
-        return expired_count
+        return len(expired_users)
     
     def get_payment_url(self, subscription_type: str, user_id: int) -> str:
         """Generate payment URL for Boosty."""
@@ -284,66 +272,30 @@ class PaymentHandler:
         
         return base_url
     
-    async def _award_referral_points(self, user: User, session: AsyncSession):
+    async def _award_referral_points(self, user: User, session: AsyncSession, payment_id: Optional[str] = None):
         """Award referral points to referrer when user makes first PRO/ULTRA payment."""
         # Проверяем, что у пользователя есть реферер и бонус еще не был выплачен
         if not user.referrer_id or user.referral_bonus_paid:
             return
         
-        # Получаем реферера
-        referrer_query = select(User).where(User.id == user.referrer_id)
-        referrer_result = await session.execute(referrer_query)
-        referrer = referrer_result.scalar_one_or_none()
+        # Атомарно: флаг на реферале + referral_balance + 1 в БД + запись в журнале
+        award = await award_referral_point(session, user.id, payment_id)
+        if award is None:
+            return
         
-        if referrer:
-            # Начисляем 1 IQ Балл рефереру
-            referrer.referral_balance = (referrer.referral_balance or 0) + 1
-            # Отмечаем, что бонус выплачен
-            user.referral_bonus_paid = True
-            
-            # Обновляем баланс в БД перед отправкой уведомления
-            await session.flush()
-            
-            # Invalidate cache for referrer (balance changed)
-            cache_service = get_user_cache_service()
-            await cache_service.invalidate_user(referrer.telegram_id)
-            
-            # Отправляем уведомление рефереру
-            try:
-                from aiogram import Bot
-                from config.settings import settings
-                from bot.lexicon import LEXICON_RU
-                
-                bot = Bot(token=settings.bot_token)
-                
-                # Формируем текст уведомления
-                subscription_type_name = user.subscription_type.value
-                notification_text = LEXICON_RU['referral_points_awarded_notification'].format(
-                    subscription_type=subscription_type_name,
-                    balance=referrer.referral_balance
-                )
-                
-                # Отправляем уведомление
-                await bot.send_message(
-                    chat_id=referrer.telegram_id,
-                    text=notification_text,
-                    parse_mode="HTML"
-                )
-                await bot.session.close()
-                
-                logger.info(f"Sent referral points notification to user {referrer.id} (telegram_id: {referrer.telegram_id})")
-            except Exception as e:
-                # Не прерываем процесс начисления, если уведомление не отправилось
-                logger.warning(f"Failed to send referral points notification to user {referrer.id}: {e}")
-            
-            print(f"✅ Начислен 1 IQ Балл пользователю {referrer.id} (telegram_id: {referrer.telegram_id}) "
-                  f"за реферала {user.id} (telegram_id: {user.telegram_id})")
-            logger.info(f"Awarded 1 referral point to user {referrer.id} for referrer {user.id}")
-        else:
-            # Реферер не найден (возможно, удален), просто отмечаем, что бонус "выплачен"
-            # чтобы не проверять снова
-            user.referral_bonus_paid = True
-            logger.warning(f"Referrer {user.referrer_id} not found for user {user.id}, marking bonus as paid")
+        # Invalidate cache for referrer (balance changed)
+        cache_service = get_user_cache_service()
+        await cache_service.invalidate_user(award.referrer_telegram_id)
+        
+        # Уведомление рефереру отправит воркер после коммита
+        if payment_id:
+            enqueue_side_effect(
+                session, payment_id, SideEffectType.REFERRAL_NOTIFICATION, award.referrer_telegram_id,
+                {'subscription_type': user.subscription_type.value, 'balance': award.referrer_balance}
+            )
+        
+        print(f"✅ Начислен 1 IQ Балл пользователю {award.referrer_id} (telegram_id: {award.referrer_telegram_id}) "
+              f"за реферала {user.id} (telegram_id: {user.telegram_id})")
     
     def get_discount_info(self, user_subscription_type: SubscriptionType) -> Dict[str, Any]:
         """Get discount information for user."""
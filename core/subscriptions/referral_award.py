@@ -0,0 +1,121 @@
+"""Atomic, exactly-once referral point award."""
+
+import logging
+from typing import NamedTuple, Optional
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from core.utils.db import dialect_insert
+from database.models import ReferralAwardLog, User
+
+logger = logging.getLogger(__name__)
+
+REFERRAL_AWARD_POINTS = 1
+
+
+class ReferralAward(NamedTuple):
+    """Result of a successful award."""
+    referrer_id: int
+    referrer_telegram_id: int
+    referrer_balance: int
+
+
+def _claim_bonus_stmt(user_id: int):
+    # Условный UPDATE блокирует строку реферала: из параллельных попыток
+    # флаг переключит только одна, остальные получат 0 строк
+    return (
+        update(User)
+        .where(
+            User.id == user_id,
+            User.referrer_id.isnot(None),
+            User.referral_bonus_paid.is_(False),
+        )
+        .values(referral_bonus_paid=True)
+        .returning(User.referrer_id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _log_award_stmt(session, user_id: int, referrer_id: int, payment_id: Optional[str]):
+    insert = dialect_insert(session)
+    return (
+        insert(ReferralAwardLog)
+        .values(
+            referred_user_id=user_id,
+            referrer_id=referrer_id,
+            points=REFERRAL_AWARD_POINTS,
+            payment_id=payment_id,
+        )
+        .on_conflict_do_nothing(index_elements=['referred_user_id'])
+        .returning(ReferralAwardLog.id)
+    )
+
+
+def _credit_referrer_stmt(referrer_id: int):
+    return (
+        update(User)
+        .where(User.id == referrer_id)
+        .values(referral_balance=User.referral_balance + REFERRAL_AWARD_POINTS)
+        .returning(User.id, User.telegram_id, User.referral_balance)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _award_result(user_id: int, referrer_id: int, row) -> Optional[ReferralAward]:
+    if row is None:
+        # Реферер удален - бонус считается выплаченным, чтобы не проверять снова
+        logger.warning(f"Referrer {referrer_id} not found for user {user_id}, marking bonus as paid")
+        return None
+    logger.info(f"Awarded {REFERRAL_AWARD_POINTS} referral point to user {row.id} for referral {user_id}")
+    return ReferralAward(row.id, row.telegram_id, row.referral_balance)
+
+
+async def award_referral_point(
+    session: AsyncSession,
+    user_id: int,
+    payment_id: Optional[str] = None
+) -> Optional[ReferralAward]:
+    """Award the referrer of user_id once, within the caller's transaction.
+
+    Баланс увеличивается на стороне БД (referral_balance + 1), без чтения
+    в Python. Повторные и параллельные вызовы для того же реферала ничего
+    не начисляют: их отсекает флаг referral_bonus_paid и уникальная запись
+    в referral_award_log. Коммит остается за вызывающим кодом.
+
+    Returns:
+        ReferralAward with the referrer's new balance, or None if nothing was awarded.
+    """
+    referrer_id = (await session.execute(_claim_bonus_stmt(user_id))).scalar_one_or_none()
+    if referrer_id is None:
+        return None
+
+    logged = (await session.execute(
+        _log_award_stmt(session, user_id, referrer_id, payment_id)
+    )).scalar_one_or_none()
+    if logged is None:
+        logger.info(f"Referral bonus for user {user_id} already logged, skipping")
+        return None
+
+    row = (await session.execute(_credit_referrer_stmt(referrer_id))).one_or_none()
+    return _award_result(user_id, referrer_id, row)
+
+
+def award_referral_point_sync(
+    session: Session,
+    user_id: int,
+    payment_id: Optional[str] = None
+) -> Optional[ReferralAward]:
+    """Sync variant of award_referral_point for SessionLocal-based handlers."""
+    referrer_id = session.execute(_claim_bonus_stmt(user_id)).scalar_one_or_none()
+    if referrer_id is None:
+        return None
+
+    logged = session.execute(_log_award_stmt(session, user_id, referrer_id, payment_id)).scalar_one_or_none()
+    if logged is None:
+        logger.info(f"Referral bonus for user {user_id} already logged, skipping")
+        return None
+
+    row = session.execute(_credit_referrer_stmt(referrer_id)).one_or_none()
+    return _award_result(user_id, referrer_id, row)
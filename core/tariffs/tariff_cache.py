@@ -0,0 +1,257 @@
+"""Process-wide in-memory tariff limits table.
+
+Лимиты тарифов меняются несколько раз в год, поэтому таблица загружается
+одним запросом при старте процесса и хранится в памяти как неизменяемый
+снимок. После изменения в админке (TariffService.update_tariff_limits)
+процесс-инициатор перечитывает таблицу и публикует сигнал в Redis, по
+которому остальные процессы (бот, воркеры, админка) перезагружают снимок.
+Поиск лимитов на пути запроса не обращается к БД, пока последняя загрузка
+была успешной; после сбоя загрузка повторяется не чаще раза в
+TARIFF_RELOAD_RETRY_SECONDS.
+"""
+
+import logging
+import threading
+import time
+from types import MappingProxyType
+from typing import Callable, Dict, Mapping, Optional
+
+from sqlalchemy import select
+
+from config.settings import settings
+from database.models.tariff_limits import TariffLimits
+from database.models.user import SubscriptionType
+
+logger = logging.getLogger(__name__)
+
+TARIFF_LIMITS_CHANNEL = "tariff_limits:changed"
+TARIFF_RELOAD_RETRY_SECONDS = 30.0
+
+
+def tariff_limits_from_settings(subscription_type: SubscriptionType) -> Dict[str, int]:
+    """Get limits from settings.py as fallback."""
+    if subscription_type == SubscriptionType.FREE:
+        return {
+            'analytics_limit': settings.free_analytics_limit,
+            'themes_limit': settings.free_themes_limit,
+            'theme_cooldown_days': 7,
+            'test_pro_duration_days': None
+        }
+    elif subscription_type == SubscriptionType.TEST_PRO:
+        return {
+            'analytics_limit': settings.test_pro_analytics_limit,
+            'themes_limit': settings.test_pro_themes_limit,
+            'theme_cooldown_days': 7,
+            'test_pro_duration_days': settings.test_pro_duration_days
+        }
+    elif subscription_type == SubscriptionType.PRO:
+        return {
+            'analytics_limit': settings.pro_analytics_limit,
+            'themes_limit': settings.pro_themes_limit,
+            'theme_cooldown_days': 7,
+            'test_pro_duration_days': None
+        }
+    elif subscription_type == SubscriptionType.ULTRA:
+        return {
+            'analytics_limit': settings.ultra_analytics_limit,
+            'themes_limit': settings.ultra_themes_limit,
+            'theme_cooldown_days': 7,
+            'test_pro_duration_days': None
+        }
+    else:
+        raise ValueError(f"Unknown subscription type: {subscription_type}")
+
+
+def _build_table(rows) -> Mapping[SubscriptionType, Mapping[str, int]]:
+    """Build immutable tariff table from DB rows, filling gaps from settings."""
+    by_type = {row.subscription_type: row for row in rows}
+    table = {}
+    for subscription_type in SubscriptionType:
+        row = by_type.get(subscription_type)
+        if row is not None:
+            limits = {
+                'analytics_limit': row.analytics_limit,
+                'themes_limit': row.themes_limit,
+                'theme_cooldown_days': row.theme_cooldown_days,
+                'test_pro_duration_days': row.test_pro_duration_days
+            }
+        else:
+            logger.info(f"Tariff limits not found in DB for {subscription_type.value}, using settings")
+            limits = tariff_limits_from_settings(subscription_type)
+        table[subscription_type] = MappingProxyType(limits)
+    return MappingProxyType(table)
+
+
+def _settings_table() -> Mapping[SubscriptionType, Mapping[str, int]]:
+    """Build tariff table entirely from settings."""
+    return MappingProxyType({
+        subscription_type: MappingProxyType(tariff_limits_from_settings(subscription_type))
+        for subscription_type in SubscriptionType
+    })
+
+
+class TariffLimitsCache:
+    """Immutable tariff table shared by the whole process."""
+
+    def __init__(self, session_factory=None, async_session_factory=None, redis_client=None,
+                 retry_interval: float = TARIFF_RELOAD_RETRY_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self._session_factory = session_factory
+        self._async_session_factory = async_session_factory
+        self._redis_client = redis_client
+        self._table: Optional[Mapping[SubscriptionType, Mapping[str, int]]] = None
+        # False, если последняя загрузка упала: снимок (или дефолты из settings)
+        # не авторитетен и будет перечитан после _retry_at
+        self._loaded_from_db = False
+        self._retry_at = 0.0
+        self.retry_interval = retry_interval
+        self._clock = clock
+        self._load_lock = threading.Lock()
+        self._listener = None
+
+    @property
+    def session_factory(self):
+        if self._session_factory is None:
+            from config.database import SessionLocal
+            self._session_factory = SessionLocal
+        return self._session_factory
+
+    @property
+    def async_session_factory(self):
+        if self._async_session_factory is None:
+            from config.database import AsyncSessionLocal
+            self._async_session_factory = AsyncSessionLocal
+        return self._async_session_factory
+
+    @property
+    def redis_client(self):
+        if self._redis_client is None:
+            from config.database import redis_client
+            self._redis_client = redis_client
+        return self._redis_client
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._table is not None
+
+    @property
+    def loaded_from_db(self) -> bool:
+        return self._loaded_from_db
+
+    def _on_loaded(self, rows) -> None:
+        self._table = _build_table(rows)
+        self._loaded_from_db = True
+
+    def _on_load_failed(self, error: Exception) -> None:
+        logger.warning(f"Failed to load tariff limits from DB: {error}, using settings")
+        if self._table is None:
+            self._table = _settings_table()
+        self._loaded_from_db = False
+        self._retry_at = self._clock() + self.retry_interval
+
+    def _claim_retry(self) -> bool:
+        """True for one caller per retry_interval while the snapshot is not from DB."""
+        if self._loaded_from_db or self._clock() < self._retry_at:
+            return False
+        # Сдвигаем срок сразу: остальные вызовы до следующего интервала берут текущий снимок
+        self._retry_at = self._clock() + self.retry_interval
+        return True
+
+    def load_sync(self) -> Mapping[SubscriptionType, Mapping[str, int]]:
+        """(Re)load the whole tariff table with a single query."""
+        with self._load_lock:
+            session = self.session_factory()
+            try:
+                self._on_loaded(session.execute(select(TariffLimits)).scalars().all())
+            except Exception as e:
+                self._on_load_failed(e)
+            finally:
+                session.close()
+        return self._table
+
+    async def load(self) -> Mapping[SubscriptionType, Mapping[str, int]]:
+        """Async variant of load_sync() for warm-up in async processes."""
+        try:
+            async with self.async_session_factory() as session:
+                result = await session.execute(select(TariffLimits))
+                self._on_loaded(result.scalars().all())
+        except Exception as e:
+            self._on_load_failed(e)
+        return self._table
+
+    def table(self) -> Mapping[SubscriptionType, Mapping[str, int]]:
+        """Return current snapshot (loaded on first use, retried after a failed load)."""
+        table = self._table
+        if table is None or self._claim_retry():
+            table = self.load_sync()
+        return table
+
+    async def atable(self) -> Mapping[SubscriptionType, Mapping[str, int]]:
+        """Async accessor for the current snapshot."""
+        table = self._table
+        if table is None or self._claim_retry():
+            table = await self.load()
+        return table
+
+    def get(self, subscription_type: SubscriptionType) -> Dict[str, int]:
+        """Get limits for subscription type (copy, safe to mutate)."""
+        return dict(self.table()[subscription_type])
+
+    async def aget(self, subscription_type: SubscriptionType) -> Dict[str, int]:
+        """Async accessor for limits of subscription type."""
+        return dict((await self.atable())[subscription_type])
+
+    def refresh_and_publish(self) -> None:
+        """Reload local snapshot and notify other processes about the change."""
+        self.load_sync()
+        client = self.redis_client
+        if client is None:
+            logger.warning("Redis unavailable - tariff limits change not broadcast to other processes")
+            return
+        try:
+            client.publish(TARIFF_LIMITS_CHANNEL, "reload")
+        except Exception as e:
+            logger.warning(f"Failed to publish tariff limits change: {e}")
+
+    def start_listener(self) -> bool:
+        """Subscribe to change notifications in a background thread."""
+        if self._listener is not None:
+            return True
+        client = self.redis_client
+        if client is None:
+            logger.warning("Redis unavailable - tariff limits will refresh only on restart")
+            return False
+        try:
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{TARIFF_LIMITS_CHANNEL: self._on_message})
+            self._listener = pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+            logger.info("Tariff limits change listener started")
+            return True
+        except Exception as e:
+            logger.warning(f"Failed to start tariff limits listener: {e}")
+            return False
+
+    def stop_listener(self) -> None:
+        """Stop background listener thread."""
+        if self._listener is not None:
+            try:
+                self._listener.stop()
+            except Exception as e:
+                logger.warning(f"Error stopping tariff limits listener: {e}")
+            self._listener = None
+
+    def _on_message(self, message) -> None:
+        logger.info("Tariff limits change received, reloading")
+        self.load_sync()
+
+
+# Global instance
+_tariff_cache: Optional[TariffLimitsCache] = None
+
+
+def get_tariff_cache() -> TariffLimitsCache:
+    """Get global TariffLimitsCache instance."""
+    global _tariff_cache
+    if _tariff_cache is None:
+        _tariff_cache = TariffLimitsCache()
+    return _tariff_cache
@@ -9,6 +9,7 @@ from config.database import SessionLocal
 from config.settings import settings
 from database.models.tariff_limits import TariffLimits
 from database.models.user import SubscriptionType
+from core.tariffs.tariff_cache import TariffLimitsCache, get_tariff_cache, tariff_limits_from_settings
 
 logger = logging.getLogger(__name__)
 
@@ -16,9 +17,10 @@ logger = logging.getLogger(__name__)
 class TariffService:
     """Service for managing tariff limits."""
     
-    def __init__(self, session: Optional[Session] = None):
-        """Initialize tariff service with optional session."""
+    def __init__(self, session: Optional[Session] = None, cache: Optional[TariffLimitsCache] = None):
+        """Initialize tariff service with optional session (used for writes)."""
         self.session = session
+        self.cache = cache or get_tariff_cache()
     
     def _get_session(self) -> Session:
         """Get database session."""
@@ -28,69 +30,20 @@ class TariffService:
     
     def _get_from_settings(self, subscription_type: SubscriptionType) -> Dict[str, int]:
         """Get limits from settings.py as fallback."""
-        if subscription_type == SubscriptionType.FREE:
-            return {
-                'analytics_limit': settings.free_analytics_limit,
-                'themes_limit': settings.free_themes_limit,
-                'theme_cooldown_days': 7,
-                'test_pro_duration_days': None
-            }
-        elif subscription_type == SubscriptionType.TEST_PRO:
-            return {
-                'analytics_limit': settings.test_pro_analytics_limit,
-                'themes_limit': settings.test_pro_themes_limit,
-                'theme_cooldown_days': 7,
-                'test_pro_duration_days': settings.test_pro_duration_days
-            }
-        elif subscription_type == SubscriptionType.PRO:
-            return {
-                'analytics_limit': settings.pro_analytics_limit,
-                'themes_limit': settings.pro_themes_limit,
-                'theme_cooldown_days': 7,
-                'test_pro_duration_days': None
-            }
-        elif subscription_type == SubscriptionType.ULTRA:
-            return {
-                'analytics_limit': settings.ultra_analytics_limit,
-                'themes_limit': settings.ultra_themes_limit,
-                'theme_cooldown_days': 7,
-                'test_pro_duration_days': None
-            }
-        else:
-            raise ValueError(f"Unknown subscription type: {subscription_type}")
+        return tariff_limits_from_settings(subscription_type)
     
     def get_tariff_limits(self, subscription_type: SubscriptionType) -> Dict[str, int]:
-        """Get limits for a subscription type from database or settings."""
-        session = self._get_session()
-        try:
-            stmt = select(TariffLimits).where(TariffLimits.subscription_type == subscription_type)
-            result = session.execute(stmt)
-            tariff_limits = result.scalar_one_or_none()
-            
-            if tariff_limits:
-                return {
-                    'analytics_limit': tariff_limits.analytics_limit,
-                    'themes_limit': tariff_limits.themes_limit,
-                    'theme_cooldown_days': tariff_limits.theme_cooldown_days,
-                    'test_pro_duration_days': tariff_limits.test_pro_duration_days
-                }
-            else:
-                # Fallback to settings
-                logger.info(f"Tariff limits not found in DB for {subscription_type.value}, using settings")
-                return self._get_from_settings(subscription_type)
-        except Exception as e:
-            logger.warning(f"Failed to get tariff limits from DB: {e}, using settings")
-            return self._get_from_settings(subscription_type)
-        finally:
-            if not self.session:
-                session.close()
+        """Get limits for a subscription type from the in-memory tariff table."""
+        return self.cache.get(subscription_type)
+    
+    async def aget_tariff_limits(self, subscription_type: SubscriptionType) -> Dict[str, int]:
+        """Async accessor for limits of a subscription type."""
+        return await self.cache.aget(subscription_type)
     
     def get_all_tariff_limits(self) -> Dict[SubscriptionType, Dict[str, int]]:
         """Get limits for all subscription types."""
-        result = {}
-        for subscription_type in SubscriptionType:
-            result[subscription_type] = self.get_tariff_limits(subscription_type)
-        return result
+        table = self.cache.table()
+        return {subscription_type: dict(limits) for subscription_type, limits in table.items()}
     
     def update_tariff_limits(
         self,
@@ -127,7 +80,6 @@ class TariffService:
             
             session.commit()
             logger.info(f"Updated tariff limits for {subscription_type.value}")
-            return True
         except Exception as e:
             logger.error(f"Failed to update tariff limits: {e}")
             session.rollback()
@@ -135,6 +87,10 @@ class TariffService:
         finally:
             if not self.session:
                 session.close()
+        
+        # Обновляем таблицу в памяти и оповещаем остальные процессы
+        self.cache.refresh_and_publish()
+        return True
     
     def get_analytics_limit(self, subscription_type: SubscriptionType) -> int:
         """Get analytics limit for subscription type."""
@@ -0,0 +1,70 @@
+"""Per-user theme issuance counters (user_theme_stats)."""
+
+import logging
+from datetime import datetime
+from typing import Optional
+
+import redis
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config.database import redis_client
+from core.cache.tagged_keys import invalidate_tag
+from core.utils.db import dialect_insert
+from database.models import UserThemeStats
+
+logger = logging.getLogger(__name__)
+
+# Страницы каталога тем с числом выдач в админке (короткий TTL + сброс при выдаче)
+THEMES_USAGE_CACHE_TAG = "admin:themes_usage"
+THEMES_USAGE_CACHE_TTL = 60
+
+
+def count_themes(theme_name: Optional[str]) -> int:
+    """Count themes in ThemeRequest.theme_name (one theme per line)."""
+    if not theme_name:
+        return 0
+    return len([t for t in theme_name.split('\n') if t.strip()])
+
+
+async def record_theme_issue(
+    session: AsyncSession,
+    user_id: int,
+    themes_count: int,
+    issued_at: Optional[datetime] = None
+) -> None:
+    """Add one issued request to user's stats.
+    
+    Должно выполняться в той же транзакции, что и создание ThemeRequest
+    (коммит остается за вызывающим кодом).
+    """
+    issued_at = issued_at or datetime.utcnow()
+    insert = dialect_insert(session)
+    stmt = insert(UserThemeStats).values(
+        user_id=user_id,
+        issued_count=themes_count,
+        requests_count=1,
+        last_issued_at=issued_at,
+        updated_at=issued_at
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UserThemeStats.user_id],
+        set_={
+            'issued_count': UserThemeStats.issued_count + stmt.excluded.issued_count,
+            'requests_count': UserThemeStats.requests_count + 1,
+            'last_issued_at': stmt.excluded.last_issued_at,
+            'updated_at': stmt.excluded.updated_at,
+        }
+    )
+    await session.execute(stmt)
+
+
+def invalidate_themes_usage_cache(client: Optional[redis.Redis] = None) -> int:
+    """Drop cached admin theme usage pages (вызывать после коммита выдачи тем)."""
+    client = client or redis_client
+    if client is None:
+        return 0
+    try:
+        return invalidate_tag(client, THEMES_USAGE_CACHE_TAG)
+    except Exception as e:
+        logger.warning(f"Failed to invalidate themes usage cache: {e}")
+        return 0
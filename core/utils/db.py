@@ -0,0 +1,13 @@
+"""Dialect helpers shared by set-based database code."""
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+
+def dialect_insert(session):
+    """Return dialect-specific insert() that supports ON CONFLICT.
+
+    Работает и с Session, и с AsyncSession: в проде PostgreSQL, в тестах SQLite.
+    """
+    if session.get_bind().dialect.name == "postgresql":
+        return postgresql.insert
+    return sqlite.insert
@@ -1,6 +1,7 @@
 """VIP Group management module."""
 
 from .vip_group_service import VIPGroupService
+from .whitelist_import import WhitelistImportResult, import_whitelist_csv
 
-__all__ = ["VIPGroupService"]
+__all__ = ["VIPGroupService", "WhitelistImportResult", "import_whitelist_csv"]
 
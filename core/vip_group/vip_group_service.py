@@ -16,6 +16,12 @@ from database.models.vip_group_member import VIPGroupMember, VIPGroupMemberStatu
 logger = logging.getLogger(__name__)
 
 
+def is_not_banned_error(error: TelegramAPIError) -> bool:
+    """Telegram answers unban for a user that is not banned / not in chat with an error."""
+    message = str(error).lower()
+    return "user not found" in message or "not banned" in message
+
+
 class VIPGroupService:
     """Service for managing VIP group access control."""
     
@@ -192,7 +198,7 @@ class VIPGroupService:
             logger.info(f"Successfully unbanned user {telegram_id} from VIP group")
             return True
         except TelegramAPIError as e:
-            if "user not found" in str(e).lower() or "not banned" in str(e).lower():
+            if is_not_banned_error(e):
                 logger.debug(f"User {telegram_id} is not banned in VIP group")
             else:
                 logger.error(f"Error unbanning user {telegram_id} from VIP group: {e}")
@@ -0,0 +1,141 @@
+"""Bulk import of VIP group whitelist from CSV."""
+
+import csv
+import io
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.utils.db import dialect_insert
+from database.models.vip_group_whitelist import VIPGroupWhitelist
+
+logger = logging.getLogger(__name__)
+
+IMPORT_CHUNK_SIZE = 1000
+ID_COLUMNS = ['ID', 'id', 'telegram_id', 'Telegram ID', 'user_id']
+
+
+@dataclass
+class WhitelistImportResult:
+    """Counts of whitelist CSV import."""
+    inserted: int = 0
+    updated: int = 0
+    skipped: int = 0
+    errors: List[str] = field(default_factory=list)
+
+
+def _clean_value(value) -> Optional[str]:
+    """Clean and normalize CSV value."""
+    if value is None:
+        return None
+    value_str = str(value).strip()
+    return value_str if value_str else None
+
+
+def _parse_telegram_id(row: Dict[str, str]) -> Optional[int]:
+    for col_name in ID_COLUMNS:
+        value = _clean_value(row.get(col_name))
+        if value:
+            try:
+                return int(value)
+            except (ValueError, TypeError):
+                continue
+    return None
+
+
+def parse_whitelist_csv(csv_text: str) -> Tuple[Dict[int, Dict[str, Optional[str]]], WhitelistImportResult]:
+    """Parse and validate CSV in one pass.
+
+    Returns rows keyed by telegram_id (first occurrence wins, повторы
+    считаются пропущенными) and result with skipped count and errors.
+    """
+    result = WhitelistImportResult()
+    rows: Dict[int, Dict[str, Optional[str]]] = {}
+
+    for row_num, row in enumerate(csv.DictReader(io.StringIO(csv_text)), start=2):  # header is row 1
+        # Skip empty rows
+        if not row or not any(row.values()):
+            continue
+
+        telegram_id = _parse_telegram_id(row)
+        if not telegram_id:
+            result.errors.append(f"Row {row_num}: No valid ID found (skipped)")
+            result.skipped += 1
+            continue
+
+        if telegram_id in rows:
+            result.skipped += 1
+            continue
+
+        rows[telegram_id] = {
+            'username': _clean_value(row.get('Username') or row.get('username')),
+            'first_name': _clean_value(row.get('First Name') or row.get('first_name')),
+        }
+
+    return rows, result
+
+
+async def upsert_whitelist_rows(
+    session: AsyncSession,
+    rows: Dict[int, Dict[str, Optional[str]]],
+    added_by: str,
+    chunk_size: int = IMPORT_CHUNK_SIZE
+) -> Tuple[int, int]:
+    """Write rows with INSERT ... ON CONFLICT DO UPDATE in chunks.
+
+    Для существующих записей обновляются только непустые username/first_name,
+    note/added_by/added_at остаются от первого добавления. Коммит - за вызывающим.
+    Returns (inserted, updated).
+    """
+    insert = dialect_insert(session)
+    now = datetime.utcnow()
+    note = f"Imported from CSV on {now.strftime('%Y-%m-%d %H:%M:%S')}"
+    telegram_ids = list(rows)
+    inserted = updated = 0
+
+    for start in range(0, len(telegram_ids), chunk_size):
+        chunk = telegram_ids[start:start + chunk_size]
+
+        existing = (await session.execute(
+            select(func.count()).select_from(VIPGroupWhitelist).where(VIPGroupWhitelist.telegram_id.in_(chunk))
+        )).scalar_one()
+
+        stmt = insert(VIPGroupWhitelist).values([
+            {
+                'telegram_id': telegram_id,
+                'username': rows[telegram_id]['username'],
+                'first_name': rows[telegram_id]['first_name'],
+                'note': note,
+                'added_at': now,
+                'added_by': added_by,
+            }
+            for telegram_id in chunk
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[VIPGroupWhitelist.telegram_id],
+            set_={
+                'username': func.coalesce(stmt.excluded.username, VIPGroupWhitelist.username),
+                'first_name': func.coalesce(stmt.excluded.first_name, VIPGroupWhitelist.first_name),
+            }
+        )
+        await session.execute(stmt)
+
+        updated += existing
+        inserted += len(chunk) - existing
+
+    return inserted, updated
+
+
+async def import_whitelist_csv(session: AsyncSession, csv_text: str, added_by: str) -> WhitelistImportResult:
+    """Parse CSV and bulk upsert whitelist entries (caller commits)."""
+    rows, result = parse_whitelist_csv(csv_text)
+    if rows:
+        result.inserted, result.updated = await upsert_whitelist_rows(session, rows, added_by)
+    logger.info(
+        f"Whitelist CSV import: inserted={result.inserted}, updated={result.updated}, skipped={result.skipped}"
+    )
+    return result
@@ -0,0 +1,63 @@
+"""add payment_webhook_events inbox table
+
+Revision ID: 1c2d3e4f5a61
+Revises: b2556601ee4c
+Create Date: 2025-11-20 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1c2d3e4f5a61'
+down_revision: Union[str, None] = 'b2556601ee4c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Create payment_webhook_events table
+    op.create_table(
+        'payment_webhook_events',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('provider', sa.String(length=32), nullable=False),
+        sa.Column('event_id', sa.String(length=255), nullable=False),
+        sa.Column('event_name', sa.String(length=100), nullable=True),
+        sa.Column('payment_id', sa.String(length=255), nullable=True),
+        sa.Column('telegram_user_id', sa.BigInteger(), nullable=True),
+        sa.Column('subscription_type', sa.String(length=50), nullable=True),
+        sa.Column('amount', sa.Numeric(precision=10, scale=2), nullable=True),
+        sa.Column('discount_percent', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False, server_default='PENDING'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_error', sa.String(length=500), nullable=True),
+        sa.Column('received_at', sa.DateTime(), nullable=False),
+        sa.Column('available_at', sa.DateTime(), nullable=False),
+        sa.Column('locked_at', sa.DateTime(), nullable=True),
+        sa.Column('processed_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('provider', 'event_id', name='uq_payment_webhook_event')
+    )
+
+    # Create indexes
+    op.create_index('ix_payment_webhook_events_id', 'payment_webhook_events', ['id'], unique=False)
+    op.create_index('ix_payment_webhook_events_telegram_user_id', 'payment_webhook_events', ['telegram_user_id'], unique=False)
+    op.create_index('idx_payment_webhook_status_available', 'payment_webhook_events', ['status', 'available_at'], unique=False)
+
+    # Index for idempotency check on payment_id
+    op.create_index('ix_subscriptions_payment_id', 'subscriptions', ['payment_id'], unique=False)
+
+
+def downgrade() -> None:
+    # Drop indexes
+    op.drop_index('ix_subscriptions_payment_id', table_name='subscriptions')
+    op.drop_index('idx_payment_webhook_status_available', table_name='payment_webhook_events')
+    op.drop_index('ix_payment_webhook_events_telegram_user_id', table_name='payment_webhook_events')
+    op.drop_index('ix_payment_webhook_events_id', table_name='payment_webhook_events')
+
+    # Drop table
+    op.drop_table('payment_webhook_events')
@@ -0,0 +1,42 @@
+"""add covering indexes for analytics report index
+
+Revision ID: 2d3e4f5a6b72
+Revises: 1c2d3e4f5a61
+Create Date: 2025-11-21 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2d3e4f5a6b72'
+down_revision: Union[str, None] = '1c2d3e4f5a61'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Completed analyses of user
+    op.create_index(
+        'idx_csv_user_status',
+        'csv_analyses',
+        ['user_id', 'status'],
+        unique=False,
+        postgresql_include=['id']
+    )
+
+    # Report navigation without reading report_text_html
+    op.create_index(
+        'idx_analytics_reports_analysis_created',
+        'analytics_reports',
+        ['csv_analysis_id', 'created_at'],
+        unique=False,
+        postgresql_include=['id', 'period_human_ru']
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_analytics_reports_analysis_created', table_name='analytics_reports')
+    op.drop_index('idx_csv_user_status', table_name='csv_analyses')
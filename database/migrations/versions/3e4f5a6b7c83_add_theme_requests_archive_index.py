@@ -0,0 +1,32 @@
+"""add theme_requests archive index
+
+Revision ID: 3e4f5a6b7c83
+Revises: 2d3e4f5a6b72
+Create Date: 2025-11-22 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3e4f5a6b7c83'
+down_revision: Union[str, None] = '2d3e4f5a6b72'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Keyset pagination of user's themes archive (newest first)
+    op.create_index(
+        'idx_theme_requests_user_status_created',
+        'theme_requests',
+        ['user_id', 'status', sa.text('created_at DESC'), sa.text('id DESC')],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_theme_requests_user_status_created', table_name='theme_requests')
@@ -0,0 +1,51 @@
+"""add user_theme_stats table
+
+Revision ID: 4f5a6b7c8d94
+Revises: 3e4f5a6b7c83
+Create Date: 2025-11-23 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4f5a6b7c8d94'
+down_revision: Union[str, None] = '3e4f5a6b7c83'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Create user_theme_stats table
+    op.create_table(
+        'user_theme_stats',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('issued_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('requests_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_issued_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id')
+    )
+
+    # Backfill from existing issued theme requests (one theme per line of theme_name)
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("""
+            INSERT INTO user_theme_stats (user_id, issued_count, requests_count, last_issued_at, updated_at)
+            SELECT tr.user_id, SUM(lines.cnt), COUNT(*), MAX(tr.created_at), NOW()
+            FROM theme_requests tr
+            CROSS JOIN LATERAL (
+                SELECT COUNT(*) AS cnt
+                FROM regexp_split_to_table(COALESCE(tr.theme_name, ''), E'\\n') AS line
+                WHERE btrim(line) <> ''
+            ) lines
+            WHERE tr.status = 'ISSUED'
+            GROUP BY tr.user_id
+        """)
+
+
+def downgrade() -> None:
+    op.drop_table('user_theme_stats')
@@ -0,0 +1,44 @@
+"""add theme_trend_snapshot table
+
+Revision ID: 5a6b7c8d9ea5
+Revises: 4f5a6b7c8d94
+Create Date: 2025-11-24 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5a6b7c8d9ea5'
+down_revision: Union[str, None] = '4f5a6b7c8d94'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Create theme_trend_snapshot table
+    op.create_table(
+        'theme_trend_snapshot',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('period', sa.String(length=16), nullable=False),
+        sa.Column('theme_id', sa.Integer(), nullable=False),
+        sa.Column('theme_name', sa.String(length=255), nullable=False),
+        sa.Column('usage_count', sa.Integer(), nullable=False),
+        sa.Column('growth_rate', sa.Float(), nullable=False),
+        sa.Column('trend_score', sa.Float(), nullable=False),
+        sa.Column('sales_rank', sa.Integer(), nullable=False),
+        sa.Column('last_updated', sa.DateTime(), nullable=True),
+        sa.Column('computed_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['theme_id'], ['global_themes.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('period', 'theme_id', name='uq_theme_trend_snapshot_period_theme')
+    )
+    op.create_index('idx_theme_trend_snapshot_period_rank', 'theme_trend_snapshot', ['period', 'sales_rank'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_theme_trend_snapshot_period_rank', table_name='theme_trend_snapshot')
+    op.drop_table('theme_trend_snapshot')
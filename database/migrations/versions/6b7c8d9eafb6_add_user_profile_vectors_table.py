@@ -0,0 +1,37 @@
+"""add user_profile_vectors table
+
+Revision ID: 6b7c8d9eafb6
+Revises: 5a6b7c8d9ea5
+Create Date: 2025-11-25 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6b7c8d9eafb6'
+down_revision: Union[str, None] = '5a6b7c8d9ea5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Create user_profile_vectors table (заполняется после CSV анализов)
+    op.create_table(
+        'user_profile_vectors',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('vector', sa.LargeBinary(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('total_analyses', sa.Integer(), nullable=False),
+        sa.Column('successful_themes', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('user_profile_vectors')
@@ -0,0 +1,42 @@
+"""add daily_metrics table
+
+Revision ID: 7c8d9eafb0c7
+Revises: 6b7c8d9eafb6
+Create Date: 2025-11-26 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c8d9eafb0c7'
+down_revision: Union[str, None] = '6b7c8d9eafb6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Create daily_metrics rollup table (заполняется задачей refresh_daily_metrics)
+    op.create_table(
+        'daily_metrics',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('new_users', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('paid_converted', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('test_pro_to_pro', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('test_pro_to_ultra', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('test_pro_to_free', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('free_to_paid', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('pro_expired', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('pro_churned', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('ultra_expired', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('ultra_churned', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('computed_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('day')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('daily_metrics')
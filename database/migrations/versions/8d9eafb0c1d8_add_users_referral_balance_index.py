@@ -0,0 +1,26 @@
+"""add users (referral_balance, id) index
+
+Revision ID: 8d9eafb0c1d8
+Revises: 7c8d9eafb0c7
+Create Date: 2025-11-27 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d9eafb0c1d8'
+down_revision: Union[str, None] = '7c8d9eafb0c7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Keyset-пагинация страницы /referral по (referral_balance, id)
+    op.create_index('idx_users_referral_balance_id', 'users', ['referral_balance', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_users_referral_balance_id', table_name='users')
@@ -0,0 +1,50 @@
+"""add referral_award_log table
+
+Revision ID: 9e0fb1c2d3e9
+Revises: 8d9eafb0c1d8
+Create Date: 2025-11-28 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e0fb1c2d3e9'
+down_revision: Union[str, None] = '8d9eafb0c1d8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Журнал начислений реферальных баллов (не более одного на реферала)
+    op.create_table(
+        'referral_award_log',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('referred_user_id', sa.Integer(), nullable=False),
+        sa.Column('referrer_id', sa.Integer(), nullable=False),
+        sa.Column('points', sa.Integer(), nullable=False, server_default='1'),
+        sa.Column('payment_id', sa.String(length=255), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['referred_user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('referred_user_id', name='uq_referral_award_referred_user')
+    )
+    op.create_index('ix_referral_award_log_referrer_id', 'referral_award_log', ['referrer_id'], unique=False)
+
+    # Уже выплаченные бонусы попадают в журнал, чтобы сброс флага не привел к повторному начислению
+    op.execute(
+        """
+        INSERT INTO referral_award_log (referred_user_id, referrer_id, points, created_at)
+        SELECT id, referrer_id, 1, CURRENT_TIMESTAMP
+        FROM users
+        WHERE referral_bonus_paid = true AND referrer_id IS NOT NULL
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_referral_award_log_referrer_id', table_name='referral_award_log')
+    op.drop_table('referral_award_log')
@@ -0,0 +1,49 @@
+"""add payment_side_effects outbox table
+
+Revision ID: a0f1c2d3e4fa
+Revises: 9e0fb1c2d3e9
+Create Date: 2025-11-29 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a0f1c2d3e4fa'
+down_revision: Union[str, None] = '9e0fb1c2d3e9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Create payment_side_effects outbox table
+    op.create_table(
+        'payment_side_effects',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('payment_id', sa.String(length=255), nullable=False),
+        sa.Column('effect_type', sa.String(length=32), nullable=False),
+        sa.Column('telegram_user_id', sa.BigInteger(), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False, server_default='{}'),
+        sa.Column('status', sa.String(length=20), nullable=False, server_default='PENDING'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_error', sa.String(length=500), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('available_at', sa.DateTime(), nullable=False),
+        sa.Column('locked_at', sa.DateTime(), nullable=True),
+        sa.Column('sent_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('payment_id', 'effect_type', name='uq_payment_side_effect')
+    )
+
+    # Create indexes
+    op.create_index(
+        'idx_payment_side_effects_status_available', 'payment_side_effects', ['status', 'available_at'], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_payment_side_effects_status_available', table_name='payment_side_effects')
+    op.drop_table('payment_side_effects')
@@ -23,6 +23,13 @@ from .tariff_limits import TariffLimits
 from .referral_reward import ReferralReward, RewardType
 from .vip_group_whitelist import VIPGroupWhitelist
 from .vip_group_member import VIPGroupMember, VIPGroupMemberStatus
+from .payment_webhook_event import PaymentWebhookEvent, WebhookEventStatus
+from .user_theme_stats import UserThemeStats
+from .theme_trend_snapshot import ThemeTrendSnapshot
+from .user_profile_vector import UserProfileVector
+from .daily_metrics import DailyMetrics
+from .referral_award_log import ReferralAwardLog
+from .payment_side_effect import PaymentSideEffect, SideEffectType, SideEffectStatus
 
 __all__ = [
     "Base",
@@ -55,4 +62,14 @@ __all__ = [
     "VIPGroupWhitelist",
     "VIPGroupMember",
     "VIPGroupMemberStatus",
+    "PaymentWebhookEvent",
+    "WebhookEventStatus",
+    "UserThemeStats",
+    "ThemeTrendSnapshot",
+    "UserProfileVector",
+    "DailyMetrics",
+    "ReferralAwardLog",
+    "PaymentSideEffect",
+    "SideEffectType",
+    "SideEffectStatus",
 ]
\ No newline at end of file
@@ -1,7 +1,7 @@
 """Analytics Report model."""
 
 from datetime import datetime
-from sqlalchemy import DateTime, ForeignKey, Integer, Numeric, String, Text
+from sqlalchemy import DateTime, ForeignKey, Index, Integer, Numeric, String, Text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from config.database import Base
@@ -35,5 +35,14 @@ class AnalyticsReport(Base):
     # Relationships
     csv_analysis: Mapped["CSVAnalysis"] = relationship(back_populates="analytics_report")
     
+    __table_args__ = (
+        # Покрывающий индекс для навигации по отчетам (без чтения report_text_html)
+        Index(
+            'idx_analytics_reports_analysis_created',
+            'csv_analysis_id', 'created_at',
+            postgresql_include=['id', 'period_human_ru']
+        ),
+    )
+    
     def __repr__(self):
         return f"<AnalyticsReport(id={self.id}, csv_analysis_id={self.csv_analysis_id})>"
@@ -65,6 +65,11 @@ class CSVAnalysis(Base):
         uselist=False
     )
     
+    __table_args__ = (
+        # Завершенные анализы пользователя (индекс отчетов)
+        Index('idx_csv_user_status', 'user_id', 'status', postgresql_include=['id']),
+    )
+    
     def __repr__(self):
         return f"<CSVAnalysis(id={self.id}, user_id={self.user_id}, status={self.status})>"
 
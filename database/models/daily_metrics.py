@@ -0,0 +1,41 @@
+"""Daily metrics rollup model."""
+
+from datetime import date, datetime
+from sqlalchemy import Date, DateTime, Integer
+from sqlalchemy.orm import Mapped, mapped_column
+
+from config.database import Base
+
+
+class DailyMetrics(Base):
+    """Per-day user and subscription counters for admin dashboard.
+    
+    Одна строка на UTC-день. Заполняется фоновой задачей от водяного знака
+    (последнего сохраненного дня); дашборд и месячные метрики суммируют
+    строки вместо пересчета по users/subscriptions.
+    """
+    
+    __tablename__ = "daily_metrics"
+    
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    
+    # Регистрации за день
+    new_users: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # Пользователи, которые в этот день стали платящими (max(регистрация, первая оплата))
+    paid_converted: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    
+    test_pro_to_pro: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    test_pro_to_ultra: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    test_pro_to_free: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    free_to_paid: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    
+    # Платные подписки, истекшие в этот день, и сколько из них не продлено
+    pro_expired: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    pro_churned: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    ultra_expired: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    ultra_churned: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    
+    computed_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    
+    def __repr__(self):
+        return f"<DailyMetrics(day={self.day}, new_users={self.new_users})>"
@@ -0,0 +1,63 @@
+"""Payment side-effect outbox model."""
+
+from datetime import datetime
+from enum import Enum
+from sqlalchemy import BigInteger, DateTime, Integer, String, Text, Index, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+
+from config.database import Base
+from database.models.user import utc_now
+
+
+class SideEffectType(str, Enum):
+    """Kind of post-payment action."""
+    VIP_UNBAN = "VIP_UNBAN"  # Разбан в VIP группе после оплаты PRO/ULTRA
+    TARIFF_NOTIFICATION = "TARIFF_NOTIFICATION"  # Сообщение о смене тарифа и лимитах
+    REFERRAL_NOTIFICATION = "REFERRAL_NOTIFICATION"  # Сообщение рефереру о начисленном балле
+
+
+class SideEffectStatus(str, Enum):
+    """Delivery status of an outbox row."""
+    PENDING = "PENDING"  # Ожидает отправки (или повтора после available_at)
+    PROCESSING = "PROCESSING"  # Захвачено воркером
+    SENT = "SENT"  # Выполнено
+    FAILED = "FAILED"  # Постоянная ошибка или исчерпаны попытки
+
+
+class PaymentSideEffect(Base):
+    """Outbox of Telegram actions to perform after a payment is committed.
+
+    Строки пишутся в той же транзакции, что и подписка: если транзакция
+    откатилась, побочных эффектов нет; если закоммитилась - они будут
+    выполнены воркером даже после падения процесса. Уникальный ключ
+    payment_id + effect_type исключает дубли при повторной обработке платежа.
+    """
+
+    __tablename__ = "payment_side_effects"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    payment_id: Mapped[str] = mapped_column(String(255), nullable=False)
+    effect_type: Mapped[str] = mapped_column(String(32), nullable=False)
+    telegram_user_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    # JSON с данными, нужными для отправки (снимок на момент оплаты)
+    payload: Mapped[str] = mapped_column(Text, nullable=False, default="{}")
+
+    status: Mapped[str] = mapped_column(String(20), default=SideEffectStatus.PENDING.value, nullable=False)
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    last_error: Mapped[str] = mapped_column(String(500), nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=utc_now, nullable=False)
+    available_at: Mapped[datetime] = mapped_column(DateTime, default=utc_now, nullable=False)
+    locked_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    sent_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint('payment_id', 'effect_type', name='uq_payment_side_effect'),
+        Index('idx_payment_side_effects_status_available', 'status', 'available_at'),
+    )
+
+    def __repr__(self):
+        return (
+            f"<PaymentSideEffect(id={self.id}, payment_id={self.payment_id}, "
+            f"effect_type={self.effect_type}, status={self.status})>"
+        )
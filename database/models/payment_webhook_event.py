@@ -0,0 +1,63 @@
+"""Payment webhook inbox model."""
+
+from datetime import datetime
+from enum import Enum
+from sqlalchemy import BigInteger, DateTime, Integer, Numeric, String, Text, Index, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+
+from config.database import Base
+from database.models.user import utc_now
+
+
+class WebhookEventStatus(str, Enum):
+    """Processing status of an inbox event."""
+    PENDING = "PENDING"  # Принято, ожидает обработки
+    PROCESSING = "PROCESSING"  # Захвачено обработчиком
+    PROCESSED = "PROCESSED"  # Платеж применен (или уже был применен ранее)
+    FAILED = "FAILED"  # Исчерпаны попытки обработки
+    IGNORED = "IGNORED"  # Событие не требует обработки (неизвестный тип, неполные данные)
+
+
+class PaymentWebhookEvent(Base):
+    """Durable inbox of payment provider webhook events.
+
+    Каждое событие записывается один раз (уникальный ключ provider + event_id),
+    поэтому повторные доставки от провайдера не приводят к повторной активации.
+    """
+
+    __tablename__ = "payment_webhook_events"
+
+    id: Mapped[int] = mapped_column(primary_key=True, index=True)
+    provider: Mapped[str] = mapped_column(String(32), nullable=False)
+    event_id: Mapped[str] = mapped_column(String(255), nullable=False)
+    event_name: Mapped[str] = mapped_column(String(100), nullable=True)
+
+    # Нормализованные данные платежа (заполняются при приеме вебхука)
+    payment_id: Mapped[str] = mapped_column(String(255), nullable=True)
+    telegram_user_id: Mapped[int] = mapped_column(BigInteger, nullable=True, index=True)
+    subscription_type: Mapped[str] = mapped_column(String(50), nullable=True)
+    amount: Mapped[float] = mapped_column(Numeric(10, 2), nullable=True)
+    discount_percent: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+    # Исходное тело вебхука (для аудита и ручного разбора)
+    payload: Mapped[str] = mapped_column(Text, nullable=False)
+
+    status: Mapped[str] = mapped_column(String(20), default=WebhookEventStatus.PENDING.value, nullable=False)
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    last_error: Mapped[str] = mapped_column(String(500), nullable=True)
+
+    received_at: Mapped[datetime] = mapped_column(DateTime, default=utc_now, nullable=False)
+    available_at: Mapped[datetime] = mapped_column(DateTime, default=utc_now, nullable=False)
+    locked_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    processed_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint('provider', 'event_id', name='uq_payment_webhook_event'),
+        Index('idx_payment_webhook_status_available', 'status', 'available_at'),
+    )
+
+    def __repr__(self):
+        return (
+            f"<PaymentWebhookEvent(id={self.id}, provider={self.provider}, "
+            f"event_id={self.event_id}, status={self.status})>"
+        )
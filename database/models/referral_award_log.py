@@ -0,0 +1,36 @@
+"""Referral award log model."""
+
+from datetime import datetime
+from sqlalchemy import DateTime, ForeignKey, Integer, String, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+
+from config.database import Base
+from database.models.user import utc_now
+
+
+class ReferralAwardLog(Base):
+    """One row per referred user whose first payment earned the referrer a point.
+
+    Уникальный ключ по referred_user_id гарантирует, что бонус за одного
+    реферала начисляется ровно один раз, даже если флаг referral_bonus_paid
+    был сброшен вручную или платежные вебхуки пришли одновременно.
+    """
+
+    __tablename__ = "referral_award_log"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    referred_user_id: Mapped[int] = mapped_column(ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    referrer_id: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
+    points: Mapped[int] = mapped_column(Integer, default=1, nullable=False)
+    payment_id: Mapped[str] = mapped_column(String(255), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=utc_now, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint('referred_user_id', name='uq_referral_award_referred_user'),
+    )
+
+    def __repr__(self):
+        return (
+            f"<ReferralAwardLog(referred_user_id={self.referred_user_id}, "
+            f"referrer_id={self.referrer_id}, points={self.points})>"
+        )
@@ -28,7 +28,7 @@ class Subscription(Base):
     started_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
     
-    payment_id: Mapped[str] = mapped_column(String(255), nullable=True)
+    payment_id: Mapped[str] = mapped_column(String(255), nullable=True, index=True)
     amount: Mapped[float] = mapped_column(Numeric(10, 2), nullable=True)
     discount_percent: Mapped[int] = mapped_column(default=0)
     
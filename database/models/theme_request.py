@@ -1,7 +1,7 @@
 """Theme Request model."""
 
 from datetime import datetime
-from sqlalchemy import DateTime, ForeignKey, Integer, String
+from sqlalchemy import DateTime, ForeignKey, Index, Integer, String, desc
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from config.database import Base
@@ -23,5 +23,10 @@ class ThemeRequest(Base):
     # Relationships
     user: Mapped["User"] = relationship(back_populates="theme_requests")
     
+    __table_args__ = (
+        # Архив тем пользователя: keyset-пагинация от новых к старым
+        Index('idx_theme_requests_user_status_created', 'user_id', 'status', desc('created_at'), desc('id')),
+    )
+    
     def __repr__(self):
         return f"<ThemeRequest(id={self.id}, user_id={self.user_id}, theme_name='{self.theme_name}', status='{self.status}')>"
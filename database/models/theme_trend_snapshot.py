@@ -0,0 +1,39 @@
+"""Theme trend snapshot model."""
+
+from datetime import datetime
+from sqlalchemy import DateTime, Float, ForeignKey, Index, Integer, String, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+
+from config.database import Base
+
+
+class ThemeTrendSnapshot(Base):
+    """Precomputed trending themes per period (week/month/quarter).
+    
+    Пересчитывается фоновым актором одним INSERT ... SELECT на период;
+    MarketAnalyzer.get_trending_themes читает отсюда готовые строки.
+    """
+    
+    __tablename__ = "theme_trend_snapshot"
+    
+    id: Mapped[int] = mapped_column(primary_key=True)
+    period: Mapped[str] = mapped_column(String(16), nullable=False)
+    theme_id: Mapped[int] = mapped_column(ForeignKey("global_themes.id", ondelete="CASCADE"), nullable=False)
+    theme_name: Mapped[str] = mapped_column(String(255), nullable=False)
+    
+    usage_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    growth_rate: Mapped[float] = mapped_column(Float, nullable=False, default=0)
+    trend_score: Mapped[float] = mapped_column(Float, nullable=False, default=0)
+    # Позиция темы по total_sales внутри периода (1 = больше всего продаж)
+    sales_rank: Mapped[int] = mapped_column(Integer, nullable=False)
+    
+    last_updated: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    computed_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    
+    __table_args__ = (
+        UniqueConstraint('period', 'theme_id', name='uq_theme_trend_snapshot_period_theme'),
+        Index('idx_theme_trend_snapshot_period_rank', 'period', 'sales_rank'),
+    )
+    
+    def __repr__(self):
+        return f"<ThemeTrendSnapshot(period={self.period}, theme={self.theme_name}, rank={self.sales_rank})>"
@@ -65,6 +65,11 @@ class User(Base):
     )
     referral_balance: Mapped[int] = mapped_column(Integer, server_default='0')
     referral_bonus_paid: Mapped[bool] = mapped_column(Boolean, server_default='False')
+
+    __table_args__ = (
+        # Keyset-пагинация таблицы рефералов в админке: ORDER BY referral_balance DESC, id DESC
+        Index('idx_users_referral_balance_id', 'referral_balance', 'id'),
+    )
     
     # Relationships with cascade delete
     subscriptions: Mapped[list["Subscription"]] = relationship(
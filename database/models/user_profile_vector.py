@@ -0,0 +1,33 @@
+"""User profile vector model."""
+
+from datetime import datetime
+from sqlalchemy import DateTime, ForeignKey, Integer, LargeBinary
+from sqlalchemy.orm import Mapped, mapped_column
+
+from config.database import Base
+from database.models.user import utc_now
+
+
+class UserProfileVector(Base):
+    """Persisted behavior profile of user as a fixed-length float32 vector.
+    
+    Пересчитывается после каждого CSV анализа (core/ai/profile_vectors.py);
+    поиск похожих пользователей читает только эту таблицу.
+    """
+    
+    __tablename__ = "user_profile_vectors"
+    
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    
+    # L2-нормированный вектор float32 (PROFILE_VECTOR_SIZE значений)
+    vector: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    # Версия раскладки вектора; строки старой версии пересчитываются
+    version: Mapped[int] = mapped_column(Integer, nullable=False)
+    
+    total_analyses: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    successful_themes: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=utc_now, onupdate=utc_now)
+    
+    def __repr__(self):
+        return f"<UserProfileVector(user_id={self.user_id}, version={self.version})>"
@@ -0,0 +1,35 @@
+"""User theme stats model."""
+
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import DateTime, ForeignKey, Integer
+from sqlalchemy.orm import Mapped, mapped_column
+
+from config.database import Base
+from database.models.user import utc_now
+
+
+class UserThemeStats(Base):
+    """Per-user theme issuance counters.
+    
+    Обновляется в той же транзакции, что и выдача тем (ThemeRequest со
+    статусом ISSUED), чтобы админка не пересчитывала историю пользователя.
+    """
+    
+    __tablename__ = "user_theme_stats"
+    
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    
+    # Сколько тем выдано всего (строк в ThemeRequest.theme_name)
+    issued_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default='0')
+    # Сколько подборок (ThemeRequest со статусом ISSUED)
+    requests_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default='0')
+    last_issued_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=utc_now, onupdate=utc_now)
+    
+    def __repr__(self):
+        return (
+            f"<UserThemeStats(user_id={self.user_id}, issued_count={self.issued_count}, "
+            f"requests_count={self.requests_count})>"
+        )
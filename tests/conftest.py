@@ -1,8 +1,12 @@
 """Test configuration and fixtures."""
 
+import asyncio
+
 import pytest
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 from database.models import Base
 
 
@@ -23,6 +27,82 @@ def test_session(test_engine):
     session.close()
 
 
+@pytest.fixture
+def sync_engine():
+    """In-memory SQLite engine with all tables, new for every test (в отличие от test_engine)."""
+    engine = create_engine(
+        "sqlite:///:memory:",
+        poolclass=StaticPool,
+        connect_args={"check_same_thread": False},
+    )
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(sync_engine):
+    """Session bound to sync_engine."""
+    session = sessionmaker(bind=sync_engine)()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def async_engine():
+    """In-memory SQLite async engine with all tables.
+
+    StaticPool держит одно соединение, поэтому все сессии видят одну и ту же БД.
+    Тесты с начальными данными переопределяют фикстуру: def async_engine(async_engine).
+    """
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:",
+        poolclass=StaticPool,
+        connect_args={"check_same_thread": False},
+    )
+
+    async def create():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.run(create())
+    yield engine
+    asyncio.run(engine.dispose())
+
+
+@pytest.fixture
+def session_factory(async_engine):
+    """async_sessionmaker bound to async_engine."""
+    return async_sessionmaker(async_engine, expire_on_commit=False)
+
+
+def _record_statements(engine):
+    executed = []
+
+    def listener(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(engine, "before_cursor_execute", listener)
+    yield executed
+    event.remove(engine, "before_cursor_execute", listener)
+
+
+@pytest.fixture
+def statements(async_engine):
+    """SQL statements executed on async_engine, in order.
+
+    Слушатель вешается после начальных данных фикстуры async_engine; чтобы
+    считать запросы с определенного места теста, вызовите statements.clear().
+    """
+    yield from _record_statements(async_engine.sync_engine)
+
+
+@pytest.fixture
+def sync_statements(sync_engine):
+    """SQL statements executed on sync_engine (see statements)."""
+    yield from _record_statements(sync_engine)
+
+
 @pytest.fixture
 def mock_user():
     """Create mock user for testing."""
@@ -22,7 +22,7 @@ async def test_admin_functions():
         
         # Test user statistics
         print("   - Testing user statistics...")
-        stats = broadcast_manager.get_user_statistics()
+        stats = await broadcast_manager.get_user_statistics()
         print(f"     Total users: {stats.get('total_users', 0)}")
         print(f"     Subscription stats: {stats.get('subscription_stats', {})}")
         print(f"     Recent users: {stats.get('recent_users', 0)}")
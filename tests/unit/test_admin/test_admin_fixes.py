@@ -23,7 +23,7 @@ async def test_admin_fixes():
         
         # Test user statistics
         print("   - Testing user statistics...")
-        stats = broadcast_manager.get_user_statistics()
+        stats = await broadcast_manager.get_user_statistics()
         print(f"     ✅ User stats: {stats}")
         
         # Test system health
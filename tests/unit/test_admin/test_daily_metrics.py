@@ -0,0 +1,166 @@
+"""Tests for daily_metrics rollup behind dashboard and subscription metrics."""
+
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+import pytest
+import sqlalchemy
+from sqlalchemy import func, select, type_coerce
+
+from admin_panel import services
+from core.analytics.daily_metrics import refresh_daily_metrics
+from database.models import DailyMetrics, Subscription, SubscriptionType, User
+from tests.fixtures import legacy_admin_metrics as legacy
+
+
+SEED_DAYS = 90
+
+
+@pytest.fixture(autouse=True)
+def no_redis(monkeypatch):
+    monkeypatch.setattr(services, "redis_client", None)
+
+
+async def seed(session_factory, now: datetime, users: int = 400):
+    """Users registered over SEED_DAYS days with trials, paid subscriptions, renewals and churn."""
+    rng = random.Random(42)
+    async with session_factory() as session:
+        for index in range(users):
+            created_at = now - timedelta(days=rng.uniform(1, SEED_DAYS), hours=rng.uniform(0, 3))
+            user = User(
+                telegram_id=100000 + index,
+                subscription_type=rng.choice(list(SubscriptionType)),
+                created_at=created_at,
+                test_pro_started_at=created_at + timedelta(hours=1) if rng.random() < 0.5 else None,
+            )
+            session.add(user)
+            await session.flush()
+
+            started_at = created_at + timedelta(days=rng.choice([0.5, 3, 10, 13, 20, 35]))
+            for _ in range(rng.choice([0, 0, 1, 1, 2, 3])):
+                if started_at >= now - timedelta(hours=1):
+                    break
+                sub_type = rng.choice([SubscriptionType.PRO, SubscriptionType.PRO, SubscriptionType.ULTRA])
+                expires_at = started_at + timedelta(days=rng.choice([7, 14, 30]))
+                session.add(Subscription(
+                    user_id=user.id,
+                    subscription_type=sub_type,
+                    started_at=started_at,
+                    expires_at=expires_at,
+                    payment_id=f"pay-{index}-{started_at.timestamp()}" if rng.random() < 0.85 else None,
+                ))
+                started_at = expires_at + timedelta(days=rng.choice([0.2, 2, 9]))
+        await session.commit()
+
+
+def seeded_months(now: datetime):
+    months = []
+    day = (now - timedelta(days=SEED_DAYS + 1)).date().replace(day=1)
+    while day <= now.date():
+        months.append(day)
+        day = (day + timedelta(days=32)).replace(day=1)
+    return months
+
+
+METRIC_KEYS = (
+    'new_users', 'test_pro_to_pro', 'test_pro_to_ultra', 'test_pro_to_free', 'free_to_paid',
+    'pro_churn_count', 'pro_churn_percent', 'ultra_churn_count', 'ultra_churn_percent',
+)
+
+
+class TestDailyMetricsRollup:
+    """Rollup-based metrics must match the raw-table computation."""
+
+    def test_rollup_matches_raw_metrics_over_90_days(self, session_factory, monkeypatch):
+        now = datetime.utcnow()
+
+        async def scenario():
+            await seed(session_factory, now)
+            async with session_factory() as session:
+                days = await session.run_sync(lambda db: refresh_daily_metrics(db, now=now))
+                await session.commit()
+
+            results = []
+            async with session_factory() as session:
+                for month_day in seeded_months(now):
+                    month = month_day.strftime('%Y-%m')
+                    actual = await services.get_subscription_metrics(session, month)
+                    expected = await legacy.get_subscription_metrics(session, month)
+                    results.append((month, actual, expected))
+
+                current = (
+                    await services.get_subscription_metrics(session),
+                    await legacy.get_subscription_metrics(session),
+                )
+                stats = await services.get_dashboard_stats(session)
+                with monkeypatch.context() as patch:
+                    # CAST(... AS DATE) в SQLite возвращает год числом; date() - аналог ::date в PostgreSQL
+                    patch.setattr(sqlalchemy, "cast", lambda expr, type_: type_coerce(func.date(expr), type_))
+                    legacy_stats = await legacy.get_dashboard_stats(session)
+            return days, results, current, stats, legacy_stats
+
+        days, results, current, stats, legacy_stats = asyncio.run(scenario())
+
+        assert days >= SEED_DAYS - 1
+        assert sum(actual['test_pro_to_pro'] + actual['free_to_paid'] for _, actual, _ in results) > 0
+        assert sum(actual['pro_churn_count'] for _, actual, _ in results) > 0
+        for month, actual, expected in results:
+            assert expected['month_display'] != 'Ошибка загрузки'
+            assert {key: actual[key] for key in expected} == expected, month
+
+        actual_current, expected_current = current
+        assert {key: actual_current[key] for key in expected_current} == expected_current
+
+        # Старый график считал первый день окна только с момента now - 30 дней
+        assert stats['user_growth_data']['dates'] == legacy_stats['user_growth_data']['dates']
+        assert stats['user_growth_data']['counts'][1:] == legacy_stats['user_growth_data']['counts'][1:]
+        assert stats['conversion_history'] == legacy_stats['conversion_history']
+        for key in METRIC_KEYS + ('subscription_counts', 'total_users', 'conversion_rate', 'new_users_week'):
+            assert stats[key] == legacy_stats[key], key
+
+    def test_refresh_processes_only_days_since_watermark(self, session_factory):
+        now = datetime.utcnow()
+
+        async def scenario():
+            await seed(session_factory, now, users=50)
+            async with session_factory() as session:
+                first = await session.run_sync(lambda db: refresh_daily_metrics(db, now=now))
+                await session.commit()
+                again = await session.run_sync(lambda db: refresh_daily_metrics(db, now=now, settle_days=0))
+                later = await session.run_sync(
+                    lambda db: refresh_daily_metrics(db, now=now + timedelta(days=2), settle_days=0)
+                )
+                settled = await session.run_sync(
+                    lambda db: refresh_daily_metrics(db, now=now + timedelta(days=2), settle_days=7)
+                )
+                await session.commit()
+                watermark = (await session.execute(select(func.max(DailyMetrics.day)))).scalar()
+                stored = (await session.execute(select(func.count()).select_from(DailyMetrics))).scalar()
+            return first, again, later, settled, watermark, stored
+
+        first, again, later, settled, watermark, stored = asyncio.run(scenario())
+
+        assert first >= SEED_DAYS - 1
+        assert again == 0
+        assert later == 2
+        assert settled == 7
+        assert watermark == (now + timedelta(days=1)).date()
+        assert stored == first + 2
+
+    def test_today_is_computed_live(self, session_factory):
+        now = datetime.utcnow()
+
+        async def scenario():
+            await seed(session_factory, now, users=20)
+            async with session_factory() as session:
+                await session.run_sync(lambda db: refresh_daily_metrics(db, now=now))
+                await session.commit()
+                before = await services.get_subscription_metrics(session)
+                session.add(User(telegram_id=1, created_at=datetime.utcnow()))
+                await session.commit()
+                after = await services.get_subscription_metrics(session)
+            return before, after
+
+        before, after = asyncio.run(scenario())
+        assert after['new_users'] == before['new_users'] + 1
@@ -0,0 +1,198 @@
+"""Tests for the Quill -> Telegram HTML converter of the lexicon editor."""
+
+import random
+import re
+import time
+
+import pytest
+
+from admin_panel.views.lexicon import convert_quill_html_to_telegram, validate_telegram_html
+from bot.lexicon.lexicon_ru import LEXICON_COMMANDS_RU, LEXICON_RU
+
+
+def legacy_convert(html: str) -> str:
+    """Previous regex implementation (reference for the property test)."""
+    if not html:
+        return html
+    html = re.sub(r' class="[^"]*"', '', html)
+    html = re.sub(r' style="[^"]*"', '', html)
+    html = re.sub(r'&nbsp;', ' ', html, flags=re.IGNORECASE)
+    html = re.sub(r'&#160;', ' ', html)
+    html = re.sub(r'<strong>', '<b>', html, flags=re.IGNORECASE)
+    html = re.sub(r'</strong>', '</b>', html, flags=re.IGNORECASE)
+    html = re.sub(r'<em>', '<i>', html, flags=re.IGNORECASE)
+    html = re.sub(r'</em>', '</i>', html, flags=re.IGNORECASE)
+    html = re.sub(r'<h[1-6][^>]*>', '<b>', html, flags=re.IGNORECASE)
+    html = re.sub(r'</h[1-6]>', '</b>\n', html, flags=re.IGNORECASE)
+    for tag in ['div', 'span', 'blockquote']:
+        html = re.sub(rf'<{tag}[^>]*>', '', html, flags=re.IGNORECASE)
+        html = re.sub(rf'</{tag}>', '', html, flags=re.IGNORECASE)
+    html = re.sub(r'<ul[^>]*>|</ul>', '\n', html, flags=re.IGNORECASE)
+    html = re.sub(r'<ol[^>]*>|</ol>', '\n', html, flags=re.IGNORECASE)
+    html = re.sub(r'<li[^>]*>', '• ', html, flags=re.IGNORECASE)
+    html = re.sub(r'</li>', '\n', html, flags=re.IGNORECASE)
+    html = re.sub(r'<p[^>]*>\s*<br\s*/?>\s*</p>', '<LINEBREAK>', html, flags=re.IGNORECASE)
+    html = re.sub(r'<p[^>]*>\s*</p>', '', html, flags=re.IGNORECASE)
+    html = re.sub(r'<p[^>]*>\s*(?:<(?:b|i|u|s|a)[^>]*>\s*</(?:b|i|u|s|a)>)+</p>', '', html, flags=re.IGNORECASE)
+    html = re.sub(r'<br\s*/?>', '\n', html, flags=re.IGNORECASE)
+    html = re.sub(r'</p>\s*<p[^>]*>', '\n', html, flags=re.IGNORECASE)
+    html = re.sub(r'<p[^>]*>', '', html, flags=re.IGNORECASE)
+    html = re.sub(r'</p>', '\n', html, flags=re.IGNORECASE)
+    html = html.replace('<LINEBREAK>', '\n')
+    html = re.sub(r'\n{3,}', '\n\n', html)
+    return html.strip('\n')
+
+
+def text_to_quill(text: str) -> str:
+    """Python port of textToHtmlForQuill from lexicon.html plus Quill's own tag names."""
+    text = text.replace('<b>', '<strong>').replace('</b>', '</strong>')
+    text = text.replace('<i>', '<em>').replace('</i>', '</em>')
+    lines = text.split('\n')
+    paragraphs = []
+    for i, line in enumerate(lines):
+        if line.strip():
+            paragraphs.append(f'<p>{line.strip()}</p>')
+        elif i > 0 and lines[i - 1].strip():
+            paragraphs.append('<p><br></p>')
+    return ''.join(paragraphs)
+
+
+def lexicon_corpus():
+    values = [value for lexicon in (LEXICON_RU, LEXICON_COMMANDS_RU)
+              for value in dict(lexicon).values() if isinstance(value, str)]
+    return [text_to_quill(value) for value in values]
+
+
+QUILL_SAMPLES = [
+    '<h2>Заголовок</h2><p>Текст&nbsp;с&nbsp;пробелами</p>',
+    '<p class="ql-align-center"><span style="color: red;">Цвет</span> и <u>подчеркнутый</u></p>',
+    '<ol><li>Первый</li><li><strong>Второй</strong></li></ol><p>После списка</p>',
+    '<ul><li>один</li></ul>',
+    '<p>   </p><p>A</p><p><strong></strong></p><p>B</p>',
+    '<p><strong> </strong><em></em></p><p>C</p>',
+    '<p>A</p>\n<p><br></p>\n<p>B</p>',
+    '<p>A<br>B<br/></p><p><br></p><p><br></p><p><br></p><p>C</p>',
+    '<p>Ссылка <a href="https://t.me/iqstocker">канал</a></p>',
+    '<div><p>В div</p></div><blockquote>цитата</blockquote>',
+    '<p><s>старое</s> <code>{price}</code> &amp; &lt;новое&gt; &#160;</p>',
+    '\n\n<p>Ведущие переводы</p>\n\n',
+    '<p>Незакрытый абзац',
+    'Просто текст\nбез абзацев',
+]
+
+
+def random_quill_document(rng: random.Random) -> str:
+    """Random document built from the markup Quill produces."""
+    words = ['Привет', 'тариф', '{balance}', 'PRO', '😊', 'a', ' ', '  ', '&nbsp;', '&amp;', '&#160;', '2.0']
+
+    def inline(depth=0):
+        parts = []
+        for _ in range(rng.randint(0, 4)):
+            choice = rng.random()
+            if choice < 0.55 or depth > 1:
+                parts.append(rng.choice(words))
+            elif choice < 0.75:
+                tag = rng.choice(['strong', 'em', 'u', 's'])
+                parts.append(f'<{tag}>{inline(depth + 1)}</{tag}>')
+            elif choice < 0.85:
+                parts.append('<br>')
+            elif choice < 0.92:
+                parts.append(f'<span class="ql-size-large">{inline(depth + 1)}</span>')
+            else:
+                parts.append(f'<a href="https://example.com/{rng.randint(1, 9)}">{inline(depth + 1)}</a>')
+        return ''.join(parts)
+
+    blocks = []
+    for _ in range(rng.randint(1, 8)):
+        choice = rng.random()
+        if choice < 0.6:
+            attrs = rng.choice(['', ' class="ql-align-right"', ' style="text-align: center;"'])
+            blocks.append(f'<p{attrs}>{inline()}</p>')
+        elif choice < 0.75:
+            blocks.append('<p><br></p>')
+        elif choice < 0.85:
+            level = rng.randint(1, 3)
+            blocks.append(f'<h{level}>{inline()}</h{level}>')
+        else:
+            tag = rng.choice(['ul', 'ol'])
+            items = ''.join(f'<li>{inline()}</li>' for _ in range(rng.randint(1, 3)))
+            blocks.append(f'<{tag}>{items}</{tag}>')
+        if rng.random() < 0.2:
+            blocks.append(rng.choice(['\n', ' ', '\n\n']))
+    return ''.join(blocks)
+
+
+class TestQuillConverter:
+    """Test single-pass converter against the previous implementation."""
+
+    @pytest.mark.parametrize("html", lexicon_corpus())
+    def test_matches_legacy_on_lexicon_entries(self, html):
+        assert convert_quill_html_to_telegram(html) == legacy_convert(html)
+
+    @pytest.mark.parametrize("html", QUILL_SAMPLES)
+    def test_matches_legacy_on_quill_samples(self, html):
+        assert convert_quill_html_to_telegram(html) == legacy_convert(html)
+
+    def test_matches_legacy_on_random_documents(self):
+        rng = random.Random(20261018)
+        for _ in range(2000):
+            html = random_quill_document(rng)
+            assert convert_quill_html_to_telegram(html) == legacy_convert(html), html
+
+    def test_round_trip_of_lexicon_entry(self):
+        value = LEXICON_RU['start_howto']
+        assert convert_quill_html_to_telegram(text_to_quill(value)) == re.sub(r'\n{3,}', '\n\n', value).strip()
+
+    def test_only_telegram_tags_are_emitted(self):
+        html = '<p><img src="x.png"><pre>код</pre> <a href="https://x" target="_blank" rel="noopener">ок</a> 1 < 2</p>'
+        result = convert_quill_html_to_telegram(html)
+        # Прежняя версия оставляла <img>, ломала <pre> и пропускала голый "<"
+        assert result == '<pre>код</pre> <a href="https://x">ок</a> 1 &lt; 2'
+        validate_telegram_html(result)
+
+    def test_empty_input(self):
+        assert convert_quill_html_to_telegram('') == ''
+        assert convert_quill_html_to_telegram(None) is None
+
+    def test_benchmark_10k_entries(self):
+        corpus = lexicon_corpus()
+        entries = [corpus[i % len(corpus)] for i in range(10_000)]
+
+        started = time.perf_counter()
+        converted = [convert_quill_html_to_telegram(html) for html in entries]
+        elapsed = time.perf_counter() - started
+
+        started = time.perf_counter()
+        expected = [legacy_convert(html) for html in entries]
+        legacy_elapsed = time.perf_counter() - started
+
+        print(f"10k lexicon entries: parser {elapsed * 1000:.0f} ms, regex {legacy_elapsed * 1000:.0f} ms")
+        assert converted == expected
+        assert elapsed <= legacy_elapsed
+
+
+class TestTelegramHtmlValidation:
+    """Test tag balance validation before saving."""
+
+    @pytest.mark.parametrize("html", [
+        '',
+        'простой текст',
+        '<b>жирный <i>курсив</i></b>\n<a href="https://x">ссылка</a>',
+        '<pre><code>x</code></pre> &lt;b&gt;',
+    ])
+    def test_valid(self, html):
+        validate_telegram_html(html)
+
+    @pytest.mark.parametrize("html, message", [
+        ('<b>не закрыт', 'не закрыт тег <b>'),
+        ('лишний</i>', 'лишний закрывающий тег </i>'),
+        ('<b><i>перекрытие</b></i>', '</b> закрывает незакрытый <i>'),
+        ('<div>блок</div>', 'неподдерживаемый тег <div>'),
+    ])
+    def test_invalid(self, html, message):
+        with pytest.raises(ValueError, match=re.escape(message)):
+            validate_telegram_html(html)
+
+    def test_lexicon_entries_are_valid(self):
+        for html in lexicon_corpus():
+            validate_telegram_html(convert_quill_html_to_telegram(html))
@@ -0,0 +1,113 @@
+"""Tests for the referral admin page aggregate query and keyset pagination."""
+
+import asyncio
+import random
+from collections import Counter
+
+import pytest
+from sqlalchemy import insert
+
+from admin_panel.views import referral as referral_view
+from database.models import User
+
+
+USERS = 10_000
+
+
+@pytest.fixture
+def session_factory(session_factory, monkeypatch):
+    monkeypatch.setattr(referral_view, "AsyncSessionLocal", session_factory)
+    return session_factory
+
+
+@pytest.fixture
+def rendered(monkeypatch):
+    contexts = []
+    monkeypatch.setattr(
+        referral_view.templates, "TemplateResponse",
+        lambda name, context: contexts.append(context) or context
+    )
+    return contexts
+
+
+def seed(session_factory, users=USERS):
+    """Users with random balances (many ties) and random referrers."""
+    rng = random.Random(11)
+    rows = []
+    for user_id in range(1, users + 1):
+        referrer_id = rng.randint(1, user_id - 1) if user_id > 1 and rng.random() < 0.4 else None
+        rows.append({
+            'id': user_id,
+            'telegram_id': 100_000 + user_id,
+            'username': f"user{user_id}" if user_id % 3 else None,
+            'referral_balance': rng.choice([0, 0, 0, 1, 2, 3, 5, 10]),
+            'referrer_id': referrer_id,
+        })
+
+    async def insert_rows():
+        async with session_factory() as session:
+            await session.execute(insert(User), rows)
+            await session.commit()
+
+    asyncio.run(insert_rows())
+    return rows
+
+
+def render(**params):
+    params.setdefault('after_balance', None)
+    params.setdefault('after_id', None)
+    params.setdefault('per_page', referral_view.REFERRAL_PAGE_SIZE)
+    return asyncio.run(referral_view.referral_page(request=None, **params))
+
+
+class TestReferralPage:
+    """Test referral table built from a single aggregate."""
+
+    def test_constant_statements_and_unchanged_totals(self, session_factory, statements, rendered):
+        rows = seed(session_factory)
+        referrals = Counter(row['referrer_id'] for row in rows if row['referrer_id'])
+
+        statements.clear()
+
+        per_page = 500
+        seen = []
+        per_render = []
+        cursor = {}
+        while True:
+            before = len(statements)
+            context = render(per_page=per_page, **cursor)
+            per_render.append(len(statements) - before)
+            seen.extend(context['users_with_referrals'])
+            if context['next_cursor'] is None:
+                break
+            cursor = context['next_cursor']
+
+        assert set(per_render) == {3}
+        assert len(per_render) == USERS // per_page
+
+        stats = rendered[0]['stats']
+        assert stats == {
+            'total_users': USERS,
+            'total_referrers': sum(1 for row in rows if row['referrer_id']),
+            'users_with_balance': sum(1 for row in rows if row['referral_balance'] > 0),
+            'total_balance': sum(row['referral_balance'] for row in rows),
+        }
+
+        # Каждый пользователь ровно один раз, в порядке (balance DESC, id DESC)
+        expected_order = sorted(rows, key=lambda row: (-row['referral_balance'], -row['id']))
+        assert [user['id'] for user in seen] == [row['id'] for row in expected_order]
+        assert {user['id']: user['referrals_count'] for user in seen} == {
+            row['id']: referrals.get(row['id'], 0) for row in rows
+        }
+        assert sum(user['referral_balance'] for user in seen) == stats['total_balance']
+
+        top = rendered[0]['top_referrers']
+        expected_top = sorted(referrals.items(), key=lambda item: (-item[1], item[0]))[:10]
+        assert [(item['id'], item['referrals_count']) for item in top] == expected_top
+
+    def test_empty_table(self, session_factory, rendered):
+        context = render()
+        assert context['users_with_referrals'] == []
+        assert context['top_referrers'] == []
+        assert context['next_cursor'] is None
+        assert context['stats']['total_balance'] == 0
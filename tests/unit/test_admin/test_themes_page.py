@@ -0,0 +1,111 @@
+"""Tests for admin themes page rendering from user_theme_stats."""
+
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from database.models import User, ThemeRequest, UserThemeStats
+from admin_panel.views import themes as themes_view
+from core.theme_stats import record_theme_issue, count_themes
+
+
+@pytest.fixture
+def session_factory(session_factory, monkeypatch):
+    monkeypatch.setattr(themes_view, "AsyncSessionLocal", session_factory)
+    return session_factory
+
+
+@pytest.fixture
+def rendered(monkeypatch):
+    contexts = []
+    monkeypatch.setattr(
+        themes_view.templates, "TemplateResponse",
+        lambda name, context: contexts.append(context) or context
+    )
+    return contexts
+
+
+async def seed(session_factory, users_count, seed_value=42):
+    """Create users with random issue histories via the issuance path."""
+    rng = random.Random(seed_value)
+    expected = {}
+    base = datetime(2025, 1, 1)
+    async with session_factory() as session:
+        users = [User(telegram_id=10_000 + i, first_name=f"User{i}", last_name="Test") for i in range(users_count)]
+        session.add_all(users)
+        await session.flush()
+        for user in users:
+            total = 0
+            for index in range(rng.randint(0, 6)):
+                theme_name = "\n".join(f"theme {user.id}-{index}-{n}" for n in range(rng.randint(1, 5)))
+                created_at = base + timedelta(hours=rng.randint(0, 10_000))
+                session.add(ThemeRequest(
+                    user_id=user.id, theme_name=theme_name, status="ISSUED",
+                    created_at=created_at, updated_at=created_at
+                ))
+                await record_theme_issue(session, user.id, count_themes(theme_name), created_at)
+                total += count_themes(theme_name)
+            expected[user.id] = total
+        await session.commit()
+    return expected
+
+
+def render(per_page, status=None):
+    return asyncio.run(themes_view.themes_page(request=None, status=status, page=1, per_page=per_page))
+
+
+class TestThemesPage:
+    """Test themes page statements and values."""
+
+    def test_constant_statements_for_500_users(self, session_factory, statements, rendered):
+        expected = asyncio.run(seed(session_factory, 500))
+        statements.clear()
+
+        small = render(per_page=10)
+        small_statements = len(statements)
+        statements.clear()
+        large = render(per_page=200)
+
+        assert len(statements) == small_statements == 3
+        assert len(small["theme_requests"]) == 10
+        assert len(large["theme_requests"]) == 200
+        for row in large["theme_requests"]:
+            assert row["total_issued_themes"] == expected[row["user_id"]]
+            assert row["user_name"] == f"User{row['user_telegram_id'] - 10_000} Test"
+
+    def test_stats_match_history(self, session_factory, rendered):
+        asyncio.run(seed(session_factory, 50, seed_value=7))
+
+        async def fetch():
+            async with session_factory() as session:
+                stats = (await session.execute(select(UserThemeStats))).scalars().all()
+                requests = (await session.execute(select(ThemeRequest))).scalars().all()
+            return stats, requests
+
+        stats, requests = asyncio.run(fetch())
+        by_user = {}
+        for item in requests:
+            count, issued = by_user.get(item.user_id, (0, 0))
+            by_user[item.user_id] = (count + 1, issued + count_themes(item.theme_name))
+
+        assert {s.user_id: (s.requests_count, s.issued_count) for s in stats} == by_user
+
+    def test_user_without_stats_shows_zero(self, session_factory, rendered):
+        async def scenario():
+            async with session_factory() as session:
+                user = User(telegram_id=1, username="nostats")
+                session.add(user)
+                await session.flush()
+                session.add(ThemeRequest(user_id=user.id, theme_name="a\nb", status="PENDING",
+                                         created_at=datetime.utcnow(), updated_at=datetime.utcnow()))
+                await session.commit()
+
+        asyncio.run(scenario())
+        context = render(per_page=20, status="ALL")
+        row = context["theme_requests"][0]
+        assert row["total_issued_themes"] == 0
+        assert row["current_request_themes_count"] == 2
+        assert row["user_name"] == "nostats"
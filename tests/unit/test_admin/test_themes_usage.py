@@ -0,0 +1,127 @@
+"""Tests for get_all_themes_with_usage aggregated query, pagination and cache."""
+
+import asyncio
+import random
+
+import fakeredis
+import pytest
+from sqlalchemy import func, select
+
+from admin_panel import services
+from core import theme_stats
+from database.models import GlobalTheme, User, UserIssuedTheme
+
+
+THEMES = 2000
+
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(services, "redis_client", client)
+    monkeypatch.setattr(theme_stats, "redis_client", client)
+    return client
+
+
+@pytest.fixture
+def no_redis(monkeypatch):
+    monkeypatch.setattr(services, "redis_client", None)
+
+
+async def seed(session_factory, themes: int = THEMES, users: int = 60):
+    rng = random.Random(7)
+    async with session_factory() as session:
+        session.add_all([
+            GlobalTheme(theme_name=f"theme {index}", total_sales=rng.randint(0, 500), total_revenue=rng.randint(0, 900))
+            for index in range(themes)
+        ])
+        session.add_all([User(telegram_id=1000 + index) for index in range(users)])
+        await session.flush()
+        for user_id in range(1, users + 1):
+            for theme_id in rng.sample(range(1, themes + 1), 40):
+                session.add(UserIssuedTheme(user_id=user_id, theme_id=theme_id))
+        await session.commit()
+
+
+async def reference_usage(session):
+    """Per-theme COUNT (previous N+1 approach) over user_issued_themes."""
+    themes = (await session.execute(select(GlobalTheme))).scalars().all()
+    usage = {}
+    for theme in themes:
+        usage[theme.id] = (await session.execute(
+            select(func.count(UserIssuedTheme.id)).where(UserIssuedTheme.theme_id == theme.id)
+        )).scalar()
+    return themes, usage
+
+
+class TestThemesWithUsage:
+    """Test aggregated usage counts."""
+
+    def test_constant_statements_and_identical_counts(self, session_factory, statements, no_redis):
+        async def scenario():
+            await seed(session_factory)
+            statements.clear()
+            async with session_factory() as session:
+                full = await services.get_all_themes_with_usage(session, page=1, per_page=THEMES)
+                full_statements = len(statements)
+                page = await services.get_all_themes_with_usage(session, page=3, per_page=25)
+                page_statements = len(statements) - full_statements
+                by_sales = await services.get_all_themes_with_usage(session, page=1, per_page=10, sort='sales')
+                themes, usage = await reference_usage(session)
+            return full, full_statements, page, page_statements, by_sales, themes, usage
+
+        full, full_statements, page, page_statements, by_sales, themes, usage = asyncio.run(scenario())
+
+        assert full_statements == 2
+        assert page_statements == 2
+
+        assert full['total'] == THEMES
+        assert {item['id']: item['usage_count'] for item in full['items']} == usage
+        counts = [item['usage_count'] for item in full['items']]
+        assert counts == sorted(counts, reverse=True)
+        assert sum(counts) == 60 * 40
+
+        assert page['pages'] == THEMES // 25
+        assert page['items'] == full['items'][50:75]
+
+        expected_sales = sorted(themes, key=lambda theme: (-theme.total_sales, theme.id))[:10]
+        assert [item['id'] for item in by_sales['items']] == [theme.id for theme in expected_sales]
+
+    def test_themes_without_issues_are_listed(self, session_factory, no_redis):
+        async def scenario():
+            async with session_factory() as session:
+                session.add_all([GlobalTheme(theme_name="unused", total_sales=5), GlobalTheme(theme_name="used")])
+                session.add(User(telegram_id=1))
+                await session.flush()
+                session.add(UserIssuedTheme(user_id=1, theme_id=2))
+                await session.commit()
+                return await services.get_all_themes_with_usage(session)
+
+        result = asyncio.run(scenario())
+        assert [(item['theme_name'], item['usage_count']) for item in result['items']] == [("used", 1), ("unused", 0)]
+
+    def test_cached_until_themes_issued(self, session_factory, statements, redis_client):
+        async def scenario():
+            await seed(session_factory, themes=50, users=5)
+            statements.clear()
+            async with session_factory() as session:
+                first = await services.get_all_themes_with_usage(session, per_page=5)
+                cached_before = len(statements)
+                cached = await services.get_all_themes_with_usage(session, per_page=5)
+                cached_statements = len(statements) - cached_before
+
+                user = User(telegram_id=99)
+                session.add(user)
+                await session.flush()
+                session.add(UserIssuedTheme(user_id=user.id, theme_id=first['items'][-1]['id']))
+                await session.commit()
+                theme_stats.invalidate_themes_usage_cache()
+                fresh = await services.get_all_themes_with_usage(session, per_page=5)
+            return first, cached, cached_statements, fresh
+
+        first, cached, cached_statements, fresh = asyncio.run(scenario())
+
+        assert cached_statements == 0
+        assert cached == first
+        assert fresh != first
+        assert 0 < redis_client.ttl("admin:themes_usage:usage:1:5") <= theme_stats.THEMES_USAGE_CACHE_TTL
@@ -0,0 +1,143 @@
+"""Tests for single-statement admin user statistics."""
+
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, or_, select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from core.admin.broadcast_manager import USER_STATISTICS_TTL, BroadcastManager
+from database.models import Limits, SubscriptionType, User
+
+
+USERS = 500
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def async_engine(async_engine):
+    rng = random.Random(7)
+    now = datetime.utcnow()
+
+    async def seed():
+        async with async_sessionmaker(async_engine)() as session:
+            for i in range(1, USERS + 1):
+                session.add(User(
+                    id=i,
+                    telegram_id=200_000 + i,
+                    subscription_type=rng.choice(list(SubscriptionType)),
+                    created_at=now - timedelta(days=rng.randint(0, 90)),
+                    referral_bonus_paid=False,
+                ))
+                # Часть пользователей без строки limits - LEFT JOIN не должен их терять
+                if i % 5:
+                    session.add(Limits(
+                        user_id=i,
+                        analytics_total=10,
+                        analytics_used=rng.choice([0, 0, 1, 3]),
+                        themes_total=4,
+                        themes_used=rng.choice([0, 0, 0, 2]),
+                    ))
+            await session.commit()
+
+    asyncio.run(seed())
+    return async_engine
+
+
+def reference_statistics(session_factory):
+    """Separate count queries, as the statistics were computed before."""
+
+    async def compute():
+        async with session_factory() as session:
+            async def count(*where, join_limits=False):
+                query = select(func.count()).select_from(User)
+                if join_limits:
+                    query = query.join(Limits, Limits.user_id == User.id)
+                return (await session.execute(query.where(*where))).scalar_one()
+
+            thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+            return {
+                "total_users": await count(),
+                "subscription_stats": {
+                    subscription_type.value: await count(User.subscription_type == subscription_type)
+                    for subscription_type in SubscriptionType
+                },
+                "recent_users": await count(User.created_at >= thirty_days_ago),
+                "active_users": await count(
+                    or_(Limits.analytics_used > 0, Limits.themes_used > 0), join_limits=True
+                ),
+            }
+
+    return asyncio.run(compute())
+
+
+class TestUserStatistics:
+    """Test BroadcastManager.get_user_statistics."""
+
+    def test_matches_separate_queries_in_one_statement(self, session_factory, statements):
+        expected = reference_statistics(session_factory)
+        statements.clear()
+
+        manager = BroadcastManager(async_session_factory=session_factory)
+        stats = asyncio.run(manager.get_user_statistics())
+
+        assert len(statements) == 1
+        assert {key: stats[key] for key in expected} == expected
+        assert sum(stats["subscription_stats"].values()) == stats["total_users"] == USERS
+        assert 0 < stats["active_users"] < USERS
+        assert stats["last_updated"]
+
+    def test_cached_for_ttl(self, session_factory, statements):
+        clock = FakeClock()
+        manager = BroadcastManager(async_session_factory=session_factory, clock=clock)
+
+        async def scenario():
+            first = await manager.get_user_statistics()
+            # Админ жмет "Обновить" несколько раз подряд
+            repeated = await asyncio.gather(*(manager.get_user_statistics() for _ in range(10)))
+            clock.now += USER_STATISTICS_TTL - 1
+            still_cached = await manager.get_user_statistics()
+            after_cached = len(statements)
+            clock.now += 1
+            await manager.get_user_statistics()
+            return first, repeated, still_cached, after_cached
+
+        first, repeated, still_cached, after_cached = asyncio.run(scenario())
+
+        assert after_cached == 1
+        assert len(statements) == 2
+        assert all(stats is first for stats in repeated)
+        assert still_cached is first
+
+    def test_postgresql_uses_filter_clause(self):
+        sql = str(BroadcastManager._user_statistics_query("postgresql").compile(dialect=postgresql.dialect()))
+        assert sql.count("FILTER (WHERE") == len(SubscriptionType) + 2
+        assert "CASE" not in sql
+
+        sqlite_sql = str(BroadcastManager._user_statistics_query("sqlite"))
+        assert "FILTER" not in sqlite_sql
+        assert sqlite_sql.count("CASE WHEN") == len(SubscriptionType) + 2
+
+    def test_error_returns_empty_and_is_not_cached(self, session_factory):
+        class BrokenSession:
+            async def __aenter__(self):
+                raise ConnectionError("db down")
+
+            async def __aexit__(self, *args):
+                return False
+
+        manager = BroadcastManager(async_session_factory=lambda: BrokenSession())
+        assert asyncio.run(manager.get_user_statistics()) == {}
+
+        manager._async_session_factory = session_factory
+        assert asyncio.run(manager.get_user_statistics())["total_users"] == USERS
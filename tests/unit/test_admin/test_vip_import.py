@@ -0,0 +1,84 @@
+"""Tests for bulk VIP whitelist CSV import."""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import select
+
+from database.models.vip_group_whitelist import VIPGroupWhitelist
+from admin_panel.views import vip_group as vip_group_view
+
+
+class FakeUpload:
+    def __init__(self, text, filename="members.csv"):
+        self.filename = filename
+        self._data = text.encode("utf-8-sig")
+
+    async def read(self):
+        return self._data
+
+
+@pytest.fixture
+def session_factory(session_factory, monkeypatch):
+    monkeypatch.setattr(vip_group_view, "AsyncSessionLocal", session_factory)
+    return session_factory
+
+
+def run_import(text):
+    request = SimpleNamespace(session={"admin_username": "boss"})
+    response = asyncio.run(vip_group_view.import_csv(request, FakeUpload(text)))
+    return response.status_code, json.loads(response.body)
+
+
+async def seed_existing(session_factory, telegram_ids):
+    async with session_factory() as session:
+        session.add_all([
+            VIPGroupWhitelist(telegram_id=telegram_id, username=f"old{telegram_id}", first_name="Old", note="manual")
+            for telegram_id in telegram_ids
+        ])
+        await session.commit()
+
+
+class TestWhitelistImport:
+    """Test import_csv counts and statement budget."""
+
+    def test_20k_rows_in_chunks(self, session_factory, statements):
+        asyncio.run(seed_existing(session_factory, range(1, 2001)))
+        lines = ["ID,Username,First Name"]
+        lines += [f"{telegram_id},user{telegram_id}," for telegram_id in range(1, 20_001)]
+        lines += [f"{telegram_id},dup{telegram_id},Dup" for telegram_id in range(1, 101)]
+        lines += [f"not-a-number,bad{index}," for index in range(50)]
+        statements.clear()
+
+        status, body = run_import("\n".join(lines))
+
+        assert status == 200
+        assert (body["inserted"], body["updated"], body["skipped"]) == (18_000, 2_000, 150)
+        assert body["added"] == 18_000
+        assert len(statements) <= 2 * (20_000 // 1000) + 2
+
+        async def fetch():
+            async with session_factory() as session:
+                query = select(VIPGroupWhitelist).order_by(VIPGroupWhitelist.telegram_id)
+                return (await session.execute(query)).scalars().all()
+
+        rows = asyncio.run(fetch())
+        assert len(rows) == 20_000
+        assert (rows[0].username, rows[0].first_name, rows[0].note) == ("user1", "Old", "manual")
+        assert rows[-1].username == "user20000" and rows[-1].added_by == "boss"
+
+    def test_repeated_import_only_updates(self, session_factory):
+        text = "telegram_id,username\n10,a\n11,\n12,c\n"
+
+        first = run_import(text)[1]
+        second = run_import(text)[1]
+
+        assert (first["inserted"], first["updated"]) == (3, 0)
+        assert (second["inserted"], second["updated"], second["skipped"]) == (0, 3, 0)
+
+    def test_invalid_file(self, session_factory):
+        request = SimpleNamespace(session={})
+        response = asyncio.run(vip_group_view.import_csv(request, FakeUpload("x", filename="a.txt")))
+        assert response.status_code == 400
@@ -0,0 +1,268 @@
+"""Tests for AdobeStockParser against a local aiohttp server."""
+
+import asyncio
+from pathlib import Path
+from types import SimpleNamespace
+
+import fakeredis
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from core.analytics.report_generator import ReportGenerator
+from core.parser import adobe_stock as adobe_stock_module
+from core.parser.adobe_stock import AdobeStockParser, TokenBucket, TAGS_CACHE_PREFIX
+
+FIXTURE_HTML = (Path(__file__).parents[2] / "fixtures" / "adobe_stock_asset.html").read_text(encoding="utf-8")
+
+
+class FixtureServer:
+    """Serves fixture HTML and tracks requests, in-flight peak and TCP connections."""
+
+    def __init__(self, delay: float = 0.02):
+        self.delay = delay
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.connections = set()
+        self.server = None
+
+    async def handle(self, request):
+        self.requests += 1
+        self.connections.add(request.transport.get_extra_info("peername"))
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            asset_id = request.query["k"]
+            if asset_id.startswith("missing"):
+                return web.Response(status=404)
+            return web.Response(text=FIXTURE_HTML.replace("{asset_id}", asset_id), content_type="text/html")
+        finally:
+            self.in_flight -= 1
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_get("/search", self.handle)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        return str(self.server.make_url("")).rstrip("/")
+
+    async def close(self):
+        await self.server.close()
+
+
+class FakeTime:
+    """Fake clock for TokenBucket: sleep() only advances the clock and records the wait."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def run_with_server(scenario, delay: float = 0.02):
+    async def main():
+        server = FixtureServer(delay)
+        base_url = await server.start()
+        try:
+            return server, await scenario(base_url)
+        finally:
+            await server.close()
+
+    return asyncio.run(main())
+
+
+class TestAdobeStockParser:
+    """Test shared session, concurrency cap and tag cache."""
+
+    def test_batch_fetch_is_concurrent_and_bounded(self):
+        async def scenario(base_url):
+            async with AdobeStockParser(
+                base_url, fakeredis.FakeRedis(), rate_limit=10_000, max_connections=4, concurrency=8
+            ) as parser:
+                return await parser.get_works_tags(range(100))
+
+        server, tags = run_with_server(scenario)
+
+        assert server.requests == 100
+        assert len(tags) == 100
+        assert tags["7"][:3] == ["business meeting", "office", "teamwork"]
+        assert "asset-7" in tags["7"]
+        # Соединения ограничены TCPConnector и переиспользуются между запросами
+        assert server.peak_in_flight == 4
+        assert len(server.connections) <= 4
+
+    def test_concurrency_cap_below_connection_limit(self):
+        async def scenario(base_url):
+            async with AdobeStockParser(
+                base_url, fakeredis.FakeRedis(), rate_limit=10_000, max_connections=8, concurrency=3
+            ) as parser:
+                return await parser.get_works_tags(range(30))
+
+        server, _ = run_with_server(scenario)
+        assert server.peak_in_flight == 3
+
+    def test_cached_tags_skip_http(self):
+        redis_client = fakeredis.FakeRedis()
+
+        async def scenario(base_url):
+            async with AdobeStockParser(base_url, redis_client, rate_limit=10_000) as parser:
+                first = await parser.get_works_tags(["1", "2", "missing-1"])
+                second = await parser.get_works_tags(["1", "2"])
+                single = await parser.get_work_tags("2", "title")
+                return first, second, single
+
+        server, (first, second, single) = run_with_server(scenario)
+
+        assert server.requests == 3
+        assert first["missing-1"] is None
+        assert second == {"1": first["1"], "2": first["2"]}
+        assert single == first["2"]
+        assert 0 < redis_client.ttl(f"{TAGS_CACHE_PREFIX}1") <= 7 * 86400
+        # Неудачная загрузка не кешируется
+        assert redis_client.get(f"{TAGS_CACHE_PREFIX}missing-1") is None
+
+    def test_session_reused_for_parser_lifetime(self):
+        async def scenario(base_url):
+            parser = AdobeStockParser(base_url, fakeredis.FakeRedis(), rate_limit=10_000)
+            await parser.get_work_tags("1", "title")
+            session = parser._session
+            await parser.get_work_tags("2", "title")
+            same = parser._session is session
+            await parser.close()
+            return same, session.closed
+
+        _, (same, closed) = run_with_server(scenario)
+        assert same
+        assert closed
+
+    def test_session_reopened_after_close(self):
+        async def scenario(base_url):
+            parser = AdobeStockParser(base_url, fakeredis.FakeRedis(), rate_limit=10_000)
+            await parser.get_work_tags("1", "title")
+            first = parser._session
+            await parser.close()
+            tags = await parser.get_work_tags("2", "title")
+            second = parser._session
+            await parser.close()
+            return tags, first, second
+
+        server, (tags, first, second) = run_with_server(scenario)
+        assert server.requests == 2
+        assert "asset-2" in tags
+        assert first is not second
+        assert first.closed and second.closed
+
+    def test_token_bucket_limits_rate(self, monkeypatch):
+        fake_time = FakeTime()
+        monkeypatch.setattr(
+            adobe_stock_module, "TokenBucket",
+            lambda rate: TokenBucket(rate, clock=fake_time, sleep=fake_time.sleep)
+        )
+
+        async def scenario(base_url):
+            async with AdobeStockParser(
+                base_url, fakeredis.FakeRedis(), rate_limit=20, concurrency=8
+            ) as parser:
+                await parser.get_works_tags(range(30))
+
+        server, _ = run_with_server(scenario, delay=0)
+        # 20 токенов в запасе, еще 10 - со скоростью 20/с
+        assert server.requests == 30
+        assert fake_time.sleeps == [pytest.approx(0.05)] * 10
+        assert fake_time.now == pytest.approx(0.5)
+
+    def test_token_bucket_shared_between_coroutines(self):
+        fake_time = FakeTime()
+
+        async def scenario():
+            bucket = TokenBucket(rate=100, capacity=1, clock=fake_time, sleep=fake_time.sleep)
+            await asyncio.gather(*(bucket.acquire() for _ in range(11)))
+            return bucket
+
+        bucket = asyncio.run(scenario())
+        # Первый токен из запаса, остальные 10 - по 10мс, ожидания не перекрываются
+        assert fake_time.sleeps == [pytest.approx(0.01)] * 10
+        assert fake_time.now == pytest.approx(0.1)
+        assert bucket.tokens == pytest.approx(0)
+
+    def test_token_bucket_refills_up_to_capacity(self):
+        fake_time = FakeTime()
+
+        async def scenario():
+            bucket = TokenBucket(rate=10, capacity=2, clock=fake_time, sleep=fake_time.sleep)
+            await bucket.acquire()
+            await bucket.acquire()
+            fake_time.now += 60
+            for _ in range(3):
+                await bucket.acquire()
+
+        asyncio.run(scenario())
+        # После простоя в запасе не больше capacity токенов
+        assert fake_time.sleeps == [pytest.approx(0.1)]
+
+    def test_report_generator_closes_parser_session(self):
+        closed = []
+
+        class Categorizer:
+            async def categorize_work_themes(self, tags):
+                return tags[:1]
+
+        async def scenario(base_url):
+            generator = ReportGenerator.__new__(ReportGenerator)
+            generator.adobe_parser = AdobeStockParser(base_url, fakeredis.FakeRedis(), rate_limit=10_000)
+            generator.theme_categorizer = Categorizer()
+            generator.db = SimpleNamespace(commit=lambda: None, close=lambda: None)
+            original_close = generator.adobe_parser.close
+
+            async def close():
+                closed.append(generator.adobe_parser._session)
+                await original_close()
+
+            generator.adobe_parser.close = close
+            await generator._generate_top_themes(1, [
+                {"work_id": work_id, "title": "t", "sales": 1, "revenue": 1.0} for work_id in (1, 2, 1)
+            ])
+            return generator.adobe_parser._session
+
+        server, session = run_with_server(scenario)
+        assert server.requests == 2
+        # Сессия закрыта по окончании загрузки тегов - без "Unclosed client session"
+        assert session is None
+        assert len(closed) == 1 and closed[0].closed
+
+    def test_works_without_redis(self):
+        async def scenario(base_url):
+            parser = AdobeStockParser(base_url, fakeredis.FakeRedis(), rate_limit=10_000)
+            parser.redis_client = None
+            async with parser:
+                return await parser.get_works_tags(["5"])
+
+        _, tags = run_with_server(scenario)
+        assert "asset-5" in tags["5"]
+
+
+@pytest.mark.slow
+class TestAdobeStockParserThroughput:
+    """Benchmark batch fetch throughput."""
+
+    def test_throughput(self):
+        async def scenario(base_url):
+            async with AdobeStockParser(
+                base_url, fakeredis.FakeRedis(), rate_limit=10_000, max_connections=8, concurrency=8
+            ) as parser:
+                return await parser.get_works_tags(range(1000))
+
+        server, tags = run_with_server(scenario, delay=0.005)
+        print(f"1000 assets: {server.requests} requests, peak {server.peak_in_flight}, "
+              f"{len(server.connections)} connections")
+        assert server.requests == len(tags) == 1000
+        assert server.peak_in_flight == 8
+        assert len(server.connections) <= 8
@@ -0,0 +1,175 @@
+"""Tests for bucketed AI performance metrics."""
+
+import asyncio
+import math
+import random
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+import fakeredis
+import pytest
+
+from core.monitoring.ai_monitor import (
+    AIPerformanceMonitor,
+    LATENCY_BUCKET_GROWTH,
+    histogram_percentiles,
+    latency_bucket,
+    latency_bucket_bounds,
+)
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+@pytest.fixture
+def monitor(redis_client):
+    return AIPerformanceMonitor(redis_client)
+
+
+def exact_percentile(values, percentile):
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(percentile * len(ordered))) - 1]
+
+
+# Геометрическая середина бакета отличается от любого значения в нем не более чем в sqrt(g) раз
+MAX_RELATIVE_ERROR = math.sqrt(LATENCY_BUCKET_GROWTH) - 1 + 1e-9
+
+
+class TestLatencyBuckets:
+    """Test histogram bucket math."""
+
+    def test_value_falls_into_its_bucket(self):
+        rng = random.Random(1)
+        for _ in range(10_000):
+            value = rng.lognormvariate(0, 2)
+            lower, upper = latency_bucket_bounds(latency_bucket(value))
+            assert lower < value <= upper
+
+    def test_percentiles_within_bucket_error(self):
+        rng = random.Random(2)
+        values = [rng.lognormvariate(0.5, 0.8) for _ in range(20_000)]
+        estimated = histogram_percentiles(Counter(latency_bucket(value) for value in values))
+
+        for percentile, estimate in estimated.items():
+            exact = exact_percentile(values, percentile)
+            assert abs(estimate - exact) / exact <= MAX_RELATIVE_ERROR
+
+
+class TestAIPerformanceMonitor:
+    """Test recording and summaries."""
+
+    def test_summary_from_counters(self, monitor, redis_client):
+        rng = random.Random(3)
+        latencies = [rng.uniform(0.2, 4.0) for _ in range(500)]
+        for index, latency in enumerate(latencies):
+            monitor.record_request("openai", latency, success=index % 10 != 0, cost=0.002, user_id="42")
+
+        summary = monitor.get_performance_summary("openai", 1)
+        response_time = summary["metrics"]["response_time"]
+
+        assert response_time["count"] == 500
+        assert response_time["mean"] == pytest.approx(sum(latencies) / 500, abs=0.001)
+        expected_p95 = exact_percentile(latencies, 0.95)
+        assert abs(response_time["p95"] - expected_p95) / expected_p95 <= MAX_RELATIVE_ERROR
+        assert summary["metrics"]["error_rate"]["error_rate"] == pytest.approx(0.1)
+        assert summary["metrics"]["success_rate"]["success_rate"] == pytest.approx(0.9)
+        assert summary["metrics"]["cost_per_request"]["mean"] == pytest.approx(0.002)
+        assert {alert["metric"] for alert in summary["alerts"]} == {"success_rate", "error_rate"}
+        assert all(redis_client.type(key) == "hash" for key in redis_client.keys("*"))
+
+        user = monitor.get_user_performance("42", 1)
+        assert user["total_requests"] == 500
+        assert user["api_providers"]["openai"]["success_rate"] == pytest.approx(0.9)
+        assert "anthropic" not in user["api_providers"]
+
+    def test_samples_outside_window_are_ignored(self, monitor):
+        monitor.record_request("openai", 1.0, success=True, timestamp=datetime.utcnow() - timedelta(hours=3))
+        monitor.record_request("openai", 2.0, success=True)
+
+        assert monitor.get_performance_summary("openai", 1)["metrics"]["response_time"]["count"] == 1
+        assert monitor.get_performance_summary("openai", 4)["metrics"]["response_time"]["count"] == 2
+
+    def test_track_request_records_error(self, monitor):
+        async def failing():
+            raise RuntimeError("boom")
+
+        result = asyncio.run(monitor.track_request("anthropic", failing, user_id="7"))
+        summary = monitor.get_performance_summary("anthropic", 1)
+
+        assert result["success"] is False
+        assert summary["metrics"]["error_rate"]["error_rate"] == 1.0
+        assert "cost_per_request" not in summary["metrics"]
+
+    def test_cleanup_removes_only_legacy_keys(self, monitor, redis_client):
+        redis_client.zadd("ai_performance:response_time:openai:2025-01-01-10", {"{'value': 1.0}": 1})
+        monitor.record_request("openai", 1.0, success=True, user_id="1")
+
+        assert monitor.cleanup_old_metrics() == 1
+        assert len(redis_client.keys("ai_performance:*")) == 2
+
+    def test_cleanup_honours_days_to_keep(self, monitor, redis_client):
+        key = "ai_performance:response_time:openai:legacy"
+        now = datetime.utcnow()
+        redis_client.zadd(key, {
+            "{'value': 10}": (now - timedelta(days=10)).timestamp(),
+            "{'value': 3}": (now - timedelta(days=3)).timestamp(),
+            "{'value': 0}": now.timestamp(),
+        })
+
+        assert monitor.cleanup_old_metrics(30) == 0
+        assert monitor.cleanup_old_metrics(5) == 1
+        assert redis_client.zcard(key) == 2
+        assert monitor.cleanup_old_metrics(1) == 1
+        assert redis_client.zrange(key, 0, -1) == ["{'value': 0}"]
+
+    def test_works_without_redis(self):
+        monitor = AIPerformanceMonitor(fakeredis.FakeRedis())
+        monitor.redis_client = None
+        monitor.record_request("openai", 1.0, success=True)
+
+        assert monitor.get_performance_summary("openai")["metrics"] == {}
+        assert monitor.get_user_performance("1")["total_requests"] == 0
+        assert monitor.cleanup_old_metrics() == 0
+
+
+@pytest.mark.slow
+class TestAIMonitorBenchmark:
+    """Record and summary latency with 1M samples in Redis."""
+
+    def test_one_million_samples(self, monitor, redis_client):
+        rng = random.Random(4)
+        now = datetime.utcnow()
+        samples = [rng.lognormvariate(0, 0.7) for _ in range(1_000_000)]
+
+        # Загружаем состояние, эквивалентное 1M вызовов record_request за последние сутки
+        per_minute = defaultdict(Counter)
+        for index, value in enumerate(samples):
+            per_minute[index % 1440][latency_bucket(value)] += 1
+        pipe = redis_client.pipeline(transaction=False)
+        for minute, buckets in per_minute.items():
+            key = monitor._minute_key("openai", now - timedelta(minutes=minute))
+            pipe.hset(key, mapping={f"lat:{index}": count for index, count in buckets.items()})
+            pipe.hincrby(key, "requests", sum(buckets.values()))
+            pipe.hincrby(key, "success", sum(buckets.values()))
+        pipe.execute()
+
+        started = time.perf_counter()
+        for _ in range(1000):
+            monitor.record_request("openai", rng.lognormvariate(0, 0.7), success=True, cost=0.001, user_id="1")
+        record_seconds = (time.perf_counter() - started) / 1000
+
+        started = time.perf_counter()
+        summary = monitor.get_performance_summary("openai", 24)
+        summary_seconds = time.perf_counter() - started
+
+        response_time = summary["metrics"]["response_time"]
+        print(f"record: {record_seconds * 1000:.3f} ms, summary: {summary_seconds * 1000:.1f} ms")
+        assert response_time["count"] == 1_001_000
+        for percentile, name in ((0.5, "median"), (0.99, "p99")):
+            exact = exact_percentile(samples, percentile)
+            assert abs(response_time[name] - exact) / exact <= MAX_RELATIVE_ERROR * 1.05
+        assert record_seconds < 0.01
+        assert summary_seconds < 5
@@ -0,0 +1,136 @@
+"""Tests for ThemeCategorizer batched cache and shared provider client."""
+
+import asyncio
+import weakref
+from types import SimpleNamespace
+
+import fakeredis
+import pytest
+
+from core.ai import categorizer as categorizer_module
+from core.ai.categorizer import ThemeCategorizer
+
+
+class FakeCompletions:
+    """Answers 'Theme | Category | Confidence' lines and tracks concurrency."""
+
+    def __init__(self):
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def create(self, **kwargs):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.001)
+        self.in_flight -= 1
+
+        prompt = kwargs["messages"][-1]["content"].split("For each theme")[0]
+        themes = [
+            line.strip().split(". ", 1)[1]
+            for line in prompt.splitlines()
+            if line.strip()[:1].isdigit() and ". " in line
+        ]
+        self.calls.append(themes)
+        content = "\n".join(f"{theme} | Category {theme[-1]} | 0.9" for theme in themes)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class CountingRedis(fakeredis.FakeRedis):
+    """Counts direct commands and pipeline executions (round-trips)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.commands = []
+        self.pipelines = 0
+
+    def execute_command(self, *args, **options):
+        self.commands.append(args[0])
+        return super().execute_command(*args, **options)
+
+    def pipeline(self, *args, **kwargs):
+        self.pipelines += 1
+        return super().pipeline(*args, **kwargs)
+
+
+@pytest.fixture
+def redis_client():
+    return CountingRedis(decode_responses=True)
+
+
+@pytest.fixture
+def completions():
+    return FakeCompletions()
+
+
+@pytest.fixture
+def categorizer(redis_client, completions):
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return ThemeCategorizer(redis_client, client=client)
+
+
+def make_themes(count):
+    return [f"Theme {index}" for index in range(count)]
+
+
+class TestCategorizeBatch:
+    """Test categorize_batch round-trips."""
+
+    def test_fully_cached_input_is_one_read(self, categorizer, redis_client, completions):
+        themes = make_themes(1000)
+        redis_client.mset({f"theme_category:{theme.lower()}": "Business" for theme in themes})
+        redis_client.commands.clear()
+
+        results = asyncio.run(categorizer.categorize_batch(themes))
+
+        assert redis_client.commands == ["MGET"]
+        assert redis_client.pipelines == 0
+        assert completions.calls == []
+        assert [result["theme"] for result in results] == themes
+        assert all(result["cached"] and result["category"] == "Business" for result in results)
+
+    def test_only_misses_go_to_provider(self, categorizer, redis_client, completions, monkeypatch):
+        monkeypatch.setattr(categorizer_module, "CATEGORIZER_BATCH_SIZE", 10)
+        monkeypatch.setattr(categorizer_module, "CATEGORIZER_CONCURRENCY", 2)
+        themes = make_themes(100)
+        redis_client.mset({f"theme_category:{theme.lower()}": "Cached" for theme in themes[::2]})
+        redis_client.commands.clear()
+
+        results = asyncio.run(categorizer.categorize_batch(themes))
+
+        requested = [theme for call in completions.calls for theme in call]
+        assert sorted(requested) == sorted(themes[1::2])
+        assert len(completions.calls) == 5
+        assert 1 < completions.max_in_flight <= 2
+        assert redis_client.commands == ["MGET"]
+        assert redis_client.pipelines == 1
+        assert [result["category"] for result in results[:4]] == ["Cached", "Category 1", "Cached", "Category 3"]
+        assert redis_client.ttl("theme_category:theme 1") > 0
+
+        redis_client.commands.clear()
+        second = asyncio.run(categorizer.categorize_batch(themes))
+        assert redis_client.commands == ["MGET"]
+        assert all(result["cached"] for result in second)
+
+    def test_duplicates_requested_once(self, categorizer, completions):
+        results = asyncio.run(categorizer.categorize_batch(["Sea", "Sea", "Forest"]))
+
+        assert completions.calls == [["Sea", "Forest"]]
+        assert [result["category"] for result in results] == ["Category a", "Category a", "Category t"]
+
+    def test_shared_client_reused_within_event_loop(self, monkeypatch):
+        monkeypatch.setattr(categorizer_module, "_shared_clients", weakref.WeakKeyDictionary())
+        monkeypatch.setattr(categorizer_module.settings, "openai_api_key", "test-key")
+
+        async def clients():
+            first = ThemeCategorizer(fakeredis.FakeRedis())
+            second = ThemeCategorizer(fakeredis.FakeRedis())
+            return first.client, second.client, first.client
+
+        first_run = asyncio.run(clients())
+        second_run = asyncio.run(clients())
+
+        assert first_run[0] is first_run[1] is first_run[2]
+        assert second_run[0] is second_run[1]
+        # Новый asyncio.run() (задача воркера) - новый клиент, без соединений закрытого loop
+        assert first_run[0] is not second_run[0]
@@ -0,0 +1,223 @@
+"""Tests for the Redis delay queue of bot message sequences."""
+
+import asyncio
+from types import SimpleNamespace
+
+import fakeredis
+import pytest
+from aiogram.exceptions import TelegramForbiddenError
+from aiogram.methods import SendMessage
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from bot.handlers import start as start_module
+from core.notifications import delayed_queue as delayed_queue_module
+from core.notifications.delayed_queue import (
+    DelayedMessage, DelayedMessageDispatcher, DelayedMessageQueue
+)
+
+TICK = 0.1
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+class Crash(BaseException):
+    """Dispatcher process dies (not handled like a send error)."""
+
+
+class FakeBot:
+    """Records sent messages with the fake clock time."""
+
+    def __init__(self, clock, failures=None, crash_after_send=False):
+        self.clock = clock
+        self.failures = list(failures or [])
+        self.crash_after_send = crash_after_send
+        self.sent = []
+
+    async def send_message(self, **kwargs):
+        if self.failures:
+            error = self.failures.pop(0)
+            if error is not None:
+                raise error
+        self.sent.append((self.clock(), kwargs["chat_id"], kwargs["text"], kwargs))
+        if self.crash_after_send:
+            raise Crash()
+        return SimpleNamespace(message_id=len(self.sent), chat=SimpleNamespace(id=kwargs["chat_id"]))
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def queue(redis_client, clock):
+    return DelayedMessageQueue(redis_client, clock=clock, visibility_timeout=30)
+
+
+def run_for(dispatcher, clock, seconds):
+    """Advance the fake clock in small ticks, running the dispatcher each tick."""
+
+    async def loop():
+        for _ in range(int(round(seconds / TICK))):
+            await dispatcher.run_once()
+            clock.now += TICK
+
+    asyncio.run(loop())
+
+
+def report_sequence(chat_id):
+    return [
+        DelayedMessage(chat_id=chat_id, text="title", delay=2.5, parse_mode="HTML"),
+        DelayedMessage(chat_id=chat_id, text="portfolio", delay=3, parse_mode="HTML"),
+        DelayedMessage(chat_id=chat_id, text="new works", delay=2, parse_mode="HTML"),
+        DelayedMessage(chat_id=chat_id, text="limit", delay=2, parse_mode="HTML"),
+        DelayedMessage(chat_id=chat_id, text="closing", parse_mode="HTML"),
+    ]
+
+
+class TestDelayedMessageQueue:
+    """Test ordering, spacing and delivery guarantees."""
+
+    def test_order_and_spacing(self, queue, clock):
+        bot = FakeBot(clock)
+        dispatcher = DelayedMessageDispatcher(bot, queue)
+        started = clock.now
+        assert queue.enqueue_sequence(report_sequence(2))
+        assert queue.enqueue_sequence([DelayedMessage(chat_id=1, text="howto", delay=2)])
+
+        run_for(dispatcher, clock, 15)
+
+        by_chat = {}
+        for sent_at, chat_id, text, _ in bot.sent:
+            by_chat.setdefault(chat_id, []).append((sent_at, text))
+
+        assert [text for _, text in by_chat[1]] == ["howto"]
+        assert 2 <= by_chat[1][0][0] - started < 2 + 2 * TICK
+
+        assert [text for _, text in by_chat[2]] == ["title", "portfolio", "new works", "limit", "closing"]
+        times = [started] + [sent_at for sent_at, _ in by_chat[2]]
+        for (previous, current), step in zip(zip(times, times[1:]), report_sequence(2)):
+            # Пауза отсчитывается от фактической отправки предыдущего шага
+            assert step.delay <= current - previous < step.delay + 2 * TICK
+        assert queue.pending_count() == 0
+
+    def test_at_least_once_across_dispatcher_restart(self, redis_client, queue, clock):
+        assert queue.enqueue_sequence([
+            DelayedMessage(chat_id=1, text="one"),
+            DelayedMessage(chat_id=1, text="two", delay=1),
+            DelayedMessage(chat_id=1, text="three", delay=1),
+        ])
+        first = FakeBot(clock)
+        run_for(DelayedMessageDispatcher(first, queue), clock, 0.5)
+        assert [text for _, _, text, _ in first.sent] == ["one"]
+
+        # Процесс бота падает сразу после отправки "two", до подтверждения
+        crashing = FakeBot(clock, crash_after_send=True)
+        with pytest.raises(Crash):
+            run_for(DelayedMessageDispatcher(crashing, queue), clock, 2)
+        assert [text for _, _, text, _ in crashing.sent] == ["two"]
+
+        # Новый процесс: до истечения visibility_timeout шаг не переотправляется
+        restarted_queue = DelayedMessageQueue(redis_client, clock=clock, visibility_timeout=30)
+        second = FakeBot(clock)
+        dispatcher = DelayedMessageDispatcher(second, restarted_queue)
+        run_for(dispatcher, clock, 29)
+        assert second.sent == []
+
+        run_for(dispatcher, clock, 3)
+        assert [text for _, _, text, _ in second.sent] == ["two", "three"]
+        assert second.sent[1][0] - second.sent[0][0] >= 1
+        assert restarted_queue.pending_count() == 0
+
+    def test_slow_dispatcher_does_not_fork_sequence(self, queue, clock):
+        assert queue.enqueue_sequence([
+            DelayedMessage(chat_id=1, text="one"),
+            DelayedMessage(chat_id=1, text="two", delay=1),
+        ])
+        [(member, payload)] = queue.claim_due()
+
+        # Первый диспетчер завис дольше visibility_timeout - шаг забрал второй
+        clock.now += 31
+        bot = FakeBot(clock)
+        run_for(DelayedMessageDispatcher(bot, queue), clock, 0.5)
+        assert [text for _, _, text, _ in bot.sent] == ["one"]
+
+        # Подтверждение от зависшего диспетчера не ставит продолжение второй раз
+        assert queue.complete_step(member, payload) is False
+        run_for(DelayedMessageDispatcher(bot, queue), clock, 2)
+        assert [text for _, _, text, _ in bot.sent] == ["one", "two"]
+
+    def test_retry_drop_and_sent_handler(self, queue, clock):
+        forbidden = TelegramForbiddenError(method=SendMessage(chat_id=2, text="x"), message="bot was blocked")
+        bot = FakeBot(clock, failures=[ConnectionError("network down"), forbidden])
+        recorded = []
+
+        async def record(message, context):
+            recorded.append((message.message_id, context))
+
+        dispatcher = DelayedMessageDispatcher(
+            bot, queue, retry_delay_seconds=5, sent_handlers={"record": record}
+        )
+        assert queue.enqueue_sequence(
+            [DelayedMessage(chat_id=1, text="a"), DelayedMessage(chat_id=1, text="b", delay=1)],
+            on_sent="record", context={"csv_analysis_id": 7},
+        )
+        assert queue.enqueue_sequence(
+            [DelayedMessage(chat_id=2, text="x", delay=0.05), DelayedMessage(chat_id=2, text="y", delay=1)]
+        )
+
+        run_for(dispatcher, clock, 4)
+        # "a" упал с сетевой ошибкой и ждет повтора; chat 2 заблокировал бота - последовательность удалена
+        assert bot.sent == []
+        run_for(dispatcher, clock, 3)
+
+        assert [(chat_id, text) for _, chat_id, text, _ in bot.sent] == [(1, "a"), (1, "b")]
+        assert recorded == [(1, {"csv_analysis_id": 7}), (2, {"csv_analysis_id": 7})]
+        assert queue.pending_count() == 0
+
+    def test_welcome_handler_enqueues_and_returns(self, queue, clock, monkeypatch):
+        monkeypatch.setattr(delayed_queue_module, "_delayed_message_queue", queue)
+
+        async def no_sleep(seconds):
+            raise AssertionError("handler must not sleep")
+
+        monkeypatch.setattr(start_module.asyncio, "sleep", no_sleep)
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="Меню", callback_data="menu")]])
+        monkeypatch.setattr(start_module, "get_main_menu_keyboard", lambda subscription_type: keyboard)
+
+        answers = []
+
+        async def answer(text, **kwargs):
+            answers.append(text)
+
+        message = SimpleNamespace(chat=SimpleNamespace(id=42), answer=answer)
+        user = SimpleNamespace(subscription_type="PRO")
+        asyncio.run(start_module.send_welcome_sequence(message, user))
+
+        assert answers == [start_module.LEXICON_RU['start_promo']]
+        monkeypatch.undo()
+
+        bot = FakeBot(clock)
+        run_for(DelayedMessageDispatcher(bot, queue), clock, 2.5)
+        [(_, chat_id, text, kwargs)] = bot.sent
+        assert (chat_id, text) == (42, start_module.LEXICON_RU['start_howto'])
+        assert kwargs["reply_markup"] == keyboard
+
+    def test_unavailable_redis(self, clock, monkeypatch):
+        monkeypatch.setattr("config.database.redis_client", None)
+        queue = DelayedMessageQueue(clock=clock)
+
+        assert queue.available is False
+        assert queue.enqueue_sequence([DelayedMessage(chat_id=1, text="a")]) is False
+        assert asyncio.run(queue.aenqueue_sequence([DelayedMessage(chat_id=1, text="a")])) is False
@@ -0,0 +1,101 @@
+"""Tests for set-based trending themes and theme_trend_snapshot."""
+
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from database.models import GlobalTheme, ThemeTrendSnapshot
+from core.ai import market_analyzer as analyzer_module
+from core.ai.market_analyzer import MarketAnalyzer, refresh_theme_trend_snapshot
+
+
+def seed(db, count=300, seed_value=11):
+    rng = random.Random(seed_value)
+    now = datetime.utcnow()
+    sales = rng.sample(range(0, 3000), count)
+    for index in range(count):
+        db.add(GlobalTheme(
+            theme_name=f"theme {index}",
+            total_sales=sales[index],
+            last_updated=now - timedelta(days=rng.uniform(0, 120))
+        ))
+    db.commit()
+
+
+def legacy_trending(analyzer, period, limit):
+    """Per-theme computation as it was done before (2 queries per theme)."""
+    days = {'week': 7, 'month': 30, 'quarter': 90}.get(period, 7)
+    themes = analyzer.db.query(GlobalTheme).filter(
+        GlobalTheme.last_updated >= datetime.utcnow() - timedelta(days=days)
+    ).order_by(GlobalTheme.total_sales.desc()).limit(limit).all()
+    data = [
+        {
+            "theme_name": theme.theme_name,
+            "growth_rate": analyzer._calculate_theme_growth_rate(theme.theme_name, period),
+            "trend_score": analyzer._calculate_trend_score(theme, period),
+        }
+        for theme in themes
+    ]
+    data.sort(key=lambda x: x["trend_score"], reverse=True)
+    return data
+
+
+def comparable(items):
+    return [(item["theme_name"], pytest.approx(item["growth_rate"]), item["trend_score"]) for item in items]
+
+
+class TestTrendingThemes:
+    """Equivalence of old and new growth values."""
+
+    @pytest.mark.parametrize("period", ["week", "month", "quarter", "unknown"])
+    def test_live_query_matches_legacy(self, db, period):
+        seed(db)
+        analyzer = MarketAnalyzer(db)
+
+        assert comparable(analyzer.get_trending_themes(period, 50)) == comparable(legacy_trending(analyzer, period, 50))
+
+    @pytest.mark.parametrize("period", ["week", "month", "quarter"])
+    def test_snapshot_matches_legacy(self, db, period):
+        seed(db)
+        analyzer = MarketAnalyzer(db)
+        refresh_theme_trend_snapshot(db)
+        db.commit()
+
+        assert comparable(analyzer.get_trending_themes(period, 20)) == comparable(legacy_trending(analyzer, period, 20))
+
+    def test_snapshot_served_with_one_statement(self, db, sync_statements):
+        seed(db)
+        stored = refresh_theme_trend_snapshot(db)
+        db.commit()
+        sync_statements.clear()
+
+        trends = MarketAnalyzer(db).get_trending_themes('month', 20)
+
+        assert len(trends) == 20
+        assert len(sync_statements) == 1
+        assert "theme_trend_snapshot" in sync_statements[0]
+        periods = db.execute(select(ThemeTrendSnapshot.period).distinct()).scalars().all()
+        assert sorted(periods) == ["month", "quarter", "week"]
+        assert stored == db.query(ThemeTrendSnapshot).count()
+
+    def test_refresh_replaces_previous_snapshot(self, db):
+        seed(db, count=30)
+        refresh_theme_trend_snapshot(db, ['week'])
+        db.commit()
+        theme = db.query(GlobalTheme).order_by(GlobalTheme.total_sales).first()
+        theme.total_sales = 10_000
+        theme.last_updated = datetime.utcnow()
+        db.commit()
+
+        refresh_theme_trend_snapshot(db, ['week'])
+        db.commit()
+        top = db.query(ThemeTrendSnapshot).filter_by(period='week').order_by(ThemeTrendSnapshot.sales_rank).first()
+
+        assert top.theme_id == theme.id
+        assert top.growth_rate == analyzer_module.TREND_PERIODS['week'][1]
+        assert db.query(ThemeTrendSnapshot).filter_by(period='week', theme_id=theme.id).count() == 1
+
+    def test_empty_database(self, db):
+        assert MarketAnalyzer(db).get_trending_themes('week', 10) == []
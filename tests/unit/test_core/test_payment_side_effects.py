@@ -0,0 +1,248 @@
+"""Tests for the payment side-effect outbox."""
+
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from core.payments import side_effects as side_effects_module
+from core.payments.side_effects import PaymentSideEffectOutbox
+from core.subscriptions import payment_handler as payment_handler_module
+from core.subscriptions.payment_handler import PaymentHandler
+from database.models import (
+    Base, PaymentSideEffect, SideEffectStatus, SideEffectType, User
+)
+
+
+TELEGRAM_LATENCY = 0.5
+
+
+class FakeSession:
+    def __init__(self):
+        self.closed = 0
+
+    async def close(self):
+        self.closed += 1
+
+
+class FakeBot:
+    """Records Telegram calls; optionally slow or failing."""
+
+    def __init__(self, latency=0.0, failures=None):
+        self.latency = latency
+        self.failures = list(failures or [])
+        self.calls = []
+        self.session = FakeSession()
+
+    async def _call(self, method, **kwargs):
+        await asyncio.sleep(self.latency)
+        if self.failures:
+            error = self.failures.pop(0)
+            if error is not None:
+                raise error
+        self.calls.append((method, kwargs))
+        return True
+
+    async def send_message(self, **kwargs):
+        return await self._call("send_message", **kwargs)
+
+    async def unban_chat_member(self, **kwargs):
+        return await self._call("unban_chat_member", **kwargs)
+
+
+class ExplodingBot:
+    """Any Bot constructed on the payment path is a failure."""
+
+    def __init__(self, *args, **kwargs):
+        raise AssertionError("Bot must not be created while processing a payment")
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = datetime.utcnow() + timedelta(seconds=1)
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / "payments.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    with sessionmaker(engine)() as session:
+        session.add(User(id=1, telegram_id=5001, referral_balance=2, referral_bonus_paid=False))
+        session.add(User(id=2, telegram_id=5002, referrer_id=1, referral_bonus_paid=False))
+        session.commit()
+    engine.dispose()
+    return path
+
+
+@pytest.fixture
+def sync_factory(db_path):
+    engine = create_engine(f"sqlite:///{db_path}")
+    yield sessionmaker(engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def kicks(db_path, monkeypatch):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}", poolclass=NullPool)
+    monkeypatch.setattr(payment_handler_module, "AsyncSessionLocal", async_sessionmaker(engine, expire_on_commit=False))
+    monkeypatch.setattr("aiogram.Bot", ExplodingBot)
+
+    calls = []
+
+    async def kick():
+        calls.append(time.perf_counter())
+
+    # Процесс "падает" сразу после коммита: воркер так и не получил задачу
+    monkeypatch.setattr(payment_handler_module, "kick_side_effects_worker", kick)
+    yield calls
+    asyncio.run(engine.dispose())
+
+
+def pay(payment_id="pay-1", user_id=5002, subscription_type="PRO"):
+    return asyncio.run(PaymentHandler().process_payment_success(
+        payment_id=payment_id, user_id=user_id, amount=990.0, subscription_type=subscription_type
+    ))
+
+
+def effects(sync_factory):
+    with sync_factory() as session:
+        return list(session.execute(select(PaymentSideEffect).order_by(PaymentSideEffect.id)).scalars().all())
+
+
+class TestPaymentSideEffects:
+    """Test outbox writes and draining."""
+
+    def test_payment_writes_outbox_without_telegram(self, sync_factory, kicks):
+        started = time.perf_counter()
+        assert pay() is True
+        elapsed = time.perf_counter() - started
+
+        # Telegram на пути вебхука не вызывается - задержка от него не зависит
+        assert elapsed < TELEGRAM_LATENCY
+        assert len(kicks) == 1
+
+        rows = effects(sync_factory)
+        assert [(row.effect_type, row.telegram_user_id, row.status) for row in rows] == [
+            (SideEffectType.REFERRAL_NOTIFICATION.value, 5001, SideEffectStatus.PENDING.value),
+            (SideEffectType.VIP_UNBAN.value, 5002, SideEffectStatus.PENDING.value),
+            (SideEffectType.TARIFF_NOTIFICATION.value, 5002, SideEffectStatus.PENDING.value),
+        ]
+        assert json.loads(rows[0].payload) == {"subscription_type": "PRO", "balance": 3}
+        assert json.loads(rows[2].payload)["subscription_type"] == "PRO"
+
+        # Повторная доставка того же платежа не добавляет эффектов
+        assert pay() is True
+        assert len(effects(sync_factory)) == 3
+
+    def test_crash_after_commit_sends_each_effect_once(self, sync_factory, kicks):
+        pay()
+        bot = FakeBot(latency=0.01)
+        outbox = PaymentSideEffectOutbox(session_factory=sync_factory)
+
+        assert outbox.drain(bot) == 3
+        assert outbox.drain(bot) == 0
+
+        assert sorted((method, kwargs["chat_id"] if method == "send_message" else kwargs["user_id"])
+                      for method, kwargs in bot.calls) == [
+            ("send_message", 5001), ("send_message", 5002), ("unban_chat_member", 5002)
+        ]
+        assert all(row.status == SideEffectStatus.SENT.value and row.sent_at for row in effects(sync_factory))
+        assert bot.session.closed == 2
+
+    def test_stale_claim_from_crashed_worker_is_reclaimed_once(self, sync_factory, kicks):
+        pay()
+        clock = FakeClock()
+        crashed = PaymentSideEffectOutbox(session_factory=sync_factory, clock=clock)
+        # Воркер захватил пачку и упал до отправки
+        assert len(crashed._claim_batch()) == 3
+
+        bot = FakeBot()
+        outbox = PaymentSideEffectOutbox(session_factory=sync_factory, clock=clock, lock_timeout_seconds=300)
+        assert outbox.drain(bot) == 0
+
+        clock.now += timedelta(seconds=301)
+        assert outbox.drain(bot) == 3
+        assert outbox.drain(bot) == 0
+        assert len(bot.calls) == 3
+        assert {row.attempts for row in effects(sync_factory)} == {2}
+
+    def test_retry_with_backoff_then_permanent_failure(self, sync_factory):
+        from aiogram.exceptions import TelegramForbiddenError
+        from aiogram.methods import SendMessage
+
+        with sync_factory() as session:
+            side_effects_module.enqueue_side_effect(
+                session, "pay-9", SideEffectType.REFERRAL_NOTIFICATION, 7001,
+                {"subscription_type": "ULTRA", "balance": 1}
+            )
+            side_effects_module.enqueue_side_effect(
+                session, "pay-10", SideEffectType.REFERRAL_NOTIFICATION, 7002,
+                {"subscription_type": "PRO", "balance": 4}
+            )
+            session.commit()
+
+        clock = FakeClock()
+        forbidden = TelegramForbiddenError(method=SendMessage(chat_id=7002, text="x"), message="bot was blocked")
+        bot = FakeBot(failures=[ConnectionError("network down"), forbidden])
+        outbox = PaymentSideEffectOutbox(session_factory=sync_factory, clock=clock, retry_delay_seconds=30)
+
+        assert outbox.drain(bot) == 2
+        first, second = effects(sync_factory)
+        assert (first.status, first.attempts, first.last_error) == (SideEffectStatus.PENDING.value, 1, "network down")
+        assert first.available_at == clock.now + timedelta(seconds=30)
+        # Пользователь заблокировал бота - не повторяем
+        assert second.status == SideEffectStatus.FAILED.value
+
+        clock.now += timedelta(seconds=29)
+        assert outbox.drain(bot) == 0
+        clock.now += timedelta(seconds=1)
+        assert outbox.drain(bot) == 1
+
+        first, second = effects(sync_factory)
+        assert first.status == SideEffectStatus.SENT.value
+        assert [kwargs["chat_id"] for _, kwargs in bot.calls] == [7001]
+
+    def test_vip_unban_of_not_banned_user_is_sent(self, sync_factory):
+        from aiogram.exceptions import TelegramBadRequest
+        from aiogram.methods import UnbanChatMember
+
+        with sync_factory() as session:
+            for payment_id, telegram_id in (("pay-11", 8001), ("pay-12", 8002), ("pay-13", 8003)):
+                side_effects_module.enqueue_side_effect(session, payment_id, SideEffectType.VIP_UNBAN, telegram_id)
+            session.commit()
+
+        method = UnbanChatMember(chat_id=-100, user_id=8001)
+        bot = FakeBot(failures=[
+            TelegramBadRequest(method=method, message="Bad Request: user not found"),
+            TelegramBadRequest(method=method, message="Bad Request: PARTICIPANT_ID_INVALID"),
+            ConnectionError("network down"),
+        ])
+        outbox = PaymentSideEffectOutbox(session_factory=sync_factory, clock=FakeClock())
+
+        assert outbox.drain(bot) == 3
+        statuses = [(row.telegram_user_id, row.status) for row in effects(sync_factory)]
+        # "user not found" - пользователь не забанен, разбан не нужен; сетевая ошибка повторяется
+        assert statuses == [
+            (8001, SideEffectStatus.SENT.value),
+            (8002, SideEffectStatus.FAILED.value),
+            (8003, SideEffectStatus.PENDING.value),
+        ]
+
+    def test_rolled_back_payment_leaves_no_effects(self, sync_factory, kicks, monkeypatch):
+        def boom(*args, **kwargs):
+            raise RuntimeError("limits update failed")
+
+        monkeypatch.setattr(PaymentHandler, "_create_limits_for_subscription", boom)
+        assert pay() is False
+        assert effects(sync_factory) == []
+        assert kicks == []
@@ -0,0 +1,132 @@
+"""Tests for atomic exactly-once referral point award."""
+
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine, func, select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from core.subscriptions.referral_award import award_referral_point, award_referral_point_sync
+from database.models import Base, ReferralAwardLog, User
+
+
+ATTEMPTS = 50
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    # Файловая БД: у каждой сессии свое соединение, записи конкурируют за блокировку
+    path = tmp_path / "referral.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    with sessionmaker(engine)() as session:
+        session.add(User(id=1, telegram_id=1001, referral_balance=5, referral_bonus_paid=False))
+        session.add_all([
+            User(id=index, telegram_id=1000 + index, referrer_id=1, referral_bonus_paid=False)
+            for index in range(2, 2 + ATTEMPTS)
+        ])
+        session.commit()
+    engine.dispose()
+    return path
+
+
+@pytest.fixture
+def session_factory(db_path):
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{db_path}",
+        poolclass=NullPool,
+        connect_args={"timeout": 30},
+    )
+    yield async_sessionmaker(engine, expire_on_commit=False)
+    asyncio.run(engine.dispose())
+
+
+async def attempt(session_factory, user_id, payment_id):
+    async with session_factory() as session:
+        award = await award_referral_point(session, user_id, payment_id)
+        await session.commit()
+        return award
+
+
+async def referrer_state(session_factory):
+    async with session_factory() as session:
+        balance = (await session.execute(select(User.referral_balance).where(User.id == 1))).scalar_one()
+        logged = (await session.execute(select(func.count(ReferralAwardLog.id)))).scalar_one()
+        return balance, logged
+
+
+class TestReferralAward:
+    """Test concurrent award attempts."""
+
+    def test_parallel_attempts_award_exactly_once(self, session_factory):
+        async def scenario():
+            awards = await asyncio.gather(*[
+                attempt(session_factory, 2, f"payment-{index}") for index in range(ATTEMPTS)
+            ])
+            return awards, await referrer_state(session_factory)
+
+        awards, (balance, logged) = asyncio.run(scenario())
+
+        successful = [award for award in awards if award is not None]
+        assert len(successful) == 1
+        assert successful[0].referrer_id == 1
+        assert successful[0].referrer_telegram_id == 1001
+        assert successful[0].referrer_balance == 6
+        assert balance == 6
+        assert logged == 1
+
+    def test_parallel_referrals_do_not_lose_increments(self, session_factory):
+        async def scenario():
+            awards = await asyncio.gather(*[
+                attempt(session_factory, user_id, f"payment-{user_id}") for user_id in range(2, 2 + ATTEMPTS)
+            ])
+            return awards, await referrer_state(session_factory)
+
+        awards, (balance, logged) = asyncio.run(scenario())
+
+        assert all(award is not None for award in awards)
+        assert sorted(award.referrer_balance for award in awards) == list(range(6, 6 + ATTEMPTS))
+        assert balance == 5 + ATTEMPTS
+        assert logged == ATTEMPTS
+
+    def test_log_blocks_repeat_after_flag_reset(self, session_factory):
+        async def scenario():
+            first = await attempt(session_factory, 3, "payment-1")
+            async with session_factory() as session:
+                await session.execute(update(User).where(User.id == 3).values(referral_bonus_paid=False))
+                await session.commit()
+            second = await attempt(session_factory, 3, "payment-2")
+            return first, second, await referrer_state(session_factory)
+
+        first, second, (balance, logged) = asyncio.run(scenario())
+
+        assert first is not None
+        assert second is None
+        assert balance == 6
+        assert logged == 1
+
+    def test_user_without_referrer_is_skipped(self, session_factory):
+        award = asyncio.run(attempt(session_factory, 1, "payment-1"))
+        assert award is None
+        assert asyncio.run(referrer_state(session_factory)) == (5, 0)
+
+    def test_sync_variant(self, db_path):
+        engine = create_engine(f"sqlite:///{db_path}")
+        Session = sessionmaker(engine)
+        try:
+            with Session() as session:
+                first = award_referral_point_sync(session, 4, "boosty-1")
+                second = award_referral_point_sync(session, 4, "boosty-1")
+                session.commit()
+            with Session() as session:
+                balance = session.execute(select(User.referral_balance).where(User.id == 1)).scalar_one()
+                log = session.execute(select(ReferralAwardLog)).scalar_one()
+        finally:
+            engine.dispose()
+
+        assert first.referrer_balance == 6
+        assert second is None
+        assert balance == 6
+        assert (log.referred_user_id, log.referrer_id, log.payment_id) == (4, 1, "boosty-1")
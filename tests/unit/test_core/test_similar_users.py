@@ -0,0 +1,139 @@
+"""Tests for vectorized similar-user search."""
+
+import random
+import time
+
+import numpy as np
+import pytest
+
+from database.models import User, CSVAnalysis, ThemeRequest, SubscriptionType, UserProfileVector
+from core.ai.profile_vectors import (
+    PROFILE_VECTOR_SIZE,
+    build_profile_vector,
+    refresh_user_profile_vector,
+    top_k_similar,
+)
+from core.ai.recommendation_engine import RecommendationEngine, SIMILARITY_THRESHOLD
+
+
+CLUSTERS = {
+    "business": ["Business meeting", "Office work", "Corporate team"],
+    "nature": ["Forest landscape", "Green nature", "Outdoor hiking"],
+    "food": ["Kitchen cooking", "Restaurant meal", "Healthy food"],
+}
+
+
+def seed(db, cluster_size=8, seed_value=5):
+    """Users in clusters sharing themes; returns {cluster: [user ids]}."""
+    rng = random.Random(seed_value)
+    clusters = {}
+    telegram_id = 1
+    for cluster, themes in CLUSTERS.items():
+        for subscription_type in (SubscriptionType.PRO, SubscriptionType.FREE):
+            for _ in range(cluster_size):
+                user = User(telegram_id=telegram_id, subscription_type=subscription_type)
+                telegram_id += 1
+                db.add(user)
+                db.flush()
+                for name in rng.sample(themes, 2):
+                    db.add(ThemeRequest(user_id=user.id, theme_name=name, status="ISSUED"))
+                for month in range(rng.randint(3, 4)):
+                    db.add(CSVAnalysis(user_id=user.id, file_path="f.csv", month=month + 1, year=2025))
+                if subscription_type == SubscriptionType.PRO:
+                    clusters.setdefault(cluster, []).append(user.id)
+    db.commit()
+    for user_id in [user.id for user in db.query(User).all()]:
+        refresh_user_profile_vector(db, user_id)
+    db.commit()
+    return clusters
+
+
+def legacy_similar(engine_, user_id, limit):
+    """Pairwise profile comparison as done before vectors."""
+    current = engine_.get_user_behavior_profile(user_id)
+    others = engine_.db.query(User).filter(
+        User.id != user_id, User.subscription_type == current["subscription_type"]
+    ).all()
+    scored = []
+    for user in others:
+        score = engine_._calculate_user_similarity(current, engine_.get_user_behavior_profile(user.id))
+        if score > SIMILARITY_THRESHOLD:
+            scored.append((score, user.id))
+    scored.sort(reverse=True)
+    return [user_id for _, user_id in scored[:limit]]
+
+
+class TestFindSimilarUsers:
+    """Test find_similar_users against the pairwise implementation."""
+
+    def test_matches_legacy_on_fixture(self, db):
+        clusters = seed(db)
+        recommendation_engine = RecommendationEngine(db)
+
+        for members in clusters.values():
+            for user_id in members:
+                found = recommendation_engine.find_similar_users(user_id, limit=len(members) - 1)
+                legacy = legacy_similar(recommendation_engine, user_id, len(members) - 1)
+                assert {item["user_id"] for item in found} == set(legacy) == set(members) - {user_id}
+                assert all(item["similarity_score"] > SIMILARITY_THRESHOLD for item in found)
+
+    def test_search_costs_two_statements(self, db, sync_statements):
+        clusters = seed(db)
+        sync_statements.clear()
+
+        found = RecommendationEngine(db).find_similar_users(clusters["food"][0], limit=3)
+
+        assert len(found) == 3
+        assert len(sync_statements) == 2
+        assert [item["similarity_score"] for item in found] == sorted(
+            (item["similarity_score"] for item in found), reverse=True
+        )
+
+    def test_missing_vector_is_built_on_demand(self, db):
+        user = User(telegram_id=1, subscription_type=SubscriptionType.PRO)
+        db.add(user)
+        db.commit()
+
+        assert RecommendationEngine(db).find_similar_users(user.id) == []
+        assert db.get(UserProfileVector, user.id) is not None
+
+    def test_unknown_user(self, db):
+        assert RecommendationEngine(db).find_similar_users(12345) == []
+
+
+class TestProfileVectors:
+    """Test vector helpers."""
+
+    def test_vectors_are_normalized(self):
+        vector = build_profile_vector(["Business meeting\nForest"], 3, 120, 55.5, 12, 40)
+        assert vector.shape == (PROFILE_VECTOR_SIZE,)
+        assert np.linalg.norm(vector) == pytest.approx(1.0, abs=1e-6)
+
+    def test_top_k_matches_full_sort(self):
+        rng = np.random.default_rng(0)
+        matrix = rng.random((1000, PROFILE_VECTOR_SIZE), dtype=np.float32)
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+        vector = matrix[0]
+
+        indices, scores = top_k_similar(matrix, vector, 10)
+
+        expected = np.argsort(-(matrix @ vector), kind="stable")[:10]
+        assert list(indices) == list(expected)
+        assert np.all(np.diff(scores) <= 0)
+
+    @pytest.mark.slow
+    def test_benchmark_50k_users(self):
+        rng = np.random.default_rng(1)
+        matrix = rng.random((50_000, PROFILE_VECTOR_SIZE), dtype=np.float32)
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+        vector = matrix[123]
+
+        top_k_similar(matrix, vector, 5)
+        started = time.perf_counter()
+        for _ in range(20):
+            indices, _ = top_k_similar(matrix, vector, 5)
+        elapsed = (time.perf_counter() - started) / 20
+
+        print(f"top-5 over 50k users: {elapsed * 1000:.2f} ms")
+        assert indices[0] == 123
+        assert elapsed < 0.05
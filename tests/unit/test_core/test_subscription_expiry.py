@@ -0,0 +1,155 @@
+"""Tests for set-based subscription expiry and TEST_PRO notifications."""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import fakeredis
+import pytest
+from sqlalchemy import select
+
+from database.models import User, Limits, SubscriptionType
+from core.cache.user_cache import UserCacheService
+from core.notifications import notification_manager as manager_module
+from core.notifications.notification_manager import NotificationManager
+from core.subscriptions import payment_handler as payment_handler_module
+from core.subscriptions.payment_handler import PaymentHandler
+from core.tariffs import tariff_cache as tariff_cache_module
+from core.tariffs.tariff_cache import TariffLimitsCache, _settings_table, tariff_limits_from_settings
+
+
+class FakeBot:
+    """Records sent messages and tracks max concurrency."""
+
+    def __init__(self):
+        self.sent = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def send_message(self, chat_id, text, parse_mode=None, reply_markup=None):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.001)
+        self.in_flight -= 1
+        self.sent.append((chat_id, text))
+
+
+@pytest.fixture(autouse=True)
+def tariff_cache(monkeypatch):
+    cache = TariffLimitsCache(redis_client=fakeredis.FakeRedis())
+    cache._table = _settings_table()
+    monkeypatch.setattr(tariff_cache_module, "_tariff_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    client = fakeredis.FakeRedis()
+    cache_service = UserCacheService(client)
+    monkeypatch.setattr(manager_module, "get_user_cache_service", lambda: cache_service)
+    monkeypatch.setattr(payment_handler_module, "get_user_cache_service", lambda: cache_service)
+    return client
+
+
+async def seed(session_factory, count, subscription_type, expires_at, start_id=1):
+    async with session_factory() as session:
+        for telegram_id in range(start_id, start_id + count):
+            user = User(telegram_id=telegram_id, subscription_type=subscription_type, subscription_expires_at=expires_at)
+            session.add(user)
+            await session.flush()
+            session.add(Limits(user_id=user.id, analytics_total=5, analytics_used=2, themes_total=20, themes_used=3))
+        await session.commit()
+
+
+class TestExpiredTestProConversion:
+    """Test set-based TEST_PRO conversion."""
+
+    @pytest.mark.parametrize("expired_count", [10, 300])
+    def test_statement_count_is_constant(self, session_factory, statements, redis_client, expired_count):
+        now = datetime.utcnow()
+
+        async def scenario():
+            await seed(session_factory, expired_count, SubscriptionType.TEST_PRO, now - timedelta(hours=1))
+            await seed(session_factory, 5, SubscriptionType.TEST_PRO, now + timedelta(days=3), start_id=10_000)
+            for telegram_id in (1, 2):
+                redis_client.set(f"user:{telegram_id}", "{}")
+                redis_client.set(f"limits:{telegram_id}", "{}")
+
+            statements.clear()
+            async with session_factory() as session:
+                converted = await NotificationManager().check_and_convert_expired_test_pro(session)
+            dml = [sql for sql in statements if sql.lstrip().upper().startswith("UPDATE")]
+
+            async with session_factory() as session:
+                users = (await session.execute(select(User).order_by(User.telegram_id))).scalars().all()
+                limits = (await session.execute(select(Limits).order_by(Limits.user_id))).scalars().all()
+            return converted, dml, users, limits
+
+        converted, dml, users, limits = asyncio.run(scenario())
+        free_limits = tariff_limits_from_settings(SubscriptionType.FREE)
+
+        assert converted == expired_count
+        assert len(dml) == 2
+        assert [user.subscription_type for user in users].count(SubscriptionType.FREE) == expired_count
+        assert all(user.subscription_expires_at is None for user in users[:expired_count])
+        assert all(user.subscription_type == SubscriptionType.TEST_PRO for user in users[expired_count:])
+        assert all(item.themes_total == free_limits['themes_limit'] for item in limits[:expired_count])
+        assert all(item.analytics_used == 2 for item in limits)
+        assert all(item.themes_total == 20 for item in limits[expired_count:])
+        assert redis_client.exists("user:1", "user:2", "limits:1", "limits:2") == 0
+
+    def test_nothing_to_convert(self, session_factory, redis_client):
+        async def scenario():
+            async with session_factory() as session:
+                return await NotificationManager().check_and_convert_expired_test_pro(session)
+
+        assert asyncio.run(scenario()) == 0
+
+
+class TestCheckSubscriptionExpiry:
+    """Test PaymentHandler.check_subscription_expiry."""
+
+    def test_downgrades_all_paid_types(self, session_factory, redis_client, monkeypatch):
+        monkeypatch.setattr(payment_handler_module, "AsyncSessionLocal", session_factory)
+        now = datetime.utcnow()
+
+        async def scenario():
+            await seed(session_factory, 3, SubscriptionType.PRO, now - timedelta(days=1))
+            await seed(session_factory, 2, SubscriptionType.ULTRA, now - timedelta(days=1), start_id=100)
+            await seed(session_factory, 2, SubscriptionType.PRO, now + timedelta(days=10), start_id=200)
+            expired = await PaymentHandler().check_subscription_expiry()
+            async with session_factory() as session:
+                result = await session.execute(
+                    select(User.subscription_type).where(User.subscription_type == SubscriptionType.FREE)
+                )
+                return expired, len(result.all())
+
+        expired, free_users = asyncio.run(scenario())
+        assert expired == 5
+        assert free_users == 5
+
+
+class TestTestProExpiringNotifications:
+    """Test TEST_PRO expiration reminders."""
+
+    def test_reminders_sent_with_bounded_concurrency(self, session_factory, monkeypatch):
+        monkeypatch.setattr(manager_module, "NOTIFICATION_SEND_CONCURRENCY", 5)
+        now = datetime.utcnow()
+        bot = FakeBot()
+
+        async def scenario():
+            await seed(session_factory, 30, SubscriptionType.TEST_PRO, now + timedelta(days=4, hours=6))
+            await seed(session_factory, 20, SubscriptionType.TEST_PRO, now + timedelta(days=1, hours=6), start_id=1000)
+            await seed(session_factory, 10, SubscriptionType.TEST_PRO, now + timedelta(days=3), start_id=2000)
+            manager = NotificationManager(bot)
+            async with session_factory() as session:
+                return await manager.send_many(
+                    [(telegram_id, "x", None) for telegram_id in range(3)], concurrency=2
+                ), await manager.send_test_pro_expiring_notifications(session)
+
+        bounded, sent = asyncio.run(scenario())
+        recipients = {chat_id for chat_id, _ in bot.sent}
+
+        assert bounded == 3
+        assert sent == 50
+        assert recipients == set(range(3)) | set(range(1, 31)) | set(range(1000, 1020))
+        assert 1 < bot.max_in_flight <= manager_module.NOTIFICATION_SEND_CONCURRENCY
@@ -0,0 +1,143 @@
+"""Tests for SystemSettingsSnapshot behind Tribute payment links."""
+
+import asyncio
+
+import fakeredis
+import pytest
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from core.cache.system_settings_snapshot import SYSTEM_SETTINGS_VERSION_KEY, SystemSettingsSnapshot
+from core.payments.tribute_handler import TributePaymentHandler
+from database.models import SubscriptionType, SystemSettings
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def async_engine(async_engine):
+    async def seed():
+        session_factory = async_sessionmaker(async_engine, expire_on_commit=False)
+        async with session_factory() as session:
+            session.add_all([
+                SystemSettings(key='payment_link_free_to_pro', value='https://t.me/tribute/app?startapp=free_pro'),
+                SystemSettings(key='payment_link_test_to_ultra', value=' https://t.me/tribute/test_ultra '),
+                SystemSettings(key='payment_link_pro_to_ultra', value=''),
+            ])
+            await session.commit()
+
+    asyncio.run(seed())
+    return async_engine
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+class TestSystemSettingsSnapshot:
+    """Test payment link resolution from in-memory snapshot."""
+
+    def test_no_db_statements_after_warm_up(self, session_factory, statements, redis_client):
+        clock = FakeClock()
+        snapshot = SystemSettingsSnapshot(session_factory, redis_client, clock=clock)
+        handler = TributePaymentHandler(settings_snapshot=snapshot)
+
+        async def scenario():
+            await snapshot.load()
+            statements.clear()
+            links = []
+            for user_id in range(1000):
+                clock.now += 0.01
+                links.append(await handler.create_subscription_link(
+                    user_id, SubscriptionType.PRO, user_subscription_type=SubscriptionType.FREE
+                ))
+            return statements, links
+
+        statements, links = asyncio.run(scenario())
+
+        assert statements == []
+        assert links[0] == "https://t.me/tribute/app?startapp=free_pro&user_id=0"
+        assert links[999] == "https://t.me/tribute/app?startapp=free_pro&user_id=999"
+
+    def test_refresh_after_version_bump(self, session_factory, redis_client):
+        clock = FakeClock()
+        bot_snapshot = SystemSettingsSnapshot(session_factory, redis_client, clock=clock)
+        admin_snapshot = SystemSettingsSnapshot(session_factory, redis_client, clock=clock)
+        handler = TributePaymentHandler(settings_snapshot=bot_snapshot)
+
+        async def link():
+            return await handler.create_subscription_link(
+                7, SubscriptionType.ULTRA, user_subscription_type=SubscriptionType.TEST_PRO
+            )
+
+        async def scenario():
+            before = await link()
+            async with session_factory() as session:
+                await session.execute(
+                    update(SystemSettings)
+                    .where(SystemSettings.key == 'payment_link_test_to_ultra')
+                    .values(value='https://t.me/tribute/new_ultra?x=1')
+                )
+                await session.commit()
+            admin_snapshot.bump_version()
+
+            # До истечения интервала проверки версии - старое значение из памяти
+            stale = await link()
+            clock.now += bot_snapshot.check_interval
+            fresh = await link()
+            return before, stale, fresh
+
+        before, stale, fresh = asyncio.run(scenario())
+
+        assert before == "https://t.me/tribute/test_ultra?user_id=7"
+        assert stale == before
+        assert fresh == "https://t.me/tribute/new_ultra?x=1&user_id=7"
+        assert redis_client.get(SYSTEM_SETTINGS_VERSION_KEY) == "1"
+
+    def test_version_checked_once_per_interval(self, session_factory, redis_client):
+        clock = FakeClock()
+        snapshot = SystemSettingsSnapshot(session_factory, redis_client, clock=clock)
+        calls = []
+        original_get = redis_client.get
+        redis_client.get = lambda key: calls.append(key) or original_get(key)
+
+        async def scenario():
+            await snapshot.load()
+            for _ in range(100):
+                await snapshot.aget('payment_link_free_to_pro')
+            clock.now += snapshot.check_interval
+            for _ in range(100):
+                await snapshot.aget('payment_link_free_to_pro')
+
+        asyncio.run(scenario())
+        assert calls == [SYSTEM_SETTINGS_VERSION_KEY, SYSTEM_SETTINGS_VERSION_KEY]
+
+    def test_empty_link_falls_back_to_settings(self, session_factory, redis_client):
+        snapshot = SystemSettingsSnapshot(session_factory, redis_client)
+        handler = TributePaymentHandler(settings_snapshot=snapshot)
+        handler.ultra_link = "https://fallback/ultra"
+
+        link = asyncio.run(handler.create_subscription_link(
+            3, SubscriptionType.ULTRA, user_subscription_type=SubscriptionType.PRO
+        ))
+        assert link == "https://fallback/ultra?user_id=3"
+
+    def test_works_without_redis(self, session_factory, monkeypatch):
+        monkeypatch.setattr("config.database.redis_client", None)
+        snapshot = SystemSettingsSnapshot(session_factory, redis_client=None, check_interval=0)
+
+        async def scenario():
+            first = await snapshot.aget('payment_link_free_to_pro')
+            snapshot.bump_version()
+            return first, snapshot.is_loaded, await snapshot.aget('payment_link_free_to_pro')
+
+        first, loaded_after_bump, again = asyncio.run(scenario())
+        assert first == again == 'https://t.me/tribute/app?startapp=free_pro'
+        assert loaded_after_bump is False
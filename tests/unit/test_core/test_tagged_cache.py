@@ -0,0 +1,131 @@
+"""Tests for tag-based cache invalidation (no KEYS)."""
+
+import fakeredis
+import pytest
+
+from admin_panel import cache_utils
+from core.ai.cache_manager import AICacheManager
+from core.cache import tagged_keys
+from core.cache.tagged_keys import invalidate_tag, set_tagged, tag_key
+
+
+class CountingRedis(fakeredis.FakeRedis):
+    """Records every command sent outside pipelines."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.commands = []
+
+    def execute_command(self, *args, **options):
+        self.commands.append(args[0].upper())
+        return super().execute_command(*args, **options)
+
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    client = CountingRedis(decode_responses=True)
+    monkeypatch.setattr(cache_utils, "redis_client", client)
+    return client
+
+
+def fill_unrelated(client, count=100_000):
+    pipe = client.pipeline(transaction=False)
+    for start in range(0, count, 10_000):
+        pipe.mset({f"user:{index}": "x" for index in range(start, start + 10_000)})
+    # Ключи с похожими префиксами, но не из кеша
+    pipe.mset({f"ai_cache_other:{index}": "x" for index in range(100)})
+    pipe.execute()
+
+
+class TestTaggedInvalidation:
+    """Test invalidation touches only tagged keys."""
+
+    def test_ai_cache_invalidation_with_100k_unrelated_keys(self, redis_client):
+        fill_unrelated(redis_client)
+        manager = AICacheManager(redis_client)
+        for identifier in range(50):
+            manager.cache_result("trends", f"user{identifier}", {"value": identifier}, period="week")
+            manager.cache_result("trends", f"user{identifier}", {"value": identifier}, period="month")
+            manager.cache_result("themes", f"user{identifier}", {"value": identifier})
+        size_before = redis_client.dbsize()
+        redis_client.commands.clear()
+
+        deleted_one = manager.invalidate_cache("trends", "user7")
+        deleted_type = manager.invalidate_cache("trends")
+
+        assert deleted_one == 2
+        assert deleted_type == 98
+        assert "KEYS" not in redis_client.commands
+        assert "SCAN" not in redis_client.commands
+        assert manager.get_cached_result("themes", "user7") is not None
+        assert manager.get_cached_result("trends", "user8", period="week") is None
+        # Удалены 100 записей trends и 2 set тегов; теги остальных идентификаторов истекут по TTL
+        assert size_before - redis_client.dbsize() == 100 + 2
+        assert redis_client.exists("user:99999") == 1
+
+    def test_admin_cache_invalidation(self, redis_client):
+        fill_unrelated(redis_client, 10_000)
+        for month in ("2025-01", "2025-02", "all"):
+            set_tagged(redis_client, f"admin:dashboard_stats:{month}", "{}", 300,
+                       [cache_utils.ADMIN_CACHE_TAG, cache_utils.DASHBOARD_CACHE_TAG])
+        set_tagged(redis_client, "admin:other", "{}", 300, [cache_utils.ADMIN_CACHE_TAG])
+        redis_client.commands.clear()
+
+        assert cache_utils.invalidate_dashboard_cache("2025-01") == 1
+        assert cache_utils.invalidate_dashboard_cache() == 2
+        assert cache_utils.invalidate_admin_cache() == 1
+        assert "KEYS" not in redis_client.commands
+        assert redis_client.dbsize() == 10_100
+
+    def test_legacy_keys_removed_by_scan(self, redis_client, monkeypatch):
+        monkeypatch.setattr(tagged_keys, "UNLINK_BATCH_SIZE", 7)
+        fill_unrelated(redis_client, 10_000)
+        redis_client.mset({f"admin:dashboard_stats:2024-{month:02d}": "{}" for month in range(1, 13)})
+        redis_client.commands.clear()
+
+        assert cache_utils.invalidate_dashboard_cache() == 12
+        assert "KEYS" not in redis_client.commands
+        assert "SCAN" in redis_client.commands
+        assert redis_client.commands.count("UNLINK") == 2
+
+    def test_tag_batches_and_cleanup(self, redis_client, monkeypatch):
+        monkeypatch.setattr(tagged_keys, "UNLINK_BATCH_SIZE", 10)
+        for index in range(35):
+            set_tagged(redis_client, f"k:{index}", "v", 60, ["t"])
+
+        assert invalidate_tag(redis_client, "t") == 35
+        # Set тега удаляется в MULTI вместе с SMEMBERS, вне pipeline - только пачки ключей
+        assert redis_client.commands.count("UNLINK") == 4
+        assert redis_client.exists(tag_key("t")) == 0
+        assert redis_client.ttl(tag_key("t")) == -2
+
+    def test_key_tagged_during_invalidation_is_kept_registered(self, redis_client, monkeypatch):
+        for index in range(3):
+            set_tagged(redis_client, f"k:{index}", "v", 60, ["t"])
+        unlink = redis_client.unlink
+
+        def unlink_with_concurrent_write(*keys):
+            # Другой процесс кеширует новое значение, пока удаляются старые ключи
+            if "k:new" not in keys and not redis_client.exists("k:new"):
+                set_tagged(redis_client, "k:new", "v", 60, ["t"])
+            return unlink(*keys)
+
+        monkeypatch.setattr(redis_client, "unlink", unlink_with_concurrent_write)
+        assert invalidate_tag(redis_client, "t") == 3
+        assert redis_client.smembers(tag_key("t")) == {"k:new"}
+
+        monkeypatch.setattr(redis_client, "unlink", unlink)
+        assert invalidate_tag(redis_client, "t") == 1
+        assert redis_client.exists("k:new") == 0
+
+    def test_statistics_use_scan(self, redis_client):
+        manager = AICacheManager(redis_client)
+        manager.cache_result("trends", "a", {"value": 1})
+        manager.cache_result("themes", "b", {"value": 2})
+        redis_client.commands.clear()
+
+        stats = manager.get_cache_statistics()
+
+        assert stats["total_cached_items"] == 2
+        assert stats["cache_types"] == {"trends": 1, "themes": 1}
+        assert "KEYS" not in redis_client.commands
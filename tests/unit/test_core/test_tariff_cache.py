@@ -0,0 +1,167 @@
+"""Tests for the in-memory tariff limits table."""
+
+import asyncio
+import time
+
+import fakeredis
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database.models import Base, TariffLimits, SubscriptionType
+from core.tariffs.tariff_cache import TariffLimitsCache, tariff_limits_from_settings
+from core.tariffs.tariff_service import TariffService
+
+
+@pytest.fixture
+def engine(tmp_path):
+    # Файловая БД, чтобы два "процесса" (два кеша) видели одни и те же данные
+    engine = create_engine(f"sqlite:///{tmp_path / 'tariffs.db'}")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as session:
+        session.add(TariffLimits(
+            subscription_type=SubscriptionType.PRO,
+            analytics_limit=3,
+            themes_limit=10,
+            theme_cooldown_days=5,
+        ))
+        session.commit()
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def statements(engine):
+    executed = []
+    event.listen(engine, "before_cursor_execute", lambda *args: executed.append(args[2]))
+    return executed
+
+
+class TestTariffLimitsCache:
+    """Test tariff table loading, lookups and change notifications."""
+
+    def test_lookups_do_not_touch_db_after_load(self, engine, statements):
+        cache = TariffLimitsCache(session_factory=sessionmaker(bind=engine), redis_client=fakeredis.FakeRedis())
+        service = TariffService(cache=cache)
+
+        for _ in range(1000):
+            service.get_tariff_limits(SubscriptionType.PRO)
+            service.get_tariff_limits(SubscriptionType.FREE)
+        all_limits = service.get_all_tariff_limits()
+
+        selects = [sql for sql in statements if sql.lstrip().upper().startswith("SELECT")]
+        assert len(selects) == 1
+        assert all_limits[SubscriptionType.PRO]["themes_limit"] == 10
+        assert all_limits[SubscriptionType.FREE] == tariff_limits_from_settings(SubscriptionType.FREE)
+
+    def test_returned_limits_are_copies(self, engine):
+        cache = TariffLimitsCache(session_factory=sessionmaker(bind=engine), redis_client=fakeredis.FakeRedis())
+
+        limits = cache.get(SubscriptionType.PRO)
+        limits["themes_limit"] = 999
+
+        assert cache.get(SubscriptionType.PRO)["themes_limit"] == 10
+        with pytest.raises(TypeError):
+            cache.table()[SubscriptionType.PRO]["themes_limit"] = 1
+
+    def test_async_accessor(self, engine, tmp_path):
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'tariffs.db'}", poolclass=StaticPool)
+        cache = TariffLimitsCache(
+            session_factory=sessionmaker(bind=engine),
+            async_session_factory=async_sessionmaker(async_engine, expire_on_commit=False),
+            redis_client=fakeredis.FakeRedis(),
+        )
+
+        async def scenario():
+            limits = await TariffService(cache=cache).aget_tariff_limits(SubscriptionType.PRO)
+            await async_engine.dispose()
+            return limits
+
+        limits = asyncio.run(scenario())
+        assert limits["analytics_limit"] == 3
+
+    def test_update_refreshes_other_processes(self, engine):
+        server = fakeredis.FakeServer()
+        Session = sessionmaker(bind=engine)
+        admin_cache = TariffLimitsCache(session_factory=Session, redis_client=fakeredis.FakeRedis(server=server))
+        bot_cache = TariffLimitsCache(session_factory=Session, redis_client=fakeredis.FakeRedis(server=server))
+        assert bot_cache.get(SubscriptionType.PRO)["themes_limit"] == 10
+        assert bot_cache.start_listener()
+
+        try:
+            with Session() as session:
+                updated = TariffService(session, cache=admin_cache).update_tariff_limits(
+                    SubscriptionType.PRO,
+                    analytics_limit=4,
+                    themes_limit=20,
+                    theme_cooldown_days=7,
+                )
+            assert updated
+            assert admin_cache.get(SubscriptionType.PRO)["themes_limit"] == 20
+
+            deadline = time.time() + 5
+            while time.time() < deadline and bot_cache.get(SubscriptionType.PRO)["themes_limit"] != 20:
+                time.sleep(0.05)
+            assert bot_cache.get(SubscriptionType.PRO)["themes_limit"] == 20
+        finally:
+            bot_cache.stop_listener()
+
+    def test_falls_back_to_settings_when_db_unavailable(self):
+        class BrokenSession:
+            def execute(self, *args, **kwargs):
+                raise RuntimeError("db down")
+
+            def close(self):
+                pass
+
+        cache = TariffLimitsCache(session_factory=BrokenSession, redis_client=fakeredis.FakeRedis())
+        assert cache.get(SubscriptionType.ULTRA) == tariff_limits_from_settings(SubscriptionType.ULTRA)
+
+    def test_retries_db_after_failed_load(self, engine, statements):
+        class FakeClock:
+            now = 100.0
+
+            def __call__(self):
+                return self.now
+
+        class FlakySession:
+            """DB is down for the first load, then comes back."""
+
+            failures = 1
+
+            def __init__(self):
+                self._session = sessionmaker(bind=engine)()
+
+            def execute(self, *args, **kwargs):
+                if FlakySession.failures:
+                    FlakySession.failures -= 1
+                    raise RuntimeError("db down")
+                return self._session.execute(*args, **kwargs)
+
+            def close(self):
+                self._session.close()
+
+        clock = FakeClock()
+        cache = TariffLimitsCache(
+            session_factory=FlakySession, redis_client=fakeredis.FakeRedis(), retry_interval=30, clock=clock
+        )
+
+        assert cache.get(SubscriptionType.PRO) == tariff_limits_from_settings(SubscriptionType.PRO)
+        assert not cache.loaded_from_db
+
+        # До истечения интервала БД не трогаем - отдаем дефолты
+        clock.now += 29
+        for _ in range(100):
+            assert cache.get(SubscriptionType.PRO) == tariff_limits_from_settings(SubscriptionType.PRO)
+        assert statements == []
+
+        clock.now += 1
+        assert cache.get(SubscriptionType.PRO)["themes_limit"] == 10
+        assert cache.loaded_from_db
+
+        clock.now += 3600
+        cache.get(SubscriptionType.PRO)
+        assert len(statements) == 1
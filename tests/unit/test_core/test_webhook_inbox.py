@@ -0,0 +1,209 @@
+"""Tests for the durable payment webhook inbox."""
+
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from database.models import PaymentWebhookEvent, WebhookEventStatus
+from core.payments import webhook_inbox as inbox_module
+from core.payments.webhook_inbox import InboxEvent, WebhookInbox
+
+
+class FakePaymentHandler:
+    """Records process_payment_success calls."""
+
+    def __init__(self, result=True):
+        self.calls = []
+        self.result = result
+
+    async def process_payment_success(self, payment_id, user_id, amount, subscription_type, discount_percent=0):
+        self.calls.append((payment_id, user_id, amount, subscription_type))
+        await asyncio.sleep(0)
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+def make_event(event_id, user_id=100, payment_id=None, provider="tribute"):
+    return InboxEvent(
+        provider=provider,
+        event_id=event_id,
+        event_name="new_subscription",
+        payload="{}",
+        payment_id=payment_id or event_id,
+        telegram_user_id=user_id,
+        subscription_type="PRO",
+        amount=5.0,
+    )
+
+
+async def fetch_events(session_factory):
+    async with session_factory() as session:
+        result = await session.execute(select(PaymentWebhookEvent).order_by(PaymentWebhookEvent.id))
+        return list(result.scalars().all())
+
+
+class TestWebhookInbox:
+    """Test ingest deduplication and batched processing."""
+
+    def test_duplicate_ingest_is_ignored(self, session_factory):
+        inbox = WebhookInbox(session_factory=session_factory, payment_handler=FakePaymentHandler())
+
+        async def scenario():
+            first = await inbox.ingest(make_event("p1"))
+            second = await inbox.ingest(make_event("p1"))
+            other_provider = await inbox.ingest(make_event("p1", provider="boosty"))
+            return first, second, other_provider, await fetch_events(session_factory)
+
+        first, second, other_provider, events = asyncio.run(scenario())
+        assert first is True
+        assert second is False
+        assert other_provider is True
+        assert len(events) == 2
+
+    def test_payment_applied_exactly_once(self, session_factory):
+        handler = FakePaymentHandler()
+        inbox = WebhookInbox(session_factory=session_factory, payment_handler=handler, batch_size=2)
+
+        async def scenario():
+            for _ in range(3):
+                await inbox.ingest(make_event("p1", user_id=1))
+            await inbox.ingest(make_event("p2", user_id=2))
+            await inbox.ingest(make_event("p3", user_id=3))
+            processed = await inbox.drain()
+            processed_again = await inbox.drain()
+            return processed, processed_again, await fetch_events(session_factory)
+
+        processed, processed_again, events = asyncio.run(scenario())
+        assert processed == 3
+        assert processed_again == 0
+        assert sorted(call[0] for call in handler.calls) == ["p1", "p2", "p3"]
+        assert all(event.status == WebhookEventStatus.PROCESSED.value for event in events)
+        assert inbox.metrics.processed == 3
+
+    def test_events_of_same_user_are_coalesced(self, session_factory):
+        handler = FakePaymentHandler()
+        inbox = WebhookInbox(session_factory=session_factory, payment_handler=handler)
+
+        async def scenario():
+            # Разные события провайдера об одном и том же платеже
+            await inbox.ingest(make_event("evt-1", user_id=7, payment_id="pay-1"))
+            await inbox.ingest(make_event("evt-2", user_id=7, payment_id="pay-1"))
+            await inbox.ingest(make_event("evt-3", user_id=7, payment_id="pay-2"))
+            await inbox.drain()
+            return await fetch_events(session_factory)
+
+        events = asyncio.run(scenario())
+        assert [call[0] for call in handler.calls] == ["pay-1", "pay-2"]
+        assert all(event.status == WebhookEventStatus.PROCESSED.value for event in events)
+
+    def test_failed_event_is_retried_then_marked_failed(self, session_factory):
+        handler = FakePaymentHandler(result=False)
+        inbox = WebhookInbox(
+            session_factory=session_factory,
+            payment_handler=handler,
+            max_attempts=2,
+            retry_delay_seconds=0,
+        )
+
+        async def scenario():
+            await inbox.ingest(make_event("p1"))
+            await inbox.drain()
+            after_first = (await fetch_events(session_factory))[0]
+            await inbox.drain()
+            after_second = (await fetch_events(session_factory))[0]
+            return after_first, after_second
+
+        after_first, after_second = asyncio.run(scenario())
+        assert after_first.status == WebhookEventStatus.PENDING.value
+        assert after_first.attempts == 1
+        assert after_second.status == WebhookEventStatus.FAILED.value
+        assert after_second.attempts == 2
+        assert len(handler.calls) == 2
+
+    def test_stale_processing_event_is_reclaimed(self, session_factory):
+        handler = FakePaymentHandler()
+        inbox = WebhookInbox(session_factory=session_factory, payment_handler=handler, lock_timeout_seconds=60)
+
+        async def scenario():
+            await inbox.ingest(make_event("p1"))
+            # Имитируем падение процесса после захвата события
+            async with session_factory() as session:
+                event = (await session.execute(select(PaymentWebhookEvent))).scalar_one()
+                event.status = WebhookEventStatus.PROCESSING.value
+                event.locked_at = datetime.utcnow() - timedelta(minutes=10)
+                await session.commit()
+            await inbox.drain()
+            return await fetch_events(session_factory)
+
+        events = asyncio.run(scenario())
+        assert events[0].status == WebhookEventStatus.PROCESSED.value
+        assert handler.calls == [("p1", 100, 5.0, "PRO")]
+
+    def test_ignored_events_are_not_processed(self, session_factory):
+        handler = FakePaymentHandler()
+        inbox = WebhookInbox(session_factory=session_factory, payment_handler=handler)
+
+        async def scenario():
+            event = make_event("unknown")
+            event.ignore_reason = "Unknown event"
+            await inbox.ingest(event)
+            await inbox.drain()
+            return await fetch_events(session_factory)
+
+        events = asyncio.run(scenario())
+        assert events[0].status == WebhookEventStatus.IGNORED.value
+        assert handler.calls == []
+
+    def test_metrics_expose_backlog_and_latency(self, session_factory):
+        inbox = WebhookInbox(session_factory=session_factory, payment_handler=FakePaymentHandler())
+
+        async def scenario():
+            await inbox.ingest(make_event("p1"))
+            await inbox.ingest(make_event("p2"))
+            inbox.metrics.observe_ingest(0.004)
+            before = await inbox.get_metrics()
+            await inbox.drain()
+            after = await inbox.get_metrics()
+            return before, after
+
+        before, after = asyncio.run(scenario())
+        assert before["backlog"]["pending"] == 2
+        assert before["ingest"]["latency_last_ms"] == 4.0
+        assert after["backlog"]["pending"] == 0
+        assert after["processing"]["processed"] == 2
+
+
+class TestTributeInboxIngest:
+    """Test that Tribute webhooks are deduplicated by payment id."""
+
+    def test_tribute_retry_is_deduplicated(self, session_factory, monkeypatch):
+        from api.webhooks.tribute import TributeWebhookHandler
+
+        handler = FakePaymentHandler()
+        inbox = WebhookInbox(session_factory=session_factory, payment_handler=handler)
+        monkeypatch.setattr(inbox_module, "_webhook_inbox", inbox)
+
+        data = {
+            "name": "new_subscription",
+            "payload": {
+                "telegram_user_id": 555,
+                "amount": 500,
+                "currency": "eur",
+                "subscription_id": 42,
+                "subscription_name": "PRO",
+            },
+        }
+
+        async def scenario():
+            tribute = TributeWebhookHandler()
+            first = await tribute.accept_event(data)
+            retry = await tribute.accept_event(data)
+            await inbox.drain()
+            return first, retry
+
+        first, retry = asyncio.run(scenario())
+        assert first is True
+        assert retry is False
+        assert handler.calls == [("42", 555, 5.0, "PRO")]
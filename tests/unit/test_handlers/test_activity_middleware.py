@@ -0,0 +1,171 @@
+"""Tests for write-behind activity tracking."""
+
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from aiogram.types import User as TelegramUser
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from bot.middlewares.activity import ActivityMiddleware, ActivityTracker
+from database.models import User
+
+
+USERS = 1000
+UPDATES = 10_000
+START = datetime(2026, 1, 1, 12, 0, 0)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = START
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def async_engine(async_engine):
+    async def seed():
+        async with async_sessionmaker(async_engine)() as session:
+            session.add_all([
+                User(id=i, telegram_id=100_000 + i, referral_bonus_paid=False,
+                     last_activity_at=START - timedelta(days=40))
+                for i in range(1, USERS + 1)
+            ])
+            await session.commit()
+
+    asyncio.run(seed())
+    return async_engine
+
+
+def updates(statements):
+    return [sql for sql in statements if sql.lstrip().upper().startswith(("UPDATE", "WITH"))]
+
+
+async def handler(event, data):
+    return "handled"
+
+
+def telegram_user(telegram_id, is_bot=False):
+    return TelegramUser(id=telegram_id, is_bot=is_bot, first_name="Test")
+
+
+def activity(session_factory):
+    async def load():
+        async with session_factory() as session:
+            result = await session.execute(select(User.telegram_id, User.last_activity_at))
+            return dict(result.all())
+
+    return asyncio.run(load())
+
+
+class TestActivityMiddleware:
+    """Test batched last_activity_at updates."""
+
+    def test_10k_updates_one_statement_per_flush(self, session_factory, statements):
+        clock = FakeClock()
+        tracker = ActivityTracker(session_factory, clock=clock)
+        middleware = ActivityMiddleware(tracker)
+        rng = random.Random(42)
+        expected = {}
+        intervals = 4
+
+        async def scenario():
+            for interval in range(intervals):
+                for _ in range(UPDATES // intervals):
+                    clock.now += timedelta(milliseconds=rng.randint(0, 3))
+                    telegram_id = 100_000 + rng.randint(1, USERS)
+                    expected[telegram_id] = clock.now
+                    data = {"event_from_user": telegram_user(telegram_id)}
+                    assert await middleware(handler, object(), data) == "handled"
+                # На пути апдейта к БД не обращаемся
+                assert len(updates(statements)) == interval
+                await tracker.flush()
+                assert len(updates(statements)) == interval + 1
+
+        asyncio.run(scenario())
+
+        assert len(updates(statements)) == intervals
+        stored = activity(session_factory)
+        for telegram_id, ts in expected.items():
+            assert stored[telegram_id] == ts
+        untouched = set(stored) - set(expected)
+        assert all(stored[telegram_id] == START - timedelta(days=40) for telegram_id in untouched)
+        assert tracker.pending_count == 0
+
+    def test_background_loop_and_drain_on_stop(self, session_factory, statements):
+        clock = FakeClock()
+        tracker = ActivityTracker(session_factory, flush_interval=0.05, clock=clock)
+        middleware = ActivityMiddleware(tracker)
+
+        async def scenario():
+            tracker.start()
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            for i in range(UPDATES):
+                clock.now += timedelta(milliseconds=1)
+                await middleware(handler, object(), {"event_from_user": telegram_user(100_000 + i % USERS + 1)})
+                if i % 500 == 0:
+                    await asyncio.sleep(0.01)
+            # Последние апдейты еще не сброшены - их сбрасывает stop()
+            await tracker.stop()
+            return loop.time() - started
+
+        elapsed = asyncio.run(scenario())
+
+        assert 1 <= len(updates(statements)) <= int(elapsed / tracker.flush_interval) + 1
+        stored = activity(session_factory)
+        for offset in range(1, USERS + 1):
+            # Последний апдейт пользователя - шаг i = UPDATES - USERS + offset - 1
+            assert stored[100_000 + offset] == START + timedelta(milliseconds=UPDATES - USERS + offset)
+        assert tracker.pending_count == 0
+
+    def test_older_timestamp_does_not_overwrite(self, session_factory):
+        tracker = ActivityTracker(session_factory)
+        newer = START + timedelta(hours=1)
+
+        async def scenario():
+            tracker.record(100_001, newer)
+            tracker.record(100_001, START)
+            await tracker.flush()
+            # Другой процесс сбрасывает более раннее время того же пользователя
+            tracker.record(100_001, START + timedelta(minutes=1))
+            await tracker.flush()
+
+        asyncio.run(scenario())
+        assert activity(session_factory)[100_001] == newer
+
+    def test_failed_flush_keeps_pending(self, session_factory):
+        clock = FakeClock()
+
+        class BrokenSession:
+            async def __aenter__(self):
+                raise ConnectionError("db down")
+
+            async def __aexit__(self, *args):
+                return False
+
+        tracker = ActivityTracker(lambda: BrokenSession(), clock=clock)
+
+        async def scenario():
+            tracker.record(100_001)
+            assert await tracker.flush() == 0
+            tracker._session_factory = session_factory
+            return await tracker.flush()
+
+        assert asyncio.run(scenario()) == 1
+        assert activity(session_factory)[100_001] == START
+
+    def test_bots_and_anonymous_updates_ignored(self, session_factory):
+        tracker = ActivityTracker(session_factory)
+        middleware = ActivityMiddleware(tracker)
+
+        async def scenario():
+            await middleware(handler, object(), {})
+            await middleware(handler, object(), {"event_from_user": telegram_user(100_002, is_bot=True)})
+
+        asyncio.run(scenario())
+        assert tracker.pending_count == 0
@@ -0,0 +1,112 @@
+"""Tests for memoized main menu and calendar keyboards."""
+
+import fakeredis
+import pytest
+
+from bot import lexicon as lexicon_package
+from bot.keyboards import keyboard_cache
+from bot.keyboards.common import get_calendar_keyboard
+from bot.keyboards.keyboard_cache import KeyboardCache
+from bot.keyboards.main_menu import get_main_menu_keyboard
+from bot.lexicon.lexicon_ru import LEXICON_COMMANDS_RU as FILE_COMMANDS, LEXICON_RU as FILE_LEXICON
+from core.lexicon.service import LexiconService
+from database.models import SubscriptionType
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class Lookups(list):
+    """Recorded lexicon keys plus the texts served for them."""
+
+    texts: dict
+
+
+@pytest.fixture
+def lookups(monkeypatch):
+    """Count LexiconMapping lookups (each one is a DB query in production)."""
+    calls = Lookups()
+    texts = {"LEXICON_RU": dict(FILE_LEXICON), "LEXICON_COMMANDS_RU": dict(FILE_COMMANDS)}
+
+    def getitem(mapping, key):
+        calls.append(key)
+        return texts[mapping._category][key]
+
+    monkeypatch.setattr(lexicon_package.LexiconMapping, "__getitem__", getitem)
+    calls.texts = texts
+    return calls
+
+
+@pytest.fixture
+def lexicon_service():
+    return LexiconService(redis_client_instance=fakeredis.FakeRedis(decode_responses=True))
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def cache(monkeypatch, lexicon_service, clock):
+    cache = KeyboardCache(lexicon_service=lexicon_service, clock=clock)
+    monkeypatch.setattr(keyboard_cache, "_keyboard_cache", cache)
+    return cache
+
+
+BUILDERS = [get_main_menu_keyboard, get_calendar_keyboard]
+
+
+class TestKeyboardCache:
+    """Test keyboard memoization by tariff and lexicon version."""
+
+    def test_identical_markup_and_no_lookups_on_hits(self, cache, lookups):
+        for builder in BUILDERS:
+            for subscription_type in SubscriptionType:
+                assert builder(subscription_type) == builder.__wrapped__(subscription_type)
+
+        lookups.clear()
+        for _ in range(100):
+            for builder in BUILDERS:
+                for subscription_type in SubscriptionType:
+                    builder(subscription_type)
+        assert lookups == []
+
+    def test_keyed_by_builder_and_subscription_type(self, cache, lookups):
+        assert get_main_menu_keyboard(SubscriptionType.PRO) is get_main_menu_keyboard(SubscriptionType.PRO)
+        assert get_main_menu_keyboard(SubscriptionType.PRO) is not get_main_menu_keyboard(SubscriptionType.FREE)
+        assert get_calendar_keyboard(SubscriptionType.PRO) is not get_main_menu_keyboard(SubscriptionType.PRO)
+
+    def test_rebuilt_after_lexicon_version_bump(self, cache, lookups, lexicon_service, clock):
+        before = get_main_menu_keyboard(SubscriptionType.ULTRA)
+
+        lookups.texts["LEXICON_RU"]["referral_program_button"] = "Новая реферальная программа"
+        lexicon_service.bump_version()
+
+        # До следующей сверки версии - прежняя клавиатура
+        assert get_main_menu_keyboard(SubscriptionType.ULTRA) is before
+        clock.now += cache.check_interval
+        after = get_main_menu_keyboard(SubscriptionType.ULTRA)
+
+        assert after.inline_keyboard[2][1].text == "Новая реферальная программа"
+        assert after == get_main_menu_keyboard.__wrapped__(SubscriptionType.ULTRA)
+        assert get_main_menu_keyboard(SubscriptionType.ULTRA) is after
+
+    def test_version_survives_lexicon_cache_invalidation(self, lexicon_service):
+        lexicon_service.bump_version()
+        lexicon_service.invalidate_cache()
+        assert lexicon_service.get_version() == "1"
+
+    def test_without_redis_builds_every_time(self, monkeypatch, lookups):
+        cache = KeyboardCache(lexicon_service=LexiconService(redis_client_instance=None))
+        cache.lexicon_service.redis_client = None
+        monkeypatch.setattr(keyboard_cache, "_keyboard_cache", cache)
+
+        get_calendar_keyboard(SubscriptionType.FREE)
+        get_calendar_keyboard(SubscriptionType.FREE)
+        assert lookups == ["back_to_main_menu", "back_to_main_menu"]
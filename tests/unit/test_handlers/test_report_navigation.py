@@ -0,0 +1,153 @@
+"""Tests for analytics report navigation (report index + cached keyboards)."""
+
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import fakeredis
+import pytest
+
+from database.models import User, SubscriptionType, AnalysisStatus
+from database.models.analytics_report import AnalyticsReport
+from database.models.csv_analysis import CSVAnalysis
+from bot.handlers import analytics as analytics_handler
+from core.cache import report_keyboard_cache as cache_module
+from core.cache.report_keyboard_cache import ReportKeyboardCache
+
+
+class FakeMessage:
+    """Collects edited and answered texts."""
+
+    def __init__(self):
+        self.edits = []
+        self.answers = []
+
+    async def edit_text(self, text, reply_markup=None, parse_mode=None):
+        self.edits.append((text, reply_markup))
+
+    async def answer(self, text, **kwargs):
+        self.answers.append(text)
+
+
+class FakeCallback:
+    def __init__(self, data):
+        self.data = data
+        self.message = FakeMessage()
+
+    async def answer(self, *args, **kwargs):
+        pass
+
+
+@pytest.fixture
+def keyboard_cache(monkeypatch):
+    cache = ReportKeyboardCache(fakeredis.FakeRedis())
+    monkeypatch.setattr(cache_module, "_report_keyboard_cache", cache)
+    return cache
+
+
+async def seed_reports(session_factory, telegram_id, count):
+    """Create user with `count` completed reports, returns (user, report ids newest first)."""
+    async with session_factory() as session:
+        user = User(telegram_id=telegram_id, subscription_type=SubscriptionType.PRO)
+        session.add(user)
+        await session.flush()
+        base = datetime(2025, 1, 1)
+        report_ids = []
+        for index in range(count):
+            analysis = CSVAnalysis(
+                user_id=user.id, file_path="f.csv", month=1, year=2025,
+                status=AnalysisStatus.COMPLETED, created_at=base + timedelta(days=index)
+            )
+            session.add(analysis)
+            await session.flush()
+            report = AnalyticsReport(
+                csv_analysis_id=analysis.id, total_sales=1, total_revenue=1,
+                portfolio_sold_percent=1, new_works_sales_percent=1,
+                report_text_html=f"<b>report {index}</b>" + "x" * 5000,
+                period_human_ru=f"Период {index}", created_at=base + timedelta(days=index)
+            )
+            session.add(report)
+            await session.flush()
+            report_ids.append(report.id)
+        await session.commit()
+        return SimpleNamespace(id=user.id, subscription_type=user.subscription_type), report_ids[::-1]
+
+
+def button_callbacks(keyboard):
+    return [button.callback_data for row in keyboard.inline_keyboard for button in row]
+
+
+class TestReportNavigation:
+    """Test view_report_callback reads."""
+
+    def test_flipping_reports_costs_one_small_read_per_click(self, session_factory, statements, keyboard_cache):
+        async def scenario():
+            user, report_ids = await seed_reports(session_factory, 1, 40)
+            statements.clear()
+
+            per_click = []
+            callbacks = []
+            async with session_factory() as session:
+                for report_id in report_ids[:10]:
+                    before = len(statements)
+                    callback = FakeCallback(f"view_report_{report_id}")
+                    await analytics_handler.view_report_callback(callback, user, session)
+                    per_click.append(statements[before:])
+                    callbacks.append(callback)
+            return report_ids, per_click, callbacks
+
+        report_ids, per_click, callbacks = asyncio.run(scenario())
+
+        # Первый клик строит индекс и клавиатуры, дальше - только HTML одного отчета
+        assert len(per_click[0]) == 2
+        assert "report_text_html" not in per_click[0][0]
+        for statements in per_click[1:]:
+            assert len(statements) == 1
+            assert "report_text_html" in statements[0]
+
+        text, keyboard = callbacks[1].message.edits[0]
+        assert text.startswith("<b>report 38</b>")
+        assert button_callbacks(keyboard)[:2] == [f"view_report_{report_ids[0]}", f"view_report_{report_ids[2]}"]
+
+    def test_new_analysis_invalidates_keyboards(self, session_factory, keyboard_cache):
+        async def scenario():
+            user, report_ids = await seed_reports(session_factory, 1, 2)
+            async with session_factory() as session:
+                await analytics_handler.view_report_callback(FakeCallback(f"view_report_{report_ids[0]}"), user, session)
+                keyboard_cache.invalidate_sync(user.id)
+                cached = await keyboard_cache.get_keyboard(user.id, report_ids[0])
+                callback = FakeCallback(f"view_report_{report_ids[0]}")
+                await analytics_handler.view_report_callback(callback, user, session)
+                return cached, callback, report_ids
+
+        cached, callback, report_ids = asyncio.run(scenario())
+        assert cached is None
+        assert button_callbacks(callback.message.edits[0][1])[0] == f"view_report_{report_ids[1]}"
+
+    def test_foreign_report_is_not_shown(self, session_factory, keyboard_cache):
+        async def scenario():
+            owner, report_ids = await seed_reports(session_factory, 1, 1)
+            other, _ = await seed_reports(session_factory, 2, 1)
+            callback = FakeCallback(f"view_report_{report_ids[0]}")
+            async with session_factory() as session:
+                await analytics_handler.view_report_callback(callback, other, session)
+            return callback
+
+        callback = asyncio.run(scenario())
+        assert callback.message.edits == []
+        assert len(callback.message.answers) == 1
+
+    def test_works_without_redis(self, session_factory, monkeypatch):
+        cache = ReportKeyboardCache(fakeredis.FakeRedis())
+        cache.redis_client = None
+        monkeypatch.setattr(cache_module, "_report_keyboard_cache", cache)
+
+        async def scenario():
+            user, report_ids = await seed_reports(session_factory, 1, 3)
+            callback = FakeCallback(f"view_report_{report_ids[1]}")
+            async with session_factory() as session:
+                await analytics_handler.view_report_callback(callback, user, session)
+            return callback
+
+        callback = asyncio.run(scenario())
+        assert callback.message.edits[0][0].startswith("<b>report 1</b>")
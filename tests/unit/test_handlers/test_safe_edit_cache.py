@@ -0,0 +1,203 @@
+"""Tests for content-hash edit suppression in safe_edit_message."""
+
+import asyncio
+from datetime import datetime
+
+import fakeredis
+import pytest
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import EditMessageText
+from aiogram.types import Chat, InlineKeyboardButton, InlineKeyboardMarkup, Message, MessageEntity
+
+from bot.utils import safe_edit as safe_edit_module
+from bot.utils.safe_edit import EDIT_HASH_PREFIX, EditHashCache, safe_edit_message
+
+
+class FakeSession(BaseSession):
+    """Records API calls instead of going to Telegram."""
+
+    def __init__(self, not_modified=False):
+        super().__init__()
+        self.calls = []
+        self.not_modified = not_modified
+
+    async def make_request(self, bot, method, timeout=None):
+        self.calls.append(method)
+        if self.not_modified and isinstance(method, EditMessageText):
+            raise TelegramBadRequest(method=method, message="Bad Request: message is not modified")
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+def keyboard(*labels):
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=label, callback_data=label)] for label in labels
+    ])
+
+
+def message(bot, message_id=10, chat_id=5001, reply_markup=None, text="old"):
+    return Message(
+        message_id=message_id,
+        date=datetime.now(),
+        chat=Chat(id=chat_id, type="private"),
+        text=text,
+        reply_markup=reply_markup,
+    ).as_(bot)
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+@pytest.fixture
+def hash_cache(redis_client, monkeypatch):
+    cache = EditHashCache(redis_client)
+    monkeypatch.setattr(safe_edit_module, "_edit_hash_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def bot():
+    return Bot(token="42:TEST", session=FakeSession())
+
+
+def edits(bot):
+    return [call for call in bot.session.calls if isinstance(call, EditMessageText)]
+
+
+class TestSafeEditHashCache:
+    """Test that identical edits are not sent to Telegram."""
+
+    def test_repeated_identical_edits_make_one_call(self, bot, hash_cache):
+        menu = keyboard("a", "b")
+
+        async def scenario():
+            await safe_edit_message(message=message(bot), text="Меню", reply_markup=menu)
+            # Апдейт от повторного нажатия несет уже отредактированное сообщение
+            for _ in range(5):
+                await safe_edit_message(message=message(bot, reply_markup=menu, text="Меню"), text="Меню", reply_markup=menu)
+
+        asyncio.run(scenario())
+        assert len(edits(bot)) == 1
+
+    def test_changed_markup_still_edits(self, bot, hash_cache):
+        first, second = keyboard("a"), keyboard("a", "b")
+
+        async def scenario():
+            await safe_edit_message(message=message(bot), text="Меню", reply_markup=first)
+            await safe_edit_message(message=message(bot, reply_markup=first, text="Меню"), text="Меню", reply_markup=second)
+            await safe_edit_message(message=message(bot, reply_markup=second, text="Меню"), text="Меню", reply_markup=second)
+            await safe_edit_message(message=message(bot, reply_markup=second, text="Меню"), text="Меню", reply_markup=second,
+                                    parse_mode=None)
+
+        asyncio.run(scenario())
+        sent = edits(bot)
+        assert len(sent) == 3
+        assert [len(call.reply_markup.inline_keyboard) for call in sent] == [1, 2, 2]
+        assert sent[2].parse_mode is None
+
+    def test_other_message_is_not_suppressed(self, bot, hash_cache):
+        menu = keyboard("a")
+
+        async def scenario():
+            await safe_edit_message(message=message(bot, message_id=10), text="Меню", reply_markup=menu)
+            await safe_edit_message(message=message(bot, message_id=11, reply_markup=menu, text="Меню"), text="Меню",
+                                    reply_markup=menu)
+
+        asyncio.run(scenario())
+        assert len(edits(bot)) == 2
+
+    def test_markup_changed_elsewhere_is_edited(self, bot, hash_cache):
+        menu = keyboard("a")
+
+        async def scenario():
+            await safe_edit_message(message=message(bot), text="Меню", reply_markup=menu)
+            # Клавиатуру сообщения поменяли в обход safe_edit_message - хеш устарел
+            await safe_edit_message(message=message(bot, reply_markup=keyboard("x")), text="Меню", reply_markup=menu)
+
+        asyncio.run(scenario())
+        assert len(edits(bot)) == 2
+
+    def test_text_changed_elsewhere_is_edited(self, bot, hash_cache):
+        menu = keyboard("a")
+
+        async def scenario():
+            await safe_edit_message(message=message(bot), text="Меню", reply_markup=menu)
+            # Другой обработчик вызвал edit_text напрямую: текст другой, клавиатура та же
+            await message(bot, reply_markup=menu, text="Меню").edit_text("Статистика", reply_markup=menu)
+            await safe_edit_message(message=message(bot, reply_markup=menu, text="Статистика"), text="Меню",
+                                    reply_markup=menu)
+
+        asyncio.run(scenario())
+        assert [call.text for call in edits(bot)] == ["Меню", "Статистика", "Меню"]
+
+    def test_html_text_is_compared_with_entities(self, bot, hash_cache):
+        menu = keyboard("a")
+        shown = Message(
+            message_id=10,
+            date=datetime.now(),
+            chat=Chat(id=5001, type="private"),
+            text="Тариф PRO",
+            entities=[MessageEntity(type="bold", offset=6, length=3)],
+            reply_markup=menu,
+        ).as_(bot)
+
+        async def scenario():
+            await safe_edit_message(message=message(bot), text="Тариф <b>PRO</b>\n", reply_markup=menu)
+            await safe_edit_message(message=shown, text="Тариф <b>PRO</b>\n", reply_markup=menu)
+
+        asyncio.run(scenario())
+        assert len(edits(bot)) == 1
+
+    def test_hash_shared_through_redis(self, bot, redis_client, monkeypatch):
+        menu = keyboard("a")
+
+        async def scenario():
+            monkeypatch.setattr(safe_edit_module, "_edit_hash_cache", EditHashCache(redis_client))
+            await safe_edit_message(message=message(bot), text="Меню", reply_markup=menu)
+            # Другой процесс бота: пустой LRU, тот же Redis
+            monkeypatch.setattr(safe_edit_module, "_edit_hash_cache", EditHashCache(redis_client))
+            await safe_edit_message(message=message(bot, reply_markup=menu, text="Меню"), text="Меню", reply_markup=menu)
+
+        asyncio.run(scenario())
+        assert len(edits(bot)) == 1
+        assert set(redis_client.hkeys(f"{EDIT_HASH_PREFIX}5001")) == {"10"}
+        assert 0 < redis_client.ttl(f"{EDIT_HASH_PREFIX}5001") <= safe_edit_module.EDIT_HASH_TTL
+
+    def test_not_modified_response_is_remembered(self, hash_cache):
+        bot = Bot(token="42:TEST", session=FakeSession(not_modified=True))
+        menu = keyboard("a")
+
+        async def scenario():
+            for _ in range(3):
+                await safe_edit_message(message=message(bot, reply_markup=menu, text="Меню"), text="Меню", reply_markup=menu)
+
+        asyncio.run(scenario())
+        assert len(edits(bot)) == 1
+
+    def test_lru_is_bounded_and_works_without_redis(self, bot, monkeypatch):
+        monkeypatch.setattr("config.database.redis_client", None)
+        cache = EditHashCache(max_size=2)
+        monkeypatch.setattr(safe_edit_module, "_edit_hash_cache", cache)
+        menu = keyboard("a")
+
+        async def scenario():
+            for message_id in (1, 2, 3):
+                await safe_edit_message(message=message(bot, message_id=message_id), text="Меню", reply_markup=menu)
+            await safe_edit_message(message=message(bot, message_id=3, reply_markup=menu, text="Меню"), text="Меню",
+                                    reply_markup=menu)
+            # Хеш для сообщения 1 вытеснен - редактируем снова
+            await safe_edit_message(message=message(bot, message_id=1, reply_markup=menu, text="Меню"), text="Меню",
+                                    reply_markup=menu)
+
+        asyncio.run(scenario())
+        assert len(edits(bot)) == 4
+        assert len(cache._lru) == 2
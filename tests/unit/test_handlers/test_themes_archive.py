@@ -0,0 +1,153 @@
+"""Tests for keyset-paginated themes archive."""
+
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import fakeredis
+import pytest
+
+from database.models import User, SubscriptionType, ThemeRequest
+from bot.handlers import themes as themes_handler
+from bot.keyboards.callbacks import ThemesCallback
+from core.cache import user_cache as user_cache_module
+from core.cache.user_cache import UserCacheService
+
+
+class FakeMessage:
+    def __init__(self):
+        self.edits = []
+
+    async def edit_text(self, text, reply_markup=None, parse_mode=None):
+        self.edits.append((text, reply_markup))
+
+
+class FakeCallback:
+    def __init__(self):
+        self.message = FakeMessage()
+        self.answered = 0
+
+    async def answer(self, *args, **kwargs):
+        self.answered += 1
+
+
+@pytest.fixture(autouse=True)
+def cache_service(monkeypatch):
+    service = UserCacheService(fakeredis.FakeRedis())
+    monkeypatch.setattr(user_cache_module, "_user_cache_service", service)
+    return service
+
+
+async def seed_archive(session_factory, count):
+    async with session_factory() as session:
+        user = User(telegram_id=1, subscription_type=SubscriptionType.ULTRA)
+        session.add(user)
+        await session.flush()
+        base = datetime(2025, 1, 1)
+        for index in range(count):
+            # Две подборки с одинаковым временем - проверка tie-break по id
+            created_at = base + timedelta(days=index // 2)
+            session.add(ThemeRequest(
+                user_id=user.id, theme_name=f"theme {index}\nsecond {index}", status="ISSUED",
+                created_at=created_at, updated_at=created_at
+            ))
+        session.add(ThemeRequest(user_id=user.id, theme_name="pending", status="PENDING",
+                                 created_at=base + timedelta(days=999), updated_at=base))
+        await session.commit()
+        return SimpleNamespace(id=user.id, subscription_type=user.subscription_type)
+
+
+def unpack_buttons(keyboard):
+    return {
+        button.text: ThemesCallback.unpack(button.callback_data)
+        for row in keyboard.inline_keyboard for button in row
+        if button.callback_data.startswith("themes:")
+    }
+
+
+def shown_theme(callback):
+    text = callback.message.edits[-1][0]
+    return text.split("1. <b>")[1].split("</b>")[0]
+
+
+class TestThemesArchive:
+    """Test archive paging reads one row per click."""
+
+    def test_archive_walks_all_pages_with_single_row_reads(self, session_factory, statements):
+        total = 50
+
+        async def scenario():
+            user = await seed_archive(session_factory, total)
+            statements.clear()
+
+            seen = []
+            per_click = []
+            async with session_factory() as session:
+                callback = FakeCallback()
+                await themes_handler.archive_themes_callback(callback, ThemesCallback(action="archive"), user, session)
+                seen.append(shown_theme(callback))
+                forward = unpack_buttons(callback.message.edits[-1][1])
+                for _ in range(total - 1):
+                    data = next(item for item in forward.values() if item.direction == "older")
+                    before = len(statements)
+                    callback = FakeCallback()
+                    await themes_handler.archive_navigation_callback(callback, data, user, session)
+                    per_click.append(statements[before:])
+                    seen.append(shown_theme(callback))
+                    forward = unpack_buttons(callback.message.edits[-1][1])
+
+                # И обратно на одну страницу
+                data = next(item for item in forward.values() if item.direction == "newer")
+                callback = FakeCallback()
+                await themes_handler.archive_navigation_callback(callback, data, user, session)
+                back = shown_theme(callback)
+                indicator = callback.message.edits[-1][1].inline_keyboard[0]
+            return seen, per_click, forward, back, indicator
+
+        seen, per_click, last_buttons, back, indicator = asyncio.run(scenario())
+
+        expected = [f"Theme {index}" for index in sorted(range(total), key=lambda i: (i // 2, i), reverse=True)]
+        assert seen == expected
+        assert all(len(statements) == 1 for statements in per_click)
+        assert all("(theme_requests.created_at, theme_requests.id) <" in statements[0] for statements in per_click)
+        # На последней странице нет кнопки "вперед"
+        assert all(item.direction != "older" for item in last_buttons.values())
+        assert back == expected[-2]
+        assert any(button.text == f"{total - 1} / {total}" for button in indicator)
+
+    def test_count_is_cached_and_invalidated(self, session_factory, cache_service):
+        async def scenario():
+            user = await seed_archive(session_factory, 3)
+            async with session_factory() as session:
+                first = await themes_handler.get_archive_count(session, user.id)
+                cached = await cache_service.get_theme_archive_count(user.id)
+                await cache_service.invalidate_theme_archive_count(user.id)
+                after_invalidation = await cache_service.get_theme_archive_count(user.id)
+            return first, cached, after_invalidation
+
+        assert asyncio.run(scenario()) == (3, 3, None)
+
+    def test_legacy_page_buttons_still_work(self, session_factory):
+        async def scenario():
+            user = await seed_archive(session_factory, 5)
+            callback = FakeCallback()
+            async with session_factory() as session:
+                await themes_handler.archive_navigation_callback(
+                    callback, ThemesCallback(action="archive_page", page=2), user, session
+                )
+            return shown_theme(callback)
+
+        assert asyncio.run(scenario()) == "Theme 2"
+
+    def test_empty_archive(self, session_factory):
+        async def scenario():
+            async with session_factory() as session:
+                user = User(telegram_id=2)
+                session.add(user)
+                await session.commit()
+                callback = FakeCallback()
+                await themes_handler.archive_themes_callback(callback, ThemesCallback(action="archive"), user, session)
+            return callback
+
+        callback = asyncio.run(scenario())
+        assert callback.message.edits[0][0] == themes_handler.LEXICON_RU['themes_archive_empty']
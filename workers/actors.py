@@ -14,6 +14,7 @@ from dramatiq.brokers.redis import RedisBroker
 from config.settings import settings
 import logging
 import os
+import threading
 
 # Настройка логирования ДО использования
 # Используем только StreamHandler для воркеров (Railway собирает автоматически)
@@ -237,9 +238,21 @@ def process_csv_analysis_task(csv_analysis_id: int, user_telegram_id: int):
                 from core.cache.user_cache import get_user_cache_service
                 cache_service = get_user_cache_service()
                 cache_service.invalidate_limits_sync(user.id)
+                # Новый отчет меняет навигацию по архиву отчетов
+                from core.cache.report_keyboard_cache import get_report_keyboard_cache
+                get_report_keyboard_cache().invalidate_sync(csv_analysis.user_id)
             except Exception as cache_error:
                 logger.warning(f"Failed to invalidate cache: {cache_error}")
             
+            # Обновляем вектор профиля для поиска похожих пользователей
+            try:
+                from core.ai.profile_vectors import refresh_user_profile_vector
+                refresh_user_profile_vector(db, csv_analysis.user_id)
+                db.commit()
+            except Exception as profile_error:
+                db.rollback()
+                logger.warning(f"Failed to refresh profile vector: {profile_error}")
+            
             logger.info(f"Analysis {csv_analysis_id} completed successfully")
             
             # Отправка уведомления пользователю
@@ -296,6 +309,7 @@ def notify_analysis_complete(user_telegram_id: int, csv_analysis_id: int):
     from database.models.csv_analysis import CSVAnalysis
     from core.analytics.report_generator_fixed import FixedReportGenerator
     from core.analytics.advanced_csv_processor import AdvancedProcessResult
+    from core.notifications.delayed_queue import DelayedMessage, get_delayed_message_queue
     import asyncio
     
     try:
@@ -394,7 +408,61 @@ def notify_analysis_complete(user_telegram_id: int, csv_analysis_id: int):
             report_generator = FixedReportGenerator()
             report_data = report_generator.generate_monthly_report(result)
             
-            # Отправка отчета в несколько сообщений
+            # Части отчета после итогового сообщения с паузами между ними (секунды).
+            # Их отправляет диспетчер отложенных сообщений в процессе бота - актор не спит
+            back_to_menu_keyboard = InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(
+                    text=LEXICON_COMMANDS_RU['back_to_main_menu'],
+                    callback_data=f"analytics_report_back_{csv_analysis_id}"
+                )]
+            ])
+            follow_up = [
+                # 2. Заголовок объяснений
+                DelayedMessage(
+                    chat_id=user_telegram_id,
+                    text=LEXICON_RU['analytics_explanation_title'],
+                    delay=2.5,
+                    parse_mode="HTML",
+                ),
+                # 3. Объяснение % портфеля, который продался
+                DelayedMessage(
+                    chat_id=user_telegram_id,
+                    text=LEXICON_RU['sold_portfolio_report'].format(
+                        sold_portfolio_percentage=report_data['sold_portfolio_percentage'],
+                        sold_portfolio_text=report_data['sold_portfolio_text']
+                    ),
+                    delay=3,
+                    parse_mode="HTML",
+                ),
+                # 4. Объяснение доли продаж нового контента
+                DelayedMessage(
+                    chat_id=user_telegram_id,
+                    text=LEXICON_RU['new_works_report'].format(
+                        new_works_percentage=report_data['new_works_percentage'],
+                        new_works_text=report_data['new_works_text']
+                    ),
+                    delay=2,
+                    parse_mode="HTML",
+                ),
+                # 5. Объяснение % лимита
+                DelayedMessage(
+                    chat_id=user_telegram_id,
+                    text=LEXICON_RU['upload_limit_report'].format(
+                        upload_limit_usage=report_data['upload_limit_usage'],
+                        upload_limit_text=report_data['upload_limit_text']
+                    ),
+                    delay=2,
+                    parse_mode="HTML",
+                ),
+                # 6. Финальное сообщение с кнопкой "Назад в меню"
+                DelayedMessage(
+                    chat_id=user_telegram_id,
+                    text=LEXICON_RU['analytics_closing_message'],
+                    parse_mode="HTML",
+                    reply_markup=DelayedMessage.markup(back_to_menu_keyboard),
+                ),
+            ]
+            
             async def send_report():
                 try:
                     message_ids = []
@@ -421,78 +489,28 @@ def notify_analysis_complete(user_telegram_id: int, csv_analysis_id: int):
                         parse_mode="HTML"
                     )
                     message_ids.append(msg1.message_id)
-                    
-                    # Пауза 2-3 секунды
-                    await asyncio.sleep(2.5)
-                    
-                    # 2. Заголовок объяснений
-                    msg2 = await bot.send_message(
-                        chat_id=user_telegram_id,
-                        text=LEXICON_RU['analytics_explanation_title'],
-                        parse_mode="HTML"
-                    )
-                    message_ids.append(msg2.message_id)
-                    
-                    # Пауза 1 секунда
-                    await asyncio.sleep(1)
-                    
-                    # 3. Объяснение % портфеля, который продался
-                    await asyncio.sleep(2)
-                    msg3 = await bot.send_message(
-                        chat_id=user_telegram_id,
-                        text=LEXICON_RU['sold_portfolio_report'].format(
-                            sold_portfolio_percentage=report_data['sold_portfolio_percentage'],
-                            sold_portfolio_text=report_data['sold_portfolio_text']
-                        ),
-                        parse_mode="HTML"
-                    )
-                    message_ids.append(msg3.message_id)
-                    
-                    # 4. Объяснение доли продаж нового контента
-                    await asyncio.sleep(2)
-                    msg4 = await bot.send_message(
-                        chat_id=user_telegram_id,
-                        text=LEXICON_RU['new_works_report'].format(
-                            new_works_percentage=report_data['new_works_percentage'],
-                            new_works_text=report_data['new_works_text']
-                        ),
-                        parse_mode="HTML"
-                    )
-                    message_ids.append(msg4.message_id)
-                    
-                    # 5. Объяснение % лимита
-                    await asyncio.sleep(2)
-                    msg5 = await bot.send_message(
-                        chat_id=user_telegram_id,
-                        text=LEXICON_RU['upload_limit_report'].format(
-                            upload_limit_usage=report_data['upload_limit_usage'],
-                            upload_limit_text=report_data['upload_limit_text']
-                        ),
-                        parse_mode="HTML"
-                    )
-                    message_ids.append(msg5.message_id)
-                    
-                    # 6. Финальное сообщение с кнопкой "Назад в меню"
-                    back_to_menu_keyboard = InlineKeyboardMarkup(inline_keyboard=[
-                        [InlineKeyboardButton(
-                            text=LEXICON_COMMANDS_RU['back_to_main_menu'],
-                            callback_data=f"analytics_report_back_{csv_analysis_id}"
-                        )]
-                    ])
-                    
-                    final_msg = await bot.send_message(
-                        chat_id=user_telegram_id,
-                        text=LEXICON_RU['analytics_closing_message'],
-                        reply_markup=back_to_menu_keyboard,
-                        parse_mode="HTML"
-                    )
-                    message_ids.append(final_msg.message_id)
-                    
                     return message_ids
                     
                 finally:
                     await bot.session.close()
             
+            async def send_follow_up_inline():
+                # Без Redis - как раньше, с паузами прямо в акторе
+                try:
+                    message_ids = []
+                    for step in follow_up:
+                        await asyncio.sleep(step.delay)
+                        msg = await bot.send_message(
+                            chat_id=step.chat_id,
+                            text=step.text,
+                            parse_mode=step.parse_mode,
+                            reply_markup=InlineKeyboardMarkup.model_validate(step.reply_markup) if step.reply_markup else None
+                        )
+                        message_ids.append(msg.message_id)
+                    return message_ids
+                finally:
+                    await bot.session.close()
+            
             logger.info(f"Calling asyncio.run() to send report to user {user_telegram_id}")
             try:
                 message_ids = asyncio.run(send_report())
@@ -502,11 +520,23 @@ def notify_analysis_complete(user_telegram_id: int, csv_analysis_id: int):
                 raise
             
             # Сохраняем все message_id в БД для последующего удаления
-            # Включаем ID первого сообщения при входе в раздел (если есть) и ID сообщений отчета
+            # Включаем ID первого сообщения при входе в раздел (если есть) и ID сообщений отчета.
+            # Коммитим до постановки в очередь: ID следующих частей дописывает диспетчер
             all_message_ids = existing_message_ids + message_ids
             if all_message_ids:
                 csv_analysis.analytics_message_ids = ','.join(map(str, all_message_ids))
                 db.commit()
+            
+            queued = get_delayed_message_queue().enqueue_sequence(
+                follow_up,
+                on_sent="analytics_report",
+                context={"csv_analysis_id": csv_analysis_id},
+            )
+            if not queued:
+                follow_up_ids = asyncio.run(send_follow_up_inline())
+                all_message_ids += follow_up_ids
+                csv_analysis.analytics_message_ids = ','.join(map(str, all_message_ids))
+                db.commit()
         
         logger.info(f"Full report sent to user {user_telegram_id}")
         
@@ -540,6 +570,75 @@ def notify_analysis_failed(user_telegram_id: int, error_message: str):
         logger.error(f"Failed to notify user {user_telegram_id}: {e}")
 
 
+@dramatiq.actor(max_retries=3, time_limit=300000)  # 5 минут на пересчет
+def refresh_theme_trends():
+    """Пересчет снимка трендовых тем (theme_trend_snapshot)."""
+    from config.database import ManagedSessionLocal
+    from core.ai.market_analyzer import refresh_theme_trend_snapshot
+    
+    with ManagedSessionLocal() as db:
+        try:
+            stored = refresh_theme_trend_snapshot(db)
+            db.commit()
+            logger.info(f"Theme trend snapshot refreshed: {stored} rows")
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to refresh theme trend snapshot: {e}")
+            raise
+
+
+@dramatiq.actor(max_retries=3, time_limit=600000)  # 10 минут: первый запуск заполняет всю историю
+def refresh_daily_metrics():
+    """Досчет rollup daily_metrics от водяного знака."""
+    from config.database import ManagedSessionLocal
+    from core.analytics.daily_metrics import refresh_daily_metrics as refresh
+    
+    with ManagedSessionLocal() as db:
+        try:
+            days = refresh(db)
+            db.commit()
+            logger.info(f"Daily metrics rolled up: {days} days")
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to roll up daily metrics: {e}")
+            raise
+
+
+# Один Bot на процесс воркера для outbox платежных эффектов
+_side_effects_bot = None
+_side_effects_lock = threading.Lock()
+
+
+def _get_side_effects_bot():
+    global _side_effects_bot
+    if _side_effects_bot is None:
+        from aiogram import Bot
+        from config.settings import settings
+        _side_effects_bot = Bot(token=settings.bot_token)
+    return _side_effects_bot
+
+
+@dramatiq.actor(max_retries=3, time_limit=300000)  # 5 минут на пачку эффектов
+def drain_payment_side_effects():
+    """Выполнить накопившиеся payment_side_effects (разбан VIP, уведомления)."""
+    from core.payments.side_effects import PaymentSideEffectOutbox
+    
+    # Общий Bot нельзя использовать из двух потоков одновременно: второй вызов
+    # просто выходит, его строки заберет текущий drain или следующий запуск
+    if not _side_effects_lock.acquire(blocking=False):
+        logger.info("Payment side effects drain already running in this process, skipping")
+        return
+    try:
+        processed = PaymentSideEffectOutbox().drain(_get_side_effects_bot())
+        if processed:
+            logger.info(f"Payment side effects processed: {processed}")
+    except Exception as e:
+        logger.error(f"Failed to drain payment side effects: {e}")
+        raise
+    finally:
+        _side_effects_lock.release()
+
+
 @dramatiq.actor
 def send_notification(user_id: int, message: str):
     """Send notification to user."""